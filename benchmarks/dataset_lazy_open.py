@@ -0,0 +1,80 @@
+# ===========================================================================
+# Opening time and resident memory of `odin.fuel.Dataset` on a synthetic
+# dataset of 1000 files (Data, csv, pickle and MmapDict), each mode is run
+# in a separated process so the RSS measurement is independent.
+#  - eager : parse every file at opening
+#  - lazy  : sniff the file header, load on first `__getitem__`
+#  - lazy (manifest) : the second lazy opening, reuse the cached directory
+#    scan
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import os
+import pickle
+import resource
+import shutil
+import time
+from multiprocessing import Process, Queue
+from tempfile import mkdtemp
+
+import numpy as np
+
+from bigarray import MmapArrayWriter
+from odin.fuel import Dataset, MmapDict
+
+NB_FILES = 1000
+path = os.path.join(mkdtemp(), 'synthetic_dataset')
+
+
+def create_dataset():
+  os.mkdir(path)
+  rand = np.random.RandomState(8)
+  for i in range(NB_FILES):
+    name = os.path.join(path, 'file%04d' % i)
+    kind = i % 4
+    if kind == 0:
+      with MmapArrayWriter(name, shape=(0, 40), dtype='float32') as f:
+        f.write(rand.rand(2000, 40).astype('float32'))
+    elif kind == 1:
+      with open(name + '.csv', 'w') as f:
+        for j in range(2000):
+          f.write('utt%d %d %d\n' % (j, j * 100, (j + 1) * 100))
+    elif kind == 2:
+      with open(name, 'wb') as f:
+        pickle.dump({'utt%d' % j: rand.rand(10) for j in range(500)},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+      db = MmapDict(name)
+      for j in range(2000):
+        db['utt%d' % j] = (j * 100, (j + 1) * 100)
+      db.flush(save_all=True)
+      db.close()
+
+
+def open_dataset(lazy, q):
+  rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  start = time.time()
+  ds = Dataset(path, read_only=False, lazy=lazy)
+  duration = time.time() - start
+  q.put((duration, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) /
+         1024., len(ds)))
+  ds.close()
+
+
+def run(name, lazy):
+  q = Queue()
+  p = Process(target=open_dataset, args=(lazy, q))
+  p.start()
+  duration, rss, n = q.get()
+  p.join()
+  print("%-18s open:%.4f(s)  RSS:+%.2f(MB)  #data:%d" %
+        (name, duration, rss, n))
+
+
+if __name__ == '__main__':
+  create_dataset()
+  run('eager', False)
+  run('lazy', True)
+  run('lazy (manifest)', True)
+  shutil.rmtree(os.path.dirname(path))
@@ -0,0 +1,49 @@
+# ===========================================================================
+# Utterances/sec of the MFCCs pipeline on 1-second clips (16kHz):
+#  - transform : one utterance per call
+#  - transform_batch : the frames of all utterances in a batch are
+#    transformed by a single FFT, mel filtering and DCT
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import numpy as np
+
+from odin.preprocessing import make_pipeline, speech
+
+NB_UTTERANCES = 2000
+SAMPLE_RATE = 16000
+
+rand = np.random.RandomState(8)
+utterances = [
+    dict(raw=rand.randn(SAMPLE_RATE).astype('float32'),
+         sr=SAMPLE_RATE,
+         name='utt%d' % i) for i in range(NB_UTTERANCES)
+]
+pipeline = make_pipeline([
+    speech.STFTExtractor(frame_length=0.025, step_length=0.010, n_fft=512),
+    speech.PowerSpecExtractor(power=2.0),
+    speech.MelsSpecExtractor(n_mels=40, fmin=64),
+    speech.MFCCsExtractor(n_ceps=20),
+])
+
+
+def benchmark(name, func):
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-22s %.2f(s)  %.2f(utt/s)" %
+        (name, duration, NB_UTTERANCES / duration))
+
+
+if __name__ == '__main__':
+  # warm up the cached window and filters
+  pipeline.transform_batch(utterances[:8])
+  benchmark('transform', lambda: [pipeline.transform(x) for x in utterances])
+  for batch_size in (8, 32, 128):
+    benchmark(
+        'transform_batch(%d)' % batch_size, lambda: [
+            pipeline.transform_batch(utterances[i:i + batch_size])
+            for i in range(0, NB_UTTERANCES, batch_size)
+        ])
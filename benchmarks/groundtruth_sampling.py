@@ -0,0 +1,83 @@
+# ===========================================================================
+# Sampling by known factors and row matching on dSprites-sized factors
+# (737280 samples: shape 3 x scale 6 x orientation 40 x posX 32 x posY 32):
+#  - scan : previous `GroundTruth.sample_factors` (list comprehension over
+#    all rows) and `sample_indices_from_factors` (`np.array_equal` of each
+#    query against all rows, numba-jitted if available)
+#  - index : `FactorIndex` used by `GroundTruth`, mixed-radix keys, CSR
+#    key -> samples and per-factor postings
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import random
+import time
+
+import numpy as np
+
+from odin.bay.vi.utils import FactorIndex
+
+rand = np.random.RandomState(8)
+SIZES = (1, 3, 6, 40, 32, 32)
+FACTORS = np.stack(np.meshgrid(*[np.arange(i) for i in SIZES],
+                               indexing='ij'), axis=-1).reshape(-1, len(SIZES))
+FACTORS = FACTORS[rand.permutation(len(FACTORS))].astype(np.int64)
+KNOWN = [{}, {1: 2}, {1: 0, 3: 10}]
+NUM = 64
+QUERY = FACTORS[rand.randint(0, len(FACTORS), size=NUM)]
+
+
+def scan_sample_factors(factors, known, num, random_state):
+  samples = [(idx, x[None, :])
+             for idx, x in enumerate(factors)
+             if all(x[k] == v for k, v in known.items())]
+  indices = random_state.choice(len(samples), size=int(num), replace=False)
+  return np.array([samples[i][0] for i in indices])
+
+
+def scan_samples_indices(known, factors):
+  outputs = [-1] * len(known)
+  for k_idx in range(len(known)):
+    for f_idx in range(len(factors)):
+      if np.array_equal(known[k_idx], factors[f_idx]):
+        if outputs[k_idx] < 0:
+          outputs[k_idx] = f_idx
+        elif bool(random.getrandbits(1)):
+          outputs[k_idx] = f_idx
+  return outputs
+
+
+try:
+  from numba import jit
+  scan_samples_indices = jit(scan_samples_indices, nopython=True)
+  NB_QUERY = NUM
+except ImportError:
+  NB_QUERY = 2  # pure python is too slow for all queries
+
+# ====== scan ====== #
+for known in KNOWN:
+  start = time.time()
+  ids1 = scan_sample_factors(FACTORS, known, NUM, np.random.RandomState(1))
+  print("%-6s sample_factors%-16s %.4f(s)" %
+        ('scan', str(known), time.time() - start))
+start = time.time()
+scan_samples_indices(QUERY[:NB_QUERY], FACTORS)
+print("%-6s sample_indices_from_factors %.4f(s/row)" %
+      ('scan', (time.time() - start) / NB_QUERY))
+
+# ====== index ====== #
+start = time.time()
+index = FactorIndex(FACTORS)
+print("%-6s build %.4f(s)" % ('index', time.time() - start))
+for known in KNOWN:
+  start = time.time()
+  random_state = np.random.RandomState(1)
+  samples = index.match(known)
+  ids2 = samples[random_state.choice(len(samples), size=NUM, replace=False)]
+  print("%-6s sample_factors%-16s %.4f(s)" %
+        ('index', str(known), time.time() - start))
+assert np.array_equal(ids1, ids2)
+start = time.time()
+ids = index.sample_rows(QUERY, np.random.RandomState(1))
+print("%-6s sample_indices_from_factors %.7f(s/row)" %
+      ('index', (time.time() - start) / NUM))
+assert np.all(FACTORS[ids] == QUERY)
@@ -0,0 +1,55 @@
+# ===========================================================================
+# Utterances/sec of i-vector extraction from Z and F statistics
+# (nmix=256, feat_dim=40, tv_dim=400):
+#  - inv : one matrix inversion per utterance (previous implementation)
+#  - cholesky : one stacked Cholesky factorization per batch
+#  - approx : diagonalized posterior covariance, matrix products only
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+from tempfile import mkdtemp
+
+import numpy as np
+from scipy import linalg
+
+from odin.ml import GMM, Tmatrix
+
+NB_UTTERANCES = 1000
+NMIX = 256
+FEAT_DIM = 40
+TV_DIM = 400
+
+rand = np.random.RandomState(8)
+gmm = GMM(nmix=NMIX, nmix_start=NMIX, device='cpu')
+gmm.initialize(rand.randn(100, FEAT_DIM).astype('float32'))
+gmm.mean = rand.randn(FEAT_DIM, NMIX).astype('float32')
+gmm.sigma = rand.rand(FEAT_DIM, NMIX).astype('float32') + 0.5
+gmm.w = rand.dirichlet(np.ones(NMIX))[np.newaxis, :].astype('float32')
+tmat = Tmatrix(tv_dim=TV_DIM, gmm=gmm, device='cpu', cache_path=mkdtemp())
+Z = (rand.rand(NB_UTTERANCES, NMIX) * 10).astype('float32')
+F = rand.randn(NB_UTTERANCES, NMIX * FEAT_DIM).astype('float32')
+
+
+def inv():
+  for i in range(NB_UTTERANCES):
+    L = np.zeros((TV_DIM, TV_DIM), dtype=tmat.dtype)
+    L[tmat._itril] = np.dot(Z[i:i + 1], tmat.T_invS_Tt)
+    L += np.tril(L, -1).T + tmat.Im
+    np.dot(linalg.inv(L), np.dot(tmat.T_invS, F[i:i + 1].T))
+
+
+def benchmark(name, func):
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-10s %.2f(s)  %.2f(utt/s)" %
+        (name, duration, NB_UTTERANCES / duration))
+
+
+if __name__ == '__main__':
+  benchmark('inv', inv)
+  benchmark('cholesky',
+            lambda: tmat.transform_to_disk(Z, F, device='cpu', approx=False))
+  benchmark('approx',
+            lambda: tmat.transform_to_disk(Z, F, device='cpu', approx=True))
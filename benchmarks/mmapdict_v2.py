@@ -0,0 +1,73 @@
+# ===========================================================================
+# MmapDict (binary index, version 2) vs MmapDictV1 (pickled index) vs
+# SQLiteDict, at 10M keys by default:
+#   python mmapdict_v2.py [nb_keys]
+# Reported: writing time (with periodical flush), re-opening time,
+# random single-key reads, and batched reads (`get_many` for MmapDict)
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import time
+from tempfile import mkdtemp
+
+import numpy as np
+
+from odin.fuel.databases import MmapDict, MmapDictV1, SQLiteDict
+
+NB_KEYS = int(sys.argv[1]) if len(sys.argv) > 1 else 10 * 1000 * 1000
+NB_READS = 100000
+BATCH_SIZE = 1000
+CACHE_SIZE = 10000
+
+path = mkdtemp()
+keys = ['utt%d' % i for i in range(NB_KEYS)]
+rand = np.random.RandomState(8)
+queries = [keys[i] for i in rand.permutation(NB_KEYS)[:NB_READS]]
+
+
+def benchmark(name, db_type):
+  db_path = os.path.join(path, name)
+  # ====== writing ====== #
+  start = time.time()
+  db = db_type(db_path, cache_size=CACHE_SIZE)
+  for i, k in enumerate(keys):
+    db[k] = (i * 100, (i + 1) * 100)
+  db.flush(save_all=True)
+  db.close()
+  write_time = time.time() - start
+  # ====== opening ====== #
+  start = time.time()
+  db = db_type(db_path, read_only=True)
+  if hasattr(db, 'indices'):  # force loading the pickled indices
+    db.indices
+  open_time = time.time() - start
+  # ====== single key ====== #
+  start = time.time()
+  for k in queries:
+    db[k]
+  single_time = time.time() - start
+  # ====== batched ====== #
+  start = time.time()
+  for i in range(0, NB_READS, BATCH_SIZE):
+    batch = queries[i:i + BATCH_SIZE]
+    if hasattr(db, 'get_many'):
+      db.get_many(batch)
+    else:
+      db[batch]
+  batch_time = time.time() - start
+  db.close()
+  print("%-10s write:%.2f(s)  open:%.4f(s)  get:%.0f(keys/s)  "
+        "batch:%.0f(keys/s)  size:%.2f(MB)" %
+        (name, write_time, open_time, NB_READS / single_time,
+         NB_READS / batch_time, os.path.getsize(db_path) / 1024. / 1024.))
+
+
+if __name__ == '__main__':
+  print("#Keys:", NB_KEYS)
+  benchmark('MmapDict', MmapDict)
+  benchmark('MmapDictV1', MmapDictV1)
+  benchmark('SQLiteDict', SQLiteDict)
+  shutil.rmtree(path)
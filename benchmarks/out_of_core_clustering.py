@@ -0,0 +1,77 @@
+# ===========================================================================
+# Out-of-core clustering and nearest neighbors on a 10M x 512 float32
+# `MmapArray` (~20GB, Gaussian mixture of 1024 components), use the
+# environment variables NB_SAMPLES and FEAT_DIM for a smaller bank:
+#  - StreamingKMeans : samples/s of one mini-batch epoch (256 clusters)
+#  - BlockedKNN : queries/s of exact 10-NN search streaming the whole bank
+#  - IVFIndex : build time, queries/s and recall@10 (w.r.t. BlockedKNN)
+#    for different number of probed lists
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from bigarray import MmapArray, MmapArrayWriter
+
+from odin.ml.cluster import BlockedKNN, IVFIndex, StreamingKMeans
+
+NB_SAMPLES = int(os.environ.get('NB_SAMPLES', 10000000))
+FEAT_DIM = int(os.environ.get('FEAT_DIM', 512))
+NB_COMPONENTS = 1024
+NB_QUERIES = 1000
+K = 10
+CHUNK = 100000
+
+rand = np.random.RandomState(8)
+TMP = tempfile.mkdtemp()
+PATH = os.path.join(TMP, 'bank')
+
+
+def create_bank():
+  centers = rand.randn(NB_COMPONENTS, FEAT_DIM).astype('float32') * 2
+  with MmapArrayWriter(PATH,
+                       shape=(0, FEAT_DIM),
+                       dtype='float32',
+                       remove_exist=True) as f:
+    for s in range(0, NB_SAMPLES, CHUNK):
+      n = min(CHUNK, NB_SAMPLES - s)
+      x = centers[rand.randint(0, NB_COMPONENTS, size=n)]
+      x += rand.randn(n, FEAT_DIM).astype('float32')
+      f.write(x)
+  return MmapArray(PATH)
+
+
+def timing(name, func, n, unit):
+  start = time.time()
+  results = func()
+  duration = time.time() - start
+  print("%-20s %10.3f(s) %12.1f(%s/s)" % (name, duration, n / duration, unit))
+  return results
+
+
+if __name__ == '__main__':
+  X = create_bank()
+  print("Bank:", X.shape, "%.2f(GB)" % (X.nbytes / 1024**3))
+  Q = np.asarray(X[rand.choice(NB_SAMPLES, size=NB_QUERIES, replace=False)])
+  # ====== k-means ====== #
+  kmeans = StreamingKMeans(n_clusters=256, max_iter=1, compute_labels=False)
+  timing('StreamingKMeans', lambda: kmeans.fit(X), NB_SAMPLES, 'samples')
+  # ====== exact search ====== #
+  knn = BlockedKNN(n_neighbors=K).fit(X)
+  _, ref = timing('BlockedKNN', lambda: knn.kneighbors(Q), NB_QUERIES,
+                  'queries')
+  # ====== approximated search ====== #
+  ivf = IVFIndex(n_neighbors=K)
+  timing('IVFIndex[build]', lambda: ivf.fit(X), NB_SAMPLES, 'samples')
+  for n_probe in (1, 4, 16, 64):
+    ivf.n_probe = n_probe
+    _, idx = timing('IVFIndex[probe=%d]' % n_probe, lambda: ivf.kneighbors(Q),
+                    NB_QUERIES, 'queries')
+    recall = np.mean([len(set(i) & set(j)) for i, j in zip(idx, ref)]) / K
+    print("%-20s recall@%d: %.4f" % ('', K, recall))
+  del X
+  shutil.rmtree(TMP)
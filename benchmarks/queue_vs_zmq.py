@@ -1,77 +1,100 @@
+# ===========================================================================
+# Per-message overhead of sending ndarray between processes:
+#  - raw Queue / zmq : bytes of the array pickled through multiprocessing
+#    Queue, or sent as a zmq message
+#  - MPI(python) / MPI(pyzmq) : results of `odin.utils.mpi.MPI`, small
+#    arrays are pickled, big arrays are sent as shared memory blocks or
+#    zmq frames; the main process CPU time shows the cost of waiting
+#    (blocking, no busy polling)
+# ===========================================================================
 import sys
-import zmq
-from multiprocessing import Process, Queue
 import time
-import numpy as np
-import marshal
-from odin.utils import array2bytes, bytes2array
-from odin.utils.mpi import QueueZMQ
-
-NB_MESSAGE = 800000 * 2
+from multiprocessing import Process, Queue
 
+import numpy as np
+import zmq
 
-X = np.random.randn(80, 120).astype('float32')
-print(np.sum(X), np.sum(X**2))
+from odin.utils import array2bytes, bytes2array
+from odin.utils.mpi import MPI
 
-context = zmq.Context(io_threads=1)
-# context = zmq.Context.instance()
+NB_MESSAGE = 2000
+SHAPES = [(80, 120), (1000, 120), (4000, 250)]  # 37.5KB, 468KB, 3.8MB
 
 
 # ===========================================================================
 # zmq
 # ===========================================================================
-def worker_zmq():
-    work_receiver = context.socket(zmq.PULL)
-    work_receiver.connect("tcp://127.0.0.1:5557")
+def worker_zmq(X):
+  context = zmq.Context()
+  sender = context.socket(zmq.PUSH)
+  sender.connect("tcp://127.0.0.1:5557")
+  for _ in range(NB_MESSAGE):
+    sender.send(array2bytes(X))
+  sender.close()
+  context.term()
+  sys.exit(0)
+
+
+def main_zmq(X):
+  context = zmq.Context()
+  receiver = context.socket(zmq.PULL)
+  receiver.bind("tcp://127.0.0.1:5557")
+  Process(target=worker_zmq, args=(X,)).start()
+  for _ in range(NB_MESSAGE):
+    message = bytes2array(receiver.recv())
+  receiver.close()
+  context.term()
 
-    start_time = time.time()
-    for task_nbr in range(NB_MESSAGE):
-        message = work_receiver.recv()
-        message = bytes2array(message)
-    end_time = time.time()
-    duration = end_time - start_time
-    msg_per_sec = NB_MESSAGE / duration
-    print("Zmq Duration: %s" % duration, msg_per_sec,
-          np.sum(message), np.sum(message**2))
-    sys.exit(1)
 
+# ===========================================================================
+# Queue
+# ===========================================================================
+def worker_queue(q, X):
+  for _ in range(NB_MESSAGE):
+    q.put(array2bytes(X))
+  sys.exit(0)
 
-def main_zmq():
-    Process(target=worker_zmq, args=()).start()
-    ventilator_send = context.socket(zmq.PUSH)
-    ventilator_send.bind("tcp://127.0.0.1:5557")
 
-    for num in range(NB_MESSAGE):
-        ventilator_send.send(array2bytes(X))
+def main_queue(X):
+  q = Queue()
+  Process(target=worker_queue, args=(q, X)).start()
+  for _ in range(NB_MESSAGE):
+    message = bytes2array(q.get())
 
 
 # ===========================================================================
-# Queue
+# MPI
 # ===========================================================================
-def worker_queue(q):
-    start_time = time.time()
-    for task_nbr in range(NB_MESSAGE):
-        message = q.get()
-        message = bytes2array(message)
-    end_time = time.time()
-    duration = end_time - start_time
-    msg_per_sec = NB_MESSAGE / duration
-    print("Queue Duration: %s" % duration, msg_per_sec,
-          np.sum(message), np.sum(message**2))
-    sys.exit(1)
-
-
-def main_queue():
-    send_q = Queue()
-    Process(target=worker_queue, args=(send_q,)).start()
-    for num in range(NB_MESSAGE):
-        send_q.put(array2bytes(X))
+def main_mpi(X, backend):
+  n = 0
+  for x in MPI(jobs=list(range(NB_MESSAGE)),
+               func=lambda i: X,
+               ncpu=2,
+               batch=1,
+               hwm=256,
+               backend=backend):
+    n += 1
+  assert n == NB_MESSAGE
+
+
+def benchmark(name, func):
+  start_cpu = time.process_time()
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-14s %6.2f(us/msg)  %10.2f(msg/s)  main CPU:%.2f(s)" %
+        (name, duration / NB_MESSAGE * 1e6, NB_MESSAGE / duration,
+         time.process_time() - start_cpu))
 
 
 # ===========================================================================
 # Run the test
 # ===========================================================================
 if __name__ == "__main__":
-    # main_zmq()
-    main_queue()
-    context.term()
+  for shape in SHAPES:
+    X = np.random.randn(*shape).astype('float32')
+    print("Array:", shape, "%.1f(KB)" % (X.nbytes / 1024))
+    benchmark('raw Queue', lambda: main_queue(X))
+    benchmark('raw zmq', lambda: main_zmq(X))
+    benchmark('MPI(python)', lambda: main_mpi(X, 'python'))
+    benchmark('MPI(pyzmq)', lambda: main_mpi(X, 'pyzmq'))
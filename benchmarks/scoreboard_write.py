@@ -0,0 +1,73 @@
+# ===========================================================================
+# Writing and reading 1M rows of per-step scores (int, float, string
+# columns) with `odin.exp.ScoreBoard` on a database file:
+#  - write : one `ScoreBoard.write` per row inside `recording()`, the
+#    throughput is measured on the first 50000 rows
+#  - write_many[rows] : list of dictionaries in one transaction
+#  - write_many[columns] : dictionary of numpy arrays in one transaction
+#  - journal modes : `write_many[columns]` with rollback journal (DELETE,
+#    synchronous=FULL) and write-ahead logging (WAL, synchronous=NORMAL)
+#  - select : list of rows vs columnar numpy arrays
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from odin.exp.scores import ScoreBoard
+
+NB_ROWS = 1000000
+NB_SINGLE = 50000
+
+rand = np.random.RandomState(8)
+COLUMNS = dict(step=np.arange(NB_ROWS),
+               loss=rand.rand(NB_ROWS),
+               llk=rand.randn(NB_ROWS),
+               split=np.array(['train', 'valid'])[rand.randint(0, 2, NB_ROWS)])
+ROWS = [
+    dict(zip(COLUMNS.keys(), r)) for r in zip(*[
+        COLUMNS['step'].tolist(), COLUMNS['loss'].tolist(),
+        COLUMNS['llk'].tolist(), COLUMNS['split'].tolist()
+    ])
+]
+TMP = tempfile.mkdtemp()
+
+
+def new_board(name, **kwargs):
+  return ScoreBoard(os.path.join(TMP, name + '.db'), **kwargs)
+
+
+def benchmark(name, func, nrows=NB_ROWS):
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-24s %8.3f(s)  %10.0f(rows/s)" % (name, duration, nrows / duration))
+
+
+def write_single():
+  board = new_board('single')
+  with board.recording():
+    for r in ROWS[:NB_SINGLE]:
+      board.write('scores', **r)
+  board.close()
+
+
+if __name__ == '__main__':
+  benchmark('write', write_single, nrows=NB_SINGLE)
+  benchmark('write_many[rows]',
+            lambda: new_board('rows').write_many('scores', ROWS).close())
+  for mode, sync in (('DELETE', 'FULL'), ('WAL', 'NORMAL')):
+    benchmark(
+        'write_many[%s,%s]' % (mode, sync), lambda: new_board(
+            mode, journal_mode=mode, synchronous=sync).write_many(
+                'scores', COLUMNS).close())
+  board = new_board('WAL', read_only=True)
+  benchmark('select[rows]', lambda: board.select(table='scores'))
+  benchmark('select[columnar]',
+            lambda: board.select(table='scores', columnar=True))
+  board.close()
+  shutil.rmtree(TMP)
@@ -0,0 +1,83 @@
+# ===========================================================================
+# Sliding-window kernels on an hour-long recording (360000 frames, 10ms
+# hop, 60 features):
+#  - loop : previous implementation, per-frame statistics over the window
+#    (wmvn, SAD thresholding) and `lfilter` for deltas
+#  - cumsum / strided : `odin.preprocessing.signal` and `SADthreshold`
+#    kernels, windowed statistics from cumulative sums in O(T * D) and
+#    deltas as a product of a strided view of all windows
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import numpy as np
+from scipy import signal as sp_signal
+
+from odin.preprocessing.signal import delta, shifted_deltas, wmvn
+from odin.preprocessing.speech import _sad_thresholding
+
+NB_FRAMES = 360000
+FEAT_DIM = 60
+WIN_LENGTH = 301
+
+rand = np.random.RandomState(8)
+X = rand.randn(NB_FRAMES, FEAT_DIM).astype('float32')
+SAD = rand.rand(NB_FRAMES) > 0.3
+ENERGY = rand.randn(NB_FRAMES).astype('float32')
+
+
+def wmvn_loop(x, w, indices):
+  nobs = x.shape[0]
+  hlen = (w - 1) // 2
+  y = np.empty_like(x)
+  for ix in range(nobs):
+    start = min(max(ix - hlen, 0), nobs - w)
+    x_stat = x[start:start + w][indices[start:start + w]]
+    y[ix] = (x[ix] - x_stat.mean(0)) / (x_stat.std(0) + 1e-18)
+  return y
+
+
+def sad_loop(energy, threshold, context, proportion):
+  n_frames = len(energy)
+  sad = np.empty(shape=(n_frames,))
+  for t in range(n_frames):
+    num_count = 0
+    den_count = 0
+    for t2 in range(t - context, t + context + 1):
+      if 0 <= t2 < n_frames:
+        den_count += 1
+        if energy[t2] > threshold:
+          num_count += 1
+    sad[t] = num_count >= den_count * proportion
+  return sad
+
+
+def delta_lfilter(x, width):
+  half_length = 1 + width // 2
+  window = np.arange(half_length - 1., -half_length, -1.)
+  window /= np.sum(window**2)
+  x = np.pad(x, [(width, width), (0, 0)], mode='edge')
+  x = sp_signal.lfilter(window, 1, x, axis=0)
+  return x[-half_length - NB_FRAMES:-half_length].astype('float32')
+
+
+def benchmark(name, func):
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-16s %8.3f(s)  %8.1fx real-time" % (name, duration,
+                                               NB_FRAMES / 100 / duration))
+
+
+if __name__ == '__main__':
+  out = np.empty_like(X)
+  benchmark('wmvn[loop]', lambda: wmvn_loop(X, WIN_LENGTH, SAD))
+  benchmark('wmvn[cumsum]',
+            lambda: wmvn(X, w=WIN_LENGTH, indices=SAD, out=out))
+  benchmark('SAD[loop]', lambda: sad_loop(ENERGY, 0.55, 2, 0.12))
+  benchmark('SAD[cumsum]',
+            lambda: _sad_thresholding(ENERGY, 0.55, 0.5, 2, 0.12))
+  benchmark('delta[lfilter]', lambda: delta_lfilter(X, 9))
+  benchmark('delta[strided]', lambda: delta(X, width=9, order=1, axis=0))
+  benchmark('SDC', lambda: shifted_deltas(X, N=7, d=1, P=3, k=7))
@@ -0,0 +1,67 @@
+# ===========================================================================
+# Milliseconds per utterance of MFCCs extraction (16kHz, 25ms frame,
+# 10ms step, 40 mels, 20 ceps) for short and long utterances:
+#  - per-call : window, mel filter banks and DCT basis computed for every
+#    utterance, separated STFT, power, mel, log and DCT steps
+#  - plan : `odin.preprocessing.signal.spectra` using the cached
+#    `SpectralPlan` and its scratch buffers, fused power/mel/log/DCT
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import numpy as np
+from scipy.signal import get_window
+
+from odin.preprocessing import signal
+
+SR = 16000
+FRAME_LENGTH = 400
+STEP_LENGTH = 160
+N_FFT = 512
+N_MELS = 40
+N_CEPS = 20
+NB_UTTERANCES = 200
+
+
+def per_call(y):
+  window = get_window('hamm', FRAME_LENGTH, fftbins=True)
+  mel_basis = signal.mel_filters.__wrapped__(SR, N_FFT, N_MELS, 64, SR // 2)
+  dct_basis = signal.dct_filters.__wrapped__(N_CEPS + 1, N_MELS)
+  frames = np.lib.stride_tricks.as_strided(
+      y,
+      shape=(1 + (len(y) - FRAME_LENGTH) // STEP_LENGTH, FRAME_LENGTH),
+      strides=(y.strides[0] * STEP_LENGTH, y.strides[0]))
+  frames = frames * window
+  energy = signal.get_energy(frames)
+  S = np.fft.rfft(frames, n=N_FFT) * np.sqrt(1.0 / window.sum()**2)
+  spec = np.abs(S)**2
+  mspec = signal.power2db(np.dot(mel_basis, spec.T).T)
+  mfcc = np.dot(dct_basis, mspec.T)[1:].T
+  return (signal.power2db(spec).astype('float32'), energy,
+          mspec.astype('float32'), mfcc.astype('float32'))
+
+
+def plan(y):
+  return signal.spectra(sr=SR, frame_length=FRAME_LENGTH, y=y,
+                        step_length=STEP_LENGTH, n_fft=N_FFT, window='hamm',
+                        n_mels=N_MELS, n_ceps=N_CEPS)
+
+
+def benchmark(name, func, utterances):
+  start = time.time()
+  for y in utterances:
+    func(y)
+  duration = time.time() - start
+  print("%-10s %8.3f(ms/utt)" % (name, duration / len(utterances) * 1000))
+
+
+if __name__ == '__main__':
+  for duration in (0.5, 2., 10.):
+    utterances = [
+        np.random.randn(int(SR * duration)).astype('float32')
+        for _ in range(NB_UTTERANCES)
+    ]
+    print("Utterance: %.1f(s)" % duration)
+    benchmark('per-call', per_call, utterances)
+    benchmark('plan', plan, utterances)
@@ -0,0 +1,58 @@
+# ===========================================================================
+# EER and minDCF of 20M trials (10% target) given in batches of 1M:
+#  - sort : concatenate all scores, then `det_curve` (sorting) and
+#    `compute_EER`, `compute_minDCF`
+#  - accumulator : `DetectionAccumulator`, histogram of 65536 bins updated
+#    per batch
+#  - merge : 4 accumulators (e.g. from parallel scorers) merged at the end
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import numpy as np
+
+from odin.backend.metrics import (DetectionAccumulator, compute_EER,
+                                  compute_minDCF, det_curve)
+
+NB_TRIALS = 20 * 10**6
+BATCH_SIZE = 10**6
+
+
+def batches():
+  rand = np.random.RandomState(8)
+  for _ in range(NB_TRIALS // BATCH_SIZE):
+    labels = rand.rand(BATCH_SIZE) < 0.1
+    yield rand.randn(BATCH_SIZE) + 3. * labels, labels
+
+
+# ====== sort ====== #
+start = time.time()
+data = list(batches())
+scores = np.concatenate([s for s, _ in data])
+labels = np.concatenate([l for _, l in data]).astype(np.int64)
+del data
+Pfa, Pmiss = det_curve(labels, scores)
+eer = compute_EER(Pfa, Pmiss)
+dcf = compute_minDCF(Pfa, Pmiss, Ptrue=0.01)[0]
+print("%-12s %.3f(s) EER:%.6f minDCF:%.6f" %
+      ('sort', time.time() - start, eer, dcf))
+del scores, labels, Pfa, Pmiss
+
+# ====== accumulator ====== #
+start = time.time()
+acc = DetectionAccumulator()
+for s, l in batches():
+  acc.update(s, l)
+print("%-12s %.3f(s) EER:%.6f minDCF:%.6f" %
+      ('accumulator', time.time() - start, acc.eer(),
+       acc.min_dcf(Ptrue=0.01)[0]))
+
+# ====== merge ====== #
+start = time.time()
+parts = [DetectionAccumulator() for _ in range(4)]
+for i, (s, l) in enumerate(batches()):
+  parts[i % 4].update(s, l)
+acc = DetectionAccumulator().merge(*parts)
+print("%-12s %.3f(s) EER:%.6f minDCF:%.6f" %
+      ('merge', time.time() - start, acc.eer(), acc.min_dcf(Ptrue=0.01)[0]))
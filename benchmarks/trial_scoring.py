@@ -0,0 +1,80 @@
+# ===========================================================================
+# Trials per second of PLDA-like scoring (150-dim latent, 20000 test
+# segments x 5000 enrollment models):
+#  - one-shot : `PLDA.predict_log_proba` before, the dense scores matrix
+#    in one expression, then looking up the trial list
+#  - engine : `odin.ml.trial_scoring.ScoringEngine` in float64/float32,
+#    tiled GEMM over all pairs, or only the trial list (NIST-style, 2% of
+#    the pairs), or streaming the trial scores into an accumulator
+# ===========================================================================
+from __future__ import absolute_import, division, print_function
+
+import time
+
+import numpy as np
+
+from odin.ml.trial_scoring import ScoringEngine
+
+NB_SEGMENTS = 20000
+NB_MODELS = 5000
+DIM = 150
+NB_TRIALS = int(0.02 * NB_SEGMENTS * NB_MODELS)
+
+rand = np.random.RandomState(8)
+X = rand.randn(NB_SEGMENTS, DIM)
+X_model = rand.randn(NB_MODELS, DIM)
+Q_hat = rand.randn(DIM, DIM) * 0.01
+Lambda = np.diag(rand.rand(DIM))
+MODEL_IDX = rand.randint(0, NB_MODELS, size=NB_TRIALS)
+SEGMENT_IDX = rand.randint(0, NB_SEGMENTS, size=NB_TRIALS)
+LABELS = rand.rand(NB_TRIALS) > 0.9
+
+
+class Counter(object):
+
+  def __init__(self):
+    self.n = 0
+    self.n_target = 0
+
+  def update(self, scores, labels):
+    self.n += len(scores)
+    self.n_target += np.sum(labels)
+
+
+def one_shot():
+  score_h1 = np.sum(np.dot(X_model, Q_hat) * X_model, axis=1, keepdims=True)
+  score_h2 = np.sum(np.dot(X, Q_hat) * X, axis=1, keepdims=True)
+  score_h1h2 = 2 * np.dot(X, np.dot(X_model, Lambda).T)
+  scores = score_h1h2 + score_h1.T + score_h2
+  return scores[SEGMENT_IDX, MODEL_IDX]
+
+
+def engine(dtype):
+  return ScoringEngine(enroll=2 * np.dot(X_model, Lambda),
+                       test=X,
+                       enroll_bias=np.sum(np.dot(X_model, Q_hat) * X_model, 1),
+                       test_bias=np.sum(np.dot(X, Q_hat) * X, 1),
+                       dtype=dtype)
+
+
+def benchmark(name, func, n_trials):
+  start = time.time()
+  func()
+  duration = time.time() - start
+  print("%-24s %8.3f(s) %14.1f(trials/s)" % (name, duration,
+                                              n_trials / duration))
+
+
+if __name__ == '__main__':
+  n_pairs = NB_SEGMENTS * NB_MODELS
+  benchmark('one-shot[all pairs]', one_shot, n_pairs)
+  for dtype in ('float64', 'float32'):
+    benchmark('engine[%s,all pairs]' % dtype,
+              lambda: engine(dtype).score_matrix(), n_pairs)
+    benchmark(
+        'engine[%s,trials]' % dtype,
+        lambda: engine(dtype).score_trials(MODEL_IDX, SEGMENT_IDX), NB_TRIALS)
+  benchmark(
+      'engine[float32,stream]', lambda: engine('float32').score_trials(
+          MODEL_IDX, SEGMENT_IDX, labels=LABELS, sink=Counter(),
+          return_scores=False), NB_TRIALS)
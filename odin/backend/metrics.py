@@ -127,7 +127,7 @@ def compute_Cavg(y_llr,
                  Cfa=1.,
                  Cmiss=1.,
                  probability_input=False):
-  ''' Fast calculation of Cavg (for only 1 clusters)
+  ''' Fast calculation of Cavg
 
   Parameters
   ----------
@@ -154,35 +154,22 @@ def compute_Cavg(y_llr,
       It contains average percentage costs for each cluster as defined by
       NIST LRE-15 language detection task. See
       http://www.nist.gov/itl/iad/mig/upload/LRE15_EvalPlan_v22-3.pdf
+      (only returned if `cluster_idx` is given)
   total_cost: float
       An average percentage cost over all clusters.
 
+  Note
+  ----
+  For large evaluations, use `CavgAccumulator` to accumulate the
+  trials in batches.
   '''
-  if probability_input:
-    y_llr = to_llr(y_llr)
-  thresh = np.log(Cfa / Cmiss) - np.log(Ptrue / (1 - Ptrue))
-  nb_classes = y_llr.shape[1].value
-  if isinstance(y_true, (list, tuple)):
-    y_true = np.asarray(y_true)
-  if y_true.shape.ndims == 1:
-    y_true = tf.one_hot(y_true, depth=nb_classes, axis=-1)
-  y_true = tf.cast(y_true, y_llr.dtype.base_dtype)
-  # ====== statistics ====== #
-  # invert of y_true, False Negative mask
-  y_false = 1. - y_true
-  y_positive = tf.cast(tf.greater_equal(y_llr, thresh), y_llr.dtype.base_dtype)
-  # invert of y_positive
-  y_negative = tf.cast(tf.less(y_llr, thresh), y_llr.dtype.base_dtype)
-  distribution = tf.clip_by_value(tf.reduce_sum(y_true, axis=0), 10e-8,
-                                  10e8)  # no zero values
-  # ====== Pmiss ====== #
-  miss = tf.reduce_sum(y_true * y_negative, axis=0)
-  Pmiss = 100 * (Cmiss * Ptrue * miss) / distribution
-  # ====== Pfa ====== # This calculation give different results
-  fa = tf.reduce_sum(y_false * y_positive, axis=0)
-  Pfa = 100 * (Cfa * (1 - Ptrue) * fa) / distribution
-  Cavg = tf.reduce_mean(Pmiss) + tf.reduce_mean(Pfa) / (nb_classes - 1)
-  return Cavg
+  y_llr = np.asarray(y_llr)
+  return CavgAccumulator(nb_classes=y_llr.shape[1],
+                         Ptrue=Ptrue,
+                         Cfa=Cfa,
+                         Cmiss=Cmiss,
+                         probability_input=probability_input).update(
+                             y_llr, y_true).cavg(cluster_idx=cluster_idx)
 
 
 def compute_Cnorm(y_true,
@@ -252,8 +239,7 @@ def compute_Cnorm(y_true,
   global_cm_array = np.zeros(shape=(nb_threshold, nb_classes, nb_classes))
   # Apply threshold on the scores and compute the confusion matrix
   for scores, labels in zip(y_score, y_true):
-    actual_TP_per_class = np.lib.arraysetops.unique(ar=labels,
-                                                    return_counts=True)[1]
+    actual_TP_per_class = np.unique(ar=labels, return_counts=True)[1]
     if probability_input:  # special case input is probability values
       scores = to_llr(scores)
     for theta_ix, theta in enumerate(np.log(beta)):
@@ -577,12 +563,12 @@ def det_curve(y_true, y_score, pos_label=None, sample_weight=None):
   y_true = np.array(y_true)
   if y_true.ndim >= 2:
     y_true = np.argmax(y_true, axis=-1)
-  nb_classes = len(np.lib.arraysetops.unique(y_true))
+  nb_classes = len(np.unique(y_true))
   # multi-classes
   if nb_classes > 2:
     total_samples = nb_classes * len(y_true)
     indices = np.arange(0, total_samples, nb_classes) + y_true
-    y_true = np.zeros(total_samples, dtype=np.int)
+    y_true = np.zeros(total_samples, dtype=int)
     y_true[indices] = 1
   # ====== check weights ====== #
   if sample_weight is not None:
@@ -594,7 +580,7 @@ def det_curve(y_true, y_score, pos_label=None, sample_weight=None):
     sample_weight = np.ones(shape=(len(y_score),), dtype=y_score.dtype)
   # ====== processing ====== #
   if pos_label is not None:
-    y_true = (y_true == pos_label).astype(np.int)
+    y_true = (y_true == pos_label).astype(int)
   # ====== start ====== #
   sorted_ndx = np.argsort(y_score, kind='mergesort')
   y_true = y_true[sorted_ndx]
@@ -609,8 +595,378 @@ def det_curve(y_true, y_score, pos_label=None, sample_weight=None):
   return Pfa, Pmiss
 
 
+# ===========================================================================
+# Streaming detection metrics
+# ===========================================================================
+def _prob_to_llr(y_prob):
+  r""" Numpy version of `odin.backend.maths.to_llr`, the log-likelihood
+  ratio of each class against the other classes from the posterior
+  probabilities """
+  y_prob = np.asarray(y_prob, dtype=np.float64)
+  nb_classes = y_prob.shape[1]
+  llr = np.empty_like(y_prob)
+  for j in range(nb_classes):
+    others = np.delete(y_prob, j, axis=1)
+    m = np.max(others, axis=1)
+    llr[:, j] = y_prob[:, j] - m - np.log(
+        np.sum(np.exp(others - m[:, None]), axis=1))
+  return llr + np.log(13)
+
+
+class DetectionAccumulator(object):
+  r""" Incremental computation of the detection error trade-off (DET) curve,
+  EER and minDCF for binary detection trials (e.g. speaker verification)
+  without holding or sorting all the scores.
+
+  The first `exact_size` trials are kept, and the metrics are exact.
+  Beyond that, the scores are counted in a histogram of at most `n_bins`
+  bins of width `2^e`, the width is doubled (two bins are merged) whenever
+  the range of scores grows, so accumulators of different ranges are always
+  aligned and could be merged (e.g. from parallel scorers).
+  The error of the EER is bounded by the fraction of trials in a single bin.
+
+  Arguments:
+    n_bins : int, maximum number of bins of the histogram
+    exact_size : int, maximum number of trials for exact metrics
+
+  Example:
+  ```
+  acc = DetectionAccumulator()
+  for scores, labels in batches:
+    acc.update(scores, labels)
+  # or as the `sink` of `odin.ml.ScoringEngine.score_trials`
+  eer = acc.eer()
+  min_dcf, Pfa_opt, Pmiss_opt = acc.min_dcf(Ptrue=[0.01, 0.001])
+  ```
+  """
 
+  def __init__(self, n_bins=2**16, exact_size=100000):
+    self.n_bins = int(n_bins)
+    if self.n_bins < 2:
+      raise ValueError("n_bins must be at least 2, given: %d" % self.n_bins)
+    self.exact_size = int(exact_size)
+    # exact mode
+    self._scores = []
+    self._labels = []
+    self._n_exact = 0
+    # histogram mode, bin `i` contains the scores in
+    # `[(offset + i) * width, (offset + i + 1) * width)`
+    self._width = None
+    self._offset = 0
+    self._counts = None  # [n_bins, 2], non-target and target counts
+
+  @property
+  def is_exact(self):
+    return self._width is None
+
+  @property
+  def n_target(self):
+    if self.is_exact:
+      return int(sum(np.sum(l) for l in self._labels))
+    return int(np.sum(self._counts[:, 1]))
+
+  @property
+  def n_nontarget(self):
+    if self.is_exact:
+      return self._n_exact - self.n_target
+    return int(np.sum(self._counts[:, 0]))
+
+  # ==================== histogram ==================== #
+  def _init_grid(self, smin, smax):
+    # width relative to the score magnitude, so constant scores do not
+    # overflow the bin index
+    span = max(smax - smin, 1e-6 * max(abs(smin), abs(smax), 1.))
+    self._width = 2.**np.ceil(np.log2(span / (self.n_bins - 1)))
+    self._offset = int(np.floor(smin / self._width))
+    self._counts = np.zeros(shape=(self.n_bins, 2), dtype=np.int64)
+
+  def _fit_grid(self, lo, hi, k=0):
+    r""" Coarsen (at least `k` times) or shift the grid, so the global bins
+    in `[lo, hi]` (at current width) and all occupied bins fit, return the
+    coarsening factor `k` (i.e. the width is multiplied by `2^k`) """
+    occupied = np.flatnonzero(np.sum(self._counts, axis=1))
+    if len(occupied) > 0:
+      lo = min(lo, self._offset + occupied[0])
+      hi = max(hi, self._offset + occupied[-1])
+    if k == 0 and lo >= self._offset and hi < self._offset + self.n_bins:
+      return 0
+    while (hi >> k) - (lo >> k) + 1 > self.n_bins:
+      k += 1
+    lo, hi = lo >> k, hi >> k
+    offset = lo - (self.n_bins - (hi - lo + 1)) // 2
+    # re-bin the occupied bins
+    index = ((self._offset + occupied) >> k) - offset
+    counts = np.zeros_like(self._counts)
+    for c in range(2):
+      counts[:, c] = np.bincount(index,
+                                 weights=self._counts[occupied, c],
+                                 minlength=self.n_bins)
+    self._counts = counts
+    self._offset = offset
+    self._width *= 2**k
+    return k
+
+  def _add_samples(self, scores, labels):
+    if len(scores) == 0:
+      return
+    smin, smax = np.min(scores), np.max(scores)
+    if self._width is None:
+      self._init_grid(smin, smax)
+    self._fit_grid(int(np.floor(smin / self._width)),
+                   int(np.floor(smax / self._width)))
+    index = np.floor(scores / self._width).astype(np.int64) - self._offset
+    self._counts += np.bincount(2 * index + labels,
+                                minlength=2 * self.n_bins).reshape(-1, 2)
+
+  def _flush(self):
+    scores, labels = self._exact_data()
+    self._scores, self._labels, self._n_exact = [], [], 0
+    self._add_samples(scores, labels)
+
+  def _exact_data(self):
+    if len(self._scores) == 0:
+      return np.empty((0,), dtype=np.float64), np.empty((0,), dtype=np.int64)
+    return np.concatenate(self._scores), np.concatenate(self._labels)
+
+  # ==================== public ==================== #
+  def update(self, scores, labels):
+    r""" Add a batch of trials.
+
+    Arguments:
+      scores : array [n_trials], the more positive the score, the more
+        likely is the target hypothesis
+      labels : array [n_trials], 1 (or True) for target trials and 0 (or
+        False) for non-target trials
+    """
+    if labels is None:
+      raise ValueError("labels are required for detection metrics")
+    scores = np.ravel(scores).astype(np.float64)
+    labels = (np.ravel(labels) > 0).astype(np.int64)
+    if scores.shape != labels.shape:
+      raise ValueError("Given %d scores but %d labels" %
+                       (scores.shape[0], labels.shape[0]))
+    if not np.all(np.isfinite(scores)):
+      raise ValueError("Scores must be finite values")
+    if self.is_exact and self._n_exact + len(scores) <= self.exact_size:
+      self._scores.append(scores)
+      self._labels.append(labels)
+      self._n_exact += len(scores)
+    else:
+      if self.is_exact:
+        self._flush()
+      self._add_samples(scores, labels)
+    return self
+
+  def merge(self, *others):
+    r""" Merge the trials of other accumulators into this one """
+    for other in others:
+      if other.is_exact:
+        scores, labels = other._exact_data()
+        self.update(scores, labels)
+        continue
+      if self.is_exact:
+        self._flush()
+        if self._width is None:  # no trials
+          self._width = other._width
+          self._offset = other._offset
+          self._counts = np.zeros(shape=(self.n_bins, 2), dtype=np.int64)
+      occupied = np.flatnonzero(np.sum(other._counts, axis=1))
+      if len(occupied) == 0:
+        continue
+      lo, hi = other._offset + occupied[0], other._offset + occupied[-1]
+      # bring both grids to the coarser width
+      k = int(np.round(np.log2(other._width / self._width)))
+      if k > 0:
+        lo, hi = lo << k, ((hi + 1) << k) - 1
+      else:
+        lo, hi = lo >> -k, hi >> -k
+      self._fit_grid(int(lo), int(hi), k=max(k, 0))
+      shift = int(np.round(np.log2(self._width / other._width)))
+      index = ((other._offset + occupied) >> shift) - self._offset
+      for c in range(2):
+        self._counts[:, c] += np.bincount(
+            index, weights=other._counts[occupied, c],
+            minlength=self.n_bins).astype(np.int64)
+    return self
+
+  def det_curve(self):
+    r""" Points of the DET curve.
+
+    Return:
+      Pfa : array [n_points], decreasing false alarm probabilities
+      Pmiss : array [n_points], increasing miss probabilities
+      thresholds : array [n_points], decision thresholds, trials with score
+        greater than the threshold are accepted (in histogram mode, the
+        thresholds are the edges of the bins)
+    """
+    if self.is_exact:
+      scores, labels = self._exact_data()
+      thresholds, index = np.unique(scores, return_inverse=True)
+      counts = np.zeros(shape=(len(thresholds), 2), dtype=np.int64)
+      np.add.at(counts, (index, labels), 1)
+      start = thresholds[0] - 1 if len(thresholds) > 0 else 0.
+    else:
+      occupied = np.flatnonzero(np.sum(self._counts, axis=1))
+      counts = self._counts[occupied]
+      thresholds = (self._offset + occupied + 1) * self._width
+      start = (self._offset + occupied[0]) * self._width
+    n_non, n_tar = np.sum(counts, axis=0)
+    if n_tar == 0 or n_non == 0:
+      raise RuntimeError("Both target and non-target trials are required, "
+                         "given: %d target and %d non-target trials" %
+                         (n_tar, n_non))
+    cumsum = np.cumsum(counts, axis=0)
+    Pmiss = np.concatenate([[0.], cumsum[:, 1] / n_tar])
+    Pfa = np.concatenate([[1.], 1. - cumsum[:, 0] / n_non])
+    thresholds = np.concatenate([[start], thresholds])
+    return Pfa, Pmiss, thresholds
+
+  def eer(self):
+    r""" Equal error rate """
+    Pfa, Pmiss, _ = self.det_curve()
+    return compute_EER(Pfa, Pmiss)
+
+  def min_dcf(self, Ptrue=0.5, Cmiss=1, Cfa=1, normalize=False):
+    r""" Minimum of the detection cost function, at one or multiple
+    operating points.
+
+    Arguments:
+      Ptrue : {float, list of float}, prior probability of target trials
+      Cmiss : scalar, weight for miss errors
+      Cfa : scalar, weight for false alarm errors
+      normalize : a Boolean, if True, divide the cost by the cost of the
+        best trivial system `min(Cmiss * Ptrue, Cfa * (1 - Ptrue))`
+
+    Return:
+      min_DCF, Pfa_optimum, Pmiss_optimum : scalars if `Ptrue` is a scalar,
+        otherwise, arrays of `len(Ptrue)`
+    """
+    Pfa, Pmiss, _ = self.det_curve()
+    results = []
+    for p in as_tuple(Ptrue):
+      dcf, fa, miss = compute_minDCF(Pfa, Pmiss, Cmiss=Cmiss, Cfa=Cfa, Ptrue=p)
+      if normalize:
+        dcf = dcf / min(Cmiss * p, Cfa * (1 - p))
+      results.append((dcf, fa, miss))
+    if is_number(Ptrue):
+      return results[0]
+    return tuple(np.array(i) for i in zip(*results))
+
+
+class CavgAccumulator(object):
+  r""" Incremental computation of the average detection cost (Cavg) of the
+  NIST language recognition evaluation (LRE-15), only the number of accepted
+  trials for each pair of (true class, detector) is kept, so accumulators
+  could be merged.
+
+  Arguments:
+    nb_classes : int, number of classes (languages)
+    Ptrue : {float, list of float}, probability of a target trial
+    Cfa : float, cost for false acceptance error
+    Cmiss : float, cost for false rejection error
+    probability_input : a Boolean, if True, the scores are the posterior
+      probabilities, and are converted to log-likelihood ratios
+  """
 
+  def __init__(self,
+               nb_classes,
+               Ptrue=0.5,
+               Cfa=1.,
+               Cmiss=1.,
+               probability_input=False):
+    self.nb_classes = int(nb_classes)
+    if self.nb_classes < 2:
+      raise ValueError("Cavg requires at least 2 classes")
+    self.Ptrue = Ptrue
+    self.Cfa = float(Cfa)
+    self.Cmiss = float(Cmiss)
+    self.probability_input = bool(probability_input)
+    Ptrue = np.asarray(as_tuple(Ptrue), dtype=np.float64)
+    self._thresholds = np.log(self.Cfa / self.Cmiss) - \
+      np.log(Ptrue / (1 - Ptrue))
+    # accepted[t, i, j]: number of trials of class `i` accepted by detector
+    # `j` at threshold `t`
+    self._accepted = np.zeros(
+        shape=(len(Ptrue), self.nb_classes, self.nb_classes), dtype=np.int64)
+    self._counts = np.zeros(shape=(self.nb_classes,), dtype=np.int64)
+
+  def update(self, y_llr, y_true):
+    r""" Add a batch of trials.
+
+    Arguments:
+      y_llr : array [n_trials, nb_classes], log-likelihood ratios
+      y_true : array [n_trials] of class indices, or one-hot matrix
+    """
+    y_llr = np.asarray(y_llr, dtype=np.float64)
+    if y_llr.ndim != 2 or y_llr.shape[1] != self.nb_classes:
+      raise ValueError("y_llr must have shape [n_trials, %d], given: %s" %
+                       (self.nb_classes, str(y_llr.shape)))
+    if self.probability_input:
+      y_llr = _prob_to_llr(y_llr)
+    y_true = np.asarray(y_true)
+    if y_true.ndim >= 2:
+      y_true = np.argmax(y_true, axis=-1)
+    y_true = y_true.ravel().astype(np.int64)
+    onehot = np.zeros(shape=(len(y_true), self.nb_classes), dtype=np.float64)
+    onehot[np.arange(len(y_true)), y_true] = 1.
+    self._counts += np.bincount(y_true, minlength=self.nb_classes)
+    for i, thresh in enumerate(self._thresholds):
+      accept = (y_llr >= thresh).astype(np.float64)
+      self._accepted[i] += np.round(np.dot(onehot.T, accept)).astype(np.int64)
+    return self
+
+  def merge(self, *others):
+    r""" Merge the trials of other accumulators into this one """
+    for other in others:
+      if other._accepted.shape != self._accepted.shape or \
+        not np.allclose(other._thresholds, self._thresholds):
+        raise ValueError("Cannot merge Cavg accumulators of different "
+                         "classes or operating points")
+      self._accepted += other._accepted
+      self._counts += other._counts
+    return self
+
+  def cavg(self, cluster_idx=None):
+    r""" Average detection cost (in percentage)
+
+    Arguments:
+      cluster_idx : {None, list of list}, each element contains the class
+        indices of a language cluster
+
+    Return:
+      total_cost : the average cost over all classes if `cluster_idx` is
+        None, otherwise, a tuple of (cluster_cost, total_cost), the costs of
+        each cluster and their average.
+      If `Ptrue` is a list, each value is an array of `len(Ptrue)`.
+    """
+    Ptrue = np.asarray(as_tuple(self.Ptrue), dtype=np.float64)
+    counts = self._counts.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      # Pmiss[t, i] of detector `i`, Pfa[t, i, j] of detector `j` on trials
+      # of class `i`
+      Pfa = self._accepted / counts[None, :, None]
+      Pmiss = 1. - np.diagonal(Pfa, axis1=1, axis2=2)
+
+    def cost(classes):
+      classes = [c for c in classes if self._counts[c] > 0]
+      n = len(classes)
+      if n < 2:
+        return np.full(shape=Ptrue.shape, fill_value=np.nan)
+      fa = Pfa[:, classes][:, :, classes]
+      fa = (np.sum(fa, axis=1) - np.diagonal(fa, axis1=1, axis2=2)) / (n - 1)
+      c = self.Cmiss * Ptrue[:, None] * Pmiss[:, classes] + \
+        self.Cfa * (1 - Ptrue[:, None]) * fa
+      return 100 * np.mean(c, axis=1)
+
+    if cluster_idx is None:
+      total = cost(range(self.nb_classes))
+      return total if len(Ptrue) > 1 or not is_number(self.Ptrue) \
+        else total[0]
+    clusters = np.stack([cost(c) for c in cluster_idx], axis=-1)
+    total = np.nanmean(clusters, axis=-1)
+    if is_number(self.Ptrue):
+      return clusters[0], total[0]
+    return clusters, total
 
 
 # ===========================================================================
@@ -1,7 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
 import os
-from collections import defaultdict
 
 import numpy as np
 import tensorflow as tf
@@ -12,8 +11,7 @@ from sklearn.svm import LinearSVC
 from tensorflow_probability import distributions as tfd
 
 from odin.bay.distributions import CombinedDistribution
-from odin.bay.helpers import batch_slice
-from odin.bay.vi.utils import discretizing
+from odin.bay.vi.utils import FactorIndex, discretizing
 from odin.stats import is_discrete
 
 
@@ -102,83 +100,88 @@ def _sampling_helper(representations,
                      verbose,
                      strategy,
                      desc="Scoring",
+                     chunk_size=4096,
+                     factor_index=None,
                      **kwargs):
   assert isinstance(representations, tfd.Distribution),\
     f"representations must be instance of Distribution, but given: {type(representations)}"
   ## arguments
-  from tensorflow_probability.python.distributions import VectorDeterministic
   size = representations.batch_shape[0]
   n_codes = representations.event_shape[0]
   n_factors = factors.shape[1]
-  indices = np.arange(size, dtype=np.int64)
-  ## create mapping factor -> representation_index
-  code_map = defaultdict(list)
-  for idx, y in enumerate(factors.T):
-    for sample_idx, i in enumerate(y):
-      code_map[(idx, i)].append(sample_idx)
-  ## prepare the output
-  if strategy == 'betavae':
-    features = np.empty(shape=(n_samples, n_codes), dtype=np.float32)
-  elif strategy == 'factorvae':
-    features = np.empty(shape=(n_samples,), dtype=np.int32)
+  ## the representations are materialized once (the mean or one sample for
+  ## each observation), and the factor -> observations postings are indexed
+  codes = np.asarray(
+      representations.mean() if use_mean else representations.sample(),
+      dtype=np.float32)
+  if factor_index is None:
+    factor_index = FactorIndex(factors)
+  elif factor_index.n_samples != factors.shape[0]:
+    raise ValueError(f"factor_index of {factor_index.n_samples} samples, but "
+                     f"given factors of shape: {factors.shape}")
+  if strategy == 'factorvae':
     global_var = np.mean(representations.variance(), axis=0)
     # should > 0. here, otherwise, collapsed to prior
     # note: for Deterministic distribution variance = 0, hence, no active dims
     active_dims = np.sqrt(global_var) > 0.
-  else:
+  elif strategy != 'betavae':
     raise NotImplementedError(f"No support for sampling strategy: {strategy}")
-  labels = np.empty(shape=(n_samples,), dtype=np.int32)
-  repr_fn = (lambda d: d.mean()) if use_mean else (lambda d: d.sample())
+  features = []
+  labels = []
   count = 0
   ## prepare the sampling progress
   if verbose:
     from tqdm import tqdm
     prog = tqdm(total=n_samples, desc=str(desc), unit='sample')
+  ## all the draws of a chunk are generated at once, the draws without enough
+  ## matching observations are discarded and re-drawn in the next chunk
   while count < n_samples:
-    factor_index = rand.randint(n_factors)
+    n = min(n_samples - count, chunk_size)
+    fixed_factor = rand.randint(n_factors, size=n)
     ## betaVAE sampling
     if strategy == 'betavae':
-      y = factors[rand.choice(indices, size=batch_size,
-                              replace=True)][:, factor_index]
-      obs1_ids = []
-      obs2_ids = []
-      for i in y:
-        sample_indices = code_map[(factor_index, i)]
-        if len(sample_indices) >= 2:
-          s1, s2 = rand.choice(sample_indices, size=2, replace=False)
-          obs1_ids.append(s1)
-          obs2_ids.append(s2)
-      # create the observation:
-      if len(obs1_ids) > 0:
-        obs1 = batch_slice(representations, obs1_ids)
-        obs2 = batch_slice(representations, obs2_ids)
-        feat = np.mean(np.abs(repr_fn(obs1) - repr_fn(obs2)), axis=0)
-        features[count, :] = feat
-        labels[count] = factor_index
-        count += 1
-        if verbose:
-          prog.update(1)
+      obs = rand.randint(size, size=(n, batch_size))
+      # pairs of different observations with the same factor value
+      ids, _ = factor_index.sample_matching(np.repeat(fixed_factor,
+                                                      batch_size),
+                                            obs.ravel(),
+                                            num=2,
+                                            random_state=rand,
+                                            replace=False)
+      ids = ids.reshape(n, batch_size, 2)
+      mask = ids[:, :, 0] >= 0
+      keep = np.any(mask, axis=1)
+      ids, mask = ids[keep], mask[keep]
+      diff = np.abs(codes[ids[:, :, 0]] - codes[ids[:, :, 1]])
+      feat = np.sum(diff * mask[:, :, None], axis=1) / \
+        np.sum(mask, axis=1, keepdims=True)
     ## factorVAE sampling
     elif strategy == 'factorvae':
-      y = factors[rand.randint(size, dtype=np.int64), factor_index]
-      obs_ids = code_map[(factor_index, y)]
-      if len(obs_ids) > 1:
-        obs_ids = rand.choice(obs_ids, size=batch_size, replace=True)
-        obs = batch_slice(representations, obs_ids)
-        local_var = np.var(repr_fn(obs), axis=0, ddof=1)
-        if not np.any(active_dims):  # no active dims
-          features[count] = 0
-        else:
-          features[count] = np.argmin(local_var[active_dims] /
-                                      global_var[active_dims])
-        labels[count] = factor_index
-        count += 1
-        if verbose:
-          prog.update(1)
+      obs = rand.randint(size, size=n)
+      ids, counts = factor_index.sample_matching(fixed_factor,
+                                                 obs,
+                                                 num=batch_size,
+                                                 random_state=rand,
+                                                 replace=True)
+      keep = counts > 1
+      ids = ids[keep]
+      if not np.any(active_dims):  # no active dims
+        feat = np.zeros(shape=(len(ids),), dtype=np.int32)
+      else:
+        local_var = np.var(codes[ids][:, :, active_dims], axis=1, ddof=1)
+        feat = np.argmin(local_var / global_var[active_dims], axis=1)
+    features.append(feat)
+    labels.append(fixed_factor[keep])
+    count += len(feat)
+    if verbose:
+      prog.update(len(feat))
   ## return shape: [n_samples, n_code] and [n_samples]
   if verbose:
     prog.clear()
     prog.close()
+  dtype = np.float32 if strategy == 'betavae' else np.int32
+  features = np.concatenate(features, axis=0).astype(dtype)
+  labels = np.concatenate(labels, axis=0).astype(np.int32)
   return features, labels
 
 
@@ -189,10 +192,14 @@ def beta_vae_score(representations: tfd.Distribution,
                    n_samples=1000,
                    random_state=1234,
                    return_model=False,
-                   verbose=False):
+                   verbose=False,
+                   factor_index=None):
   r""" The Beta-VAE score train a logistic regression to detect the invariant
   factor based on the absolute difference in the representations.
 
+  A prebuilt `FactorIndex` of the `factors` could be given as `factor_index`
+  to avoid indexing the factors at every call.
+
   References:
     beta-VAE: Learning Basic Visual Concepts with a Constrained
       Variational Framework (https://openreview.net/forum?id=Sy2fzU9gl).
@@ -219,10 +226,14 @@ def factor_vae_score(representations: tfd.Distribution,
                      n_samples=1000,
                      random_state=1234,
                      return_model=False,
-                     verbose=False):
+                     verbose=False,
+                     factor_index=None):
   r""" The Factor-VAE score train a highest-vote classifier to detect the
   invariant factor index from the lowest variated latent dimension.
 
+  A prebuilt `FactorIndex` of the `factors` could be given as `factor_index`
+  to avoid indexing the factors at every call.
+
   References:
     Kim, H., Mnih, A., 2018. Disentangling by Factorising.
       arXiv:1802.05983 [cs, stat].
@@ -23,7 +23,7 @@ import numpy as np
 import scipy as sp
 from odin.bay.vi.downstream_metrics import *
 from odin.utils import catch_warnings_ignore
-from odin.utils.mpi import MPI, get_cpu_count
+from odin.utils.mpi import MPI
 from sklearn.cluster import KMeans
 from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import adjusted_mutual_info_score, adjusted_rand_score
@@ -377,7 +377,8 @@ def representative_importance_matrix(repr_train,
                                      repr_test,
                                      factor_test,
                                      random_state=1234,
-                                     algo=GradientBoostingClassifier):
+                                     algo=GradientBoostingClassifier,
+                                     n_cpu=1):
   r""" Using Tree Classifier to estimate the importance of each
   representation for each factor.
 
@@ -395,6 +396,8 @@ def representative_importance_matrix(repr_train,
         and boosting methods:
         - `sklearn.ensemble.GradientBoostingClassifier`
         - `sklearn.ensemble.AdaBoostClassifier`
+    n_cpu : an Integer, number of processes for training the classifiers of
+      different factors in parallel
 
   Return:
     importance_matrix : a Matrix of shape `(n_features, n_factors)`
@@ -419,9 +422,12 @@ def representative_importance_matrix(repr_train,
                                dtype=np.float64)
   train_acc = list(range(num_factors))
   test_acc = list(range(num_factors))
-  ncpu = min(max(1, get_cpu_count() - 1), 10)
-  for factor_idx in range(num_factors):
-    i, feat, train, test = _train(factor_idx)
+  jobs = list(range(num_factors))
+  if n_cpu < 2:
+    it = (_train(i) for i in jobs)
+  else:
+    it = MPI(jobs=jobs, func=_train, ncpu=n_cpu, batch=1)
+  for i, feat, train, test in it:
     importance_matrix[:, i] = feat
     train_acc[i] = train
     test_acc[i] = test
@@ -432,12 +438,14 @@ def dci_scores(repr_train,
                factor_train,
                repr_test,
                factor_test,
-               random_state=1234):
+               random_state=1234,
+               n_cpu=1):
   r""" Disentanglement, completeness, informativeness
 
   Arguments:
     repr_train, repr_test : 2-D matrix `[n_samples, latent_dim]`
     factor_train, factor_test : 2-D matrix `[n_samples, n_factors]`
+    n_cpu : an Integer, number of processes for the per-factor classifiers
 
   Return:
     tuple of 3 scores (disentanglement, completeness, informativeness), all
@@ -458,7 +466,12 @@ def dci_scores(repr_train,
       score
   """
   importance, train_acc, test_acc = representative_importance_matrix(
-      repr_train, factor_train, repr_test, factor_test, random_state)
+      repr_train,
+      factor_train,
+      repr_test,
+      factor_test,
+      random_state=random_state,
+      n_cpu=n_cpu)
   train_acc = np.mean(train_acc)
   test_acc = np.mean(test_acc)
   # ====== disentanglement and completeness ====== #
@@ -1,6 +1,6 @@
 from __future__ import absolute_import, annotations, division, print_function
 
-import random
+import time
 import warnings
 from collections import Counter, OrderedDict
 from contextlib import contextmanager
@@ -15,9 +15,12 @@ from numpy import ndarray
 from odin import visual as vs
 from odin.bay.distributions import CombinedDistribution
 from odin.bay.vi._base import VariationalModel
-from odin.bay.vi.metrics import (mutual_info_estimate, mutual_info_gap,
+from odin.bay.vi.metrics import (beta_vae_score, completeness_score,
+                                 disentanglement_score, factor_vae_score,
+                                 mutual_info_estimate, mutual_info_gap,
+                                 relative_strength,
                                  representative_importance_matrix)
-from odin.bay.vi.utils import discretizing
+from odin.bay.vi.utils import FactorIndex, discretizing
 from odin.ml import dimension_reduce, linear_classifier
 from odin.search import diagonal_linear_assignment
 from odin.utils import as_tuple
@@ -37,33 +40,6 @@ __all__ = ['GroundTruth', 'VariationalPosterior']
 # ===========================================================================
 # Helpers
 # ===========================================================================
-def _fast_samples_indices(known: ndarray, factors: ndarray):
-  outputs = [-1] * len(known)
-  for k_idx in range(len(known)):
-    for f_idx in range(len(factors)):
-      if np.array_equal(known[k_idx], factors[f_idx]):
-        if outputs[k_idx] < 0:
-          outputs[k_idx] = f_idx
-        elif bool(random.getrandbits(1)):
-          outputs[k_idx] = f_idx
-  return outputs
-
-
-try:
-  # with    numba: ~1.3 sec
-  # without numba: ~19.3 sec
-  # ~15 times faster
-  from numba import jit
-  _fast_samples_indices = jit(
-      _fast_samples_indices,
-      # target='cpu',
-      cache=False,
-      parallel=False,
-      nopython=True)
-except ImportError:
-  pass
-
-
 def _boostrap_sampling(
     model: VariationalModel,
     inputs: List[ndarray],
@@ -218,6 +194,7 @@ class GroundTruth:
     self.names = factor_names
     self.labels = [np.unique(x) for x in factors.T]
     self.sizes = [len(lab) for lab in self.labels]
+    self._index = None
 
   def is_categorical(self, factor_index: Union[int, str]) -> bool:
     if isinstance(factor_index, string_types):
@@ -233,14 +210,23 @@ class GroundTruth:
     obj.names = self.names
     obj.labels = self.labels
     obj.sizes = self.sizes
+    obj._index = self._index
     return obj
 
   def __getitem__(self, key):
     obj = self.copy()
     obj.factors = obj.factors[key]
     obj.factors_original = obj.factors_original[key]
+    obj._index = None
     return obj
 
+  @property
+  def index(self) -> FactorIndex:
+    r""" The `FactorIndex` of the factors, built once at the first call """
+    if getattr(self, '_index', None) is None:
+      self._index = FactorIndex(self.factors)
+    return self._index
+
   @property
   def shape(self) -> List[int]:
     return self.factors.shape
@@ -288,13 +274,13 @@ class GroundTruth:
         val = labels[val]
       known[idx] = val
     # all samples with similar known factors
-    samples = [(idx, x[None, :])
-               for idx, x in enumerate(self.factors)
-               if all(x[k] == v for k, v in known.items())]
-    indices = random_state.choice(len(samples), size=int(num), replace=replace)
-    factors = np.vstack([samples[i][1] for i in indices])
+    samples = self.index.match(known)
+    indices = samples[random_state.choice(len(samples),
+                                          size=int(num),
+                                          replace=replace)]
+    factors = self.factors[indices]
     if return_indices:
-      return factors, np.array([samples[i][0] for i in indices])
+      return factors, indices
     return factors
 
   def sample_indices_from_factors(self,
@@ -306,17 +292,16 @@ class GroundTruth:
 
     Arguments:
       factors : `[num_samples, n_factors]`
-      random_state : None or `np.random.RandomState`
+      seed : An Integer, seed for choosing among the matching samples
 
     Returns:
-      indices : list of Integer
+      indices : list of Integer, -1 if no sample matches the factors
     """
-    random_state = np.random.RandomState(seed=1)
-    random.seed(random_state.randint(1e8))
+    random_state = np.random.RandomState(seed=seed)
     if factors.ndim == 1:
       factors = np.expand_dims(factors, axis=0)
     assert factors.ndim == 2, "Only support matrix as factors."
-    return np.array(_fast_samples_indices(factors, self.factors))
+    return self.index.sample_rows(factors, random_state)
 
   def __str__(self):
     text = f'GroundTruth: {self.factors.shape}\n'
@@ -683,6 +668,50 @@ class Posterior(vs.Visualizer):
   def verbose(self) -> bool:
     return self._verbose
 
+  ############## Metric engine
+  def _cached(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+    """Memoize the intermediate `key` (latent codes, discretized codes,
+    mutual information, correlation or importance matrices) of this posterior,
+    the latents are converted by `dist_to_tensor` so it is a part of the key"""
+    cache = self.__dict__.setdefault('_metric_cache', {})
+    key = (self.dist_to_tensor,) + tuple(key)
+    if key not in cache:
+      cache[key] = fn()
+    return cache[key]
+
+  def clear_cache(self) -> Posterior:
+    """Remove all the memoized intermediates of the metrics"""
+    self.__dict__.pop('_metric_cache', None)
+    return self
+
+  @property
+  def metric_timing(self) -> Dict[str, float]:
+    """Wall-clock time (in seconds) of each metric in the last `summary`"""
+    return dict(self.__dict__.get('_metric_timing', {}))
+
+  def latent_codes(self) -> ndarray:
+    """The latents converted by `dist_to_tensor` (i.e. a sample by default),
+    computed once and shared by all the metrics"""
+    return self._cached(
+        ('codes',), lambda: np.asarray(self.dist_to_tensor(self.latents)))
+
+  def discretized_codes(
+      self,
+      n_bins: int = 10,
+      strategy: Literal['uniform', 'quantile', 'kmeans', 'gmm'] = 'uniform',
+  ) -> ndarray:
+    """The discretized `latent_codes`, computed once for each `n_bins` and
+    `strategy`"""
+    return self._cached(
+        ('discretized', int(n_bins), strategy), lambda: discretizing(
+            self.latent_codes(), independent=True, n_bins=n_bins,
+            strategy=strategy))
+
+  def _split(self, seed: int, ratio: float = 0.8) -> Tuple[ndarray, ndarray]:
+    ids = np.random.RandomState(seed=seed).permutation(self.n_samples)
+    n = int(ratio * self.n_samples)
+    return ids[:n], ids[n:]
+
   ############## Matrices
   def dimension_reduce(
       self,
@@ -694,8 +723,7 @@ class Posterior(vs.Visualizer):
     key = f'{id(self)}_{id(self.dist_to_tensor)}_{algorithm}_{int(seed)}'
     if key in _CACHE_LATENTS:
       return _CACHE_LATENTS[key]
-    x = self.dist_to_tensor(self.latents).numpy()
-    x = dimension_reduce(x, algo=algorithm, random_state=seed)
+    x = dimension_reduce(self.latent_codes(), algo=algorithm, random_state=seed)
     _CACHE_LATENTS[key] = x
     return x
 
@@ -739,35 +767,12 @@ class Posterior(vs.Visualizer):
     ### average mode
     if method == 'average':
       corr_mat = sum(
-          self.correlation_matrix(convert_to_tensor=self.dist_to_tensor,
-                                  method=corr,
-                                  sort_pairs=False,
-                                  seed=seed)
+          self.correlation_matrix(method=corr, sort_pairs=False, seed=seed)
           for corr in ['spearman', 'pearson', 'lasso']) / 3
     ### specific mode
     else:
-      # start form correlation matrix
-      z = self.dist_to_tensor(self.latents).numpy()
-      f = self.factors
-      # lasso
-      if method == 'lasso':
-        from sklearn.linear_model import Lasso
-        model = Lasso(random_state=seed, alpha=0.1)
-        model.fit(z, f)
-        # coef_ is [n_target, n_features], so we need transpose here
-        corr_mat = np.transpose(np.absolute(model.coef_))
-      # spearman and pearson
-      else:
-        corr_mat = np.empty(shape=(self.n_latents, self.n_factors),
-                            dtype=np.float64)
-        for code in range(self.n_latents):
-          for fact in range(self.n_factors):
-            x, y = z[:, code], f[:, fact]
-            if method == 'spearman':
-              corr = sp.stats.spearmanr(x, y, nan_policy="omit")[0]
-            elif method == 'pearson':
-              corr = sp.stats.pearsonr(x, y)[0]
-            corr_mat[code, fact] = corr
+      corr_mat = self._cached(('correlation', method, int(seed)),
+                              lambda: self._correlation(method, seed))
     ## decoding and return
     if sort_pairs:
       ids = diagonal_linear_assignment(corr_mat)
@@ -775,6 +780,27 @@ class Posterior(vs.Visualizer):
       return corr_mat, OrderedDict(zip(range(self.n_factors), ids))
     return corr_mat
 
+  def _correlation(self, method: str, seed: int) -> ndarray:
+    z = self.latent_codes()
+    f = self.factors
+    # lasso
+    if method == 'lasso':
+      from sklearn.linear_model import Lasso
+      model = Lasso(random_state=seed, alpha=0.1)
+      model.fit(z, f)
+      # coef_ is [n_target, n_features], so we need transpose here
+      return np.transpose(np.absolute(model.coef_))
+    # spearman is the pearson correlation of the ranks, all pairs of
+    # (code, factor) are computed by a single matrix product
+    if method == 'spearman':
+      z = sp.stats.rankdata(z, axis=0)
+      f = sp.stats.rankdata(f, axis=0)
+    z = z - np.mean(z, axis=0)
+    f = f - np.mean(f, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return np.dot(z.T, f) / np.outer(np.linalg.norm(z, axis=0),
+                                       np.linalg.norm(f, axis=0))
+
   def mutualinfo_matrix(
       self,
       n_neighbors: Union[int, List[int]] = [3, 4, 5],
@@ -801,15 +827,15 @@ class Posterior(vs.Visualizer):
     """
     n_neighbors = as_tuple(n_neighbors, t=int)
     mi = sum(
-        mutual_info_estimate(
-            representations=self.dist_to_tensor(self.latents).numpy(),
+        self._cached(('mutualinfo', i, int(seed)), lambda: mutual_info_estimate(
+            representations=self.latent_codes(),
             factors=self.factors,
             continuous_representations=True,
             continuous_factors=False,
             n_neighbors=i,
             n_cpu=n_cpu,
             seed=seed,
-        ) for i in n_neighbors)
+        )) for i in n_neighbors)
     return mi / len(n_neighbors)
 
   def mutual_info_gap(
@@ -835,12 +861,141 @@ class Posterior(vs.Visualizer):
     float
         mutual information gap score
     """
-    z = self.dist_to_tensor(self.latents).numpy()
-    if n_bins > 1:
-      z = discretizing(z, independent=True, n_bins=n_bins, strategy=strategy)
+    z = self.discretized_codes(n_bins, strategy) if n_bins > 1 else \
+      self.latent_codes()
     f = self.factors
     return mutual_info_gap(z, f)
 
+  def importance_matrix(self, n_cpu: int = 1, seed: int = 1) -> ndarray:
+    """Importance of each latent for predicting each factor, estimated by
+    gradient boosted trees (one classifier per factor, trained on 80% of the
+    samples in `n_cpu` processes).
+
+    Returns
+    -------
+    ndarray
+        importance matrix `[n_latents, n_factors]`
+    ndarray
+        train and test accuracy of each factor, `[2, n_factors]`
+    """
+    return self._cached(('importance', int(seed)),
+                        lambda: self._importance(n_cpu, seed))
+
+  def _importance(self, n_cpu: int, seed: int):
+    train, test = self._split(seed)
+    z, f = self.latent_codes(), self.factors
+    mat, train_acc, test_acc = representative_importance_matrix(
+        z[train], f[train], z[test], f[test], random_state=seed, n_cpu=n_cpu)
+    return mat, np.array([train_acc, test_acc])
+
+  def dci_scores(self,
+                 n_cpu: int = 1,
+                 seed: int = 1) -> Tuple[float, float, float]:
+    """Disentanglement, Completeness, Informativeness (test accuracy) from the
+    `importance_matrix`"""
+    mat, acc = self.importance_matrix(n_cpu=n_cpu, seed=seed)
+    return (disentanglement_score(mat), completeness_score(mat),
+            np.mean(acc[1]))
+
+  def betavae_score(self, n_samples: int = 10000, seed: int = 1) -> float:
+    """The beta-VAE score on the means of the latents"""
+    return self._cached(('betavae', int(n_samples), int(seed)),
+                        lambda: beta_vae_score(
+                            self.latents,
+                            self.factors,
+                            use_mean=True,
+                            n_samples=n_samples,
+                            random_state=seed,
+                            verbose=self.verbose,
+                            factor_index=self._groundtruth.index))
+
+  def factorvae_score(self, n_samples: int = 10000, seed: int = 1) -> float:
+    """The factor-VAE score on the means of the latents"""
+    return self._cached(('factorvae', int(n_samples), int(seed)),
+                        lambda: factor_vae_score(
+                            self.latents,
+                            self.factors,
+                            use_mean=True,
+                            n_samples=n_samples,
+                            random_state=seed,
+                            verbose=self.verbose,
+                            factor_index=self._groundtruth.index))
+
+  def summary(self,
+              n_samples: int = 10000,
+              n_neighbors: Union[int, List[int]] = 3,
+              n_bins: int = 10,
+              n_cpu: int = 1,
+              seed: int = 1,
+              save_path: Optional[str] = None) -> Dict[str, float]:
+    """Report of all the quantitative metrics, the shared intermediates
+    (latent codes, discretized codes, mutual information, correlation and
+    importance matrices) are computed once, the wall-clock time of each
+    metric is stored in `metric_timing`.
+
+    Parameters
+    ----------
+    n_samples : int, optional
+        number of samples for beta-VAE and factor-VAE scores, by default 10000
+    n_neighbors : Union[int, List[int]], optional
+        number of neighbors for estimating MI, by default 3
+    n_bins : int, optional
+        number of bins for discretizing the latents, by default 10
+    n_cpu : int, optional
+        number of processes for the per-factor estimators, by default 1
+    seed : int, optional
+        random state seed, by default 1
+    save_path : str, optional
+        path to a YAML file for saving the scores, by default None
+
+    Returns
+    -------
+    Dict[str, float]
+        mapping from metric name to its score
+    """
+    timing = OrderedDict()
+    scores = OrderedDict()
+
+    def mi():
+      mat = self.mutualinfo_matrix(n_neighbors=n_neighbors,
+                                   n_cpu=n_cpu,
+                                   seed=seed)
+      return dict(dcmi_d=disentanglement_score(mat),
+                  dcmi_c=completeness_score(mat),
+                  rms=relative_strength(mat))
+
+    def corr():
+      mat = np.abs(self.correlation_matrix(method='spearman', seed=seed))
+      return dict(dcc_d=disentanglement_score(mat),
+                  dcc_c=completeness_score(mat),
+                  rds=relative_strength(mat))
+
+    def dci():
+      return dict(zip(('dci_d', 'dci_c', 'dci_i'),
+                      self.dci_scores(n_cpu=n_cpu, seed=seed)))
+
+    for name, fn in [
+        ('mig', lambda: dict(mig=self.mutual_info_gap(n_bins=n_bins))),
+        ('mutualinfo', mi),
+        ('correlation', corr),
+        ('dci', dci),
+        ('betavae', lambda: dict(
+            betavae=self.betavae_score(n_samples=n_samples, seed=seed))),
+        ('factorvae', lambda: dict(
+            factorvae=self.factorvae_score(n_samples=n_samples, seed=seed))),
+    ]:
+      start = time.time()
+      scores.update(fn())
+      timing[name] = time.time() - start
+      if self.verbose:
+        print(f"[{self.name}] {name}: {timing[name]:.2f}(s)")
+    self._metric_timing = timing
+    if save_path is not None:
+      with open(save_path, 'w') as f:
+        for k, v in sorted(scores.items(), key=lambda x: x[0]):
+          f.write("%s: %g\n" % (k, v))
+    return scores
+
   def copy(self, suffix='copy') -> Posterior:
     obj = self.__class__.__new__(self.__class__)
     obj._name = f'{self.name}_{suffix}'
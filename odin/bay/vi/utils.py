@@ -3,7 +3,7 @@ from __future__ import absolute_import, division, print_function
 import types
 import warnings
 from numbers import Number
-from typing import List
+from typing import Dict, List, Tuple
 
 import numpy as np
 import tensorflow as tf
@@ -12,6 +12,7 @@ from sklearn.preprocessing import KBinsDiscretizer
 from typing_extensions import Literal
 
 __all__ = [
+    'FactorIndex',
     'discretizing',
     'permute_dims',
     'marginalize_categorical_labels',
@@ -159,3 +160,193 @@ def permute_dims(z):
     perm = perm.write(i, z_i)
   return tf.transpose(perm.stack(),
                       perm=tf.concat([tf.range(1, tf.rank(z)), (0,)], axis=0))
+
+
+class FactorIndex:
+  r""" Index of the rows of a discrete factors matrix for fast sampling by
+  known factors and row matching:
+
+    - each row is encoded into an `int64` key in mixed radix (the radix of a
+      factor is its number of unique values)
+    - a CSR mapping from key to the (sorted) indices of the samples
+    - for each factor, postings from value to the (sorted) indices of the
+      samples
+
+  Arguments:
+    factors : `[n_samples, n_factors]`, an Integer array
+
+  Example:
+  ```
+  index = FactorIndex(factors)
+  # indices of all samples with factor 0 equal to `value`
+  ids = index.postings(0, value)
+  # a random sample for each row of `factors`, -1 if no match
+  ids = index.sample_rows(factors, random_state)
+  ```
+  """
+
+  def __init__(self, factors: np.ndarray):
+    factors = np.asarray(factors)
+    if factors.ndim != 2:
+      raise ValueError("factors must be a matrix [n_samples, n_factors], "
+                       f"but given shape:{factors.shape}")
+    self.n_samples, self.n_factors = factors.shape
+    self.labels = []
+    codes = np.empty(shape=factors.shape, dtype=np.int64)
+    for i, x in enumerate(factors.T):
+      labels, codes[:, i] = np.unique(x, return_inverse=True)
+      self.labels.append(labels)
+    self.codes = codes
+    # ====== postings: factor value -> samples ====== #
+    # samples of value `j` of factor `i` are
+    # `_posting_order[i, _posting_indptr[i, j]:_posting_indptr[i, j + 1]]`
+    max_size = max([len(labels) for labels in self.labels] + [0])
+    self._posting_order = np.argsort(codes.T, axis=1, kind='stable')
+    self._posting_indptr = np.full(shape=(self.n_factors, max_size + 1),
+                                   fill_value=self.n_samples,
+                                   dtype=np.int64)
+    for i, labels in enumerate(self.labels):
+      self._posting_indptr[i, 0] = 0
+      self._posting_indptr[i, 1:len(labels) + 1] = np.cumsum(
+          np.bincount(codes[:, i], minlength=len(labels)))
+    # ====== mixed radix keys ====== #
+    # if the product of the radices overflows, the prefix keys are replaced
+    # by their rank
+    self._steps = []
+    keys = np.zeros(shape=(self.n_samples,), dtype=np.int64)
+    radix = 1
+    for i, labels in enumerate(self.labels):
+      if radix * len(labels) >= np.iinfo(np.int64).max:
+        uniques, keys = np.unique(keys, return_inverse=True)
+        self._steps.append((i, uniques))
+        radix = len(uniques)
+      keys = keys * len(labels) + codes[:, i]
+      radix *= len(labels)
+    self.keys = keys
+    # ====== CSR: key -> samples ====== #
+    self._order = np.argsort(keys, kind='stable')
+    self.unique_keys, starts = np.unique(keys[self._order], return_index=True)
+    self._indptr = np.append(starts, self.n_samples)
+
+  @property
+  def sizes(self) -> List[int]:
+    return [len(labels) for labels in self.labels]
+
+  def encode(self, factors: np.ndarray) -> np.ndarray:
+    r""" Keys of the given factor rows `[num, n_factors]`, -1 for rows with
+    unknown factor values """
+    factors = np.atleast_2d(factors)
+    if factors.shape[1] != self.n_factors:
+      raise ValueError(f"Expect {self.n_factors} factors, "
+                       f"but given shape:{factors.shape}")
+    valid = np.ones(shape=(factors.shape[0],), dtype=bool)
+    keys = np.zeros(shape=(factors.shape[0],), dtype=np.int64)
+    steps = dict(self._steps)
+    for i, labels in enumerate(self.labels):
+      if i in steps:
+        uniques = steps[i]
+        pos = np.clip(np.searchsorted(uniques, keys), 0, len(uniques) - 1)
+        valid &= uniques[pos] == keys
+        keys = pos
+      pos = np.clip(np.searchsorted(labels, factors[:, i]), 0, len(labels) - 1)
+      valid &= labels[pos] == factors[:, i]
+      keys = keys * len(labels) + pos
+    keys[~valid] = -1
+    return keys
+
+  def lookup(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    r""" Return the `start` and `end` of the samples of each key in
+    `self.samples`, `start == end` for unknown keys """
+    keys = np.asarray(keys, dtype=np.int64)
+    pos = np.clip(np.searchsorted(self.unique_keys, keys), 0,
+                  len(self.unique_keys) - 1)
+    found = self.unique_keys[pos] == keys
+    start = np.where(found, self._indptr[pos], 0)
+    end = np.where(found, self._indptr[pos + 1], 0)
+    return start, end
+
+  @property
+  def samples(self) -> np.ndarray:
+    r""" Indices of the samples sorted by keys """
+    return self._order
+
+  def postings(self, factor_index: int, value: int) -> np.ndarray:
+    r""" Sorted indices of the samples with the given factor value """
+    order = self._posting_order[factor_index]
+    indptr = self._posting_indptr[factor_index]
+    labels = self.labels[factor_index]
+    code = np.searchsorted(labels, value)
+    if code >= len(labels) or labels[code] != value:
+      return np.empty(shape=(0,), dtype=np.int64)
+    return order[indptr[code]:indptr[code + 1]]
+
+  def match(self, known: Dict[int, int]) -> np.ndarray:
+    r""" Sorted indices of the samples with all the `known` factor values,
+    a mapping from factor index to factor value """
+    if len(known) == 0:
+      return np.arange(self.n_samples, dtype=np.int64)
+    postings = sorted(
+        [(self.postings(i, v), i, v) for i, v in known.items()],
+        key=lambda x: len(x[0]))
+    ids = postings[0][0]
+    for _, i, v in postings[1:]:
+      code = np.searchsorted(self.labels[i], v)
+      ids = ids[self.codes[ids, i] == code]
+    return ids
+
+  def sample_rows(self,
+                  factors: np.ndarray,
+                  random_state: np.random.RandomState) -> np.ndarray:
+    r""" A random sample (uniformly among the matching samples) for each
+    row of `factors`, -1 if no sample matches """
+    start, end = self.lookup(self.encode(factors))
+    counts = end - start
+    ids = start + (random_state.rand(len(start)) * counts).astype(np.int64)
+    ids = self._order[np.minimum(ids, self.n_samples - 1)]
+    return np.where(counts > 0, ids, -1)
+
+  def sample_matching(
+      self,
+      factor_index: np.ndarray,
+      samples: np.ndarray,
+      num: int,
+      random_state: np.random.RandomState,
+      replace: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    r""" For each `samples[i]`, draw `num` samples (uniformly) with the same
+    value of the factor `factor_index[i]`, vectorized over all the rows.
+
+    Arguments:
+      factor_index : `[n]`, index of the fixed factor for each row
+      samples : `[n]`, index of the sample giving the factor value
+      num : An Integer, number of samples drawn for each row
+      random_state : `np.random.RandomState`
+      replace : A Boolean, sampling with or without replacement (the cost
+        is quadratic in `num` without replacement, i.e. for small `num`)
+
+    Returns:
+      indices : `[n, num]`, -1 for the rows with not enough matching samples
+      counts : `[n]`, number of matching samples of each row
+    """
+    factor_index = np.ravel(factor_index).astype(np.int64)
+    samples = np.ravel(samples).astype(np.int64)
+    code = self.codes[samples, factor_index]
+    start = self._posting_indptr[factor_index, code]
+    counts = self._posting_indptr[factor_index, code + 1] - start
+    if replace:
+      pos = (random_state.rand(len(samples), num) *
+             counts[:, None]).astype(np.int64)
+    else:
+      # the j-th draw is uniform among the `counts - j` positions left, then
+      # shifted over the previous draws (in increasing order)
+      pos = np.zeros(shape=(len(samples), num), dtype=np.int64)
+      for j in range(num):
+        p = (random_state.rand(len(samples)) *
+             np.maximum(counts - j, 1)).astype(np.int64)
+        for prev in np.sort(pos[:, :j], axis=1).T:
+          p += p >= prev
+        pos[:, j] = p
+    valid = counts >= (1 if replace else num)
+    pos = np.minimum(start[:, None] + pos, self.n_samples - 1)
+    indices = self._posting_order[factor_index[:, None], pos]
+    indices[~valid] = -1
+    return indices, counts
@@ -60,13 +60,43 @@ def _parse(x):
   if isinstance(x, bytes):
     b = BytesIO(x)
     x = np.load(b, allow_pickle=True)['x']
-    if x.dtype == np.object:
+    if x.dtype == object:
       x = x.tolist()
     elif x.shape == (0,):
       x = []
   return x
 
 
+def _column_data(values):
+  r""" Convert a whole column to SQL data, numeric columns are converted
+  at once by numpy instead of calling `_data` for every cell """
+  if isinstance(values, np.ndarray) and values.dtype.kind == 'U':
+    return values.tolist()
+  try:
+    arr = np.asarray(values)
+  except ValueError:  # ragged arrays
+    arr = None
+  if arr is not None and arr.ndim == 1 and arr.dtype.kind in 'biuf':
+    return arr.tolist()
+  return [None if v is None else _data(v) for v in values]
+
+
+def _parse_column(values):
+  r""" Convert a column of SQL data to a numpy array, integer and real
+  columns with missing values are returned as float with NaN """
+  if any(isinstance(v, bytes) for v in values):
+    arr = np.empty(shape=(len(values),), dtype=object)
+    arr[:] = [_parse(v) for v in values]
+    return arr
+  arr = np.array(values)
+  if arr.dtype == object:
+    try:
+      arr = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+      pass
+  return arr
+
+
 # ===========================================================================
 # Main
 # ===========================================================================
@@ -74,24 +104,48 @@ class ScoreBoard:
   r""" Using SQLite database for storing the scores and configuration of
   multiple experiments.
 
-  Note: this object is not optimized for high-frequency inserting.
+  Note: for high-frequency inserting, use `write_many` which creates the
+  table and its columns once and inserts all rows in a single transaction.
 
   Note:
     it might be easier to just use NoSQL, however, we are not dealing with
     performance critical app so SQL still a more intuitive approach.
 
     All column names are lower case
+
+  Arguments:
+    path : String, path to the database file or ':memory:'.
+    read_only : a Boolean, open the database in read-only mode.
+    journal_mode : String or None, SQLite journal mode of the database file,
+      'WAL' (write-ahead logging) allows concurrent readers (e.g. plotting
+      dashboards) while experiments are writing. `None` keeps the current
+      mode of the database.
+    synchronous : String, 'OFF', 'NORMAL', 'FULL' or 'EXTRA'. With WAL,
+      'NORMAL' is safe against corruption but the last transactions might be
+      rolled back after a power loss.
   """
 
-  def __init__(self, path=":memory:", read_only=False):
+  def __init__(self,
+               path=":memory:",
+               read_only=False,
+               journal_mode='WAL',
+               synchronous='NORMAL'):
     if ':memory:' not in path:
       path = os.path.abspath(os.path.expanduser(path))
       if os.path.isdir(path):
         raise ValueError("path to %s must be path to a file." % path)
+    synchronous = str(synchronous).strip().upper()
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+      raise ValueError("synchronous must be one of: OFF, NORMAL, FULL, EXTRA; "
+                       "but given: %s" % synchronous)
     self.path = path
     self._conn = None
     self._c = None
     self._read_only = bool(read_only)
+    self._journal_mode = journal_mode
+    self._synchronous = synchronous
+    # mapping: table_name -> OrderedDict(column_name -> SQL type)
+    self._schema = {}
 
   @property
   def read_only(self):
@@ -103,6 +157,7 @@ class ScoreBoard:
       self._read_only = bool(ro)
       if self._conn is not None:
         self._conn.close()
+        self._conn = None
 
   @property
   def conn(self) -> sqlite3.Connection:
@@ -111,6 +166,10 @@ class ScoreBoard:
         self._conn = sqlite3.connect('file:%s?mode=ro' % self.path, uri=True)
       else:
         self._conn = sqlite3.connect(self.path)
+        if self._journal_mode is not None and ':memory:' not in self.path:
+          self._conn.execute(f"PRAGMA journal_mode={self._journal_mode};")
+      self._conn.execute(f"PRAGMA synchronous={self._synchronous};")
+      self._schema = {}
     return self._conn
 
   @contextmanager
@@ -159,10 +218,20 @@ class ScoreBoard:
   def get_column_names(self, table):
     table = str(table).strip().lower()
     with self.cursor() as c:
-      cols = c.execute(f"""PRAGMA table_info({table});""").fetchall()
-      cols = [i[1] for i in cols]
+      cols = list(self._load_schema(c, table).keys())
     return cols
 
+  def _load_schema(self, _cursor, table):
+    r""" Read the columns of given table from the database and update the
+    schema cache, return empty mapping if the table does not exist """
+    cols = _cursor.execute(f"""PRAGMA table_info('{table}');""").fetchall()
+    schema = OrderedDict([(i[1], i[2]) for i in cols])
+    if len(schema) > 0:
+      self._schema[table] = schema
+    else:
+      self._schema.pop(table, None)
+    return schema
+
   def get_table(self, table, where="", distinct=False):
     r""" Get all rows from given table
 
@@ -190,10 +259,16 @@ class ScoreBoard:
              where="",
              join="",
              order="",
-             group=""):
+             group="",
+             columnar=False):
     r""" If `query` is given run the query directly, otherwise, infer the
     appropriate query from all given information
 
+    By default, a list of rows is returned (a single value per row if only
+    one column is selected). If `columnar='numpy'` (or `True`), return an
+    `OrderedDict` mapping column name to `numpy.ndarray`; if
+    `columnar='pandas'`, return a `pandas.DataFrame`.
+
     The format of the query is:
     `SELECT {keys} FROM {table} {join} {where} {order} {group};`
 
@@ -248,6 +323,9 @@ class ScoreBoard:
             for k in keys.split(',')])
       # final query
       query = f"""SELECT {keys} FROM {table} {join} {where} {order} {group};"""
+    if columnar not in (False, True, 'numpy', 'pandas'):
+      raise ValueError("columnar must be False, True, 'numpy' or 'pandas', "
+                       "but given: %s" % str(columnar))
     # execute
     with self.cursor() as c:
       try:
@@ -255,6 +333,18 @@ class ScoreBoard:
       except sqlite3.OperationalError as e:
         print(query)
         raise e
+      if columnar:
+        names = []
+        for i, desc in enumerate(c.description):
+          names.append(desc[0] if desc[0] not in names else f"{desc[0]}_{i}")
+        columns = list(zip(*rows)) if len(rows) > 0 else [()] * len(names)
+        data = OrderedDict([
+            (name, _parse_column(col)) for name, col in zip(names, columns)
+        ])
+        if columnar == 'pandas':
+          import pandas as pd
+          data = pd.DataFrame(data, columns=names)
+        return data
       rows = [[_parse(x) for x in r] for r in rows]
       rows = [r[0] if len(r) == 1 else r for r in rows]
     return rows
@@ -284,46 +374,54 @@ class ScoreBoard:
       print(query)
       raise e
 
-  def _write_table(self, _cursor, table, unique, replace, **row):
-    if self.read_only:
-      warnings.warn("Cannot write to table: %s %s" % (table, str(row)))
-      return
-    # make sure table exist
-    row = {str(k).strip().lower(): v for k, v in row.items()}
-    self._create_table(_cursor, table, row, unique)
-    table_name = str(table).strip().lower()
-    new_cols = list(row.keys())
-    cols = ",".join([f"'{k}'" for k in new_cols])
-    fmt = ','.join(['?'] * len(row))
-    # make sure all column exist
-    exist_cols = self.get_column_names(table)
-    alter_cols = [k for k in new_cols if k not in exist_cols]
-    if len(alter_cols) > 0:
-      for c in alter_cols:
-        t = _to_sqltype(row[c])
-        try:
-          query = f"ALTER TABLE '{table_name}' ADD COLUMN '{c}' {t};"
-          _cursor.execute(query)
-        except sqlite3.OperationalError as e:
-          print(query)
-          raise e
+  def _prepare_table(self, _cursor, table, row, unique):
+    r""" Make sure the table and all columns of the `row` (mapping column name
+    to an example value) exist, the schema cache is used to avoid querying
+    the database for every write """
+    schema = self._schema.get(table, None)
+    if schema is None:
+      schema = self._load_schema(_cursor, table)
+      if len(schema) == 0:
+        self._create_table(_cursor, table, row, unique)
+        schema = self._load_schema(_cursor, table)
+    alter_cols = [k for k in row.keys() if k not in schema]
+    for c in alter_cols:
+      t = _to_sqltype(row[c])
+      try:
+        query = f"ALTER TABLE '{table}' ADD COLUMN '{c}' {t};"
+        _cursor.execute(query)
+      except sqlite3.OperationalError as e:
+        print(query)
+        raise e
+      schema[c] = t
+
+  def _write_table(self, _cursor, table, unique, replace, header, rows):
+    r""" Insert `rows` (sequences of SQL data ordered as the columns of
+    `header`, a mapping from column name to an example value) """
+    table = str(table).strip().lower()
+    cols = ",".join([f"'{k}'" for k in header.keys()])
+    fmt = ','.join(['?'] * len(header))
     # prepare the query
     if replace:
       write_mode = "REPLACE INTO"
+    elif unique:  # skip duplicated rows for unique values
+      write_mode = "INSERT OR IGNORE INTO"
     else:
       write_mode = "INSERT INTO"
-    query = f"""{write_mode} '{table_name}' ({cols}) VALUES({fmt});"""
+    query = f"""{write_mode} '{table}' ({cols}) VALUES({fmt});"""
     try:
-      _cursor.execute(query, [_data(v) for v in row.values()])
-    except sqlite3.IntegrityError as e:
-      if unique:
-        pass
-        # warnings.warn(f"Duplicated row for unique values: {row}")
-      else:
+      self._prepare_table(_cursor, table, header, unique)
+      _cursor.executemany(query, rows)
+    except sqlite3.OperationalError:
+      # stale schema cache (e.g. the table was modified by other connection),
+      # reload the schema and retry once
+      self._schema.pop(table, None)
+      try:
+        self._prepare_table(_cursor, table, header, unique)
+        _cursor.executemany(query, rows)
+      except sqlite3.OperationalError as e:
+        print(query)
         raise e
-    except sqlite3.OperationalError as e:
-      print(query)
-      raise e
 
   def write(self, table, unique=False, replace=False, **row):
     r""" Write one row of data to SQL table.
@@ -334,18 +432,70 @@ class ScoreBoard:
       replace : a Boolean. In case unique, replace existing row and column.
       **row : mapping key, value for the row.
     """
-    row.pop('table', None)
-    row.pop('unique', None)
-    row.pop('replace', None)
-    row.pop('_cursor', None)
-    row['table'] = table
-    row['unique'] = unique
-    row['replace'] = replace
+    if self.read_only:
+      warnings.warn("Cannot write to table: %s %s" % (table, str(row)))
+      return self
+    row = OrderedDict([(str(k).strip().lower(), v) for k, v in row.items()])
+    rows = [[_data(v) for v in row.values()]]
+    if self._c is None:
+      with self.cursor() as c:
+        self._write_table(c, table, unique, replace, row, rows)
+    else:
+      self._write_table(self._c, table, unique, replace, row, rows)
+    return self
+
+  def write_many(self, table, rows, unique=False, replace=False):
+    r""" Write many rows of data to SQL table in a single transaction,
+    the schema is inferred once from all rows.
+
+    Arguments:
+      table : String, SQL table name.
+      rows : list of mapping (key, value) for each row, or a mapping from
+        column name to a sequence of values (e.g. a dictionary of numpy
+        arrays or a `pandas.DataFrame`). Missing values are stored as NULL.
+      unique : list of String, name of unique keys.
+      replace : a Boolean. In case unique, replace existing row and column.
+
+    Example:
+    ```
+    board.write_many('scores', [dict(epoch=1, loss=0.5), dict(epoch=2)])
+    # is the same as
+    board.write_many('scores', dict(epoch=[1, 2], loss=[0.5, None]))
+    ```
+    """
+    if hasattr(rows, 'items'):  # columnar data
+      columns = OrderedDict([
+          (str(k).strip().lower(),
+           np.asarray(v) if hasattr(v, '__array__') else list(v))
+          for k, v in rows.items()
+      ])
+      lengths = set(len(v) for v in columns.values())
+      if len(lengths) > 1:
+        raise ValueError("All columns must have the same length, given: %s" %
+                         {k: len(v) for k, v in columns.items()})
+    else:  # list of rows, the column names are normalized once
+      rows = list(rows)
+      keys = {}
+      for r in rows:
+        keys.update(dict.fromkeys(r))
+      columns = OrderedDict([(str(k).strip().lower(),
+                              [r.get(k, None) for r in rows]) for k in keys])
+    if len(columns) == 0 or len(next(iter(columns.values()))) == 0:
+      return self
+    if self.read_only:
+      warnings.warn("Cannot write %d rows to table: %s" %
+                    (len(next(iter(columns.values()))), table))
+      return self
+    # the first non-missing value decides the type of each column
+    header = OrderedDict()
+    for k, v in columns.items():
+      header[k] = next((i for i in v if i is not None), None)
+    data = list(zip(*[_column_data(v) for v in columns.values()]))
     if self._c is None:
       with self.cursor() as c:
-        self._write_table(_cursor=c, **row)
+        self._write_table(c, table, unique, replace, header, data)
     else:
-      self._write_table(_cursor=self._c, **row)
+      self._write_table(self._c, table, unique, replace, header, data)
     return self
 
   ######## others
@@ -367,6 +517,7 @@ class ScoreBoard:
       self._conn.close()
     self._c = None
     self._conn = None
+    self._schema = {}
 
   def __del__(self):
     self.close()
@@ -1,15 +1,17 @@
 from __future__ import annotations
 
+import atexit
 import glob
 import inspect
 import os
 import pickle
 import tempfile
+import time
 import warnings
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from functools import partial
 from numbers import Number
-from threading import RLock
+from threading import Condition, RLock, Thread
 from typing import Any, Callable, Dict, List, Optional, Text, Tuple, Union
 
 import numpy as np
@@ -27,7 +29,7 @@ from tensorflow.python.ops import summary_ops_v2
 from tensorflow.python.summary.summary_iterator import summary_iterator
 from tqdm import tqdm
 
-__all__ = ['Trainer', 'get_current_trainer']
+__all__ = ['Trainer', 'StepProfiler', 'get_current_trainer']
 
 # ===========================================================================
 # Helpers
@@ -38,6 +40,7 @@ _BEST_WEIGHTS = {}
 _BEST_OPTIMIZER = {}
 _CHECKPOINT_MANAGER = {}
 _CURRENT_TRAINER = None
+_CHECKPOINT_WRITER = None
 
 
 def _validate_optimize(func):
@@ -159,6 +162,190 @@ def read_tensorboard(logdir: str) -> Dict[Text, Tuple[float, int, float]]:
   return all_log
 
 
+# ===========================================================================
+# Asynchronous checkpoint
+# ===========================================================================
+class _AsyncWriter(object):
+  r""" Run the writing jobs in a background thread.
+
+  A job is identified by a key (i.e. the checkpoint path), the pending job of
+  the same key is replaced by the newer one (the intermediate checkpoint is
+  dropped when the writer is behind), at most `max_pending` distinct keys are
+  queued, otherwise, `submit` blocks until a job finished.
+  """
+
+  def __init__(self, max_pending: int = 4):
+    self.max_pending = max(1, int(max_pending))
+    self.n_written = 0
+    self.n_dropped = 0
+    self._pending = OrderedDict()
+    self._cond = Condition()
+    self._writing = False
+    self._error = None
+    self._thread = None
+
+  def _raise_error(self):
+    error, self._error = self._error, None
+    if error is not None:
+      raise RuntimeError("Asynchronous checkpoint failed") from error
+
+  def submit(self, key: str, write: Callable[[], None]):
+    self._raise_error()
+    with self._cond:
+      if key in self._pending:
+        del self._pending[key]
+        self.n_dropped += 1
+      self._cond.wait_for(lambda: len(self._pending) < self.max_pending)
+      self._pending[key] = write
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = Thread(target=self._run,
+                              name='AsyncCheckpointWriter',
+                              daemon=True)
+        self._thread.start()
+      self._cond.notify_all()
+
+  def _run(self):
+    while True:
+      with self._cond:
+        self._cond.wait_for(lambda: len(self._pending) > 0)
+        _, write = self._pending.popitem(last=False)
+        self._writing = True
+        self._cond.notify_all()
+      try:
+        write()
+        self.n_written += 1
+      except BaseException as e:
+        self._error = e
+      finally:
+        with self._cond:
+          self._writing = False
+          self._cond.notify_all()
+
+  def wait(self, timeout: Optional[float] = None) -> bool:
+    with self._cond:
+      done = self._cond.wait_for(
+          lambda: len(self._pending) == 0 and not self._writing, timeout)
+    self._raise_error()
+    return done
+
+
+def _get_writer() -> _AsyncWriter:
+  global _CHECKPOINT_WRITER
+  if _CHECKPOINT_WRITER is None:
+    _CHECKPOINT_WRITER = _AsyncWriter()
+    atexit.register(_CHECKPOINT_WRITER.wait)
+  return _CHECKPOINT_WRITER
+
+
+def _snapshot(objs) -> List[Any]:
+  r""" Copy the values of variables, layers or optimizers to host memory """
+  values = []
+  for i in objs:
+    if isinstance(i, tf.Variable):
+      values.append(np.array(i.numpy()))
+    else:
+      values.append([np.array(w) for w in i.get_weights()])
+  return values
+
+
+def _atomic_write(path: str, obj: Any):
+  r""" Write `bytes` or pickle an object to a temporary file, then rename it
+  to `path`, so a checkpoint file is either complete or does not exist """
+  tmp_path = f"{path}.tmp"
+  with open(tmp_path, 'wb') as f:
+    if isinstance(obj, bytes):
+      f.write(obj)
+    else:
+      pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(tmp_path, path)
+
+
+def _async_checkpoints(dir_path: str) -> List[str]:
+  r""" Sorted paths to the checkpoints saved by `async_mode` """
+  files = glob.glob(os.path.join(dir_path, 'ckpt-async-*.pkl'))
+  return sorted(files, key=lambda f: int(f.split('-')[-1][:-4]))
+
+
+# ===========================================================================
+# Profiling
+# ===========================================================================
+def _n_examples(inputs) -> int:
+  x = tf.nest.flatten(inputs)
+  if len(x) == 0 or len(x[0].shape) == 0 or x[0].shape[0] is None:
+    return 1
+  return int(x[0].shape[0])
+
+
+class StepProfiler(object):
+  r""" Rolling statistics of the wall-clock time of each training phase,
+  the durations of the last `window` iterations are kept in a ring buffer.
+
+  The phases are:
+    - 'data' : waiting for the next batch from the input pipeline
+    - 'step' : calling the `optimize` function
+    - 'sync' : copying the loss to host memory (i.e. waiting for the
+        asynchronous computation of the step to finish)
+    - 'summary' : writing the summary and logging
+    - 'valid' : validation
+    - 'callback' : the callbacks
+
+  Arguments:
+    window : an Integer, number of iterations for the rolling statistics
+    percentiles : list of percentiles of the phase durations
+  """
+  PHASES = ('data', 'step', 'sync', 'summary', 'valid', 'callback')
+
+  def __init__(self, window: int = 200, percentiles=(50, 90, 99)):
+    self.window = max(1, int(window))
+    self.percentiles = tuple(int(p) for p in percentiles)
+    self._durations = np.zeros((self.window, len(StepProfiler.PHASES)),
+                               dtype=np.float64)
+    self._examples = np.zeros((self.window,), dtype=np.float64)
+    self.n_iter = 0
+
+  def record(self, durations: List[float], n_examples: int):
+    r""" Record the durations (in second) of all phases of an iteration """
+    i = self.n_iter % self.window
+    self._durations[i] = durations
+    self._examples[i] = n_examples
+    self.n_iter += 1
+
+  def statistics(self) -> Dict[str, float]:
+    r""" Return the rolling statistics:
+      - '{phase}_p{percentile}' : durations percentiles in millisecond
+      - 'examples_per_sec' : training throughput
+      - 'input_fraction' : fraction of the training time (data, step and
+          sync) waiting for the input pipeline
+      - 'input_bound' : 1 if waiting for data longer than computing,
+          i.e. the input pipeline is the bottleneck, otherwise, 0
+    """
+    n = min(self.n_iter, self.window)
+    if n == 0:
+      return dict()
+    durations = self._durations[:n]
+    stats = dict()
+    values = np.percentile(durations, self.percentiles, axis=0) * 1000.
+    for j, name in enumerate(StepProfiler.PHASES):
+      for p, v in zip(self.percentiles, values[:, j]):
+        stats[f"{name}_p{p}"] = float(v)
+    total = np.sum(durations)
+    data, compute = np.sum(durations[:, 0]), np.sum(durations[:, 1:3])
+    stats['examples_per_sec'] = float(np.sum(self._examples[:n]) /
+                                      max(total, 1e-12))
+    stats['input_fraction'] = float(data / max(data + compute, 1e-12))
+    stats['input_bound'] = float(data > compute)
+    return stats
+
+  def summary(self, prefix: str = "profile/") -> Dict[str, float]:
+    r""" Write the statistics as tensorboard scalars """
+    stats = self.statistics()
+    for k, v in stats.items():
+      tf.summary.scalar(f"{prefix}{k}", v)
+    return stats
+
+
 # ===========================================================================
 # Main
 # ===========================================================================
@@ -198,8 +385,22 @@ class Trainer(object):
                       models,
                       optimizers=None,
                       trainer=None,
-                      max_to_keep=5):
-    r""" Save checkpoint """
+                      max_to_keep=5,
+                      async_mode=False):
+    r""" Save checkpoint
+
+    Arguments:
+      dir_path : path to the checkpoint folder
+      models : list of `keras.layers.Layer` or `tf.Variable`
+      optimizers : list of `tf.optimizers.Optimizer`
+      trainer : `odin.backend.Trainer` or `None`
+      max_to_keep : an Integer, number of kept checkpoints
+      async_mode : a Boolean. If True, the weights are copied to host memory
+        and written together with the optimizers' configs and the trainer to
+        a single file by a background thread (atomic rename on completion), an
+        intermediate checkpoint waiting to be written is dropped if a newer
+        one is saved. Call `Trainer.wait()` to finish all pending writes.
+    """
     if optimizers is None:
       optimizers = []
     optimizers = tf.nest.flatten(optimizers)
@@ -214,6 +415,11 @@ class Trainer(object):
         i for i in tf.nest.flatten(models)
         if isinstance(i, (tf.Variable, keras.layers.Layer))
     ]
+    if async_mode:
+      Trainer._save_checkpoint_async(dir_path, models, optimizers, trainer,
+                                     max_to_keep)
+      return
+    Trainer.wait()  # pending asynchronous writes finish first
     footprint = dir_path + \
       ''.join(sorted([str(id(i)) for i in optimizers])) + \
       ''.join(sorted([str(id(i)) for i in models]))
@@ -238,10 +444,87 @@ class Trainer(object):
       with open(os.path.join(dir_path, 'trainer.pkl'), 'wb') as f:
         pickle.dump(trainer, f)
 
+  @staticmethod
+  def _save_checkpoint_async(dir_path, models, optimizers, trainer,
+                             max_to_keep):
+    # snapshot in the training thread, the optimizers' configs and the
+    # trainer are bundled with the weights, so a checkpoint is written
+    # (and restored) as a whole
+    bundle = dict(
+        models=_snapshot(models),
+        optimizers=_snapshot(optimizers),
+        configs=[(opt.__class__.__name__, opt.get_config())
+                 for opt in optimizers],
+        trainer=None if trainer is None else pickle.dumps(trainer))
+
+    # write in the background thread
+    def write():
+      ckpts = _async_checkpoints(dir_path)
+      index = int(ckpts[-1].split('-')[-1][:-4]) + 1 if len(ckpts) > 0 else 1
+      _atomic_write(os.path.join(dir_path, f'ckpt-async-{index}.pkl'), bundle)
+      for f in _async_checkpoints(dir_path)[:-max_to_keep]:
+        os.remove(f)
+
+    _get_writer().submit(dir_path, write)
+
+  @staticmethod
+  def _restore_checkpoint_async(dir_path, models, optimizers, index):
+    with open(_async_checkpoints(dir_path)[int(index)], 'rb') as f:
+      weights = pickle.load(f)
+    models = [
+        i for i in tf.nest.flatten(models)
+        if isinstance(i, (tf.Variable, keras.layers.Layer))
+    ]
+    if optimizers is None:
+      optimizers = [
+          tf.optimizers.get(name).from_config(config)
+          for name, config in weights['configs']
+      ]
+    optimizers = tf.nest.flatten(optimizers)
+    for m, w in zip(models, weights['models']):
+      if isinstance(m, tf.Variable):
+        m.assign(w)
+      else:
+        m.set_weights(w)
+    # the slots of a new optimizer are created before setting the weights
+    variables = []
+    for m in models:
+      if isinstance(m, tf.Variable):
+        if m.trainable:
+          variables.append(m)
+      else:
+        variables += m.trainable_variables
+    for opt, w in zip(optimizers, weights['optimizers']):
+      if len(w) == 0:
+        continue
+      if len(opt.weights) != len(w) and hasattr(opt, '_create_all_weights'):
+        opt._create_all_weights(variables)
+      if len(opt.weights) != len(w):
+        warnings.warn(f"Cannot restore weights of optimizer {opt}, expect "
+                      f"{len(w)} weights but given {len(opt.weights)}")
+        continue
+      opt.set_weights(w)
+    trainer = weights['trainer']
+    if trainer is not None:
+      trainer = pickle.loads(trainer)
+    return models, optimizers, trainer
+
+  @staticmethod
+  def wait(timeout: Optional[float] = None) -> bool:
+    r""" Block until all asynchronous checkpoints are written, return False
+    if the timeout is reached """
+    if _CHECKPOINT_WRITER is None:
+      return True
+    return _CHECKPOINT_WRITER.wait(timeout)
+
   @staticmethod
   def restore_checkpoint(dir_path, models=None, optimizers=None, index=-1):
     r""" Restore saved checkpoint
 
+    The checkpoints saved by `async_mode` are restored into the given
+    `models` (and `optimizers`), a folder should contain only one type of
+    checkpoints.
+
     Returns:
       models : list of `keras.Model` or `tf.Variable`
       optimizers : list of `tf.optimizers.Optimizer`
@@ -253,6 +536,14 @@ class Trainer(object):
       os.mkdir(dir_path)
     elif os.path.isfile(dir_path):
       raise ValueError("dir_path must be path to a folder")
+    Trainer.wait()
+    # asynchronous checkpoints
+    if len(_async_checkpoints(dir_path)) > 0:
+      if models is None:
+        raise ValueError("models must be provided for restoring the "
+                         f"asynchronous checkpoint at path: {dir_path}")
+      return Trainer._restore_checkpoint_async(dir_path, models, optimizers,
+                                               index)
     # check models and optimizers
     if models is None and optimizers is None:
       footprint = [name for name in _CHECKPOINT_MANAGER \
@@ -491,6 +782,7 @@ class Trainer(object):
     self._current_train_progress = None
     self._cached_tensorboard = None
     self._is_training = False
+    self.profiler = None
 
   @property
   def tensorboard(self) -> Dict[Text, Tuple[float, int, float]]:
@@ -534,6 +826,15 @@ class Trainer(object):
         metrics[key] = val
     return metrics
 
+  @property
+  def profile_metrics(self) -> Dict[str, List[float]]:
+    r""" The step-time statistics written by `StepProfiler` during `fit` """
+    metrics = dict()
+    for key, val in self.tensorboard.items():
+      if "profile/" == key[:8]:
+        metrics[key[8:]] = [i[-1] for i in val]
+    return metrics
+
   @property
   def current_valid_loss(self) -> List[float]:
     return self._current_valid_loss
@@ -562,6 +863,7 @@ class Trainer(object):
     self._current_train_progress = None
     self._cached_tensorboard = None
     self._is_training = False
+    self.profiler = None
 
   def fit(self,
           train_ds: DatasetV2,
@@ -575,7 +877,11 @@ class Trainer(object):
           log_tag: str = '',
           max_iter: int = -1,
           terminate_on_nan: bool = True,
-          callback: Union[Callback, List[Callback]] = lambda: None):
+          callback: Union[Callback, List[Callback]] = lambda: None,
+          profile: bool = False,
+          profile_window: int = 200,
+          profile_every: int = 0,
+          profile_steps: int = 10):
     r""" A simplified fitting API
 
     Arguments:
@@ -597,6 +903,17 @@ class Trainer(object):
       callback : Callable take no input arguments.
         The callback will be called after every fixed number of iteration
         according to `valid_freq`, or fixed duration defined by `valid_interval`
+      profile : Boolean. Record the wall-clock time of each phase of the
+        training iterations (see `StepProfiler`), the rolling statistics are
+        written to tensorboard (tag 'profile/*') and printed every
+        `logging_interval`. Disabled by default.
+      profile_window : An Integer. Number of iterations for the rolling
+        statistics.
+      profile_every : An Integer. If greater than 0, a `tf.profiler` trace of
+        `profile_steps` iterations is written to `logdir` every
+        `profile_every` iterations.
+      profile_steps : An Integer. Number of iterations of each trace, must be
+        smaller than `profile_every`.
 
     Example:
       def optimize(inputs, tape, n_iter, training):
@@ -681,6 +998,25 @@ class Trainer(object):
       }
       return epoch_loss, epoch_metrics
 
+    ### profiling
+    profiler = StepProfiler(window=profile_window) if profile else None
+    self.profiler = profiler
+    profile_every = int(profile_every)
+    profile_steps = max(1, int(profile_steps))
+    if 0 < profile_every <= profile_steps:
+      raise ValueError(f"profile_steps={profile_steps} must be smaller than "
+                       f"profile_every={profile_every}")
+    tracing = [False]
+
+    def trace(n_iter, stop=False):
+      if tracing[0] and (stop or n_iter % profile_every >= profile_steps):
+        tf.profiler.experimental.stop()
+        tracing[0] = False
+      elif not stop and not tracing[0] and profile_every > 0 and \
+        n_iter % profile_every == 0:
+        tf.profiler.experimental.start(self.logdir)
+        tracing[0] = True
+
     ### training function
     def train():
       global _CURRENT_TRAINER
@@ -691,7 +1027,9 @@ class Trainer(object):
       start_time = progress.start_t
       last_print_time = 0
       last_valid_time = start_time
+      t_end = time.perf_counter()
       for cur_iter, inputs in enumerate(progress):
+        t_data = time.perf_counter()
         self.n_iter += 1
         # ====== check maximum iteration ====== #
         if max_iter > 0 and cur_iter >= max_iter:
@@ -699,8 +1037,10 @@ class Trainer(object):
         tf.summary.experimental.set_step(self.n_iter)
         # the tensorboard will change after each iteration
         self._cached_tensorboard = None
+        trace(self.n_iter)
         # ====== train ====== #
         loss, metrics = fn_step(self.n_iter, inputs, training=True)
+        t_step = time.perf_counter()
         # do not record the loss and metrics at every iteration, the
         # performance will drop about 40%
         if terminate_on_nan and np.isnan(loss) or np.isinf(loss):
@@ -709,6 +1049,7 @@ class Trainer(object):
           for k, v in metrics.items():
             progress.write(f"\t{k}: {v}")
           break
+        t_sync = time.perf_counter()
         # ====== logging ====== #
         interval = progress._time() - last_print_time
         if interval >= logging_interval:
@@ -720,7 +1061,16 @@ class Trainer(object):
                          metrics,
                          self.n_iter,
                          is_valid=False)
+          if profiler is not None:
+            stats = profiler.summary()
+            if len(stats) > 0:
+              progress.write(
+                  f"{log_tag} [Profile] {stats['examples_per_sec']:.1f}"
+                  f"(examples/s) data:{stats['input_fraction'] * 100:.1f}%"
+                  f" {'input' if stats['input_bound'] else 'compute'}-bound")
           last_print_time = progress._time()
+        t_summary = time.perf_counter()
+        t_valid = t_summary
         # ====== validation ====== #
         interval = progress._time() - last_valid_time
         if cur_iter == 0 or \
@@ -736,11 +1086,19 @@ class Trainer(object):
                            val_metrics,
                            self.n_iter,
                            is_valid=True)
+          t_valid = time.perf_counter()
           # callback always called
           _process_callback_returns(progress, log_tag, self.n_iter, callback())
           if not self.is_training:
             break
           last_valid_time = progress._time()
+        # ====== profiling ====== #
+        if profiler is not None:
+          t_prev, t_end = t_end, time.perf_counter()
+          profiler.record([
+              t_data - t_prev, t_step - t_data, t_sync - t_step,
+              t_summary - t_sync, t_valid - t_summary, t_end - t_valid
+          ], _n_examples(inputs))
         #########
       # Final callback to signal train ended
       self._is_training = False
@@ -755,7 +1113,11 @@ class Trainer(object):
         tf.summary.trace_on(graph=True, profiler=False)
       else:
         tf.summary.trace_off()
-      train()
+      try:
+        train()
+      finally:  # the tf.profiler trace is stopped even on error
+        trace(self.n_iter, stop=True)
+      Trainer.wait()
       if self.trace_on:
         tf.summary.trace_export(name=func_name,
                                 step=0,
@@ -3,8 +3,11 @@ from __future__ import print_function, division, absolute_import
 import os
 import io
 import mmap
+import struct
+import hashlib
 import marshal
 import sqlite3
+import threading
 from itertools import chain
 from six import add_metaclass
 from six.moves import cPickle
@@ -136,10 +139,10 @@ class NoSQL(MutableMapping):
   def close(self):
     if self._is_closed:
       return
-    self._is_closed = True
-    # check if in read only mode
+    # check if in read only mode, flush before marking the closed flag
     if not self.read_only:
       self.flush(save_all=True)
+    self._is_closed = True
     # delete Singleton instance
     del NoSQL._INSTANCES[self.__class__.__name__][self.path]
     # close but some of the attribute may not be initialized
@@ -220,6 +223,485 @@ class NoSQL(MutableMapping):
 # ===========================================================================
 # MmapDict
 # ===========================================================================
+# signature, end of valid data, offset of the newest index block, and the
+# number of garbage bytes (i.e. overwritten values and merged index blocks)
+_FILE_HEADER = struct.Struct('<8sQQQ')
+# signature, padding, number of entries, offset of the previous index block
+_BLOCK_HEADER = struct.Struct('<4sIQQ')
+_BLOCK_SIGNATURE = b'idxb'
+# the key is stored at `start`, followed by the marshaled value
+_INDEX_DTYPE = np.dtype([('hash', '<u8'), ('start', '<u8'),
+                         ('key_size', '<u4'), ('value_size', '<u4')])
+# value_size of a deleted key
+_TOMBSTONE = 0xFFFFFFFF
+
+
+class _Deleted(object):
+  pass
+
+
+_DELETED = _Deleted()
+
+
+def _hash_key(key):
+  return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                        'little')
+
+
+def _read_signature(path):
+  if not os.path.isfile(path):
+    return None
+  with open(path, 'rb') as f:
+    return f.read(8)
+
+
+def _entries_nbytes(entries):
+  """ Size of the (key, value) pairs referenced by given index entries """
+  value_size = entries['value_size'].astype(np.int64)
+  value_size[value_size == _TOMBSTONE] = 0
+  return int(np.sum(entries['key_size'], dtype=np.int64) + np.sum(value_size))
+
+
+class MmapDict(NoSQL):
+  """ MmapDict
+  Handle enormous dictionary (up to thousand terabytes of data) in
+  memory mapped dictionary, extremely fast to load, and for randomly access.
+  The alignment of saved files:
+
+  ==> |'mmapdic2'|uint64(end)|uint64(last_block)|uint64(garbage)|data|...
+
+  * `end` : ending position of the valid data, every byte after this
+  position is an uncommitted write.
+
+  * `last_block` : offset of the newest index block.
+
+  * `garbage` : number of bytes not referenced anymore, the file is
+  compacted when more than half of it is garbage.
+
+  Each flush appends the new (key, value) pairs followed by a binary index
+  block: |'idxb'|uint32|uint64(n)|uint64(prev_block)|n entries|, the entries
+  are fixed-width `(hash, start, key_size, value_size)` sorted by the 64-bit
+  hash of the key, and they are read directly from the mmap. Blocks of
+  similar size are merged (log-structured), so there are only
+  `O(log(n_keys))` blocks and the cost of each flush is proportional to
+  the number of new keys.
+
+  Note
+  ----
+  Only support (key, value) types = (str, primitive_type)
+  MmapDict read speed is double faster than SQLiteDict.
+  MmapDict also support multiprocessing, and reading from multiple threads.
+  Files created by the older version (i.e. `MmapDictV1`) are still readable.
+  """
+  HEADER = b'mmapdic2'
+  SUPPORTED_HEADERS = (b'mmapdic2', b'mmapdict')
+
+  def __new__(cls, path, read_only=False, cache_size=250, *args, **kwargs):
+    override = kwargs.get('override', args[0] if len(args) > 0 else False)
+    if cls is MmapDict and is_string(path) and not override and \
+      _read_signature(path) == MmapDictV1.HEADER:
+      cls = MmapDictV1
+    return super(MmapDict, cls).__new__(cls, path, read_only, cache_size,
+                                        *args, **kwargs)
+
+  def _restore_dict(self, path, read_only, cache_size):
+    # ====== already exist ====== #
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+      file = open(str(path), mode='rb' if read_only else 'rb+')
+      header = file.read(_FILE_HEADER.size)
+      if len(header) != _FILE_HEADER.size or \
+        header[:len(MmapDict.HEADER)] != MmapDict.HEADER:
+        file.close()  # close the file before Exception
+        raise Exception('Given file is not in the right format '
+                        'for MmapDict.')
+    # ====== create new file from scratch ====== #
+    else:
+      if read_only:
+        raise Exception('File at path:"%s" has zero size, no data '
+                        'found in (read-only mode).' % path)
+      file = open(str(path), mode='wb+')
+      header = _FILE_HEADER.pack(MmapDict.HEADER, _FILE_HEADER.size, 0, 0)
+      file.write(header)
+      file.flush()
+    _, end_position, last_block, garbage = _FILE_HEADER.unpack(header)
+    self._file = file
+    self._lock = threading.Lock()
+    self._set_state(last_block)
+    self._end_position = end_position
+    self._garbage = garbage
+    self._length = None
+    # store all the (key, value) recently added
+    self._cache_dict = {}
+
+  def _set_state(self, last_block):
+    """ Remap the file, the (mmap, blocks) are always replaced together,
+    so readers from other threads see a consistent snapshot without any
+    locking, the old mmap is released when no reader uses it. """
+    mm = mmap.mmap(self._file.fileno(), length=0, access=mmap.ACCESS_READ)
+    blocks = []  # list of (offset, prev_offset, entries, hashes)
+    offset = last_block
+    while offset > 0:
+      signature, _, n, prev = _BLOCK_HEADER.unpack_from(mm, offset)
+      if signature != _BLOCK_SIGNATURE:
+        raise RuntimeError("Corrupted index block at position: %d" % offset)
+      entries = np.frombuffer(mm,
+                              dtype=_INDEX_DTYPE,
+                              count=n,
+                              offset=offset + _BLOCK_HEADER.size)
+      blocks.append((offset, prev, entries, entries['hash']))
+      offset = prev
+    self._state = (mm, blocks)
+
+  def _close(self):
+    mm = self._state[0]
+    # release all the views before closing the mmap
+    self._state = None
+    try:
+      mm.close()
+    except BufferError:  # some views are still used outside
+      pass
+    self._file.close()
+    del self._cache_dict
+
+  # ==================== index helpers ==================== #
+  @staticmethod
+  def _merge_entries(mm, arrays, drop_tombstones):
+    """ Merge index entries (given newest first), only the newest entry
+    of each key is kept, the output is sorted by hash.
+
+    Return the merged entries and the entries that were dropped
+    """
+    entries = arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+    keep = np.ones(len(entries), dtype=bool)
+    if len(arrays) > 1:
+      entries = entries[np.argsort(entries['hash'], kind='stable')]
+      hashes = entries['hash']
+      starts = entries['start']
+      sizes = entries['key_size']
+      key = lambda i: mm[starts[i]:starts[i] + sizes[i]]
+      for i in (np.flatnonzero(hashes[1:] == hashes[:-1]) + 1).tolist():
+        j = i - 1
+        while j >= 0 and hashes[j] == hashes[i]:
+          if keep[j] and key(j) == key(i):
+            keep[i] = False
+            break
+          j -= 1
+    if drop_tombstones:
+      keep &= entries['value_size'] != _TOMBSTONE
+    return entries[keep], entries[~keep]
+
+  @staticmethod
+  def _search(mm, blocks, key):
+    """ Return (start, key_size, value_size) of the newest entry """
+    h = _hash_key(key)
+    h_uint = np.uint64(h)
+    for _, _, entries, hashes in blocks:
+      i = int(hashes.searchsorted(h_uint))
+      n = len(hashes)
+      while i < n:
+        entry = entries.item(i)
+        if entry[0] != h:
+          break
+        start, key_size, value_size = entry[1:]
+        if mm[start:start + key_size] == key:
+          return start, key_size, value_size
+        i += 1
+    return None
+
+  def _live_entries(self):
+    mm, blocks = self._state
+    if len(blocks) == 0:
+      return np.empty((0,), dtype=_INDEX_DTYPE)
+    entries, _ = self._merge_entries(mm, [b[2] for b in blocks],
+                                     drop_tombstones=True)
+    # follow the writing order
+    return entries[np.argsort(entries['start'], kind='stable')]
+
+  def _iter_persisted(self):
+    """ Yield (key, value_start, value_size) """
+    mm = self._state[0]
+    cache = self._cache_dict
+    entries = self._live_entries()
+    for start, key_size, value_size in zip(entries['start'].tolist(),
+                                           entries['key_size'].tolist(),
+                                           entries['value_size'].tolist()):
+      key = mm[start:start + key_size].decode('utf-8')
+      if key in cache:
+        continue
+      yield key, start + key_size, value_size
+
+  def _persisted_length(self):
+    if self._length is None:
+      self._length = len(self._live_entries())
+    return self._length
+
+  def _flush(self, save_all=False):
+    """
+    Parameters
+    ----------
+    save_all: bool
+        kept for compatibility, the index is always saved (incrementally)
+        in this version.
+    """
+    # check if closed or in read only mode
+    if self.is_closed or self.read_only or len(self._cache_dict) == 0:
+      return
+    with self._lock:
+      fd = self._file.fileno()
+      cache = self._cache_dict
+      # ====== serialize the data ====== #
+      position = self._end_position
+      data = []
+      index = []
+      for key, value in cache.items():
+        key = key.encode('utf-8')
+        if value is _DELETED:
+          value, value_size = b'', _TOMBSTONE
+        else:
+          try:
+            value = _dump(value)
+          except ValueError:
+            raise RuntimeError("Cannot marshal.dump %s" % str(value))
+          value_size = len(value)
+        index.append((_hash_key(key), position, len(key), value_size))
+        data.append(key)
+        data.append(value)
+        position += len(key) + len(value)
+      entries = np.array(index, dtype=_INDEX_DTYPE)
+      entries = entries[np.argsort(entries['hash'], kind='stable')]
+      # ====== write data and the new index block ====== #
+      blocks = self._state[1]
+      last_block = blocks[0][0] if len(blocks) > 0 else 0
+      padding = (-position) % 8
+      data.append(b'\0' * padding)
+      position += padding
+      data.append(
+          _BLOCK_HEADER.pack(_BLOCK_SIGNATURE, 0, len(entries), last_block))
+      data.append(entries.tobytes())
+      os.pwrite(fd, b''.join(data), self._end_position)
+      new_blocks = [(position, last_block, entries)] + \
+        [b[:3] for b in blocks]
+      position += _BLOCK_HEADER.size + entries.nbytes
+      garbage = self._garbage + padding
+      # ====== merge blocks with similar size ====== #
+      mm = None
+      while len(new_blocks) >= 2 and \
+        len(new_blocks[1][2]) <= 2 * len(new_blocks[0][2]):
+        if mm is None or len(mm) < position:
+          mm = mmap.mmap(fd, length=0, access=mmap.ACCESS_READ)
+        prev = new_blocks[1][1]
+        merged, dropped = self._merge_entries(
+            mm, [new_blocks[0][2], new_blocks[1][2]], drop_tombstones=prev == 0)
+        os.pwrite(
+            fd,
+            _BLOCK_HEADER.pack(_BLOCK_SIGNATURE, 0, len(merged), prev) +
+            merged.tobytes(), position)
+        garbage += 2 * _BLOCK_HEADER.size + new_blocks[0][2].nbytes + \
+          new_blocks[1][2].nbytes + _entries_nbytes(dropped)
+        new_blocks = [(position, prev, merged)] + new_blocks[2:]
+        position += _BLOCK_HEADER.size + merged.nbytes
+      del mm
+      # ====== commit: update the header ====== #
+      os.pwrite(
+          fd,
+          _FILE_HEADER.pack(MmapDict.HEADER, position, new_blocks[0][0],
+                            garbage), 0)
+      self._end_position = position
+      self._garbage = garbage
+      self._set_state(new_blocks[0][0])
+      self._length = None
+      # reset the cache after the new state is visible
+      self._cache_dict = {}
+      # ====== more than half of the file is garbage ====== #
+      if garbage > position // 2:
+        self._compact()
+
+  def _compact(self):
+    """ Rewrite only the live (key, value) pairs and a single index block
+    to a new file, then atomically replace the old one. Readers holding
+    the old mmap are not affected. """
+    mm = self._state[0]
+    entries = self._live_entries()
+    sizes = entries['key_size'].astype(np.int64) + entries['value_size']
+    starts = entries['start'].astype(np.int64)
+    # ====== copy contiguous runs of data ====== #
+    tmp_path = self.path + '.compact'
+    position = _FILE_HEADER.size
+    with open(tmp_path, 'wb') as f:
+      f.write(b'\0' * _FILE_HEADER.size)
+      if len(entries) > 0:
+        breaks = np.flatnonzero(starts[1:] != (starts + sizes)[:-1]) + 1
+        run_starts = np.concatenate([[0], breaks])
+        run_ends = np.concatenate([breaks, [len(entries)]])
+        with memoryview(mm) as buffer:
+          for i, j in zip(run_starts.tolist(), run_ends.tolist()):
+            f.write(buffer[starts[i]:starts[j - 1] + sizes[j - 1]])
+      entries['start'] = position + np.concatenate([[0], np.cumsum(sizes)[:-1]
+                                                   ]).astype(np.uint64)
+      position += int(np.sum(sizes))
+      entries = entries[np.argsort(entries['hash'], kind='stable')]
+      padding = (-position) % 8
+      f.write(b'\0' * padding)
+      position += padding
+      f.write(_BLOCK_HEADER.pack(_BLOCK_SIGNATURE, 0, len(entries), 0))
+      f.write(entries.tobytes())
+      f.seek(0)
+      f.write(
+          _FILE_HEADER.pack(MmapDict.HEADER,
+                            position + _BLOCK_HEADER.size + entries.nbytes,
+                            position, padding))
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self.path)
+    # ====== reopen the file ====== #
+    self._file.close()
+    self._file = open(self.path, mode='rb+')
+    self._end_position = position + _BLOCK_HEADER.size + entries.nbytes
+    self._garbage = padding
+    self._set_state(position)
+
+  # ==================== I/O methods ==================== #
+  def __str__(self):
+    length = None if self.is_closed else str(len(self))
+    cache_length = 'None' if self.is_closed else \
+        str(len(self._cache_dict))
+    blocks = 'None' if self.is_closed else str(len(self._state[1]))
+    fmt = '<MmapDict path:"%s", length:%s/%s, blocks:%s, closed:%s, read_only:%s>'
+    return fmt % (self.path, length, cache_length, blocks, self.is_closed,
+                  self.read_only)
+
+  # ==================== Dictionary ==================== #
+  def __setitem__(self, key, value):
+    if self.read_only:
+      return
+    key = str(key)
+    # store newly added value for fast query
+    self._cache_dict[key] = value
+    if len(self._cache_dict) > self.cache_size:
+      self.flush(save_all=False)
+
+  def __getitem__(self, key):
+    key = str(key)
+    cache = self._cache_dict
+    if key in cache:
+      value = cache[key]
+      if value is _DELETED:
+        raise KeyError(key)
+      return value
+    # ====== load from mmap ====== #
+    mm, blocks = self._state
+    entry = self._search(mm, blocks, key.encode('utf-8'))
+    if entry is None or entry[-1] == _TOMBSTONE:
+      raise KeyError(key)
+    start, key_size, value_size = entry
+    start += key_size
+    with memoryview(mm) as buffer:
+      return marshal.loads(buffer[start:start + value_size])
+
+  def get_many(self, keys):
+    """ Return the list of values for all given `keys`, the index lookup
+    is vectorized and the values are decoded from slices of the mmap.
+
+    Raise `KeyError` if any key is not found.
+    """
+    keys = [str(k) for k in keys]
+    values = [None] * len(keys)
+    found = np.zeros((len(keys),), dtype=bool)
+    # ====== the cache ====== #
+    cache = self._cache_dict
+    for i, key in enumerate(keys):
+      if key in cache:
+        values[i] = cache[key]
+        found[i] = True
+    # ====== search all blocks, newest first ====== #
+    mm, blocks = self._state
+    encoded = [k.encode('utf-8') for k in keys]
+    hashes = np.fromiter((_hash_key(k) for k in encoded),
+                         dtype=np.uint64,
+                         count=len(keys))
+    with memoryview(mm) as buffer:
+      for _, _, entries, block_hashes in blocks:
+        todo = np.flatnonzero(~found)
+        if len(todo) == 0 or len(entries) == 0:
+          break
+        n = len(entries)
+        positions = np.searchsorted(block_hashes, hashes[todo])
+        matched = block_hashes[np.minimum(positions, n - 1)] == hashes[todo]
+        positions = positions[matched]
+        for i, pos, entry in zip(todo[matched].tolist(), positions.tolist(),
+                                 entries[positions].tolist()):
+          h, start, key_size, value_size = entry
+          while buffer[start:start + key_size] != encoded[i]:
+            pos += 1  # hash collision, check the next entry
+            if pos >= n or block_hashes[pos] != h:
+              break
+            _, start, key_size, value_size = entries.item(pos)
+          else:
+            found[i] = True
+            if value_size == _TOMBSTONE:
+              values[i] = _DELETED
+            else:
+              start += key_size
+              values[i] = marshal.loads(buffer[start:start + value_size])
+    missing = [k for k, f, v in zip(keys, found, values)
+               if not f or v is _DELETED]
+    if len(missing) > 0:
+      raise KeyError("Cannot find keys: %s" % ', '.join(missing[:10]))
+    return values
+
+  def __contains__(self, key):
+    key = str(key)
+    cache = self._cache_dict
+    if key in cache:
+      return cache[key] is not _DELETED
+    mm, blocks = self._state
+    entry = self._search(mm, blocks, key.encode('utf-8'))
+    return entry is not None and entry[-1] != _TOMBSTONE
+
+  def __len__(self):
+    mm, blocks = self._state
+    n = self._persisted_length()
+    for key, value in list(self._cache_dict.items()):
+      entry = self._search(mm, blocks, key.encode('utf-8'))
+      persisted = entry is not None and entry[-1] != _TOMBSTONE
+      if value is _DELETED:
+        n -= int(persisted)
+      else:
+        n += int(not persisted)
+    return n
+
+  def __delitem__(self, key):
+    if self.read_only:
+      return
+    key = str(key)
+    if key not in self:
+      raise KeyError(key)
+    self._cache_dict[key] = _DELETED
+
+  def keys(self):
+    for key, _, _ in self._iter_persisted():
+      yield key
+    for key, value in list(self._cache_dict.items()):
+      if value is not _DELETED:
+        yield key
+
+  def values(self):
+    for _, value in self.items():
+      yield value
+
+  def items(self):
+    mm = self._state[0]
+    with memoryview(mm) as buffer:
+      for key, start, size in self._iter_persisted():
+        yield key, marshal.loads(buffer[start:start + size])
+    for key, value in list(self._cache_dict.items()):
+      if value is not _DELETED:
+        yield key, value
+
+
+# ===========================================================================
+# MmapDict (version 1)
+# ===========================================================================
 def _safe_loading_indices(file_obj, class_name, path):
   try:
     return cPickle.loads(file_obj)
@@ -229,10 +711,10 @@ def _safe_loading_indices(file_obj, class_name, path):
     traceback.print_exc()
     raise e
 
-class MmapDict(NoSQL):
-  """ MmapDict
-  Handle enormous dictionary (up to thousand terabytes of data) in
-  memory mapped dictionary, extremely fast to load, and for randomly access.
+class MmapDictV1(MmapDict):
+  """ The first version of MmapDict, kept for reading (and appending to)
+  the files created by older version, opening `MmapDict` on these files
+  automatically return this class.
   The alignment of saved files:
 
   ==> |'mmapdict'|48-bytes(max_pos)|48-bytes(dict_size)|MmapData|indices-dict|
@@ -262,14 +744,14 @@ class MmapDict(NoSQL):
           raise Exception('File at path:"%s" has zero size, no data '
                           'found in (read-only mode).' % path)
       file = open(str(path), mode='rb+')
-      if file.read(len(MmapDict.HEADER)) != MmapDict.HEADER:
+      if file.read(len(MmapDictV1.HEADER)) != MmapDictV1.HEADER:
         file.close() # close the file before Exception
         raise Exception('Given file is not in the right format '
                         'for MmapDict.')
       # 48 bytes for the file size
-      max_position = int(file.read(MmapDict.SIZE_BYTES))
+      max_position = int(file.read(MmapDictV1.SIZE_BYTES))
       # length of pickled indices dictionary
-      dict_size = int(file.read(MmapDict.SIZE_BYTES))
+      dict_size = int(file.read(MmapDictV1.SIZE_BYTES))
       # read dictionary
       file.seek(max_position)
       pickled_indices = file.read(dict_size)
@@ -278,13 +760,13 @@ class MmapDict(NoSQL):
     # ====== create new file from scratch ====== #
     else:
       file = open(str(path), mode='wb+')
-      file.write(MmapDict.HEADER)
+      file.write(MmapDictV1.HEADER)
       # just write the header
-      header = ('%' + str(MmapDict.SIZE_BYTES) + 'd') % \
-          (len(MmapDict.HEADER) + MmapDict.SIZE_BYTES * 2)
+      header = ('%' + str(MmapDictV1.SIZE_BYTES) + 'd') % \
+          (len(MmapDictV1.HEADER) + MmapDictV1.SIZE_BYTES * 2)
       file.write(header.encode())
       # write the length of Pickled indices dictionary
-      data_size = ('%' + str(MmapDict.SIZE_BYTES) + 'd') % 0
+      data_size = ('%' + str(MmapDictV1.SIZE_BYTES) + 'd') % 0
       file.write(data_size.encode())
       file.flush()
       # init indices dict
@@ -318,8 +800,8 @@ class MmapDict(NoSQL):
     # get old position
     file = self._file
     # start from header (i.e. "mmapdict")
-    file.seek(len(MmapDict.HEADER))
-    max_position = int(file.read(MmapDict.SIZE_BYTES))
+    file.seek(len(MmapDictV1.HEADER))
+    max_position = int(file.read(MmapDictV1.SIZE_BYTES))
     # ====== serialize the data ====== #
     # start from old_max_position, append new values
     file.seek(max_position)
@@ -336,7 +818,7 @@ class MmapDict(NoSQL):
     # ====== write the dumped indices ====== #
     indices_length = 0
     if save_all or \
-    self._increased_indices_size > MmapDict.MAX_INDICES_SIZE:
+    self._increased_indices_size > MmapDictV1.MAX_INDICES_SIZE:
       indices_dump = cPickle.dumps(self.indices,
                                    protocol=cPickle.HIGHEST_PROTOCOL)
       indices_length = len(indices_dump)
@@ -344,12 +826,12 @@ class MmapDict(NoSQL):
       self._increased_indices_size = 0.
     # ====== update the position ====== #
     # write new max size
-    file.seek(len(MmapDict.HEADER))
-    max_position = ('%' + str(MmapDict.SIZE_BYTES) + 'd') % max_position
+    file.seek(len(MmapDictV1.HEADER))
+    max_position = ('%' + str(MmapDictV1.SIZE_BYTES) + 'd') % max_position
     file.write(max_position.encode())
     # update length of pickled indices dictionary
     if indices_length > 0:
-      indices_length = ('%' + str(MmapDict.SIZE_BYTES) + 'd') % indices_length
+      indices_length = ('%' + str(MmapDictV1.SIZE_BYTES) + 'd') % indices_length
       file.write(indices_length.encode())
     # flush everything
     file.flush()
@@ -381,7 +863,7 @@ class MmapDict(NoSQL):
         str(len(self.indices) + len(self._cache_dict))
     cache_length = 'None' if self.is_closed else \
         str(len(self._cache_dict))
-    fmt = '<MmapDict path:"%s", length:%s/%s, loaded:%s, closed:%s, read_only:%s>'
+    fmt = '<MmapDictV1 path:"%s", length:%s/%s, loaded:%s, closed:%s, read_only:%s>'
     return fmt % (self.path, length, cache_length,
                   self.is_loaded, self.is_closed, self.read_only)
 
@@ -406,6 +888,9 @@ class MmapDict(NoSQL):
   def __contains__(self, key):
     return key in self.indices or key in self._cache_dict
 
+  def get_many(self, keys):
+    return [self[key] for key in keys]
+
   def __len__(self):
     return len(self.indices) + len(self._cache_dict)
 
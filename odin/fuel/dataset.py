@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
+import marshal
 import os
 import pickle
 import shutil
@@ -48,7 +49,25 @@ _audio_ext = ('.3gp', '.aa', '.aac', '.aax', '.act', '.aiff', '.amr', '.ape',
 _image_ext = ('.tif', '.tiff', '.gif', '.jpeg', '.jpg', '.jif', '.jfif', '.jp2',
               '.jpx', '.j2k', '.j2c', '.fpx', '.pcd', '.png', '.pdf')
 
-_ignore_files = ('.DS_Store',)
+_MANIFEST = '.odin_manifest'
+
+# '.odin_journal' is the commit log of `FeatureProcessor`
+_ignore_files = ('.DS_Store', _MANIFEST, _MANIFEST + '.tmp', '.odin_journal')
+
+_PICKLE_MAGIC = b'\x80'
+_NUMPY_MAGIC = b'\x93NUMPY'
+_MMAPARRAY_MAGIC = b'mmapdata'
+
+
+class _LazyData(object):
+  """ Placeholder stored in `Dataset._data_map` for data that has only
+  been sniffed, the real data is parsed on the first `__getitem__` """
+
+  def __repr__(self):
+    return '<lazy>'
+
+
+_LAZY = _LazyData()
 
 
 def _parse_data_descriptor(path, read_only):
@@ -137,6 +156,71 @@ def _parse_data_descriptor(path, read_only):
   return [(file_name, ('unknown', 'unknown', None, path))]
 
 
+def _is_memmapable(value):
+  return isinstance(value, np.ndarray) and value.ndim >= 1 and \
+    value.dtype.kind in 'biufcSU'
+
+
+def _sniff_data_descriptor(path, read_only):
+  """ Same as `_parse_data_descriptor` but only reading the file type and
+  header, the data is returned as `_LAZY` and loaded on demand.
+  Fallback to full parsing for unknown format. """
+  if not os.path.isfile(path):
+    return None
+  file_ext = os.path.splitext(path)[-1].lower()
+  file_name = os.path.basename(path)
+  if file_name in _ignore_files:
+    return None
+  if file_ext in _audio_ext or file_ext in _image_ext or \
+    file_ext in ('.txt',):
+    return _parse_data_descriptor(path, read_only)
+  # ====== csv: only check the separator in the first line ====== #
+  if file_ext in ('.csv', '.tsv'):
+    _infer_separator(path)
+    return [('.'.join(file_name.split('.')[:-1]), ('csv', 'unknown', _LAZY,
+                                                   path))]
+  # ====== sniff the magic bytes ====== #
+  with open(path, 'rb') as f:
+    magic = f.read(max(len(MmapDict.HEADER), len(_NUMPY_MAGIC)))
+  if magic[:len(_MMAPARRAY_MAGIC)] == _MMAPARRAY_MAGIC:
+    try:
+      dtype, shape = read_mmaparray_header(path)
+      return [(file_name, (np.dtype(dtype), tuple(shape), _LAZY, path))]
+    except Exception:
+      pass
+  if magic[:len(MmapDict.HEADER)] in MmapDict.SUPPORTED_HEADERS:
+    return [(file_name, ('memdict', 'unknown', _LAZY, path))]
+  if magic[:len(_PICKLE_MAGIC)] == _PICKLE_MAGIC:
+    return [(file_name, ('pickle', 'unknown', _LAZY, path))]
+  if magic[:len(_NUMPY_MAGIC)] == _NUMPY_MAGIC:
+    return [(file_name, ('numpy', 'unknown', _LAZY, path))]
+  return _parse_data_descriptor(path, read_only)
+
+
+def _read_manifest(path):
+  """ Return mapping: file_name -> (mtime_ns, size, [(key, info), ...]) """
+  path = os.path.join(path, _MANIFEST)
+  if not os.path.isfile(path):
+    return {}
+  try:
+    with open(path, 'rb') as f:
+      manifest = cPickle.load(f)
+    return manifest if isinstance(manifest, dict) else {}
+  except Exception:  # corrupted manifest, just rescan the folder
+    return {}
+
+
+def _write_manifest(path, manifest):
+  tmp_path = os.path.join(path, _MANIFEST + '.tmp')
+  try:
+    with open(tmp_path, 'wb') as f:
+      cPickle.dump(manifest, f, protocol=cPickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, os.path.join(path, _MANIFEST))
+  except (IOError, OSError):  # no write permission, skip caching
+    if os.path.exists(tmp_path):
+      os.remove(tmp_path)
+
+
 # ===========================================================================
 # Datasets
 # ===========================================================================
@@ -151,6 +235,20 @@ class Dataset(object):
    - .txt or .csv files:
    -
 
+  Parameters
+  ----------
+  path : str
+    path to the dataset folder (or a `.zip` archive)
+  read_only : bool
+    open all data in copy-on-write mode
+  override : bool
+    remove the existed folder
+  lazy : bool
+    if True, only the file type and header are read when opening the
+    dataset, Data, csv, pickle and MmapDict are loaded on the first
+    `__getitem__`. The directory scan is cached in a manifest file
+    (i.e. `.odin_manifest`) so the next opening only `stat` the files.
+
   Note
   ----
   for developer: _data_map contains: name -> (dtype, shape, Data or pathtoData)
@@ -176,9 +274,10 @@ class Dataset(object):
     Dataset.__INSTANCES[path] = new_instance
     return new_instance
 
-  def __init__(self, path, read_only=False, override=False):
+  def __init__(self, path, read_only=False, override=False, lazy=False):
     path = os.path.abspath(path)
     self.read_only = read_only
+    self.lazy = bool(lazy)
     self._readme_info = [
         ctext('README:', 'yellow'), '------', '  No information!'
     ]
@@ -209,6 +308,8 @@ class Dataset(object):
     # svaed feeder info
     self._saved_indices = {}
     self._saved_recipes = {}
+    # opened MmapArrayWriter for appending data
+    self._writers = {}
     # just make new dir
     if not os.path.exists(path):
       os.mkdir(path)
@@ -218,8 +319,11 @@ class Dataset(object):
     elif not os.path.isdir(path):
       raise ValueError('Dataset path must be a folder.')
     # ====== Load all Data ====== #
-    files = os.listdir(path)
-    for fname in files:
+    lazy = getattr(self, 'lazy', False)
+    old_manifest = _read_manifest(path) if lazy else {}
+    new_manifest = {}
+    for entry in os.scandir(path):
+      fname = entry.name
       # found README
       if 'readme' == fname[:6].lower():
         readme_path = os.path.join(path, fname)
@@ -230,7 +334,24 @@ class Dataset(object):
           self._readme_info = [ctext('README:', 'yellow'), '------'] + readme
           self._readme_path = readme_path
       # parse data
-      data = _parse_data_descriptor(os.path.join(path, fname), read_only)
+      if lazy:
+        data = None
+        if entry.is_file():
+          stat = entry.stat()
+          cached = old_manifest.get(fname, None)
+          if cached is not None and \
+            cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            data = [(key, info + (_LAZY, entry.path))
+                    for key, info in cached[2]]
+          else:
+            data = _sniff_data_descriptor(entry.path, read_only)
+          # only cache the descriptor that could be restored lazily
+          if data is not None and \
+            all(d[2] is _LAZY or d[2] is None for key, d in data):
+            new_manifest[fname] = (stat.st_mtime_ns, stat.st_size,
+                                   [(key, d[:2]) for key, d in data])
+      else:
+        data = _parse_data_descriptor(entry.path, read_only)
       if data is None:
         continue
       for key, d in data:
@@ -239,6 +360,22 @@ class Dataset(object):
                            '{}'.format(key))
         else:
           self._data_map[key] = d
+    if lazy and not read_only and new_manifest != old_manifest:
+      _write_manifest(path, new_manifest)
+
+  def _materialize(self, key):
+    """ Fully parse a lazily opened data """
+    dtype, shape, data, path = self._data_map[key]
+    if dtype == 'memdict':
+      data = MmapDict(path, read_only=self.read_only)
+      self._data_map[key] = ('memdict', len(data), data, path)
+      return self._data_map[key]
+    for name, d in _parse_data_descriptor(path, self.read_only):
+      if name == key:
+        self._data_map[key] = d
+        return d
+    raise RuntimeError("Cannot load data with name '%s' at path: %s" %
+                       (key, path))
 
   # ==================== Pickle ==================== #
   def __getstate__(self):
@@ -247,10 +384,12 @@ class Dataset(object):
           "You must use argument `protocol=cPickle.HIGHEST_PROTOCOL` "
           "when using `pickle` or `cPickle` to be able pickling Dataset.")
     self._new_args_called = False
-    return self.path, self.read_only
+    return self.path, self.read_only, self.lazy
 
   def __setstate__(self, states):
-    path, read_only = states
+    path, read_only = states[:2]
+    self.read_only = read_only
+    self.lazy = states[2] if len(states) > 2 else False
     self._new_args_called = False
     self._set_path(path, read_only)
 
@@ -403,7 +542,11 @@ class Dataset(object):
     raise NotImplementedError
 
   def flush(self):
+    for writer in self._writers.values():
+      writer.flush()
     for dtype, shape, data, path in self._data_map.values():
+      if data is _LAZY:  # never loaded, nothing changed
+        continue
       if hasattr(data, 'flush'):
         data.flush()
       elif data is not None:  # Flush pickling data
@@ -413,6 +556,9 @@ class Dataset(object):
   def close(self, name=None):
     # ====== close all Data ====== #
     if name is None:  # close all files
+      for writer in self._writers.values():
+        writer.close()
+      self._writers.clear()
       for name, (dtype, shape, data, path) in list(self._data_map.items()):
         if hasattr(data, 'close'):
           data.close()
@@ -430,6 +576,8 @@ class Dataset(object):
         del Dataset.__INSTANCES[self.path]
     # ====== close a particular file ====== #
     elif name in self._data_map:
+      if name in self._writers:
+        self._writers.pop(name).close()
       (dtype, shape, data, path) = self._data_map[name]
       if dtype == 'sqlite':
         data.sqlite.close()
@@ -466,6 +614,8 @@ class Dataset(object):
       if key not in self._data_map:
         raise KeyError('%s not found in this dataset' % key)
       dtype, shape, data, path = self._data_map[key]
+      if data is _LAZY:
+        dtype, shape, data, path = self._materialize(key)
       return path if data is None else data
     raise ValueError('Only accept key type is string.')
 
@@ -478,19 +628,108 @@ class Dataset(object):
     """
     Parameters
     ----------
-    key : str or tuple
+    name : str or tuple
         if tuple is specified, it contain the key and the datatype
-        which must be "memmap", "hdf5"
-        for example: ds[('X', 'hdf5')] = numpy.ones((8, 12))
+        which must be "memmap" or "pickle"
+        for example: ds[('X', 'memmap')] = numpy.ones((8, 12))
+        By default, `numpy.ndarray` (with `ndim >= 1`) is saved as `MmapArray`
+        and any other value is pickled.
+
+    Note
+    ----
+    Use `Dataset.append` to grow an existed memmap array in place.
     """
+    dtype = None
+    if isinstance(name, (tuple, list)):
+      name, dtype = name
+      dtype = str(dtype).lower()
+      if dtype not in ('memmap', 'pickle'):
+        raise ValueError("Only support datatype 'memmap' or 'pickle', "
+                         "but given: '%s'" % dtype)
     assert isinstance(name, string_types), \
       "name must be given as string types."
+    if dtype is None:
+      dtype = 'memmap' if _is_memmapable(value) else 'pickle'
+    elif dtype == 'memmap' and not _is_memmapable(value):
+      raise ValueError("Only numpy.ndarray with numeric dtype and ndim >= 1 "
+                       "can be saved as memmap, given: %s" % str(type(value)))
     path = os.path.join(self.path, name)
-    with open(path, 'wb') as f:
-      pickle.dump(value, f)
-    self._data_map[name] = (value.dtype if hasattr(value, 'dtype') else str(
-        type(value)), value.shape if hasattr(value, 'shape') else 'unknown',
-                            value, path)
+    # close the old data before overriding the file
+    if name in self._data_map:
+      self.close(name)
+    if dtype == 'memmap':
+      with MmapArrayWriter(path,
+                           shape=(0,) + value.shape[1:],
+                           dtype=value.dtype,
+                           remove_exist=True) as writer:
+        writer.write(value)
+      self._data_map[name] = (value.dtype, value.shape, _LAZY, path)
+    else:
+      with open(path, 'wb') as f:
+        pickle.dump(value, f)
+      self._data_map[name] = (value.dtype if hasattr(value, 'dtype') else str(
+          type(value)), value.shape if hasattr(value, 'shape') else 'unknown',
+                              value, path)
+
+  def append(self, name: Text, value: np.ndarray):
+    """ Append `value` to the end of the memmap array with given name,
+    the file is extended in place, only the new rows are written.
+    If `name` does not exist, create a new memmap array.
+
+    `value` could be a list of arrays, the file is resized only once.
+    """
+    if isinstance(value, np.ndarray):
+      value = [value]
+    if name not in self._data_map:
+      self[(name, 'memmap')] = value[0]
+      value = value[1:]
+      if len(value) == 0:
+        return self
+    dtype, shape, data, path = self._data_map[name]
+    if name not in self._writers:
+      try:
+        read_mmaparray_header(path)
+      except Exception:
+        raise ValueError("Data with name '%s' is not a memmap array, "
+                         "cannot append." % name)
+      self._writers[name] = MmapArrayWriter(path)
+    writer = self._writers[name]
+    writer.write(value)
+    # the old MmapArray is out-dated, reload on next `__getitem__`
+    self._data_map[name] = (writer.dtype, writer.shape, _LAZY, path)
+    return self
+
+  def truncate(self, name: Text, length: int):
+    """ Shrink the memmap array with given name to its first `length` rows,
+    the header is rewritten and the file is truncated in place (the rows
+    appended after the last consistent point are discarded).
+    """
+    if name not in self._data_map:
+      raise KeyError('%s not found in this dataset' % name)
+    path = self._data_map[name][-1]
+    dtype, shape = read_mmaparray_header(path)
+    length = int(length)
+    if shape[0] == length:
+      return self
+    if not 0 <= length < shape[0]:
+      raise ValueError("Cannot truncate '%s' with %d rows to length: %d" %
+                       (name, shape[0], length))
+    self.close(name)
+    # the data is stored at the end of the file, after the aligned header
+    row_size = int(np.dtype(dtype).itemsize * np.prod(shape[1:]))
+    offset = os.path.getsize(path) - shape[0] * row_size
+    if length == 0:  # numpy.memmap does not support empty array
+      os.remove(path)
+      return self
+    shape = (length,) + tuple(shape[1:])
+    with open(path, 'rb+') as f:
+      f.seek(len(_MMAPARRAY_MAGIC))
+      meta = marshal.dumps([dtype, shape])
+      f.write(('%8d' % len(meta)).encode('utf-8'))
+      f.write(meta)
+      f.truncate(offset + length * row_size)
+    self._data_map[name] = (np.dtype(dtype), shape, _LAZY, path)
+    return self
 
   def get_md5_checksum(self, excluded_name=[]):
     from odin.utils.crypto import md5_checksum
@@ -5,6 +5,7 @@ import numpy as np
 from odin.ml.base import evaluate
 from odin.ml.cluster import fast_dbscan, fast_kmeans, fast_knn
 from odin.ml.decompositions import *
+from odin.ml.embedding_cache import get_embedding_cache, set_embedding_cache
 from odin.ml.fast_lda_topics import fast_lda_topics, get_topics_string
 from odin.ml.fast_tsne import fast_tsne
 from odin.ml.fast_umap import fast_umap
@@ -17,6 +18,7 @@ from odin.ml.neural_nlp import *
 from odin.ml.plda import PLDA
 from odin.ml.scoring import (Scorer, VectorNormalizer, compute_class_avg,
                              compute_wccn, compute_within_cov)
+from odin.ml.trial_scoring import ScoringEngine
 from sklearn.base import ClassifierMixin
 from typing_extensions import Literal
 
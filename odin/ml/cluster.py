@@ -1,14 +1,20 @@
 from __future__ import absolute_import, division, print_function
 
 import types
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
 from numbers import Number
 from warnings import warn
 
 import numpy as np
 from scipy import sparse, stats
 from scipy.sparse import csr_matrix
+from six import string_types
 
-__all__ = ['fast_kmeans', 'fast_knn', 'fast_dbscan']
+__all__ = [
+    'fast_kmeans', 'fast_knn', 'fast_dbscan', 'StreamingKMeans', 'BlockedKNN',
+    'IVFIndex'
+]
 
 
 # ===========================================================================
@@ -37,10 +43,11 @@ def nn_kneighbors_graph(self, X=None, n_neighbors=None, mode='connectivity'):
   # check the input only in self.kneighbors
   # construct CSR matrix representation of the k-NN graph
   A_data, A_ind = self.kneighbors(X, n_neighbors)
-  n_queries = A_ind.shape[0]
+  # the number of neighbors might be clamped to the number of samples
+  n_queries, n_neighbors = A_ind.shape
   n_samples_fit = self.n_samples_fit_
   n_nonzero = n_queries * n_neighbors
-  A_indptr = np.arange(0, n_nonzero + 1, n_neighbors)
+  A_indptr = np.arange(n_queries + 1) * n_neighbors
   # prepare the return
   returns = []
   if mode in ('distance', 'both'):
@@ -127,6 +134,472 @@ def dbscan_predict(self, X=None):
   return y
 
 
+# ===========================================================================
+# Out-of-core clustering and nearest neighbors
+# ===========================================================================
+def _chunks(n, chunk_size):
+  return [(s, min(s + chunk_size, n)) for s in range(0, n, chunk_size)]
+
+
+def _thread_map(func, jobs, n_threads):
+  r""" Ordered map of `func` over `jobs` using threads, numpy releases the
+  GIL for BLAS and most of array operations """
+  if n_threads <= 1 or len(jobs) <= 1:
+    return [func(j) for j in jobs]
+  with ThreadPoolExecutor(max_workers=min(n_threads, len(jobs))) as executor:
+    return list(executor.map(func, jobs))
+
+
+def _read(X, start, end):
+  return np.asarray(X[start:end], dtype=np.float32)
+
+
+def _row_norms(X, chunk_size, n_threads):
+  r""" Squared L2-norm of all rows, streaming the array by chunks """
+  norms = np.empty(shape=(X.shape[0],), dtype=np.float32)
+
+  def job(j):
+    x = _read(X, *j)
+    norms[j[0]:j[1]] = np.einsum('ij,ij->i', x, x)
+
+  _thread_map(job, _chunks(X.shape[0], chunk_size), n_threads)
+  return norms
+
+
+def _neg_inner(A, B, B_norms):
+  r""" Squared euclidean distances between rows of `A` and `B` minus the
+  norm of rows in `A` (i.e. `|b|^2 - 2ab`), enough for ranking the rows
+  of `B` for each row of `A` """
+  d = np.dot(A, B.T)
+  d *= -2
+  d += B_norms
+  return d
+
+
+def _merge_topk(best_d, best_i, d, ids, k):
+  r""" Merge the distances `d` [n_queries, n_candidates] of candidates
+  `ids` into the current top-`k` (`best_d`, `best_i`) of each query """
+  if d.shape[1] > k:
+    part = np.argpartition(d, k - 1, axis=1)[:, :k]
+    d = np.take_along_axis(d, part, axis=1)
+    ids = ids[part]
+  else:
+    ids = np.broadcast_to(ids, d.shape)
+  d = np.concatenate([best_d, d], axis=1)
+  ids = np.concatenate([best_i, ids], axis=1)
+  part = np.argpartition(d, k - 1, axis=1)[:, :k]
+  return np.take_along_axis(d, part, axis=1), np.take_along_axis(ids,
+                                                                 part,
+                                                                 axis=1)
+
+
+def _finalize_topk(best_d, best_i, Q, return_distance):
+  order = np.argsort(best_d, axis=1)
+  best_i = np.take_along_axis(best_i, order, axis=1)
+  if not return_distance:
+    return None, best_i
+  best_d = np.take_along_axis(best_d, order, axis=1)
+  best_d += np.einsum('ij,ij->i', Q, Q)[:, None]
+  return np.sqrt(np.maximum(best_d, 0, out=best_d), out=best_d), best_i
+
+
+def _exclude_self(distances, indices, offset):
+  r""" Remove each query itself from its `k + 1` neighbors """
+  n, k = indices.shape
+  is_self = indices == (np.arange(offset, offset + n)[:, None])
+  # duplicated samples might push the query out of the list, drop the last
+  is_self[~np.any(is_self, axis=1), -1] = True
+  keep = ~is_self
+  indices = indices[keep].reshape(n, k - 1)
+  if distances is not None:
+    distances = distances[keep].reshape(n, k - 1)
+  return distances, indices
+
+
+def _kmeans_plusplus(X, n_clusters, rand):
+  r""" Greedy k-means++ seeding (as in sklearn) on in-memory `X` """
+  n = X.shape[0]
+  n_local_trials = 2 + int(np.log(n_clusters))
+  norms = np.einsum('ij,ij->i', X, X)
+  centers = np.empty(shape=(n_clusters, X.shape[1]), dtype=X.dtype)
+  centers[0] = X[rand.randint(n)]
+  closest = np.maximum(
+      _neg_inner(centers[:1], X, norms)[0] + np.dot(centers[0], centers[0]),
+      0)
+  potential = closest.sum()
+  for c in range(1, n_clusters):
+    candidates = np.searchsorted(np.cumsum(closest),
+                                 rand.random_sample(n_local_trials) * potential)
+    candidates = np.clip(candidates, 0, n - 1)
+    d = _neg_inner(X[candidates], X, norms) + norms[candidates][:, None]
+    d = np.minimum(closest, np.maximum(d, 0, out=d), out=d)
+    best = np.argmin(d.sum(axis=1))
+    closest = d[best]
+    potential = closest.sum()
+    centers[c] = X[candidates[best]]
+  return centers
+
+
+class StreamingKMeans(object):
+  r""" Mini-batch k-means for arrays larger than memory (e.g. `MmapArray`)
+
+  The centers are initialized by k-means++ on a random sample, then each
+  epoch visits the contiguous chunks of `batch_size` rows in a random order,
+  the next chunk is read from disk while the current one is assigned by
+  `n_threads` threads.
+
+  Arguments:
+    n_clusters : int
+    batch_size : int, number of samples in each mini-batch
+    max_iter : int, maximum number of epochs
+    tol : float, stop when the relative improvement of the inertia between
+      two epochs is smaller than `tol`
+    init : {'k-means++', 'random', numpy.ndarray}
+    init_size : int, number of samples for the initialization,
+      default: `max(16 * n_clusters, 4096)`
+    compute_labels : a Boolean, compute `labels_` for all samples after
+      fitting (one more pass over the data)
+    n_threads : int, default: number of CPUs
+  """
+
+  def __init__(self,
+               n_clusters=8,
+               batch_size=32768,
+               max_iter=10,
+               tol=1e-4,
+               init='k-means++',
+               init_size=None,
+               compute_labels=True,
+               n_threads=None,
+               random_state=1234,
+               verbose=False):
+    self.n_clusters = int(n_clusters)
+    self.batch_size = int(batch_size)
+    self.max_iter = int(max_iter)
+    self.tol = float(tol)
+    self.init = init
+    self.init_size = init_size
+    self.compute_labels = bool(compute_labels)
+    self.n_threads = cpu_count() if n_threads is None else int(n_threads)
+    self.random_state = random_state
+    self.verbose = bool(verbose)
+    self.cluster_centers_ = None
+    self.counts_ = None
+    self.inertia_ = None
+    self.labels_ = None
+    self.n_iter_ = 0
+
+  def _rand(self):
+    if isinstance(self.random_state, np.random.RandomState):
+      return self.random_state
+    return np.random.RandomState(self.random_state)
+
+  def _initialize(self, X, rand):
+    if isinstance(self.init, np.ndarray):
+      centers = np.array(self.init, dtype=np.float32)
+    else:
+      n = X.shape[0]
+      init_size = self.init_size
+      if init_size is None:
+        init_size = max(16 * self.n_clusters, 4096)
+      init_size = min(int(init_size), n)
+      # sorted indices for sequential reading
+      ids = np.sort(rand.choice(n, size=init_size, replace=False))
+      sample = np.asarray(X[ids], dtype=np.float32)
+      if self.init == 'random':
+        centers = sample[rand.choice(init_size, self.n_clusters, replace=False)]
+      else:
+        centers = _kmeans_plusplus(sample, self.n_clusters, rand)
+    self.cluster_centers_ = centers
+    self.counts_ = np.zeros(shape=(self.n_clusters,), dtype=np.int64)
+
+  def _assign(self, x, return_distance=False, n_threads=None):
+    r""" Closest center (and squared distance) for each row of `x` """
+    if n_threads is None:
+      n_threads = self.n_threads
+    centers = self.cluster_centers_
+    norms = np.einsum('ij,ij->i', centers, centers)
+
+    def job(j):
+      d = _neg_inner(x[j[0]:j[1]], centers, norms)
+      labels = np.argmin(d, axis=1)
+      return labels, d[np.arange(len(labels)), labels]
+
+    chunk_size = max(1, int(np.ceil(x.shape[0] / n_threads)))
+    results = _thread_map(job, _chunks(x.shape[0], chunk_size), n_threads)
+    labels = np.concatenate([r[0] for r in results])
+    if not return_distance:
+      return labels
+    d = np.concatenate([r[1] for r in results]) + np.einsum('ij,ij->i', x, x)
+    return labels, np.maximum(d, 0, out=d)
+
+  def partial_fit(self, x):
+    r""" Update the centers with one mini-batch of in-memory samples,
+    return the sum of squared distances to the closest centers (before the
+    update) """
+    x = np.asarray(x, dtype=np.float32)
+    if self.cluster_centers_ is None:
+      self._initialize(x, self._rand())
+    labels, d = self._assign(x, return_distance=True)
+    # per-center sums of the batch
+    order = np.argsort(labels, kind='stable')
+    clusters, starts, counts = np.unique(labels[order],
+                                         return_index=True,
+                                         return_counts=True)
+    sums = np.add.reduceat(x[order], starts, axis=0)
+    # per-center learning rate 1/count (Sculley, 2010)
+    old_counts = self.counts_[clusters]
+    new_counts = old_counts + counts
+    centers = self.cluster_centers_
+    centers[clusters] = (centers[clusters] * old_counts[:, None] + sums) / \
+      new_counts[:, None]
+    self.counts_[clusters] = new_counts
+    return float(np.sum(d))
+
+  def fit(self, X, y=None):
+    rand = self._rand()
+    self._initialize(X, rand)
+    n = X.shape[0]
+    chunks = _chunks(n, self.batch_size)
+    last_inertia = None
+    with ThreadPoolExecutor(max_workers=1) as reader:
+      for epoch in range(self.max_iter):
+        order = rand.permutation(len(chunks))
+        inertia = 0.
+        future = reader.submit(_read, X, *chunks[order[0]])
+        for i in range(len(order)):
+          x = future.result()
+          if i + 1 < len(order):  # prefetch the next chunk
+            future = reader.submit(_read, X, *chunks[order[i + 1]])
+          inertia += self.partial_fit(x)
+        self.n_iter_ = epoch + 1
+        self.inertia_ = inertia
+        if self.verbose:
+          print("[StreamingKMeans] epoch:%d inertia:%.4f" % (epoch, inertia))
+        if last_inertia is not None and \
+          abs(last_inertia - inertia) <= self.tol * abs(last_inertia):
+          break
+        last_inertia = inertia
+    if self.compute_labels:
+      self.labels_ = self.predict(X)
+    return self
+
+  def _map_chunks(self, X, func):
+    chunks = _chunks(X.shape[0], self.batch_size)
+    return _thread_map(lambda j: func(_read(X, *j)), chunks, self.n_threads)
+
+  def predict(self, X):
+    labels = self._map_chunks(X, lambda x: self._assign(x, n_threads=1))
+    return np.concatenate(labels) if len(labels) > 0 else \
+      np.empty(shape=(0,), dtype=np.int64)
+
+  def fit_predict(self, X, y=None):
+    return self.fit(X).predict(X)
+
+  def transform(self, X):
+    r""" Euclidean distances to all centers """
+    centers = self.cluster_centers_
+    norms = np.einsum('ij,ij->i', centers, centers)
+
+    def func(x):
+      d = _neg_inner(x, centers, norms) + np.einsum('ij,ij->i', x, x)[:, None]
+      return np.sqrt(np.maximum(d, 0, out=d), out=d)
+
+    return np.concatenate(self._map_chunks(X, func), axis=0)
+
+  def score(self, X, y=None):
+    r""" Opposite of the sum of squared distances to the closest centers """
+    return -sum(np.sum(d) for _, d in self._map_chunks(
+        X, lambda x: self._assign(x, return_distance=True, n_threads=1)))
+
+
+class BlockedKNN(object):
+  r""" Exact k-nearest neighbors (euclidean) for arrays larger than memory
+  (e.g. `MmapArray`)
+
+  The fitted array is streamed by tiles of `tile_size` rows for each block
+  of `batch_size` queries, the distances of a tile are computed by a single
+  matrix product (BLAS), and only the `k` closest candidates of each query
+  are kept between tiles. The tiles are processed in parallel by
+  `n_threads` threads.
+
+  Arguments:
+    n_neighbors : int
+    batch_size : int, number of queries processed together
+    tile_size : int, number of fitted samples in each distance tile
+    n_threads : int, default: number of CPUs
+  """
+
+  def __init__(self,
+               n_neighbors=5,
+               batch_size=1024,
+               tile_size=16384,
+               n_threads=None):
+    self.n_neighbors = int(n_neighbors)
+    self.batch_size = int(batch_size)
+    self.tile_size = int(tile_size)
+    self.n_threads = cpu_count() if n_threads is None else int(n_threads)
+
+  def fit(self, X, y=None):
+    self._fit_X = X
+    self._fit_norms = _row_norms(X, self.tile_size, self.n_threads)
+    self.n_samples_fit_ = X.shape[0]
+    return self
+
+  def _search(self, Q, k):
+    r""" Top-`k` of a block of in-memory queries """
+    X = self._fit_X
+    norms = self._fit_norms
+
+    def job(j):
+      s, e = j
+      d = _neg_inner(Q, _read(X, s, e), norms[s:e])
+      return _merge_topk(np.empty(shape=(Q.shape[0], 0), dtype=d.dtype),
+                         np.empty(shape=(Q.shape[0], 0), dtype=np.int64),
+                         d, np.arange(s, e), min(k, e - s))
+
+    best_d = np.full(shape=(Q.shape[0], k), fill_value=np.inf, dtype=np.float32)
+    best_i = np.full(shape=(Q.shape[0], k), fill_value=-1, dtype=np.int64)
+    tiles = _chunks(self.n_samples_fit_, self.tile_size)
+    # bound the memory by processing n_threads tiles at a time
+    for i in range(0, len(tiles), self.n_threads):
+      for d, ids in _thread_map(job, tiles[i:i + self.n_threads],
+                                self.n_threads):
+        best_d, best_i = _merge_topk(best_d, best_i, d, ids, k)
+    return best_d, best_i
+
+  def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+    r""" Return (distances, indices) of the neighbors of each row in `X`,
+    if `X` is None, the neighbors of each fitted sample (excluding itself)
+    """
+    if n_neighbors is None:
+      n_neighbors = self.n_neighbors
+    query_is_train = X is None
+    if query_is_train:
+      X = self._fit_X
+      n_neighbors += 1
+    n_neighbors = min(n_neighbors, self.n_samples_fit_)
+    distances = []
+    indices = []
+    for s, e in _chunks(X.shape[0], self.batch_size):
+      Q = _read(X, s, e)
+      d, i = _finalize_topk(*self._search(Q, n_neighbors), Q, return_distance)
+      if query_is_train:
+        d, i = _exclude_self(d, i, s)
+      distances.append(d)
+      indices.append(i)
+    indices = np.concatenate(indices, axis=0)
+    if not return_distance:
+      return indices
+    return np.concatenate(distances, axis=0), indices
+
+  kneighbors_graph = nn_kneighbors_graph
+
+
+class IVFIndex(BlockedKNN):
+  r""" Approximate k-nearest neighbors (euclidean) using an inverted-file
+  index: the fitted samples are partitioned by a coarse k-means quantizer
+  (`n_lists` clusters), and each query only searches the samples of its
+  `n_probe` closest clusters.
+
+  Arguments:
+    n_neighbors : int
+    n_lists : int, number of clusters, default: `sqrt(n_samples)`
+    n_probe : int, number of clusters searched for each query, the higher
+      the better recall but slower
+    train_size : int, number of samples for training the quantizer,
+      default: `32 * n_lists`
+    batch_size : int, number of queries processed together
+    tile_size : int, number of samples read at once when assigning the
+      fitted samples to the clusters
+    n_threads : int, default: number of CPUs
+  """
+
+  def __init__(self,
+               n_neighbors=5,
+               n_lists=None,
+               n_probe=8,
+               train_size=None,
+               batch_size=1024,
+               tile_size=65536,
+               n_threads=None,
+               random_state=1234):
+    super().__init__(n_neighbors=n_neighbors,
+                     batch_size=batch_size,
+                     tile_size=tile_size,
+                     n_threads=n_threads)
+    self.n_lists = n_lists
+    self.n_probe = int(n_probe)
+    self.train_size = train_size
+    self.random_state = random_state
+
+  def fit(self, X, y=None):
+    n = X.shape[0]
+    n_lists = self.n_lists
+    if n_lists is None:
+      n_lists = int(np.sqrt(n))
+    n_lists = max(1, min(int(n_lists), n))
+    train_size = self.train_size
+    if train_size is None:
+      train_size = 32 * n_lists
+    rand = np.random.RandomState(self.random_state)
+    ids = np.sort(rand.choice(n, size=min(int(train_size), n), replace=False))
+    self.quantizer_ = StreamingKMeans(n_clusters=n_lists,
+                                      batch_size=self.tile_size,
+                                      max_iter=5,
+                                      init='random',
+                                      compute_labels=False,
+                                      n_threads=self.n_threads,
+                                      random_state=rand).fit(
+                                          np.asarray(X[ids], dtype=np.float32))
+    # ====== inverted lists ====== #
+    labels = self.quantizer_.predict(X)
+    self._list_ids = np.argsort(labels, kind='stable')
+    self._list_offsets = np.concatenate(
+        [[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+    return super().fit(X)
+
+  def _search(self, Q, k):
+    X = self._fit_X
+    norms = self._fit_norms
+    centers = self.quantizer_.cluster_centers_
+    n_probe = min(self.n_probe, centers.shape[0])
+    d = _neg_inner(Q, centers, np.einsum('ij,ij->i', centers, centers))
+    probes = np.argpartition(d, n_probe - 1, axis=1)[:, :n_probe]
+    # queries probing each list
+    order = np.argsort(probes.ravel(), kind='stable')
+    lists, starts = np.unique(probes.ravel()[order], return_index=True)
+    queries = order // n_probe
+    jobs = [(l, queries[s:e])
+            for l, s, e in zip(lists, starts,
+                               np.append(starts[1:], order.shape[0]))]
+
+    def job(j):
+      l, q = j
+      ids = self._list_ids[self._list_offsets[l]:self._list_offsets[l + 1]]
+      if len(ids) == 0:
+        return q, None, None
+      ids = np.sort(ids)  # sequential reading
+      d = _neg_inner(Q[q], np.asarray(X[ids], dtype=np.float32), norms[ids])
+      return (q,) + _merge_topk(
+          np.empty(shape=(len(q), 0), dtype=d.dtype),
+          np.empty(shape=(len(q), 0), dtype=np.int64), d, ids,
+          min(k, len(ids)))
+
+    best_d = np.full(shape=(Q.shape[0], k), fill_value=np.inf, dtype=np.float32)
+    best_i = np.full(shape=(Q.shape[0], k), fill_value=-1, dtype=np.int64)
+    for i in range(0, len(jobs), self.n_threads * 4):
+      for q, d, ids in _thread_map(job, jobs[i:i + self.n_threads * 4],
+                                   self.n_threads):
+        if d is not None:
+          best_d[q], best_i[q] = _merge_topk(best_d[q], best_i[q], d, ids, k)
+    # the probed lists contain less than `k` samples, exhaustive search
+    short = np.flatnonzero(best_i[:, -1] < 0)
+    if len(short) > 0:
+      best_d[short], best_i[short] = super()._search(Q[short], k)
+    return best_d, best_i
+
+
 # ===========================================================================
 # Main method
 # ===========================================================================
@@ -139,7 +612,9 @@ def fast_kmeans(X,
                 init='scalable-k-means++',
                 oversampling_factor=2.0,
                 max_samples_per_batch=32768,
-                force_sklearn=False):
+                force_sklearn=False,
+                out_of_core=None,
+                n_threads=None):
   r""" KMeans clustering
 
   Arguments:
@@ -174,10 +649,30 @@ def fast_kmeans(X,
         pairwise distance computation is max_samples_per_batch * n_clusters.
         It might become necessary to lower this number when n_clusters
         becomes prohibitively large.
+    out_of_core : {None, bool}
+        if True, use `StreamingKMeans` which streams `X` from disk by chunks
+        of `max_samples_per_batch` samples. By default, enabled for
+        memory-mapped arrays (e.g. `numpy.memmap`, `bigarray.MmapArray`).
+    n_threads : int
+        number of threads for `StreamingKMeans`, default: number of CPUs
   """
+  if out_of_core is None:
+    out_of_core = isinstance(X, np.memmap)
+  if out_of_core:
+    if isinstance(init, string_types) and init != 'random':
+      init = 'k-means++'
+    return StreamingKMeans(n_clusters=n_clusters,
+                           batch_size=max_samples_per_batch,
+                           max_iter=max_iter,
+                           tol=tol,
+                           init=init,
+                           n_threads=n_threads,
+                           random_state=random_state).fit(X)
   kwargs = dict(locals())
   X = kwargs.pop('X')
   kwargs.pop('force_sklearn')
+  kwargs.pop('out_of_core')
+  kwargs.pop('n_threads')
   ## fine-tuning the kwargs
   cuml = _check_cuml(force_sklearn)
   if cuml:
@@ -211,6 +706,8 @@ def fast_knn(X,
              algorithm='brute',
              n_jobs=1,
              random_state=1234,
+             n_lists=None,
+             n_probe=8,
              force_sklearn=False):
   r"""
   Arguments:
@@ -238,11 +735,23 @@ def fast_knn(X,
         - 'brute' will use a brute-force search.
         - 'auto' will attempt to decide the most appropriate algorithm
           based on the values passed to :meth:`fit` method.
+        - 'blocked' exact search streaming `X` by tiles, see `BlockedKNN`
+        - 'ivf' approximate search using inverted-file index, see `IVFIndex`
         Note: fitting on sparse input will override the setting of
         this parameter, using brute force.
+        Note: 'blocked' is used for memory-mapped arrays (e.g.
+        `numpy.memmap`, `bigarray.MmapArray`) unless 'ivf' is given.
+    n_jobs : int
+        number of threads for 'blocked' and 'ivf' algorithms.
+    n_lists : int
+        number of clusters of the 'ivf' index, default: `sqrt(n_samples)`
+    n_probe : int
+        number of clusters searched for each query by the 'ivf' index
   """
   kwargs = dict(locals())
   X = kwargs.pop('X')
+  n_lists = kwargs.pop('n_lists')
+  n_probe = kwargs.pop('n_probe')
   force_sklearn = kwargs.pop('force_sklearn')
   random_state = kwargs.pop('random_state')
   n_clusters = int(kwargs.pop('n_clusters'))
@@ -254,9 +763,24 @@ def fast_knn(X,
   assert graph_mode in ('distance', 'connectivity')
   ## cluster mode
   cluster_mode = str(kwargs.pop('cluster_mode')).strip().lower()
+  ## out-of-core algorithms
+  algorithm = str(algorithm).strip().lower()
+  if isinstance(X, np.memmap) and algorithm != 'ivf':
+    algorithm = 'blocked'
   ## fine-tuning the kwargs
-  use_cuml = _check_cuml(force_sklearn)
-  if use_cuml:
+  use_cuml = False
+  if algorithm == 'blocked':
+    NearestNeighbors = BlockedKNN
+    kwargs = dict(n_neighbors=n_neighbors, n_threads=n_jobs)
+  elif algorithm == 'ivf':
+    NearestNeighbors = IVFIndex
+    kwargs = dict(n_neighbors=n_neighbors,
+                  n_lists=n_lists,
+                  n_probe=n_probe,
+                  n_threads=n_jobs,
+                  random_state=random_state)
+  elif _check_cuml(force_sklearn):
+    use_cuml = True
     from cuml.neighbors import NearestNeighbors
     kwargs['n_gpus'] = kwargs['n_jobs']
     kwargs.pop('n_jobs')
@@ -16,7 +16,9 @@ from sklearn.utils.extmath import (_incremental_mean_and_var, randomized_svd,
 from sklearn.utils.validation import check_is_fitted
 
 from odin.ml.base import BaseEstimator, TransformerMixin
+from odin.ml.embedding_cache import cached_embedding
 from odin.utils import Progbar, batching, ctext, flatten_list
+from odin.utils.crypto import fast_checksum
 from odin.utils.mpi import MPI
 
 __all__ = [
@@ -56,6 +58,11 @@ def fast_pca(*x,
       batch size, only used for IncrementalPCA
     return_model : bool (default: False)
       if True, return the trained PCA model as the FIRST return
+
+  Note:
+    The transformed arrays are cached on disk and shared between processes,
+    the PCA is only trained if any of them is not cached, see
+    `odin.ml.embedding_cache.set_embedding_cache`.
   """
   try:
     from cuml.decomposition import PCA as cuPCA
@@ -83,43 +90,63 @@ def fast_pca(*x,
     if n_components is not None:  # no need to reshape back
       input_shape = None
   # ====== train PCA ====== #
-  if algo == 'sppca':
-    pca = SupervisedPPCA(n_components=n_components, random_state=random_state)
-    pca.fit(x_train, y)
-  elif algo == 'plda':
-    from odin.ml import PLDA
-    pca = PLDA(n_phi=n_components, random_state=random_state)
-    pca.fit(x_train, y)
-  elif algo == 'pca':
-    if x_train.shape[1] > 1000 and x_train.shape[0] > 1e5 and cuPCA is not None:
-      pca = cuPCA(n_components=n_components, random_state=random_state)
-    else:
-      pca = PCA(n_components=n_components, random_state=random_state)
-    pca.fit(x_train)
-  elif algo == 'rpca':
-    # we copy the implementation of RandomizedPCA because
-    # it is significantly faster than PCA(svd_solver='randomize')
-    pca = RandomizedPCA(n_components=n_components,
-                        iterated_power=2,
-                        random_state=random_state)
-    pca.fit(x_train)
-  elif algo == 'ipca':
-    pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
-    prog = Progbar(target=x_train.shape[0],
-                   print_report=False,
-                   print_summary=False,
-                   name="Fitting PCA")
-    for start, end in batching(batch_size=batch_size,
-                               n=x_train.shape[0],
-                               seed=1234):
-      pca.partial_fit(x_train[start:end], check_input=False)
-      prog.add(end - start)
-  elif algo == 'ppca':
-    pca = PPCA(n_components=n_components, random_state=random_state)
-    pca.fit(x_train)
+  def train():
+    if algo == 'sppca':
+      pca = SupervisedPPCA(n_components=n_components, random_state=random_state)
+      pca.fit(x_train, y)
+    elif algo == 'plda':
+      from odin.ml import PLDA
+      pca = PLDA(n_phi=n_components, random_state=random_state)
+      pca.fit(x_train, y)
+    elif algo == 'pca':
+      if (x_train.shape[1] > 1000 and x_train.shape[0] > 1e5 and
+          cuPCA is not None):
+        pca = cuPCA(n_components=n_components, random_state=random_state)
+      else:
+        pca = PCA(n_components=n_components, random_state=random_state)
+      pca.fit(x_train)
+    elif algo == 'rpca':
+      # we copy the implementation of RandomizedPCA because
+      # it is significantly faster than PCA(svd_solver='randomize')
+      pca = RandomizedPCA(n_components=n_components,
+                          iterated_power=2,
+                          random_state=random_state)
+      pca.fit(x_train)
+    elif algo == 'ipca':
+      pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+      prog = Progbar(target=x_train.shape[0],
+                     print_report=False,
+                     print_summary=False,
+                     name="Fitting PCA")
+      for start, end in batching(batch_size=batch_size,
+                                 n=x_train.shape[0],
+                                 seed=1234):
+        pca.partial_fit(x_train[start:end], check_input=False)
+        prog.add(end - start)
+    elif algo == 'ppca':
+      pca = PPCA(n_components=n_components, random_state=random_state)
+      pca.fit(x_train)
+    return pca
+
   # ====== transform ====== #
-  x_train = pca.transform(x_train)
-  x_test = [pca.transform(x) for x in x_test]
+  model = []
+
+  def transform(x, init):
+    if len(model) == 0:
+      model.append(train())
+    return model[0].transform(x)
+
+  kwargs = dict(n_components=n_components,
+                algo=algo,
+                y=y,
+                batch_size=batch_size,
+                random_state=random_state,
+                fit=fast_checksum(x_train))
+  x_train, *x_test = [
+      cached_embedding('pca', x, transform, kwargs, refit=return_model)
+      for x in [x_train] + list(x_test)
+  ]
+  pca = model[0] if len(model) > 0 else None
   # reshape back to original shape if necessary
   if input_shape is not None:
     x_train = np.reshape(x_train, input_shape)
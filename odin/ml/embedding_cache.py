@@ -0,0 +1,138 @@
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from odin.utils.cache_utils import MmapLRUCache, cache_path
+from odin.utils.crypto import fast_checksum
+
+__all__ = [
+    'get_embedding_cache',
+    'set_embedding_cache',
+    'embedding_key',
+    'cached_embedding',
+]
+
+# arguments that do not change the results
+_IGNORED_KWARGS = ('verbose', 'n_jobs', 'return_model')
+_cache = {}
+
+
+# ===========================================================================
+# Cache configuration
+# ===========================================================================
+def set_embedding_cache(path=None, max_size=4096, enable=True):
+  r""" Configure the disk cache shared by `fast_tsne`, `fast_umap` and
+  `fast_pca`.
+
+  Arguments:
+    path : str, default: `cache_path()/embedding`
+    max_size : int, maximum size in MB, the least recently used embeddings
+      are removed when exceeded
+    enable : a Boolean, if False, no caching is performed
+  """
+  if path is None:
+    path = os.path.join(cache_path(), 'embedding')
+  _cache['cache'] = MmapLRUCache(path, max_size=max_size) if enable else None
+  return _cache['cache']
+
+
+def get_embedding_cache():
+  r""" Return the `MmapLRUCache` for embeddings, or `None` if disabled """
+  if 'cache' not in _cache:
+    set_embedding_cache()
+  return _cache['cache']
+
+
+# ===========================================================================
+# Keys
+# ===========================================================================
+def _group(method, kwargs):
+  items = []
+  for k, v in sorted(kwargs.items(), key=lambda i: i[0]):
+    if k in _IGNORED_KWARGS:
+      continue
+    if isinstance(v, np.ndarray):
+      v = fast_checksum(v)
+    elif isinstance(v, np.random.RandomState):
+      v = fast_checksum(v.get_state()[1])
+    items.append((k, v))
+  return hashlib.md5((method + str(items)).encode()).hexdigest()[:16]
+
+
+def _prefix(method, kwargs):
+  method = re.sub(r'[^0-9a-zA-Z]', '', method)
+  return '%s_%s_' % (method, _group(method, kwargs))
+
+
+def embedding_key(method, x, kwargs):
+  r""" Key of the embedding of `x` by `method` with arguments `kwargs`,
+  formatted as `{method}_{arguments hash}_{n_samples}_{checksum}` """
+  return '%s%d_%s' % (_prefix(method, kwargs), x.shape[0], fast_checksum(x))
+
+
+def _warm_start(cache, method, x, kwargs):
+  r""" Initial embedding of `x` from the cached embedding of its largest
+  prefix `x[:n]` (i.e. incremental data appended to previous inputs), the new
+  samples start at the position of their nearest neighbor in the input
+  space. """
+  prefix = _prefix(method, kwargs)
+  candidates = []
+  for key in cache.keys(prefix):
+    n, digest = key[len(prefix):].split('_', 1)
+    if 0 < int(n) < x.shape[0]:
+      candidates.append((int(n), digest, key))
+  for n, digest, key in sorted(candidates, reverse=True):
+    if fast_checksum(x[:n]) != digest:
+      continue
+    y = cache.get(key)
+    if y is None:
+      continue
+    old = np.reshape(x[:n], (n, -1)).astype(np.float64)
+    new = np.reshape(x[n:], (x.shape[0] - n, -1)).astype(np.float64)
+    old_norm = np.sum(old**2, axis=1)
+    # nearest neighbors in blocks of ~32M distances
+    batch = max(1, 2**25 // n)
+    nearest = np.concatenate([
+        np.argmin(old_norm - 2 * np.dot(new[s:s + batch], old.T), axis=1)
+        for s in range(0, new.shape[0], batch)
+    ])
+    rand = np.random.RandomState(n)
+    jitter = rand.randn(new.shape[0], y.shape[1]) * 1e-4 * np.std(y, axis=0)
+    return np.concatenate([y, y[nearest] + jitter], axis=0).astype(y.dtype)
+  return None
+
+
+# ===========================================================================
+# Main
+# ===========================================================================
+def cached_embedding(method, x, fit, kwargs, warm_start=False, refit=False):
+  r""" Return the cached embedding of `x`, otherwise, call `fit(x, init)`
+  and store the results.
+
+  Only one process computes the embedding of the same key at a time, others
+  wait and reuse the results.
+
+  Arguments:
+    method : str, name of the algorithm
+    x : numpy.ndarray, the input data
+    fit : callable, `fit(x, init)` returns the embedding of `x`, `init` is
+      the initial embedding (or `None`) when `warm_start=True`
+    kwargs : dict, arguments of the algorithm
+    warm_start : a Boolean, if True and `x[:n]` was embedded before with the
+      same arguments, initialize from the cached embedding
+    refit : a Boolean, if True, always call `fit` and overwrite the cache
+  """
+  cache = get_embedding_cache()
+  if cache is None:
+    return fit(x, None)
+  key = embedding_key(method, x, kwargs)
+  with cache.lock(key):
+    y = None if refit else cache.get(key)
+    if y is None:
+      init = _warm_start(cache, method, x, kwargs) if warm_start else None
+      y = cache.set(key, fit(x, init))
+  return y
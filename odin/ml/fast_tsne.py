@@ -4,22 +4,13 @@ import warnings
 
 import numpy as np
 
-from odin.utils.crypto import md5_checksum
+from odin.ml.embedding_cache import cached_embedding
 from odin.utils.mpi import MPI, cpu_count
 
-_cached_values = {}
-
 
 # ===========================================================================
 # auto-select best TSNE
 # ===========================================================================
-def _create_key(framework, kwargs, md5):
-  key = dict(kwargs)
-  del key['verbose']
-  key['md5'] = md5
-  return framework + str(list(sorted(key.items(), key=lambda x: x[0])))
-
-
 def fast_tsne(*X,
               n_components=2,
               n_samples=None,
@@ -38,7 +29,8 @@ def fast_tsne(*X,
               n_jobs=4,
               combined=True,
               return_model=False,
-              force_sklearn=False):
+              force_sklearn=False,
+              warm_start=False):
   r"""
   Arguments:
     n_components : int, optional (default: 2)
@@ -120,6 +112,13 @@ def fast_tsne(*X,
     return_model : a Boolean, if `True`, return the trained t-SNE model
     combined : a Boolean, if `True`, combined all arrays into a single array
       for training t-SNE.
+    warm_start : a Boolean, if `True` and the first `n` samples were embedded
+      before with the same arguments (i.e. new samples appended to the data),
+      initialize from the cached embedding instead of `init`.
+
+  Note:
+    The embeddings are cached on disk and shared between processes, see
+    `odin.ml.embedding_cache.set_embedding_cache`.
   """
   assert len(X) > 0, "No input is given!"
   if isinstance(X[0], (tuple, list)):
@@ -133,6 +132,7 @@ def fast_tsne(*X,
   return_model = kwargs.pop('return_model', return_model)
   n_samples = kwargs.pop('n_samples', n_samples)
   force_sklearn = kwargs.pop('force_sklearn', force_sklearn)
+  warm_start = kwargs.pop('warm_start', warm_start)
   # ====== downsampling ====== #
   if n_samples is not None:
     n_samples = int(n_samples)
@@ -175,51 +175,52 @@ def fast_tsne(*X,
     pass
   else:
     del kwargs['n_jobs']
-  # ====== getting cached values ====== #
-  results = []
-  X_new = []
+  # ====== perform T-SNE ====== #
   X_size = []
   if combined:
     X_size = [x.shape[0] for x in X]
-    x = np.vstack(X) if len(X) > 1 else X[0]
-    md5 = md5_checksum(x)
-    key = _create_key(tsne_version, kwargs, md5)
-    if key in _cached_values:
-      results.append((0, _cached_values[key]))
-    else:
-      X_new.append((0, md5, x))
+    X_new = [(0, np.vstack(X) if len(X) > 1 else X[0])]
   else:
-    for i, x in enumerate(X):
-      md5 = md5_checksum(x)
-      key = _create_key(tsne_version, kwargs, md5)
-      if key in _cached_values:
-        results.append((i, _cached_values[key]))
-      else:
-        X_new.append((i, md5, x))
+    X_new = list(enumerate(X))
 
-  # ====== perform T-SNE ====== #
   def apply_tsne(j):
-    idx, md5, x = j
-    tsne = TSNE(**kwargs)
-    return (idx, md5, tsne.fit_transform(x), tsne if return_model else None)
+    idx, x = j
+    model = []
+
+    def fit(x, init):
+      kw = dict(kwargs)
+      if init is not None:
+        kw['init'] = init
+      tsne = TSNE(**kw)
+      model.append(tsne)
+      return tsne.fit_transform(x)
+
+    x = cached_embedding('tsne-' + tsne_version,
+                         x,
+                         fit,
+                         kwargs,
+                         warm_start=warm_start,
+                         refit=return_model)
+    return (idx, x, model[0] if len(model) > 0 else None)
 
   # only 1 X, no need for MPI
+  results = []
+  model = []
   if len(X_new) == 1 or tsne_version in ('cuda', 'multicore'):
     for x in X_new:
-      idx, md5, x, model = apply_tsne(x)
+      idx, x, m = apply_tsne(x)
       results.append((idx, x))
-      _cached_values[_create_key(tsne_version, kwargs, md5)] = x
+      model.append(m)
   else:
     mpi = MPI(jobs=X_new,
               func=apply_tsne,
               batch=1,
               ncpu=min(len(X_new),
                        cpu_count() - 1))
-    model = []
-    for idx, md5, x, m in mpi:
+    for idx, x, m in mpi:
       results.append((idx, x))
-      _cached_values[_create_key(tsne_version, kwargs, md5)] = x
       model.append(m)
+  model = model[0] if len(model) == 1 else model
   # ====== return and clean ====== #
   if combined and len(X_size) > 1:
     indices = [0] + np.cumsum(X_size).tolist()
@@ -2,6 +2,9 @@ from __future__ import absolute_import, division, print_function
 
 import numpy as np
 
+from odin.ml.embedding_cache import cached_embedding
+from odin.utils.crypto import fast_checksum
+
 
 def fast_umap(*X,
               n_components=2,
@@ -29,7 +32,8 @@ def fast_umap(*X,
               target_weight=0.5,
               transform_seed=42,
               return_model=False,
-              verbose=False):
+              verbose=False,
+              warm_start=False):
   r"""Uniform Manifold Approximation and Projection
 
   Finds a low dimensional embedding of the data that approximates
@@ -174,12 +178,22 @@ def fast_umap(*X,
       This ensures consistency in transform operations.
   verbose: bool (optional, default False)
       Controls verbosity of logging.
+  warm_start: bool (optional, default False)
+      If the first `n` samples of the training data (i.e. `X[0]`) were
+      embedded before with the same arguments, initialize from the cached
+      embedding instead of ``init``.
+
+  Note
+  ----
+  The embeddings are cached on disk and shared between processes, see
+  `odin.ml.embedding_cache.set_embedding_cache`.
   """
   # ====== kwarg for creating UMAP class ====== #
   kwargs = dict(locals())
   del kwargs['X']
   n_samples = kwargs.pop('n_samples', None)
   return_model = kwargs.pop('return_model', False)
+  warm_start = kwargs.pop('warm_start', False)
   # check X
   if isinstance(X[0], (tuple, list)):
     X = X[0]
@@ -204,9 +218,27 @@ def fast_umap(*X,
     import umap
   except ImportError:
     raise ImportError(msg)
-  umap = umap.UMAP(**kwargs)
-  umap.fit(X[0])
-  results = [umap.transform(x) for x in X]
+  model = []
+
+  def transform(x, init):
+    # only fit the model if any results is not cached
+    if len(model) == 0:
+      kw = dict(kwargs)
+      if init is not None:
+        kw['init'] = init
+      model.append(umap.UMAP(**kw).fit(X[0]))
+    return model[0].transform(x)
+
+  # other arrays are transformed by the model fitted on X[0]
+  fit_kwargs = dict(kwargs, fit=fast_checksum(X[0]))
+  results = [
+      cached_embedding('umap',
+                       x,
+                       transform,
+                       kwargs if i == 0 else fit_kwargs,
+                       warm_start=warm_start and i == 0,
+                       refit=return_model) for i, x in enumerate(X)
+  ]
   if return_model:
-    return results[0] if len(results) == 1 else results, umap
+    return results[0] if len(results) == 1 else results, model[0]
   return results[0] if len(results) == 1 else results
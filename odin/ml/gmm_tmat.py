@@ -18,11 +18,11 @@ from scipy import linalg
 from six import string_types
 
 from odin import backend as K
-from bigarray import MmapArray
+from bigarray import MmapArray, MmapArrayWriter
 from odin.ml.base import BaseEstimator, DensityMixin, TransformerMixin
-from odin.utils import (MPI, Progbar, array_size, as_tuple, batching, cpu_count,
-                        ctext, defaultdictkey, eprint, is_number, segment_list,
-                        uuid, wprint)
+from odin.utils import (MPI, Progbar, WorkerPool, array_size, as_tuple,
+                        batching, cpu_count, ctext, defaultdictkey, eprint,
+                        is_number, segment_list, uuid, wprint)
 
 EPS = 1e-6
 # minimum batch size that will be optimal to transfer
@@ -99,6 +99,36 @@ def logsumexp(X, axis):
   return y
 
 
+def _cholesky_solve(C, B):
+  """ Solve the stacked systems `(C C^T) x = b`
+
+  Parameters
+  ----------
+  C : ndarray [n, dim, dim]
+    stacked lower Cholesky factors (i.e. `numpy.linalg.cholesky`)
+  B : ndarray [n, dim]
+    stacked right-hand sides
+
+  Return
+  ------
+  x : ndarray [n, dim]
+  """
+  n, dim = B.shape
+  diag = C[:, np.arange(dim), np.arange(dim)]
+  # forward substitution: C y = b
+  y = np.empty_like(B)
+  for i in range(dim):
+    y[:, i] = (B[:, i] - np.einsum('nj,nj->n', C[:, i, :i], y[:, :i])) / \
+        diag[:, i]
+  # backward substitution: C^T x = y (rows of C^T are contiguous in Ct)
+  Ct = np.ascontiguousarray(np.swapaxes(C, 1, 2))
+  x = np.empty_like(B)
+  for i in range(dim - 1, -1, -1):
+    x[:, i] = (y[:, i] -
+               np.einsum('nj,nj->n', Ct[:, i, i + 1:], x[:, i + 1:])) / \
+        diag[:, i]
+  return x
+
 def _split_jobs(n_samples, ncpu, device, gpu_factor):
   """ Return: jobs_cpu, jobs_gpu"""
   # number of GPU
@@ -231,6 +261,190 @@ def _create_batch_indices(X, sad, indices, batch_size,
   if len(X_buffer) > 0:
     yield np.concatenate(X_buffer, axis=0), n_selected_buffer, n_original_buffer
 
+def _create_chunks(segments, chunk_size):
+  """ Cut the list of `(start, end)` segments (sorted by `start`) into
+  chunks of at most `chunk_size` frames, adjacent segments are merged
+  so each chunk is read with as few slices as possible.
+
+  Return
+  ------
+  list of chunks, each chunk is a list of `(start, end)`
+  """
+  chunk_size = max(1, int(chunk_size))
+  chunks = []
+  curr = []
+  n = 0
+  for start, end in segments:
+    start = int(start)
+    end = int(end)
+    while start < end:
+      step = min(end - start, chunk_size - n)
+      if len(curr) > 0 and curr[-1][1] == start:
+        curr[-1] = (curr[-1][0], start + step)
+      else:
+        curr.append((start, start + step))
+      n += step
+      start += step
+      if n == chunk_size:
+        chunks.append(curr)
+        curr = []
+        n = 0
+  if len(curr) > 0:
+    chunks.append(curr)
+  return chunks
+
+def _read_chunk(X, sad, segments, dtype):
+  """ Read the frames of given segments from `X` (e.g. `MmapArray`),
+  the SAD mask is only loaded for the given segments. """
+  if len(segments) == 1:
+    start, end = segments[0]
+    x = X[start:end]
+    mask = None if sad is None else sad[start:end]
+  else:
+    x = np.concatenate([X[start:end] for start, end in segments], axis=0)
+    mask = None if sad is None else \
+        np.concatenate([sad[start:end] for start, end in segments], axis=0)
+  if mask is not None:
+    x = x[np.ravel(mask).astype('bool')]
+  return np.asarray(x, dtype=dtype)
+
+def _gmm_stats(X, params):
+  """ Return the zero, first, second order statistics and the total
+  log-likelihood of `X`, given the CPU parameters of the GMM
+  (i.e. `GMM._pool_params`) """
+  X_2 = X ** 2
+  # (batch_size, nmix)
+  logprob = -0.5 * (params['C'] + np.dot(X_2, params['precision']) -
+                    2 * np.dot(X, params['mu_precision']) +
+                    params['feat_const'])
+  llk = logsumexp(logprob, axis=1) # (batch_size, 1)
+  post = np.exp(logprob - llk) # (batch_size, nmix)
+  return (zeroStat(post), firstStat(X, post),
+          np.dot(X_2.T, post), np.sum(llk, axis=None))
+
+def _accumulate_chunks(X, sad, acc, params, chunks, seed):
+  """ Add the statistics of given chunks into `acc`, a 1-D array of
+  the flattened `Z (1, nmix), F (feat_dim, nmix), S (feat_dim, nmix),
+  llk, nframes`; yield the number of processed frames. """
+  downsample = params['downsample']
+  feat_dim, nmix = params['precision'].shape
+  Z = acc[:nmix].reshape(1, nmix)
+  F = acc[nmix:nmix + feat_dim * nmix].reshape(feat_dim, nmix)
+  S = acc[nmix + feat_dim * nmix:-2].reshape(feat_dim, nmix)
+  rand = random.Random(seed)
+  for chunk_id, segs in enumerate(chunks):
+    n_original_sample = sum(end - start for start, end in segs)
+    # first chunk always selected,
+    # downsample by randomly ignore a chunk
+    if chunk_id == 0 or \
+    downsample == 1 or \
+    (downsample > 1 and rand.random() <= 1. / downsample):
+      y = _read_chunk(X, sad, segs, dtype=params['dtype'])
+      if y.shape[0] > 0:
+        z, f, s, llk = _gmm_stats(y, params)
+        Z += z
+        F += f
+        S += s
+        acc[-2] += llk
+        acc[-1] += y.shape[0]
+        del z, f, s
+      del y
+    # return the progress
+    yield n_original_sample
+
+def _pool_accumulate_chunks(job):
+  """ `WorkerPool` job of the streaming GMM expectation """
+  slot, chunks, seed, name = job
+  shared = WorkerPool.shared
+  for n in _accumulate_chunks(shared(name + '_X'), shared(name + '_sad'),
+                              shared(name + '_acc')[slot],
+                              shared(name + '_params'), chunks, seed):
+    yield n
+
+def _pool_gmm_expectation(job):
+  """ `WorkerPool` job of the GMM expectation (not `streaming`), `segment`
+  is `(start, end)` or a list of `(name, (start, end))` """
+  segment, kwargs, name = job
+  shared = WorkerPool.shared
+  X, sad = shared(name + '_X'), shared(name + '_sad')
+  params = shared(name + '_params')
+  if isinstance(segment, list):
+    batch_iterator = _create_batch_indices(X, sad, segment, **kwargs)
+  else:
+    start, end = segment
+    batch_iterator = _create_batch(X, sad, start, end, **kwargs)
+  # Z, F, S, L, n_frames
+  results = [0., 0., 0., 0., 0]
+  for y, n_selected_frame, n_original_sample in batch_iterator:
+    if y is not None:
+      for i, res in enumerate(_gmm_stats(y, params)):
+        results[i] += res
+      results[-1] += n_selected_frame
+    # return the progress
+    yield n_original_sample
+  yield tuple(results)
+
+def _tmat_expectation(Z, F, params, buffers):
+  """ CPU expectation of the T-matrix for a batch of files, given the
+  parameters of `Tmatrix._pool_params` and the cached `(Ex, Exx, llk)`
+  arrays for the number of files.
+
+  Return
+  ------
+  LU, RU, llk, nframes
+  """
+  T_invS_Tt, T_invS, Im = params['T_invS_Tt'], params['T_invS'], params['Im']
+  itril = params['itril']
+  tv_dim = Im.shape[0]
+  nframes = np.ceil(Z.sum())
+  nfiles = F.shape[0]
+  # (nfiles, tv_dim * (tv_dim + 1) / 2)
+  L1 = np.dot(Z, T_invS_Tt)
+  # (nfiles, tv_dim)
+  B1 = np.dot(F, T_invS.T)
+  Ex, Exx, llk = buffers
+  for ix in range(nfiles):
+    L = np.zeros((tv_dim, tv_dim), dtype=params['dtype'])
+    L[itril] = L1[ix]
+    L = L + np.tril(L, k=-1).T + Im
+    Cxx = linalg.inv(L)
+    B = B1[ix][:, np.newaxis]
+    this_Ex = np.dot(Cxx, B)
+    this_ExT = this_Ex.T
+    Ex[ix] = this_ExT
+    llk[ix] = -0.5 * this_ExT.dot(B - this_Ex) + this_ExT.dot(B)
+    Exx[ix] = (Cxx + this_Ex.dot(this_ExT))[itril]
+  # (tdim, nmix * feat_dim)
+  RU = np.dot(Ex.T, F)
+  # (nmix, tdim * (tdim + 1) / 2)
+  LU = np.dot(Z.T, Exx)
+  return LU, RU, llk.sum(), nframes
+
+def _pool_tmat_expectation(job):
+  """ `WorkerPool` job of the T-matrix expectation """
+  start, end, batch_size, name = job
+  shared = WorkerPool.shared
+  Z, F = shared(name + '_Z'), shared(name + '_F')
+  params = shared(name + '_params')
+  tv_dim, t2_dim = params['Im'].shape[0], len(params['itril'][0])
+  buffers = defaultdictkey(
+      lambda nfiles: (np.empty((nfiles, tv_dim), dtype=params['dtype']),
+                      np.empty((nfiles, t2_dim), dtype=params['dtype']),
+                      np.empty((nfiles, 1), dtype=params['dtype'])))
+  tmp = [0., 0., 0., 0.] # LU, RU, llk, nframes
+  for s, e in batching(n=end - start, batch_size=batch_size):
+    s += start
+    e += start
+    for i, r in enumerate(_tmat_expectation(Z[s:e], F[s:e], params,
+                                            buffers[e - s])):
+      tmp[i] += r
+    yield e - s
+  # LU and RU bigger than 1 Gigabytes are downcasted
+  for i in (0, 1):
+    if array_size(tmp[i]) / (1024 ** 3) > 1:
+      tmp[i] = tmp[i].astype('float32')
+  yield tmp
+
 class _ExpectationResults(object):
   """ ExpectationResult """
 
@@ -255,8 +469,9 @@ class _ExpectationResults(object):
     self.lock.acquire()
     try:
       # returned number of processed samples
-      if is_number(res) and self.print_progress:
-        self.prog.add(res)
+      if is_number(res):
+        if self.print_progress:
+          self.prog.add(res)
       # return the statistics, end of process
       else:
         for i, r in enumerate(res):
@@ -311,6 +526,16 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
       each iteration => the training is deterministic.
   seed : int
       random seed for reproducible
+  streaming : bool (default: False)
+      if True, the Expectation on 'cpu' device reads fixed-size
+      chunks directly from the input array (e.g. `MmapArray`),
+      the SAD mask is only loaded for each chunk, and each process
+      reduces its statistics into a shared-memory accumulator
+      instead of sending them back to the main process.
+  memory_budget : int (default: 256)
+      maximum amount of memory (in Megabytes) used by each process
+      for one chunk in `streaming` mode, the number of frames per
+      chunk is inferred from this budget, `nmix` and `feat_dim`
   path : {str, None}
       If given a path, save the model after everytime its
       parameters changed (i.e. `maximization` or `gmm_mixup`
@@ -333,6 +558,10 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
   Memory throughput is the bottleneck in most of the case,
   try to move the data to faster storage before fitting.
 
+  For large corpus (e.g. a 2048-mixture UBM on 100M frames), store
+  the features in a `MmapArray` and use `streaming=True`, the memory
+  of each process is then bounded by `memory_budget`.
+
   """
 
   STANDARD_CPU_BATCH_SIZE = 12 * 1024 * 1024 # 12 Megabytes
@@ -343,7 +572,8 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
                batch_size_cpu='auto', batch_size_gpu='auto',
                downsample=1, stochastic_downsample=True,
                device='cpu', ncpu=1, gpu_factor=80,
-               seed=1234, path=None, name=None):
+               seed=1234, streaming=False, memory_budget=256,
+               path=None, name=None):
     super(GMM, self).__init__()
     self._path = path if isinstance(path, string_types) else None
     # ====== set number of mixtures ====== #
@@ -362,6 +592,12 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
     self.downsample = int(downsample)
     self.stochastic_downsample = bool(stochastic_downsample)
     self._seed = int(seed)
+    # ====== streaming ====== #
+    self.streaming = bool(streaming)
+    self.memory_budget = float(memory_budget)
+    # WorkerPool reused by all iterations of `fit`
+    self._pool = None
+    self._pool_inputs = None
     # ====== multi-processing ====== #
     self.gpu_factor = int(gpu_factor)
     # cpu
@@ -397,9 +633,13 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
             self.downsample, self.stochastic_downsample,
             self._seed, self._llk_hist,
             self.ncpu, self._device, self.gpu_factor,
-            self._dtype, self._path, self._name)
+            self._dtype, self._path, self._name,
+            self.streaming, self.memory_budget)
 
   def __setstate__(self, states):
+    # GMM saved before `streaming` was introduced
+    if len(states) == 21:
+      states = tuple(states) + (False, 256.)
     (self.mean, self.sigma, self.w,
      self.allow_rollback, self.exit_on_error,
      self._nmix, self._curr_nmix, self._feat_dim,
@@ -407,7 +647,10 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
      self.downsample, self.stochastic_downsample,
      self._seed, self._llk_hist,
      self.ncpu, self._device, self.gpu_factor,
-     self._dtype, self._path, self._name) = states
+     self._dtype, self._path, self._name,
+     self.streaming, self.memory_budget) = states
+    self._pool = None
+    self._pool_inputs = None
     # basic constants
     self._stop_fitting = False
     self._feat_const = self.feat_dim * np.log(2 * np.pi)
@@ -563,7 +806,7 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
     indices = None
     if isinstance(X, (tuple, list)):
       tmp = [i for i in X if hasattr(i, 'shape')][0]
-      indices = [i for i in X if i != tmp][0]
+      indices = [i for i in X if i is not tmp][0]
       X = tmp
     # ====== check X ====== #
     if not isinstance(X, np.ndarray):
@@ -677,6 +920,19 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
     niter = [1, 2, 4, 4, 4, 4, 6, 6, 10, 10, 10, 10, 10, 16, 16]
     niter[int(np.log2(self._nmix))] = self._niter
     self._stop_fitting = False
+    # the worker processes are reused for all E-M iterations
+    if self._device in ('cpu', 'mix') and \
+    self.ncpu > 1 and cpu_count() > 1:
+      with WorkerPool(ncpu=self.ncpu) as pool:
+        self._pool = pool
+        try:
+          return self._fit(X, sad, niter)
+        finally:
+          self._pool = None
+          self._pool_inputs = None
+    return self._fit(X, sad, niter)
+
+  def _fit(self, X, sad, niter):
     # run the algorithm
     while True:
       # fitting the mixtures
@@ -1091,6 +1347,11 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
     if device not in ('gpu', 'cpu', 'mix'):
       raise ValueError("`device` can only be of the following:"
                        "'gpu', 'cpu', and 'mix'.")
+    # ====== streaming from memmap with shared accumulators ====== #
+    if self.streaming and device == 'cpu':
+      return self._streaming_expectation(X, sad, indices, n_samples,
+                                         zero, first, second, llk,
+                                         print_progress)
     # ====== only 1 batch ====== #
     if (n_samples <= self.batch_size_cpu and self._device == 'cpu') or\
     (n_samples <= self.batch_size_gpu and self._device in ('gpu', 'mix')):
@@ -1196,26 +1457,38 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
         name="[GMM] cmix:%d nmix:%d ndim:%d iter:%d" %
                    (curr_nmix, self.nmix, self.feat_dim, curr_niter + 1),
         print_progress=print_progress)
-    mpi = []
+    # the pool of `fit`, or a temporary pool
+    pool = None
     if len(jobs_cpu) > 0:
-      # create CPU processes
-      mpi = MPI(jobs=[(j, False) for j in jobs_cpu],
-                func=map_expectation,
-                ncpu=self.ncpu, batch=1, hwm=2**25,
-                backend='python')
+      pool = WorkerPool(ncpu=self.ncpu) if self._pool is None else self._pool
+      self._broadcast_inputs(pool, X, sad)
+      kwargs = dict(batch_size=int(self.batch_size_cpu /
+                                   np.floor(np.power(2, curr_nmix / 1024))),
+                    downsample=self.downsample,
+                    stochastic=self.stochastic_downsample,
+                    seed=self._seed,
+                    curr_nmix=int(curr_nmix),
+                    curr_niter=int(curr_niter))
     # create GPU threads
     gpu_threads = [threading.Thread(target=thread_expectation,
                                     args=(results, j))
                    for j in jobs_gpu]
-    # start gpu and cpu threads
-    for t in gpu_threads:
-      t.start()
-    # start the cpu processes
-    for res in mpi:
-      results.update(res)
-    # finish all threads
-    for t in gpu_threads:
-      t.join()
+    try:
+      # start gpu and cpu threads
+      for t in gpu_threads:
+        t.start()
+      # run the cpu jobs
+      if pool is not None:
+        for res in pool.imap(_pool_gmm_expectation,
+                             [(j, kwargs, self.name) for j in jobs_cpu]):
+          results.update(res)
+      # finish all threads
+      for t in gpu_threads:
+        t.join()
+    finally:
+      if pool is not None and pool is not self._pool:
+        pool.close()
+        self._pool_inputs = None
     # ====== summary ====== #
     Z, F, S, L, nfr = results.stats
     L = L / nfr if nfr > 0 else 0
@@ -1230,6 +1503,106 @@ class GMM(DensityMixin, BaseEstimator, TransformerMixin):
       results.append(L)
     return results[0] if len(results) == 1 else results
 
+  def _pool_params(self):
+    """ The parameters of the CPU expectation sent to the workers """
+    return dict(precision=self.__expressions_cpu['precision'],
+                mu_precision=self.__expressions_cpu['mu_precision'],
+                C=self.__expressions_cpu['C'],
+                feat_const=self._feat_const,
+                downsample=self.downsample,
+                dtype=self.dtype)
+
+  def _broadcast_inputs(self, pool, X, sad):
+    """ Send the inputs to the workers of `pool`, the data is only
+    broadcasted once for each pool, the parameters are sent on every
+    call (i.e. every E-M iteration) """
+    if self._pool_inputs is None or \
+    any(i is not j for i, j in zip(self._pool_inputs, (pool, X, sad))):
+      pool.broadcast(self.name + '_X', X)
+      pool.broadcast(self.name + '_sad', sad)
+      self._pool_inputs = (pool, X, sad)
+    pool.broadcast(self.name + '_params', self._pool_params())
+
+  def _streaming_expectation(self, X, sad, indices, n_samples,
+                             zero, first, second, llk, print_progress):
+    """ Expectation in `streaming` mode, the jobs are contiguous group
+    of fixed-size chunks, each job reduces its sufficient statistics
+    into its own slot of a shared-memory accumulator, the slots are
+    summed up in the main process. """
+    curr_niter = len(self._llk_hist[self._curr_nmix])
+    curr_nmix = self._curr_nmix
+    feat_dim = self.feat_dim
+    # ====== number of frames fit in the memory budget ====== #
+    # X, X**2 and the selected frames (feat_dim), and
+    # D, logprob, logprob - llk and post (nmix)
+    frame_size = (3 * feat_dim + 4 * curr_nmix) * self.dtype.itemsize
+    chunk_size = max(1, int(self.memory_budget * 1024 * 1024 / frame_size))
+    # ====== create the chunks ====== #
+    if indices is None:
+      segments = [(0, X.shape[0])]
+    else:
+      segments = sorted([(start, end) for name, (start, end) in indices],
+                        key=lambda x: x[0])
+    chunks = _create_chunks(segments, chunk_size)
+    # contiguous chunks for each process for sequential reading,
+    # stochastic downsample, seed change every iter and mixup
+    njob = int(np.clip(self.ncpu, 1, max(1, len(chunks))))
+    seed = self._seed + (curr_nmix + curr_niter
+                         if self.stochastic_downsample else 0)
+    jobs = [(i, [chunks[j] for j in job], int(seed + i), self.name)
+            for i, job in enumerate(
+                np.array_split(np.arange(len(chunks)), njob))]
+    params = self._pool_params()
+    # ====== accumulator: Z, F, S, L, nfr ====== #
+    acc_shape = (njob, curr_nmix + 2 * feat_dim * curr_nmix + 2)
+    results = _ExpectationResults(n_samples=n_samples, nb_results=5,
+        name="[GMM] cmix:%d nmix:%d ndim:%d iter:%d" %
+                   (curr_nmix, self.nmix, self.feat_dim, curr_niter + 1),
+        print_progress=print_progress)
+    # ====== single process ====== #
+    if njob == 1 or cpu_count() == 1:
+      acc = np.zeros(acc_shape, dtype='float64')
+      for slot, job_chunks, job_seed, _ in jobs:
+        for res in _accumulate_chunks(X, sad, acc[slot], params,
+                                      job_chunks, job_seed):
+          results.update(res)
+    # ====== the pool of `fit`, or a temporary pool ====== #
+    else:
+      pool = self._pool
+      if pool is None:
+        pool = WorkerPool(ncpu=njob)
+      try:
+        self._broadcast_inputs(pool, X, sad)
+        acc = pool.broadcast(self.name + '_acc',
+                             np.zeros(acc_shape, dtype='float64'))
+        for res in pool.imap(_pool_accumulate_chunks, jobs):
+          results.update(res)
+        acc = np.array(acc)
+        pool.remove(self.name + '_acc')
+      finally:
+        if pool is not self._pool:
+          pool.close()
+          self._pool_inputs = None
+    # ====== reduce the accumulators ====== #
+    acc = np.sum(acc, axis=0)
+    Z = acc[:curr_nmix].reshape(1, curr_nmix)
+    F = acc[curr_nmix:curr_nmix + feat_dim * curr_nmix].reshape(
+        feat_dim, curr_nmix)
+    S = acc[curr_nmix + feat_dim * curr_nmix:-2].reshape(
+        feat_dim, curr_nmix)
+    L, nfr = acc[-2], acc[-1]
+    L = L / nfr if nfr > 0 else 0
+    results = []
+    if zero:
+      results.append(Z)
+    if first:
+      results.append(F)
+    if second:
+      results.append(S)
+    if llk:
+      results.append(L)
+    return results[0] if len(results) == 1 else results
+
   def maximization(self, Z, F, S, floor_const=None):
     """
     Parameters
@@ -1475,6 +1848,9 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
         lambda nfiles: (np.empty((nfiles, self.tv_dim), dtype=self.dtype),
                         np.empty((nfiles, self.t2_dim), dtype=self.dtype),
                         np.empty((nfiles, 1), dtype=self.dtype)))
+    # WorkerPool reused by all iterations of `fit`
+    self._pool = None
+    self._pool_inputs = None
     # ====== calculate stats first ====== #
     self._refresh_T_statistics()
     self._refresh_gpu()
@@ -1503,6 +1879,9 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
         lambda nfiles: (np.empty((nfiles, self.tv_dim), dtype=self.dtype),
                         np.empty((nfiles, self.t2_dim), dtype=self.dtype),
                         np.empty((nfiles, 1), dtype=self.dtype)))
+    # WorkerPool reused by all iterations of `fit`
+    self._pool = None
+    self._pool_inputs = None
     # ====== calculate stats first ====== #
     self._refresh_T_statistics()
     self._refresh_gpu()
@@ -1587,6 +1966,8 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
       end = start + self.feat_dim
       tmp = T_invS2[:, start:end].dot(T_invS2[:, start:end].T)
       self.T_invS_Tt[mix] = tmp[self._itril]
+    # approximated posterior precision must be recomputed
+    self._approx_eig = None
 
   def _refresh_gpu(self):
     if hasattr(self, '_gpu_inputs') and hasattr(self, '_gpu_outputs'):
@@ -1702,27 +2083,24 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
       )
       return LU, RU, llk, nframes
     # ====== CPU ====== #
-    # (nfiles, tv_dim * (tv_dim + 1) / 2)
-    L1 = np.dot(Z, self.T_invS_Tt)
-    # (nfiles, tv_dim)
-    B1 = np.dot(F, self.T_invS.T)
-    Ex, Exx, llk = self._Ex_Exx_llk[nfiles]
-    for ix in range(nfiles):
-      L = np.zeros((self.tv_dim, self.tv_dim), dtype=self.dtype)
-      L[self._itril] = L1[ix]
-      L = L + np.tril(L, k=-1).T + self.Im
-      Cxx = linalg.inv(L)
-      B = B1[ix][:, np.newaxis]
-      this_Ex = np.dot(Cxx, B)
-      this_ExT = this_Ex.T
-      Ex[ix] = this_ExT
-      llk[ix] = -0.5 * this_ExT.dot(B - this_Ex) + this_ExT.dot(B)
-      Exx[ix] = (Cxx + this_Ex.dot(this_ExT))[self._itril]
-    # (tdim, nmix * feat_dim)
-    RU = np.dot(Ex.T, F)
-    # (nmix, tdim * (tdim + 1) / 2)
-    LU = np.dot(Z.T, Exx)
-    return LU, RU, llk.sum(), nframes
+    return _tmat_expectation(Z, F, self._pool_params(),
+                             self._Ex_Exx_llk[nfiles])
+
+  def _pool_params(self):
+    """ The parameters of the CPU expectation sent to the workers """
+    return dict(T_invS_Tt=self.T_invS_Tt, T_invS=self.T_invS, Im=self.Im,
+                itril=self._itril, dtype=self.dtype)
+
+  def _broadcast_inputs(self, pool, Z, F):
+    """ Send the inputs to the workers of `pool`, the statistics `Z` and
+    `F` are only broadcasted once for each pool, the T-matrix statistics
+    are sent on every call (i.e. every E-M iteration) """
+    if self._pool_inputs is None or \
+    any(i is not j for i, j in zip(self._pool_inputs, (pool, Z, F))):
+      pool.broadcast(self.name + '_Z', Z)
+      pool.broadcast(self.name + '_F', F)
+      self._pool_inputs = (pool, Z, F)
+    pool.broadcast(self.name + '_params', self._pool_params())
 
   def expectation(self, Z, F, device=None, print_progress=True):
     """
@@ -1752,27 +2130,6 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
           yield (self._fast_expectation(Z=Z[s:e], F=F[s:e], on_gpu=on_gpu),
                  nfiles)
 
-      def _mpi_fn(start_end):
-        start, end = start_end
-        tmp = [0., 0., 0., 0.] # LU, RU, llk, nframes
-        for res, nfiles in _map_expectation(start, end, on_gpu=False):
-          yield nfiles
-          for i, r in enumerate(res):
-            tmp[i] += r
-        # LU return size in Gigabytes
-        size = array_size(tmp[0]) / (1024 ** 3)
-        if size > 1:
-          tmp[0] = tmp[0].astype('float32')
-        elif size > 2:
-          tmp[0] = tmp[0].astype('float16')
-        # RU return size in Gigabytes
-        size = array_size(tmp[1]) / (1024 ** 3)
-        if size > 1:
-          tmp[1] = tmp[1].astype('float32')
-        elif size > 2:
-          tmp[1] = tmp[1].astype('float16')
-        yield tmp
-
       def _thread_fn(start_end):
         start, end = start_end
         tmp = [0., 0., 0., 0.] # LU, RU, llk, nframes
@@ -1791,27 +2148,37 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
                      (self.tv_dim, self.nmix, self.feat_dim,
                       len(self._llk_hist) + 1),
           print_progress=print_progress)
+      # ====== the pool of `fit`, or a temporary pool ====== #
+      pool = None
+      if len(jobs_cpu) > 0:
+        pool = WorkerPool(ncpu=self.ncpu) if self._pool is None else self._pool
+        self._broadcast_inputs(pool, Z, F)
       # ====== create gpu thread ====== #
-      mpi = MPI(jobs=jobs_cpu, func=_mpi_fn,
-                ncpu=self.ncpu, batch=1, hwm=2**25)
-      # yield in _map_expectation, make it become a generator
       threads = [threading.Thread(target=_thread_fn, args=(j,))
                  for j in jobs_gpu]
-      # start gpu and threads
-      for t in threads:
-        t.start()
-      # run the mpi
-      for r in mpi:
-        if not is_number(r):
-          # r is downsample to prevent overloading multiprocessing Pipe
-          r = [i.astype(self.dtype)
-               if isinstance(i, np.ndarray) and i.dtype != self.dtype
-               else i
-               for i in r]
-        results.update(r)
-      # finish all threads
-      for t in threads:
-        t.join()
+      try:
+        # start gpu and threads
+        for t in threads:
+          t.start()
+        # run the cpu jobs
+        if pool is not None:
+          for r in pool.imap(_pool_tmat_expectation,
+                             [(start, end, self.batch_size_cpu, self.name)
+                              for start, end in jobs_cpu]):
+            if not is_number(r):
+              # r is downsample to prevent overloading the result queue
+              r = [i.astype(self.dtype)
+                   if isinstance(i, np.ndarray) and i.dtype != self.dtype
+                   else i
+                   for i in r]
+            results.update(r)
+        # finish all threads
+        for t in threads:
+          t.join()
+      finally:
+        if pool is not None and pool is not self._pool:
+          pool.close()
+          self._pool_inputs = None
     # return
     return results.stats
 
@@ -1895,25 +2262,80 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
     return self
 
   # ==================== sklearn ==================== #
-  def transform(self, X):
+  def _get_approx_eig(self):
+    """ Eigen decomposition of the precision shared by all utterances
+    in the approximated extraction, i.e. `sum_c w_c * T_c' Sigma_c^-1 T_c` """
+    if self._approx_eig is None:
+      w = np.ravel(self.gmm.w) / np.sum(self.gmm.w)
+      A = np.zeros((self.tv_dim, self.tv_dim), dtype='float64')
+      A[self._itril] = np.dot(w, self.T_invS_Tt)
+      A += np.tril(A, -1).T
+      d, V = linalg.eigh(A)
+      self._approx_eig = (d.astype(self.dtype), V.astype(self.dtype))
+    return self._approx_eig
+
+  def _batch_transform(self, Z, F, approx=False):
+    """ Extract the i-vectors of a batch of utterances
+
+    Parameters
+    ----------
+    Z : ndarray [n, nmix]
+      zero-th order statistics
+    F : ndarray [n, nmix * feat_dim]
+      first order statistics
+    approx : bool
+      if False, the posterior precision of all utterances are stacked
+      and factorized by a single Cholesky call.
+      if True, the occupancy of each utterance is assumed to be
+      distributed as the UBM weights, the shared precision is then
+      diagonalized once and the i-vectors are computed with matrix
+      products only (no per-utterance factorization).
+
+    Return
+    ------
+    I-vector : (n, tv_dim)
+    """
+    Z = np.asarray(Z, dtype=self.dtype)
+    F = np.asarray(F, dtype=self.dtype)
+    n = Z.shape[0]
+    # (n, tv_dim)
+    B = np.dot(F, self.T_invS.T)
+    # ====== diagonalized approximation ====== #
+    if approx:
+      d, V = self._get_approx_eig()
+      nframes = Z.sum(axis=1, keepdims=True)
+      return np.dot(np.dot(B, V) / (1. + nframes * d), V.T)
+    # ====== stacked Cholesky ====== #
+    L1 = np.dot(Z, self.T_invS_Tt) # (n, t2_dim)
+    L = np.empty((n, self.tv_dim, self.tv_dim), dtype=self.dtype)
+    row, col = self._itril
+    L[:, row, col] = L1
+    L[:, col, row] = L1
+    L[:, np.arange(self.tv_dim), np.arange(self.tv_dim)] += 1.
+    return _cholesky_solve(np.linalg.cholesky(L), B)
+
+  def transform(self, X, approx=False):
     """ Extract i-vector from trained T-matrix
 
     Parameters
     ----------
     X : {tuple, list, numpy.ndarray, odin.fuel.data.MmapArray}
       if tuple or list is given, the inputs include:
-      Z-[1, nmix]; F-[1, nmix*feat_dim]
+      Z-[n, nmix]; F-[n, nmix*feat_dim]
       if numpy.ndarray is given, shape must be [n_samples, feat_dim]
+    approx : bool (default: False)
+      use the diagonalized posterior covariance approximation,
+      see `Tmatrix.transform_to_disk`
 
     Return
     ------
-    I-vector : (1, tv_dim)
+    I-vector : (n, tv_dim)
 
     Note
     ----
-    No need to parallel this function, `numpy.linalg.inv` is
-    already a multi-threaded method, and will be bottleneck
-    for `multiprocessing`
+    No need to parallel this function, the stacked Cholesky
+    factorization is already a multi-threaded BLAS call, and will
+    be bottleneck for `multiprocessing`
 
     """
     # ====== GMM transform ====== #
@@ -1927,23 +2349,11 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
       (self.nmix * self.feat_dim, str(F.shape))
     else:
       Z, F = self.gmm.transform(X)
-    # ====== pass ====== #
-    L = np.zeros((self.tv_dim, self.tv_dim),
-                 dtype=self.dtype)
-    L[self._itril] = np.dot(Z, self.T_invS_Tt)
-    L += np.tril(L, -1).T + self.Im
-    # (tv_dim, tv_dim)
-    Cxx = linalg.inv(L)
-    # (tv_dim, 1)
-    B = np.dot(self.T_invS, F.T)
-    # (tv_dim, 1)
-    Ex = np.dot(Cxx, B)
-    # (1, tv_dim)
-    return Ex.T
+    return self._batch_transform(Z, F, approx=approx)
 
   def transform_to_disk(self, Z, F, path=None,
                         dtype='float32', device='gpu', ncpu=None,
-                        override=True):
+                        override=True, approx=False):
     """ Same as `transform`, however, save the transformed statistics
     to file using `odin.fuel.MmapArray`
 
@@ -1956,6 +2366,11 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
     path : {str, None}
       if str, saving path for extracted i-vector, otherwise,
       return numpy.ndarray for the i-vector
+    approx : bool (default: False)
+      only for 'cpu' device, if True, the posterior covariance of every
+      utterance is approximated by assuming its occupancy follows the
+      UBM weights, the shared precision is diagonalized once, hence,
+      no factorization is performed per utterance.
 
     Return
     ------
@@ -1965,6 +2380,10 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
     ----
     this function return i-vectors in the same order provided
     by `Z` and `F`
+    On 'cpu', `Z` and `F` are read batch by batch (e.g. from the
+    memmaps written by `Ivector.fit`), the batch of i-vectors is solved
+    by one stacked Cholesky factorization, and written by a single
+    `MmapArrayWriter`.
     Calculation on `gpu` is approximated to the results from
     `cpu` that satisfied `np.allclose(gpu, cpu, rtol=1.e-5, atol=1.e-4)`,
     the final performance using cosine scoring, GMM and PLDA is identical.
@@ -1987,14 +2406,18 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
                    name="Extracting %d-D i-vector" % self.tv_dim)
     # ====== init data files ====== #
     if path is not None:
-      if os.path.exists(path) and override:
-        os.remove(path)
-      dat = MmapArray(path=path, dtype=dtype,
-                     shape=(n_samples, self.tv_dim),
-                     read_only=False)
+      if os.path.exists(path) and not override:
+        raise RuntimeError("i-vector file exists at path: %s" % path)
+      dat = MmapArrayWriter(path=path, dtype=dtype,
+                            shape=(0, self.tv_dim),
+                            remove_exist=True)
+      write = lambda s, ivec: dat.write(ivec, start_position=s)
     else:
       dat = np.empty(shape=(n_samples, self.tv_dim),
                      dtype=dtype)
+
+      def write(s, ivec):
+        dat[s:s + ivec.shape[0]] = ivec
     # ====== run on GPU ====== #
     if (device == 'gpu' or device == 'mix') and get_ngpu() > 0:
       for s, e in batching(batch_size=self.batch_size_gpu, n=n_samples):
@@ -2005,40 +2428,37 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
                                           (z_minibatch, f_minibatch, self.Tm, self.T_invS_Tt))}
         )
         prog.add(Ex[0].shape[0])
-        dat[s:e] = Ex[0]
+        write(s, Ex[0].astype(dtype))
     # ====== run on CPU ====== #
     else:
-      def extract_ivec(idx):
-        vecs = []
-        for i in idx:
-          L = np.zeros((self.tv_dim, self.tv_dim),
-                       dtype=self.dtype)
-          L[self._itril] = np.dot(Z[i:i + 1], self.T_invS_Tt)
-          L += np.tril(L, -1).T + self.Im
-          # (tv_dim, tv_dim)
-          Cxx = linalg.inv(L)
-          # (tv_dim, 1)
-          B = np.dot(self.T_invS, F[i:i + 1].T)
-          # (tv_dim, 1)
-          Ex = np.dot(Cxx, B)
-          # (1, tv_dim)
-          ivec = Ex.T
-          if ivec.dtype != dtype:
-            ivec = ivec.astype(dtype)
-          vecs.append((i, ivec))
-        return vecs
-      mpi = MPI(jobs=list(range(n_samples)), func=extract_ivec,
-                ncpu=self.ncpu if ncpu is None else int(ncpu),
-                batch=max(12, self.batch_size_cpu))
-      for vecs in mpi:
-        for i, v in vecs:
-          dat[i:i + 1] = v
-        prog.add(len(vecs))
+      if approx: # compute once before forking
+        self._get_approx_eig()
+      # the stacked precision matrices must fit in the batch memory
+      batch_size = self.batch_size_cpu
+      if not approx:
+        batch_size = min(batch_size,
+                         max(1, Tmatrix.STANDARD_CPU_BATCH_SIZE //
+                             (self.tv_dim ** 2 * self.dtype.itemsize)))
+
+      def extract_ivec(start_end):
+        s, e = start_end
+        return s, self._batch_transform(
+            Z[s:e], F[s:e], approx=approx).astype(dtype)
+      jobs = list(batching(batch_size=batch_size, n=n_samples))
+      ncpu = self.ncpu if ncpu is None else int(ncpu)
+      if ncpu > 1 and len(jobs) > 1:
+        results = MPI(jobs=jobs, func=extract_ivec,
+                      ncpu=ncpu, batch=1)
+      else:
+        results = (extract_ivec(j) for j in jobs)
+      for s, ivec in results:
+        write(s, ivec)
+        prog.add(ivec.shape[0])
     # ====== flush and close ====== #
     if path is not None:
       dat.flush()
       dat.close()
-      return MmapArray(path=path, read_only=True)
+      return MmapArray(path)
     return dat
 
   def fit(self, X, y=None):
@@ -2065,7 +2485,7 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
       any(isinstance(i, (tuple, list, Mapping)) for i in X):
         tmp = [i for i in X
                if hasattr(i, 'shape') and i.shape[1] == self.feat_dim][0]
-        indices = [i for i in X if i != tmp][0]
+        indices = [i for i in X if i is not tmp][0]
         X = tmp
         self.gmm.transform_to_disk(X, indices, pathZ=cache_Z, pathF=cache_F,
                                    dtype='float32', device=None,
@@ -2080,13 +2500,27 @@ class Tmatrix(DensityMixin, BaseEstimator, TransformerMixin):
       else:
         raise ValueError("The input arguments must be tuple of (Z, F) or (X, indices).")
       # ====== EM ====== #
-      # LU, RU, LLK, nframes
-      for iter in range(self.niter):
-        self.expectation_maximization(Z, F, device=self._device,
-                                      print_progress=True)
+      # the worker processes are reused for all E-M iterations
+      if self._device in ('cpu', 'mix') and \
+      self.ncpu > 1 and cpu_count() > 1:
+        with WorkerPool(ncpu=self.ncpu) as pool:
+          self._pool = pool
+          try:
+            self._fit(Z, F)
+          finally:
+            self._pool = None
+            self._pool_inputs = None
+      else:
+        self._fit(Z, F)
     # ====== exception ====== #
     finally:
       if os.path.exists(cache_Z):
         os.remove(cache_Z)
       if os.path.exists(cache_F):
         os.remove(cache_F)
+
+  def _fit(self, Z, F):
+    # LU, RU, LLK, nframes
+    for iter in range(self.niter):
+      self.expectation_maximization(Z, F, device=self._device,
+                                    print_progress=True)
@@ -381,18 +381,22 @@ class PLDA(BaseEstimator, TransformerMixin, Evaluable):
     # h = np.dot(X_project, self.Q_hat_) * X_project
     # return h
 
-  def predict_log_proba(self, X, X_model=None):
-    """
+  def scoring_engine(self, X, X_model=None, dtype=None, **kwargs):
+    """ Create a `ScoringEngine` for tiled scoring of large trial lists,
+    the quadratic terms `score_h1` (per model) and `score_h2` (per segment)
+    are computed once.
+
     Parameters
     ----------
     X : [num_samples, feat_dim]
     X_model : [num_classes, feat_dim]
       if None, use class average extracted based on fitted data
-
-    Return
-    ------
-    log-probabilities matrix [num_samples, num_classes]
+    dtype : {None, 'float32', 'float64'}
+      data type for scoring, by default, the `dtype` of this PLDA
+    **kwargs : extra arguments for `odin.ml.trial_scoring.ScoringEngine`
+      (i.e. `test_tile`, `enroll_tile`, `n_threads`, `verbose`)
     """
+    from odin.ml.trial_scoring import ScoringEngine
     if not self.is_fitted:
       raise RuntimeError("This model hasn't been fitted!")
     # ====== check X_model ====== #
@@ -412,12 +416,33 @@ class PLDA(BaseEstimator, TransformerMixin, Evaluable):
       X = X[:]
     # ====== transform the input matrices ====== #
     X = np.dot(self.normalizer.transform(X), self.Uk_) # [num_samples, n_phi]
-    # [num_classes, 1]
-    score_h1 = np.sum(np.dot(X_model, self.Q_hat_) * X_model, axis=1, keepdims=True)
-    # [num_samples, 1]
-    score_h2 = np.sum(np.dot(X, self.Q_hat_) * X, axis=1, keepdims=True)
-    # [num_samples, num_classes]
-    score_h1h2 = 2 * np.dot(X, np.dot(X_model, self.Lambda_).T)
-    # [num_samples, num_classes]
-    scores = score_h1h2 + score_h1.T + score_h2
-    return scores
+    # [num_classes]
+    score_h1 = np.sum(np.dot(X_model, self.Q_hat_) * X_model, axis=1)
+    # [num_samples]
+    score_h2 = np.sum(np.dot(X, self.Q_hat_) * X, axis=1)
+    # score_h1h2 = 2 * X . (X_model . Lambda)^T
+    return ScoringEngine(enroll=2 * np.dot(X_model, self.Lambda_),
+                         test=X,
+                         enroll_bias=score_h1,
+                         test_bias=score_h2,
+                         dtype=self.dtype if dtype is None else dtype,
+                         **kwargs)
+
+  def predict_log_proba(self, X, X_model=None):
+    """
+    Parameters
+    ----------
+    X : [num_samples, feat_dim]
+    X_model : [num_classes, feat_dim]
+      if None, use class average extracted based on fitted data
+
+    Return
+    ------
+    log-probabilities matrix [num_samples, num_classes]
+
+    Note
+    ----
+    For large number of samples and models, use `scoring_engine` to score
+    only the trials, or to write the scores to disk.
+    """
+    return self.scoring_engine(X, X_model=X_model).score_matrix()
@@ -348,6 +348,29 @@ class Scorer(BaseEstimator, TransformerMixin, Evaluable):
   def predict_log_proba(self, X):
     return self.transform(X)
 
+  def scoring_engine(self, X, X_model=None, dtype='float32', **kwargs):
+    """ Create a `ScoringEngine` for tiled cosine scoring of large trial
+    lists, only support `method='cosine'`
+
+    Parameters
+    ----------
+    X : array [nb_samples, feat_dim]
+    X_model : {None, array [nb_models, feat_dim]}
+      if None, use the enrollment vectors of the fitted classes
+    **kwargs : extra arguments for `odin.ml.trial_scoring.ScoringEngine`
+    """
+    from odin.ml.trial_scoring import ScoringEngine
+    if self.method != 'cosine':
+      raise RuntimeError("`scoring_engine` only for 'cosine' method")
+    if X_model is None:
+      X_model = self._normalizer.enroll_vecs
+    else:
+      X_model = self._normalizer.normalize(X_model, concat=False)
+    return ScoringEngine(enroll=X_model,
+                         test=self._normalizer.transform(X),
+                         dtype=dtype,
+                         **kwargs)
+
   def transform(self, X):
     # [nb_samples, nb_classes - 1] (if LDA applied)
     X = self._normalizer.transform(X)
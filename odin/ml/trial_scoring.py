@@ -0,0 +1,236 @@
+from __future__ import absolute_import, division, print_function
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+
+import numpy as np
+from six import string_types
+
+__all__ = ['ScoringEngine']
+
+
+def _open_output(out, shape, dtype):
+  r""" `out` could be an array or a path to `.npy` file (memory-mapped) """
+  if out is None:
+    return np.empty(shape=shape, dtype=dtype)
+  if isinstance(out, string_types):
+    return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+  if out.shape != shape:
+    raise ValueError("Output array must has shape %s, but given %s" %
+                     (str(shape), str(out.shape)))
+  return out
+
+
+class ScoringEngine(object):
+  r""" Scoring of enrollment models against test segments for large
+  evaluations (e.g. 1M segments x 100k models), the score of model `i` and
+  segment `j` has the bilinear form:
+
+    `score[j, i] = enroll_bias[i] + test_bias[j] + <enroll[i], test[j]>`
+
+  i.e. the quadratic terms of PLDA (`score_h1`, `score_h2`) are computed
+  once per model and per segment, and cosine scoring has no bias.
+
+  The scores are evaluated in tiles of `test_tile x enroll_tile` by matrix
+  products (GEMM) in `n_threads` threads, so the dense scores matrix is
+  never held in memory, the results could be written to a memory-mapped
+  `.npy` file or streamed into accumulators (e.g. for EER and minDCF).
+
+  Arguments:
+    enroll : array [num_models, dim], projected enrollment models
+    test : array [num_segments, dim], projected test segments
+    enroll_bias : {None, array [num_models]}
+    test_bias : {None, array [num_segments]}
+    dtype : data type for scoring, 'float32' is faster with lower memory
+    test_tile : int, number of test segments in each tile
+    enroll_tile : int, number of models in each tile
+    n_threads : int, default: number of CPUs
+    verbose : a Boolean, print the number of trials per second
+
+  Example:
+  ```
+  engine = plda.scoring_engine(X_test, X_model=X_enroll)
+  # scores of a NIST trial list, written to disk
+  engine.score_trials(model_idx, segment_idx, out='/tmp/scores.npy')
+  # streaming the scores of all pairs to an accumulator with
+  # `update(scores, labels)` method, without keeping the scores
+  engine.score_trials(model_idx, segment_idx, labels=is_target,
+                      sink=accumulator, return_scores=False)
+  ```
+  """
+
+  def __init__(self,
+               enroll,
+               test,
+               enroll_bias=None,
+               test_bias=None,
+               dtype='float32',
+               test_tile=2048,
+               enroll_tile=8192,
+               n_threads=None,
+               verbose=False):
+    self.dtype = np.dtype(dtype)
+    self.enroll = np.ascontiguousarray(enroll, dtype=self.dtype)
+    self.test = np.ascontiguousarray(test, dtype=self.dtype)
+    if self.enroll.shape[1] != self.test.shape[1]:
+      raise ValueError("Enrollment and test dimension mismatch: %d != %d" %
+                       (self.enroll.shape[1], self.test.shape[1]))
+    self.enroll_bias = np.zeros(shape=(self.num_models,), dtype=self.dtype) \
+      if enroll_bias is None else \
+        np.ravel(enroll_bias).astype(self.dtype, copy=False)
+    self.test_bias = np.zeros(shape=(self.num_segments,), dtype=self.dtype) \
+      if test_bias is None else \
+        np.ravel(test_bias).astype(self.dtype, copy=False)
+    self.test_tile = int(test_tile)
+    self.enroll_tile = int(enroll_tile)
+    self.n_threads = cpu_count() if n_threads is None else int(n_threads)
+    self.verbose = bool(verbose)
+    self.trials_per_second = None
+
+  @property
+  def num_models(self):
+    return self.enroll.shape[0]
+
+  @property
+  def num_segments(self):
+    return self.test.shape[0]
+
+  def _tile(self, t0, t1, m0, m1):
+    scores = np.dot(self.test[t0:t1], self.enroll[m0:m1].T)
+    scores += self.enroll_bias[m0:m1]
+    scores += self.test_bias[t0:t1, None]
+    return scores
+
+  def _map(self, func, jobs):
+    r""" Ordered results of `func` over `jobs` by threads, at most
+    `2 * n_threads` results are pending at any time """
+    if self.n_threads <= 1:
+      for j in jobs:
+        yield func(j)
+      return
+    with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+      pending = []
+      for j in jobs:
+        pending.append(executor.submit(func, j))
+        if len(pending) >= 2 * self.n_threads:
+          yield pending.pop(0).result()
+      for f in pending:
+        yield f.result()
+
+  def _report(self, n_trials, start):
+    duration = max(time.time() - start, 1e-12)
+    self.trials_per_second = n_trials / duration
+    if self.verbose:
+      print("[ScoringEngine] %d trials in %.2f(s): %.2f(trials/s)" %
+            (n_trials, duration, self.trials_per_second))
+
+  def score_matrix(self, out=None):
+    r""" Scores of all pairs.
+
+    Arguments:
+      out : {None, array, str}, output array, or path to `.npy` file for
+        memory-mapped output
+
+    Return:
+      scores : array [num_segments, num_models]
+    """
+    start = time.time()
+    scores = _open_output(out, (self.num_segments, self.num_models),
+                          self.dtype)
+    jobs = [(t0, min(t0 + self.test_tile, self.num_segments), m0,
+             min(m0 + self.enroll_tile, self.num_models))
+            for t0 in range(0, self.num_segments, self.test_tile)
+            for m0 in range(0, self.num_models, self.enroll_tile)]
+
+    def job(j):
+      t0, t1, m0, m1 = j
+      scores[t0:t1, m0:m1] = self._tile(t0, t1, m0, m1)
+
+    for _ in self._map(job, jobs):
+      pass
+    self._report(scores.size, start)
+    return scores
+
+  def score_trials(self,
+                   model_idx,
+                   segment_idx,
+                   labels=None,
+                   out=None,
+                   sink=None,
+                   return_scores=True):
+    r""" Scores of the given trials.
+
+    The trials are grouped by tiles of `test_tile` segments, a tile is
+    scored by GEMM against the models it contains if the trials are dense
+    enough, otherwise by the dot products of the trial pairs.
+
+    Arguments:
+      model_idx : array [num_trials], index of the enrollment model
+      segment_idx : array [num_trials], index of the test segment
+      labels : {None, array [num_trials]}, e.g. 1 for target trials and 0
+        for non-target trials, given to the `sink`
+      out : {None, array, str}, output array, or path to `.npy` file for
+        memory-mapped output
+      sink : {None, object}, object with method `update(scores, labels)`
+        called for each tile of scores (in the main thread)
+      return_scores : a Boolean, if False, the scores are only given to the
+        `sink` and not stored
+
+    Return:
+      scores : array [num_trials] (same order as given trials) or `None`
+    """
+    start = time.time()
+    model_idx = np.ravel(model_idx).astype(np.int64)
+    segment_idx = np.ravel(segment_idx).astype(np.int64)
+    if model_idx.shape != segment_idx.shape:
+      raise ValueError("model_idx and segment_idx must have the same length")
+    if labels is not None:
+      labels = np.ravel(labels)
+    n_trials = model_idx.shape[0]
+    scores = _open_output(out, (n_trials,), self.dtype) \
+      if return_scores or out is not None else None
+    # ====== group trials by test tiles ====== #
+    # tile index in the smallest integer type, so the stable sort is a radix
+    # sort for less than 65536 tiles
+    n_tiles = (self.num_segments - 1) // self.test_tile + 1
+    tiles = (segment_idx // self.test_tile).astype(
+        np.uint16 if n_tiles <= np.iinfo(np.uint16).max else np.int64)
+    order = np.argsort(tiles, kind='stable')
+    bounds = np.searchsorted(tiles[order], np.arange(n_tiles + 1))
+    jobs = [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if e > s]
+
+    def job(j):
+      ids = order[j[0]:j[1]]
+      seg = segment_idx[ids]
+      mod = model_idx[ids]
+      t0, t1 = seg.min(), seg.max() + 1
+      models, mod_pos = np.unique(mod, return_inverse=True)
+      if len(ids) * 64 >= (t1 - t0) * len(models):  # dense, GEMM then gather
+        s = np.empty(shape=(len(ids),), dtype=self.dtype)
+        # tiles of `enroll_tile` models, each trial is in one tile
+        starts = np.arange(0, len(models), self.enroll_tile)
+        if len(starts) == 1:
+          groups = [slice(None)]
+        else:
+          by_model = np.argsort(mod_pos, kind='stable')
+          bounds = np.searchsorted(mod_pos[by_model],
+                                   np.append(starts, len(models)))
+          groups = [by_model[b0:b1] for b0, b1 in zip(bounds[:-1], bounds[1:])]
+        for m0, sel in zip(starts, groups):
+          tile = np.dot(self.test[t0:t1],
+                        self.enroll[models[m0:m0 + self.enroll_tile]].T)
+          s[sel] = tile[seg[sel] - t0, mod_pos[sel] - m0]
+      else:  # sparse, dot products of the pairs
+        s = np.einsum('ij,ij->i', self.test[seg], self.enroll[mod])
+      s += self.enroll_bias[mod]
+      s += self.test_bias[seg]
+      return ids, s
+
+    for ids, s in self._map(job, jobs):
+      if scores is not None:
+        scores[ids] = s
+      if sink is not None:
+        sink.update(s, None if labels is None else labels[ids])
+    self._report(n_trials, start)
+    return scores if return_scores else None
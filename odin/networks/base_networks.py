@@ -19,6 +19,7 @@ from odin.backend.alias import (parse_activation, parse_constraint,
                                 parse_initializer, parse_regularizer)
 from odin.backend.keras_helpers import layer2text
 from odin.exp import Callback, Trainer
+from odin.exp.trainer import _atomic_write, _get_writer
 from odin.networks.util_layers import (Conv1DTranspose, ExpandDims, Identity,
                                        ReshapeMCMC)
 from odin.utils import MD5object, as_tuple, classproperty
@@ -248,15 +249,25 @@ class Networks(keras.Model, MD5object):
     Note
     -----
     Remember to build the Networks before loading saved weights.
+    The weights saved by `async_mode` (file `{filepath}.weights`) are loaded
+    if the file exists, it is removed by every synchronous `save_weights`,
+    so it is always the latest saved weights.
     """
     if filepath is None:
       if self.save_path is None:
         raise ValueError('No path is given for loading weights')
       filepath = self.save_path
     if isinstance(filepath, string_types):
+      Trainer.wait()
       files = glob.glob(filepath + '.*')
+      async_path = filepath + '.weights'
       # load weights
-      if len(files) > 0 and (filepath + '.index') in files:
+      if async_path in files:
+        if verbose:
+          print(f"Loading weights at path: {async_path}")
+        with open(async_path, 'rb') as f:
+          self.set_weights(pickle.load(f))
+      elif len(files) > 0 and (filepath + '.index') in files:
         if verbose:
           print(f"Loading weights at path: {filepath}")
         super().load_weights(filepath, by_name=False, skip_mismatch=False)
@@ -275,14 +286,31 @@ class Networks(keras.Model, MD5object):
 
   def save_weights(self,
                    filepath: Optional[str] = None,
-                   overwrite: bool = True) -> Networks:
+                   overwrite: bool = True,
+                   async_mode: bool = False) -> Networks:
     r""" Just copy this function here to fix the `save_format` to 'tf'
 
     Since saving 'h5' will drop certain variables.
+
+    If `async_mode=True`, the weights are copied to host memory and written
+    to `{filepath}.weights` by a background thread (see
+    `Trainer.save_checkpoint`), call `Trainer.wait()` to finish all pending
+    writes.
     """
     if filepath is None:
       filepath = self.save_path
     assert filepath is not None
+    if async_mode:
+      weights = [np.array(w) for w in self.get_weights()]
+      trainer = pickle.dumps(self.trainer)
+
+      def write():
+        _atomic_write(filepath + '.trainer', trainer)
+        _atomic_write(filepath + '.weights', weights)
+
+      _get_writer().submit(filepath, write)
+      return self
+    Trainer.wait()  # pending asynchronous writes finish first
     with open(filepath + '.trainer', 'wb') as f:
       pickle.dump(self.trainer, f)
     logging.get_logger().disabled = True
@@ -290,6 +318,9 @@ class Networks(keras.Model, MD5object):
                          overwrite=overwrite,
                          save_format='tf')
     logging.get_logger().disabled = False
+    # the older weights of `async_mode` must not shadow this save
+    if os.path.exists(filepath + '.weights'):
+      os.remove(filepath + '.weights')
     return self
 
   def train_steps(self,
@@ -328,6 +359,13 @@ class Networks(keras.Model, MD5object):
     track_gradients : bool, optional
         track and return the metrics includes the gradients' L2-norm for each
         trainable variable, by default False
+    profile : bool, optional
+        record the step-time statistics of the training phases and the
+        throughput to tensorboard (tag 'profile/*', see `Trainer.fit`),
+        by default False
+    profile_every : int, optional
+        if greater than 0, write a `tf.profiler` trace every `profile_every`
+        steps to `logdir`, by default 0
 
     Returns
     -------
@@ -406,7 +444,9 @@ class Networks(keras.Model, MD5object):
           terminate_on_nan: bool = True,
           logdir: Optional[str] = None,
           allow_none_gradients: bool = False,
-          track_gradients: bool = False) -> Networks:
+          track_gradients: bool = False,
+          profile: bool = False,
+          profile_every: int = 0) -> Networks:
     """Override the original fit method of keras to provide simplified
     procedure with `Networks.optimize` and `Networks.train_steps`
 
@@ -517,6 +557,8 @@ class Networks(keras.Model, MD5object):
         max_iter=max_iter,
         terminate_on_nan=terminate_on_nan,
         callback=callback,
+        profile=profile,
+        profile_every=profile_every,
     )
     return self
 
@@ -1,6 +1,7 @@
 from odin.preprocessing import (base, dataloader, sequence, signal, speech,
                                 textgrid)
-from odin.preprocessing.base import Pipeline, make_pipeline, set_extractor_debug
+from odin.preprocessing.base import (ExtractorPipeline, Pipeline, make_pipeline,
+                                    set_extractor_debug)
 from odin.preprocessing.processor import (FeatureProcessor, calculate_pca,
                                           validate_features)
 
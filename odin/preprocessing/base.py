@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, print_function
 
+import hashlib
 import inspect
 import os
 import re
@@ -14,8 +15,10 @@ from sklearn.pipeline import Pipeline
 from sklearn.pipeline import make_pipeline as _make_pipeline
 
 from odin.fuel import Dataset
-from odin.preprocessing.signal import delta, mvn, stack_frames
-from odin.utils import (as_tuple, ctext, dummy_formatter, flatten_list,
+from odin.preprocessing.signal import (OnlineStatistics, delta, mvn,
+                                       stack_frames)
+from odin.utils import (DiskLRUCache, as_tuple, ctext, dummy_formatter,
+                        flatten_list,
                         get_all_files, get_formatted_datetime, is_pickleable,
                         is_string)
 
@@ -93,13 +96,16 @@ class ExtractorSignal(object):
 # ===========================================================================
 # Helper
 # ===========================================================================
-def make_pipeline(steps, debug=False):
+def make_pipeline(steps, debug=False, cache_path=None, cache_size=4096):
   """ NOTE: this method automatically revmove None entries
 
    - Flatten list or dictionary found in steps.
    - Remove any object that not is instance of `Extractor`
 
   during creation of `Pipeline`.
+
+  If `cache_path` is given, the output of each step is cached on disk
+  (see `ExtractorPipeline`), `cache_size` is the maximum size in MB.
   """
   ID = [0]
 
@@ -132,10 +138,107 @@ def make_pipeline(steps, debug=False):
   # ====== set debug mode ====== #
   set_extractor_debug([i[1] for i in steps], debug=bool(debug))
   # ====== return pipeline ====== #
-  ret = Pipeline(steps=steps)
+  ret = ExtractorPipeline(steps=steps,
+                          cache_path=cache_path,
+                          cache_size=cache_size)
   return ret
 
 
+class ExtractorPipeline(Pipeline):
+  """ `sklearn.pipeline.Pipeline` of `Extractor` with an additional
+  batch mode `transform_batch`, each step processes the whole list of
+  inputs before passing it to the next step.
+
+  Parameters
+  ----------
+  steps : list of (name, Extractor)
+  cache_path : {None, string}
+      if given, the output of every step is stored in a `DiskLRUCache`
+      keyed by the fingerprint of the input (path, modification time and
+      size for files) and the fingerprints of all the steps up to the
+      output (see `Extractor.get_fingerprint`). Re-running the pipeline
+      after changing a step only recomputes the changed suffix.
+  cache_size : int
+      maximum size of the cache in MB
+
+  Example
+  -------
+  >>> pipeline = make_pipeline([STFTExtractor(...), MelsSpecExtractor(...)])
+  >>> outputs = pipeline.transform_batch([dict(raw=y, sr=sr) for y in ...])
+
+  Note
+  ----
+  The cache is only used by `transform`.
+  """
+
+  def __init__(self, steps, cache_path=None, cache_size=4096, **kwargs):
+    super(ExtractorPipeline, self).__init__(steps=steps, **kwargs)
+    self.cache_path = cache_path
+    self.cache_size = cache_size
+    self._cache = None
+
+  @property
+  def cache(self):
+    if self.cache_path is None:
+      return None
+    if getattr(self, '_cache', None) is None:
+      self._cache = DiskLRUCache(self.cache_path, max_size=self.cache_size)
+    return self._cache
+
+  def __getstate__(self):
+    states = dict(self.__dict__)
+    states['_cache'] = None  # re-open the cache index in the new process
+    return states
+
+  def get_fingerprints(self):
+    """ Return the fingerprint of each prefix of the pipeline """
+    fingerprints = []
+    upstream = ''
+    for _, step in self.steps:
+      if isinstance(step, Extractor):
+        upstream = step.get_fingerprint(upstream)
+      else:
+        upstream = _hash_string(upstream + _stable_repr(step))
+      fingerprints.append(upstream)
+    return fingerprints
+
+  def transform(self, X):
+    cache = self.cache
+    if cache is None:
+      for _, step in self.steps:
+        X = step.transform(X)
+      return X
+    # ====== search for the longest cached prefix ====== #
+    input_key = _input_fingerprint(X)
+    keys = [
+        _hash_string(input_key + fingerprint)
+        for fingerprint in self.get_fingerprints()
+    ]
+    start = 0
+    for i in range(len(keys) - 1, -1, -1):
+      value = cache.get(keys[i], default=_MISSING)
+      if value is not _MISSING:
+        X = value
+        start = i + 1
+        break
+    # ====== only compute the remained suffix ====== #
+    for key, (_, step) in zip(keys[start:], self.steps[start:]):
+      X = step.transform(X)
+      if isinstance(X, ExtractorSignal):
+        break
+      cache[key] = X
+    return X
+
+  def transform_batch(self, X):
+    X = list(X)
+    for _, step in self.steps:
+      if isinstance(step, Extractor):
+        X = step.transform_batch(X)
+      else:
+        X = [step.transform(x) for x in X]
+    return X
+
+
 def set_extractor_debug(extractors, debug):
   # ====== prepare ====== #
   if isinstance(extractors, (tuple, list)):
@@ -169,6 +272,56 @@ def _preprocess(x):
   return x
 
 
+_MISSING = object()
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def _hash_string(s):
+  return hashlib.blake2b(s.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def _stable_repr(x, files=False):
+  """ String representation which is identical between runs (no memory
+  address), `numpy.ndarray` is represented by the hash of its data,
+  if `files=True`, the modification time and size of existed files are
+  included """
+  if isinstance(x, Extractor):
+    return x.get_fingerprint()
+  if isinstance(x, np.ndarray):
+    x = np.ascontiguousarray(x)
+    return 'ndarray(%s,%s,%s)' % (x.dtype.str, x.shape,
+                                  hashlib.blake2b(x.data).hexdigest())
+  if isinstance(x, Mapping):
+    items = sorted((str(k), _stable_repr(v, files)) for k, v in x.items())
+    return '{%s}' % ','.join('%s:%s' % i for i in items)
+  if isinstance(x, (tuple, list)):
+    return '(%s)' % ','.join(_stable_repr(i, files) for i in x)
+  if isinstance(x, string_types) and files and os.path.isfile(x):
+    stat = os.stat(x)
+    return 'file(%s,%d,%d)' % (os.path.abspath(x), stat.st_mtime_ns,
+                               stat.st_size)
+  if inspect.isfunction(x) or inspect.isclass(x):
+    return '%s.%s' % (x.__module__, x.__qualname__)
+  return _ADDRESS.sub('', repr(x))
+
+
+def _input_fingerprint(x):
+  return _stable_repr(x, files=True)
+
+
+def _concat_ragged(arrays):
+  """ Concatenate a list of arrays with different first dimension,
+  return the concatenated array and the offsets for splitting it back
+
+  Example
+  -------
+  >>> frames, offsets = _concat_ragged([x1, x2, x3])
+  >>> spec1, spec2, spec3 = np.split(np.fft.rfft(frames), offsets, axis=0)
+  """
+  offsets = np.cumsum([len(a) for a in arrays])[:-1]
+  return np.concatenate(arrays, axis=0), offsets
+
+
 # ===========================================================================
 # Basic extractors
 # ===========================================================================
@@ -208,7 +361,8 @@ class Extractor(BaseEstimator, TransformerMixin):
                name=None):
     super(Extractor, self).__init__()
     if name is None:
-      self._name = "%s%d" % (self.__class__.__name__, np.random.rand(0, 888888))
+      self._name = "%s%d" % (self.__class__.__name__,
+                             np.random.randint(0, 888888))
     else:
       self._name = str(name)
     self._debug = False
@@ -278,6 +432,21 @@ class Extractor(BaseEstimator, TransformerMixin):
     self._debug = bool(debug)
     return self
 
+  def get_fingerprint(self, upstream=''):
+    """ Stable hash string of this extractor, computed from its class,
+    `get_params()` and the fingerprint of the upstream extractors """
+    try:
+      params = self.get_params(deep=False)
+    except Exception:  # some attributes are not stored as in `__init__`
+      params = {
+          k: v
+          for k, v in self.__dict__.items()
+          if k not in ('_debug', '_last_debugging_text', '_name')
+      }
+    return _hash_string('%s|%s.%s|%s' %
+                        (upstream, self.__class__.__module__,
+                         self.__class__.__qualname__, _stable_repr(params)))
+
   def fit(self, X, y=None):
     # Do nothing here
     return self
@@ -288,8 +457,16 @@ class Extractor(BaseEstimator, TransformerMixin):
   def _transform(self, X):
     raise NotImplementedError
 
-  def transform(self, X):
-    # NOTE: do not override this method
+  def _transform_batch(self, X):
+    """ Override this method to transform a list of valid inputs at once
+    (e.g. by concatenating the frames of all inputs), must return a list
+    of outputs with the same length as `X`, each output is handled as the
+    return of `_transform` """
+    raise NotImplementedError
+
+  def _check_input(self, X):
+    """ Return an `ExtractorSignal` if `X` cannot be transformed,
+    otherwise, None """
     if isinstance(X, ExtractorSignal):
       return X
     # ====== interpret different signal ====== #
@@ -314,7 +491,11 @@ class Extractor(BaseEstimator, TransformerMixin):
               extractor=self,
               msg="Cannot find features with name: %s" % name,
               last_input=X).set_action('error')
-    y = self._transform(X)
+    return None
+
+  def _merge_output(self, X, y):
+    """ Post-processing the output `y` of `_transform`, merging it with
+    the input features `X` """
     # if return Signal or None, no post-processing
     if isinstance(y, ExtractorSignal):
       return y
@@ -333,10 +514,11 @@ class Extractor(BaseEstimator, TransformerMixin):
       else:
         y = {self.output_name: y}
     # ====== Merge previous results ====== #
-    # remove None values
+    # remove None values, `name.lower()` is much faster than checking
+    # each character
     tmp = {}
     for name, feat in y.items():
-      if any(c.isupper() for c in name):
+      if name != name.lower():
         return ExtractorSignal().set_message(
             extractor=self,
             msg="Name for features cannot contain upper case",
@@ -348,47 +530,74 @@ class Extractor(BaseEstimator, TransformerMixin):
     # add old features extracted in X, but do NOT override new features in y
     if isinstance(X, Mapping):
       for name, feat in X.items():
-        if any(c.isupper() for c in name):
+        if name in y:
+          continue
+        if name != name.lower():
           return ExtractorSignal().set_message(
               extractor=self,
               msg="Name for features cannot contain upper case",
               last_input=X).set_action('error')
-        if name not in y:
-          y[name] = _preprocess(feat)
+        y[name] = _preprocess(feat)
     # ====== print debug text ====== #
     # maybe someone implement __getstate__ and forget _debug
-    if not hasattr(self, '_debug'):
-      self._debug = False
-    if self._debug:
-      debug_text = ''
-      debug_text += '%s %s\n' % (ctext(
-          "[Extractor]", 'cyan'), ctext(self.__class__.__name__, 'magenta'))
-      # inputs
-      if not _equal_inputs_outputs(X, y):
-        debug_text += '  %s\n' % ctext("Inputs:", 'yellow')
-        debug_text += '  %s\n' % ctext("-------", 'yellow')
-        if isinstance(X, Mapping):
-          for k, v in X.items():
-            debug_text += '    %s : %s\n' % (ctext(k,
-                                                   'blue'), dummy_formatter(v))
-        else:
-          debug_text += '    %s\n' % dummy_formatter(X)
-      # outputs
-      debug_text += '  %s\n' % ctext("Outputs:", 'yellow')
+    if getattr(self, '_debug', False):
+      self._print_debug(X, y)
+    return y
+
+  def _print_debug(self, X, y):
+    debug_text = ''
+    debug_text += '%s %s\n' % (ctext(
+        "[Extractor]", 'cyan'), ctext(self.__class__.__name__, 'magenta'))
+    # inputs
+    if not _equal_inputs_outputs(X, y):
+      debug_text += '  %s\n' % ctext("Inputs:", 'yellow')
       debug_text += '  %s\n' % ctext("-------", 'yellow')
-      if isinstance(y, Mapping):
-        for k, v in y.items():
+      if isinstance(X, Mapping):
+        for k, v in X.items():
           debug_text += '    %s : %s\n' % (ctext(k, 'blue'), dummy_formatter(v))
       else:
-        debug_text += '    %s\n' % dummy_formatter(y)
-      # parameters
-      for name, param in self.get_params().items():
-        if name not in ('_input_name', '_output_name'):
-          debug_text += '  %s : %s\n' % (ctext(
-              name, 'yellow'), dummy_formatter(param))
-      self._last_debugging_text = debug_text
-      print(debug_text)
-    return y
+        debug_text += '    %s\n' % dummy_formatter(X)
+    # outputs
+    debug_text += '  %s\n' % ctext("Outputs:", 'yellow')
+    debug_text += '  %s\n' % ctext("-------", 'yellow')
+    if isinstance(y, Mapping):
+      for k, v in y.items():
+        debug_text += '    %s : %s\n' % (ctext(k, 'blue'), dummy_formatter(v))
+    else:
+      debug_text += '    %s\n' % dummy_formatter(y)
+    # parameters
+    for name, param in self.get_params().items():
+      if name not in ('_input_name', '_output_name'):
+        debug_text += '  %s : %s\n' % (ctext(
+            name, 'yellow'), dummy_formatter(param))
+    self._last_debugging_text = debug_text
+    print(debug_text)
+
+  def transform(self, X):
+    # NOTE: do not override this method
+    signal = self._check_input(X)
+    if signal is not None:
+      return signal
+    return self._merge_output(X, self._transform(X))
+
+  def transform_batch(self, X):
+    """ Transform a list of inputs, return a list of outputs (i.e. the
+    features dictionary or an `ExtractorSignal` for each input).
+
+    If the extractor implements `_transform_batch`, all valid inputs are
+    processed in one call, otherwise, fall back to `transform` for each
+    input.
+    """
+    # NOTE: do not override this method
+    X = list(X)
+    if type(self)._transform_batch is Extractor._transform_batch:
+      return [self.transform(x) for x in X]
+    outputs = [self._check_input(x) for x in X]
+    valid = [i for i, o in enumerate(outputs) if o is None]
+    if len(valid) > 0:
+      for i, y in zip(valid, self._transform_batch([X[i] for i in valid])):
+        outputs[i] = self._merge_output(X[i], y)
+    return outputs
 
 
 # ===========================================================================
@@ -554,7 +763,8 @@ class EqualizeShape0(Extractor):
 
 
 class RunningStatistics(Extractor):
-  """ Running statistics
+  """ Running statistics, return a mergeable `OnlineStatistics`
+  (count, mean, M2) for each feature with name: `'%s_%sstats' % (name, prefix)`
 
   Parameters
   ----------
@@ -566,22 +776,25 @@ class RunningStatistics(Extractor):
   axis : int (default: 0)
       the axis for calculating the statistics
   prefix : ''
-      the prefix append to 'sum1' and 'sum2'
+      the prefix append to 'stats'
+  group_name : {None, string}
+      name of the feature identifying the group of the statistics,
+      e.g. 'spkid' for per-speaker or 'name' for per-file statistics,
+      `FeatureProcessor` saves the statistics of each group for CMVN
+      (see `AcousticNorm`)
   """
 
-  def __init__(self, input_name=None, axis=0, prefix=''):
+  def __init__(self, input_name=None, axis=0, prefix='', group_name=None):
     super(
         RunningStatistics,
         self).__init__(input_name=as_tuple(input_name, t=string_types
                                           ) if input_name is not None else None)
     self.axis = axis
     self.prefix = str(prefix)
+    self.group_name = None if group_name is None else str(group_name)
 
-  def get_sum1_name(self, feat_name):
-    return '%s_%ssum1' % (feat_name, self.prefix)
-
-  def get_sum2_name(self, feat_name):
-    return '%s_%ssum2' % (feat_name, self.prefix)
+  def get_stats_name(self, feat_name):
+    return '%s_%sstats' % (feat_name, self.prefix)
 
   def _transform(self, feat):
     if self.input_name is None:
@@ -594,22 +807,15 @@ class RunningStatistics(Extractor):
     else:
       X = [feat[name] for name in self.input_name]
       output_name = self.input_name
+    group = None if self.group_name is None else str(feat[self.group_name])
     # ====== calculate the statistics ====== #
     for name, y in zip(output_name, X):
-      # ====== SUM of x^1 ====== #
-      sum1 = np.sum(y, axis=self.axis, dtype='float64')
-      s1_name = self.get_sum1_name(name)
-      if s1_name not in feat:
-        feat[s1_name] = sum1
-      else:
-        feat[s1_name] += sum1
-      # ====== SUM of x^2 ====== #
-      sum2 = np.sum(np.power(y, 2), axis=self.axis, dtype='float64')
-      s2_name = self.get_sum2_name(name)
-      if s2_name not in feat:
-        feat[s2_name] = sum2
+      stats = OnlineStatistics(y, axis=self.axis, group=group)
+      stats_name = self.get_stats_name(name)
+      if stats_name not in feat:
+        feat[stats_name] = stats
       else:
-        feat[s2_name] += sum2
+        feat[stats_name].merge(stats)
     return feat
 
 
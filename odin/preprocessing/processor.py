@@ -9,10 +9,13 @@ import os
 import random
 import re
 import shutil
+import struct
 import sys
+import threading
 import time
 import warnings
 import wave
+import zlib
 from abc import ABCMeta, abstractmethod, abstractproperty
 from collections import Mapping, defaultdict
 from multiprocessing import Pool, Process, Queue, cpu_count
@@ -26,11 +29,12 @@ from sklearn.pipeline import Pipeline
 from bigarray import MmapArray
 from odin.fuel import Dataset, MmapDict
 from odin.preprocessing.base import Extractor, ExtractorSignal
+from odin.preprocessing.signal import OnlineStatistics
 from odin.utils import (Progbar, add_notification, as_tuple, batching, ctext,
                         defaultdictkey, flatten_list, get_all_files,
                         get_formatted_datetime, get_stdio_path, get_tempdir,
                         is_string, stdio, wprint)
-from odin.utils.mpi import MPI
+from odin.utils.mpi import MPI, SharedArray
 
 _default_module = re.compile(r"__.*__")
 
@@ -403,6 +407,131 @@ def _check_logpath(log_path):
   return main_path + '.' + str(current_log_index) + ext
 
 
+class _AsyncWriter(object):
+  """ Apply `func` to every item from a bounded queue in a separated
+  thread, the exception raised in the thread is re-raised on the next
+  `put` or `join`. The items not processed after an error (or an abort)
+  are given to `discard` """
+
+  def __init__(self, func, maxsize, discard=None):
+    from queue import Queue as ThreadQueue
+    self._func = func
+    self._discard = discard
+    self._queue = ThreadQueue(maxsize=max(1, int(maxsize)))
+    self._error = None
+    self._abort = False
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def _run(self):
+    while True:
+      item = self._queue.get()
+      if item is None:
+        break
+      if self._error is None and not self._abort:
+        try:
+          self._func(item)
+          continue
+        except Exception as e:
+          self._error = e
+      if self._discard is not None:
+        self._discard(item)
+
+  def _check(self):
+    if self._error is not None:
+      raise self._error
+
+  def put(self, item):
+    self._check()
+    self._queue.put(item)
+
+  def join(self, abort=False):
+    """ Wait for all items, if `abort=True`, the pending items are
+    discarded and the error of the thread is not raised """
+    self._abort = bool(abort)
+    self._queue.put(None)
+    self._thread.join()
+    if not abort:
+      self._check()
+
+
+def _release_shared(arrays):
+  """ Remove the shared memory blocks of the results that are not written """
+  for x in arrays:
+    if isinstance(x, SharedArray):
+      try:
+        x.release()
+      except FileNotFoundError:  # already released
+        pass
+
+
+def _job_key(job):
+  """ Stable identity of a job, used to skip the committed jobs """
+  return job if is_string(job) else str(job)
+
+
+class _Journal(object):
+  """ Append-only commit log of a `FeatureProcessor` run, a record is
+  appended only after the data and indices of its jobs were flushed, so
+  the last valid record is always a consistent point of the Dataset.
+
+  Each record is `<length><crc32><pickled state>`, a torn record at the
+  end of the file (i.e. crashed while committing) is discarded.
+  """
+  _HEADER = struct.Struct('<QI')
+
+  def __init__(self, path):
+    self.path = path
+    self.jobs = set()
+    self.lengths = {}  # feat_name -> number of committed rows
+    self.stats = {}
+    self.groups = {}
+    self.n_records = 0
+    self.exists = os.path.exists(path)
+    if not self.exists:
+      return
+    with open(path, 'rb') as f:
+      data = f.read()
+    end = 0
+    size = _Journal._HEADER.size
+    while end + size <= len(data):
+      n, crc = _Journal._HEADER.unpack_from(data, end)
+      record = data[end + size:end + size + n]
+      if len(record) != n or zlib.crc32(record) != crc:
+        break
+      self._update(cPickle.loads(record))
+      end += size + n
+    if end < len(data):
+      with open(path, 'rb+') as f:
+        f.truncate(end)
+
+  def _update(self, record):
+    self.jobs.update(record['jobs'])
+    self.lengths = record['lengths']
+    self.stats = record['stats']
+    self.groups = record['groups']
+    self.n_records += 1
+
+  def create(self):
+    """ Create an empty journal, so the rows written before the first
+    commit are discarded on resume """
+    open(self.path, 'ab').close()
+    self.exists = True
+
+  def commit(self, jobs, lengths, stats, groups):
+    record = dict(jobs=list(jobs),
+                  lengths=dict(lengths),
+                  stats=dict(stats),
+                  groups=dict(groups))
+    data = cPickle.dumps(record, protocol=cPickle.HIGHEST_PROTOCOL)
+    with open(self.path, 'ab') as f:
+      f.write(_Journal._HEADER.pack(len(data), zlib.crc32(data)))
+      f.write(data)
+      f.flush()
+      os.fsync(f.fileno())
+    self._update(record)
+
+
 class FeatureProcessor(object):
   """ FeatureProcessor
 
@@ -452,6 +581,25 @@ class FeatureProcessor(object):
 
       if True, terminate the processor if non-handled Exception
       appeared.
+
+  shared_memory : bool (default: False)
+      if True, the workers copy extracted features into
+      `multiprocessing.shared_memory` blocks and only send their
+      descriptors back, a dedicated writer thread streams the blocks
+      into the memmap files and updates the `indices_*` MmapDict, so the
+      main process only dispatches results (requires python>=3.8).
+
+  Note
+  ----
+  Every time the cache is flushed, the processor appends a record to the
+  journal file `.odin_journal` in the output folder (the committed jobs,
+  the length of each feature and the running statistics). Running a
+  processor on an existed Dataset (i.e. `override=False`) resumes from
+  the last record: the committed jobs are skipped, the uncommitted rows
+  are discarded and the new features are appended, hence, new files can
+  be added to an existed Dataset without recomputing everything.
+  A Dataset without journal (e.g. written by an older version) is never
+  modified, `RuntimeError` is raised unless `override=True`.
   """
 
   def __init__(self,
@@ -463,7 +611,8 @@ class FeatureProcessor(object):
                override=False,
                identifier='name',
                log_path=None,
-               stop_on_failure=False):
+               stop_on_failure=False,
+               shared_memory=False):
     super(FeatureProcessor, self).__init__()
     # ====== check outpath ====== #
     path = os.path.abspath(str(path))
@@ -521,6 +670,7 @@ class FeatureProcessor(object):
     self.config = {}
     self._error_log = []
     self.stop_on_failure = bool(stop_on_failure)
+    self.shared_memory = bool(shared_memory)
 
   @property
   def identifier(self):
@@ -555,8 +705,25 @@ class FeatureProcessor(object):
 
   # ==================== Abstract properties ==================== #
   def run(self):
-    njobs = len(self.jobs)
     dataset = Dataset(self.path)
+    # ====== resume from the last commit ====== #
+    journal = _Journal(os.path.join(dataset.path, '.odin_journal'))
+    if not journal.exists:
+      # the features of a Dataset without journal cannot be resumed, and
+      # must not be truncated
+      existed = [
+          name for name in dataset.keys()
+          if name != 'config' and not re.match(r'^log.*\.txt$', name)
+      ]
+      if len(existed) > 0:
+        raise RuntimeError(
+            "Found features %s of a Dataset without journal at path: %s, "
+            "set `override=True` to remove the Dataset." %
+            (', '.join(sorted(existed)), dataset.path))
+      journal.create()
+    jobs = [j for j in self.jobs if _job_key(j) not in journal.jobs]
+    n_committed = len(self.jobs) - len(jobs)
+    njobs = len(jobs)
     if self.n_cache <= 1:
       cache_limit = max(2, int(0.12 * njobs))
     else:
@@ -566,30 +733,58 @@ class FeatureProcessor(object):
         path=os.path.join(dataset.path, key), cache_size=10000, read_only=False)
                               )
     last_start = defaultdict(int)
+    for feat_name, n in journal.lengths.items():
+      last_start['indices_%s' % feat_name] = n
+    # features that are already truncated to the committed length
+    checked_features = set()
+    # jobs processed since the last commit
+    pending_jobs = []
     # ====== statistic ====== #
-    # load old statistics
-    stats = defaultdict(lambda: [0, 0])  # name -> (sum1, sum2)
-    for key in dataset.keys():
-      if 'sum1' == key[-4]:
-        stats[key[:-4]][0] = dataset[key][:]
-      elif 'sum2' == key[-4:]:
-        stats[key[:-4]][1] = dataset[key][:]
+    # the exact accumulators of the committed jobs are restored from the
+    # journal, the mean and std saved in the Dataset are not mergeable
+    stats = defaultdict(OnlineStatistics)  # name -> OnlineStatistics
+    stats.update(journal.stats)
+    # name -> {group: OnlineStatistics}, for per-speaker or per-file CMVN
+    group_stats = defaultdict(dict)
+    group_stats.update(journal.groups)
     # all data are cached for periodically flushed
     cache = defaultdict(list)
     n_processed = [0]  # store the value as reference
 
     # ====== helper ====== #
     def flush_feature(feat_name, X_cached):
-      if len(X_cached) > 0:
+      # discard the rows written after the last commit
+      if feat_name not in checked_features:
+        checked_features.add(feat_name)
+        if feat_name in dataset:
+          dataset.truncate(feat_name, journal.lengths.get(feat_name, 0))
+      # shared memory blocks, written directly without concatenation
+      if len(X_cached) > 0 and isinstance(X_cached[0], SharedArray):
+        dataset.append(feat_name, [x.attach() for x in X_cached])
+        for x in X_cached:
+          x.release()
+      elif len(X_cached) > 0:
         X_cached = np.concatenate(X_cached, 0)
-        # flush data
+        # flush data, extend the memmap file in place
         if feat_name in dataset:
-          dataset[feat_name].append(X_cached)
+          dataset.append(feat_name, X_cached)
         else:
           dataset[(feat_name, 'memmap')] = X_cached
 
+    def commit():
+      dataset.flush()
+      for db in databases.values():
+        db.flush()
+      lengths = {
+          name[8:]: n
+          for name, n in last_start.items()
+          if name[:8] == 'indices_'
+      }
+      journal.commit(pending_jobs, lengths, stats, group_stats)
+      del pending_jobs[:]
+
     # ====== repeated for each result returned ====== #
-    def post_processing(result):
+    def post_processing(job_key, result):
       # search for file name
       if self.identifier not in result:
         raise RuntimeError(
@@ -609,28 +804,28 @@ class FeatureProcessor(object):
       # processing
       for feat_name, X in result.items():
         # some invalid feat_name
-        if feat_name in ('config', 'pipeline', 'sum1', 'sum2'):
+        if feat_name in ('config', 'pipeline', 'stats'):
           raise RuntimeError(
               "Returned features' name cannot be one "
-              "of the following: 'config', 'pipeline', 'sum1', 'sum2'.")
+              "of the following: 'config', 'pipeline', 'stats'.")
         # ignore some feat_name
         if feat_name in ('name'):
           continue
+        # merge the statistics, O(dim) for each file
+        if isinstance(X, OnlineStatistics):
+          stats[feat_name].merge(X)
+          if X.group is not None:
+            groups = group_stats[feat_name]
+            if X.group in groups:
+              groups[X.group].merge(X)
+            else:
+              groups[X.group] = X
         # if numpy ndarray, save to MmapData
-        if isinstance(X, np.ndarray) or \
-        'sum1' == feat_name[-4:] or \
-        'sum2' == feat_name[-4:]:
-          # save statistics instead
-          if 'sum1' == feat_name[-4:]:
-            stats[feat_name[:-4]][0] += X
-          elif 'sum2' == feat_name[-4:]:
-            stats[feat_name[:-4]][1] += X
-          # save features array
-          else:
-            all_indices[feat_name] = X.shape[0]
-            # cache data, only if we have more than 0 sample
-            if X.shape[0] > 0:
-              cache[feat_name].append(X)
+        elif isinstance(X, (np.ndarray, SharedArray)):
+          all_indices[feat_name] = X.shape[0]
+          # cache data, only if we have more than 0 sample
+          if X.shape[0] > 0:
+            cache[feat_name].append(X)
         # else all other kind of data save to MmapDict
         else:
           databases[feat_name][file_name] = X
@@ -644,18 +839,29 @@ class FeatureProcessor(object):
                                             last_start[ids_name] + n)
           last_start[ids_name] += n
       # ====== flush cache ====== #
+      pending_jobs.append(job_key)
       n_processed[0] += 1
       if n_processed[0] % cache_limit == 0:  # 12 + 8
         for feat_name, X_cached in cache.items():
           flush_feature(feat_name, X_cached)
         cache.clear()
+        commit()
       # ====== update progress ====== #
       return file_name
 
     # ====== mapping function ====== #
     def _map_func(dat):
+      job_key = _job_key(dat)
       try:
         ret = self.extractor.transform(dat)
+        # only send the descriptor of shared memory block
+        if self.shared_memory and isinstance(ret, Mapping):
+          ret = {
+              name: SharedArray.from_array(X) if
+              (isinstance(X, np.ndarray) and X.ndim > 0 and X.shape[0] > 0)
+              else X
+              for name, X in ret.items()
+          }
       except Exception as e:  # Non-handled exception
         ret = '\n========\n'
         ret += 'Time  : `%s`\n' % str(get_formatted_datetime(only_number=False))
@@ -668,10 +874,10 @@ class FeatureProcessor(object):
                                                  tb,
                                                  limit=None).format(chain=True):
           ret += line
-      return ret
+      return job_key, ret
 
     # ====== processing ====== #
-    mpi = MPI(jobs=self.jobs,
+    mpi = MPI(jobs=jobs,
               func=_map_func,
               ncpu=self.n_cpu,
               batch=1,
@@ -686,78 +892,104 @@ class FeatureProcessor(object):
     start_time = time.time()
     last_time = time.time()
     last_count = 0
-    with open(self._log_path, 'w') as flog:
-      # writing the log head
-      flog.write('============================\n')
-      flog.write('Start Time : %s\n' %
-                 get_formatted_datetime(only_number=False))
-      flog.write('Outpath    : %s\n' % self.path)
-      flog.write(
-          'Extractor  : %s\n' %
-          '->'.join([s[-1].__class__.__name__ for s in self.extractor.steps]))
-      flog.write('#Jobs      : %d\n' % njobs)
-      flog.write('#CPU       : %d\n' % self.n_cpu)
-      flog.write('#Cache     : %d\n' % cache_limit)
-      flog.write('============================\n')
-      flog.flush()
-      # start processing the file list
-      for count, result in enumerate(mpi):
-        # Non-handled exception
-        if isinstance(result, string_types):
-          flog.write(result)
-          flog.flush()
-          self._error_log.append(result)
-          if self.stop_on_failure:
-            raise RuntimeError(result)
-        # some error might happened
-        elif isinstance(result, ExtractorSignal):
-          flog.write(str(result))
-          flog.flush()
-          if result.action == 'error':
-            prog.add_notification(str(result))
-            raise RuntimeError(
-                "ExtractorSignal requests terminating processor!")
-          elif result.action == 'warn':
-            prog.add_notification(str(result))
-          elif result.action == 'ignore':
+    # ====== dedicated writer thread ====== #
+    writer = _AsyncWriter(lambda item: post_processing(*item),
+                          maxsize=self.n_cpu * 3,
+                          discard=lambda item: _release_shared(
+                              item[1].values())) \
+      if self.shared_memory else None
+    completed = False
+    try:
+      with open(self._log_path, 'w') as flog:
+        # writing the log head
+        flog.write('============================\n')
+        flog.write('Start Time : %s\n' %
+                   get_formatted_datetime(only_number=False))
+        flog.write('Outpath    : %s\n' % self.path)
+        flog.write(
+            'Extractor  : %s\n' %
+            '->'.join([s[-1].__class__.__name__ for s in self.extractor.steps]))
+        flog.write('#Jobs      : %d\n' % njobs)
+        flog.write('#Committed : %d\n' % n_committed)
+        flog.write('#CPU       : %d\n' % self.n_cpu)
+        flog.write('#Cache     : %d\n' % cache_limit)
+        flog.write('============================\n')
+        flog.flush()
+        # start processing the file list
+        for count, (job_key, result) in enumerate(mpi):
+          # Non-handled exception
+          if isinstance(result, string_types):
+            flog.write(result)
+            flog.flush()
             self._error_log.append(result)
+            if self.stop_on_failure:
+              raise RuntimeError(result)
+          # some error might happened
+          elif isinstance(result, ExtractorSignal):
+            flog.write(str(result))
+            flog.flush()
+            if result.action == 'error':
+              prog.add_notification(str(result))
+              raise RuntimeError(
+                  "ExtractorSignal requests terminating processor!")
+            elif result.action == 'warn':
+              prog.add_notification(str(result))
+            elif result.action == 'ignore':
+              self._error_log.append(result)
+            else:
+              raise RuntimeError("Unknown action from ExtractorSignal: %s" %
+                                 result.action)
+            prog['File'] = '%-48s' % result.message[:48]
+          # otherwise, no error happened, do post-processing
+          elif writer is not None:
+            writer.put((job_key, result))
+            prog['File'] = '%-48s' % str(result.get(self.identifier, ''))[:48]
           else:
-            raise RuntimeError("Unknown action from ExtractorSignal: %s" %
-                               result.action)
-          prog['File'] = '%-48s' % result.message[:48]
-        # otherwise, no error happened, do post-processing
-        else:
-          name = post_processing(result)
-          prog['File'] = '%-48s' % str(name)[:48]
-        # update progress
-        prog.add(1)
-        # manually write to external log file
-        if (count + 1) % max(1, int(0.01 * njobs)) == 0:
-          curr_time = time.time()
-          elap = curr_time - start_time
-          avg_speed = (count + 1) / elap
-          cur_speed = (count + 1 - last_count) / (curr_time - last_time)
-          avg_est = (njobs - count - 1) / avg_speed
-          cur_est = (njobs - count - 1) / cur_speed
-          flog.write(
-              '[%s] Processed: %d(files)   Remain: %d(files)   Elap.: %.2f(secs)\n'
-              '   Avg.Spd: %.2f(obj/sec)  Avg.Est.: %.2f(secs)\n'
-              '   Cur.Spd: %.2f(obj/sec)  Cur.Est.: %.2f(secs)\n' %
-              (get_formatted_datetime(only_number=False), count + 1,
-               njobs - count - 1, elap, avg_speed, avg_est, cur_speed, cur_est))
-          flog.flush()
-          last_time = curr_time
-          last_count = count + 1
+            name = post_processing(job_key, result)
+            prog['File'] = '%-48s' % str(name)[:48]
+          # update progress
+          prog.add(1)
+          # manually write to external log file
+          if (count + 1) % max(1, int(0.01 * njobs)) == 0:
+            curr_time = time.time()
+            elap = curr_time - start_time
+            avg_speed = (count + 1) / elap
+            cur_speed = (count + 1 - last_count) / (curr_time - last_time)
+            avg_est = (njobs - count - 1) / avg_speed
+            cur_est = (njobs - count - 1) / cur_speed
+            flog.write(
+                '[%s] Processed: %d(files)   Remain: %d(files)   '
+                'Elap.: %.2f(secs)\n'
+                '   Avg.Spd: %.2f(obj/sec)  Avg.Est.: %.2f(secs)\n'
+                '   Cur.Spd: %.2f(obj/sec)  Cur.Est.: %.2f(secs)\n' %
+                (get_formatted_datetime(only_number=False), count + 1,
+                 njobs - count - 1, elap, avg_speed, avg_est, cur_speed,
+                 cur_est))
+            flog.flush()
+            last_time = curr_time
+            last_count = count + 1
+      completed = True
+    finally:
+      # the writer is always joined, and the shared memory blocks of the
+      # results not written are released on failure
+      if not completed:
+        for _, result in mpi.cancel():
+          if isinstance(result, Mapping):
+            _release_shared(result.values())
+      if writer is not None:
+        writer.join(abort=not completed)
+      if not completed:
+        for X_cached in cache.values():
+          _release_shared(X_cached)
     # ====== end, flush the last time ====== #
     for feat_name, X_cached in cache.items():
       flush_feature(feat_name, X_cached)
     cache.clear()
     cache = None
-    dataset.flush()
+    commit()
     prog.add_notification("Flushed all data to disk")
     # ====== saving indices ====== #
     for name, db in databases.items():
-      db.flush(save_all=True)
       db_size = len(db)
       db.close()
       prog.add_notification(
@@ -765,26 +997,33 @@ class FeatureProcessor(object):
           (ctext(name, 'yellow'), ctext(str(db_size), 'yellow')))
 
     # ====== save mean and std ====== #
-    def save_mean_std(sum1, sum2, name):
-      N = dataset[name.split('_')[0]].shape[0]
-      mean = sum1 / N
-      std = np.sqrt(sum2 / N - np.power(mean, 2))
+    def save_mean_std(s, name):
+      mean = s.mean
+      std = s.std
       if np.any(np.isnan(mean)):
         wprint('Mean contains NaN, name: %s' % name)
       if np.any(np.isnan(std)):
         wprint('Std contains NaN, name: %s' % name)
-      dataset[name + 'sum1'] = sum1
-      dataset[name + 'sum2'] = sum2
+      dataset[name + 'sum1'] = s.sum1
+      dataset[name + 'sum2'] = s.sum2
       dataset[name + 'mean'] = mean
       dataset[name + 'std'] = std
 
-    # save all stats
+    # save all stats, 'mfcc_stats' -> 'mfcc_mean', 'mfcc_std', ...
     if len(stats) > 0:
-      for feat_name, (sum1, sum2) in stats.items():
-        save_mean_std(sum1, sum2, feat_name)
+      for feat_name, s in stats.items():
+        save_mean_std(s, feat_name[:-5])
         prog.add_notification('Saved statistics of: %s, shape: %s' %
                               (ctext(feat_name.split('_')[0], 'yellow'),
-                               ctext(str(sum1.shape), 'yellow')))
+                               ctext(str(np.shape(s.mean)), 'yellow')))
+    # CMVN statistics: group -> (mean, std)
+    for feat_name, groups in group_stats.items():
+      dataset[feat_name[:-5] + 'cmvn'] = {
+          g: (s.mean, s.std) for g, s in groups.items()
+      }
+      prog.add_notification('Saved CMVN statistics of: %s, #groups: %d' %
+                            (ctext(feat_name.split('_')[0], 'yellow'),
+                             len(groups)))
     # ====== dataset flush() ====== #
     dataset.flush()
     dataset.close()
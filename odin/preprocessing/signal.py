@@ -19,9 +19,11 @@ from __future__ import print_function, division, absolute_import
 
 import os
 import six
+import inspect
 import copy
 import warnings
 import subprocess
+import threading
 from io import BytesIO
 from numbers import Number
 from six import string_types
@@ -601,8 +603,8 @@ def mel_frequencies(n_mels=128, fmin=0.0, fmax=11025.0):
            8467.272,   9246.028,  10096.408,  11025.   ])
 
   """
-  min_mel = hz2mel(fmin)
-  max_mel = hz2mel(fmax)
+  min_mel = hz2mel(fmin)[0]
+  max_mel = hz2mel(fmax)[0]
   mels = np.linspace(min_mel, max_mel, n_mels)
   return mel2hz(mels)
 
@@ -781,8 +783,8 @@ def mel_filters(sr, n_fft, n_mels=128, fmin=0.0, fmax=None):
                          endpoint=True)
 
   # 'Center freqs' of mel bands - uniformly spaced between limits
-  min_mel = hz2mel(fmin)
-  max_mel = hz2mel(fmax)
+  min_mel = hz2mel(fmin)[0]
+  max_mel = hz2mel(fmax)[0]
   mel_f = mel2hz(mels=np.linspace(min_mel, max_mel, n_mels + 2))
 
   fdiff = np.diff(mel_f)
@@ -850,7 +852,97 @@ _fnorm1 = lambda x, x_stat, keepdims: x - x_stat.mean(axis=0, keepdims=keepdims)
 _fnorm2 = lambda x, x_stat, keepdims: ((x - x_stat.mean(axis=0, keepdims=keepdims)) /
                                        (x_stat.std(axis=0, keepdims=keepdims) + 1e-18))
 
-def mvn(x, varnorm=True, indices=None):
+class OnlineStatistics(object):
+  """ Mergeable mean and variance accumulator storing
+  (count, mean, M2), where M2 is the sum of squared deviation from the mean.
+
+  Each batch is reduced exactly in float64, and two accumulators are
+  combined using the parallel formula of Chan et al. in O(dim), so the
+  statistics can be computed locally by each worker then merged by the
+  parent process without loss of precision (unlike `sum2/N - mean^2`).
+
+  Parameters
+  ----------
+  x : {None, numpy.ndarray}
+      if given, initialize the statistics from `x`
+  axis : int (default: 0)
+      the axis for calculating the statistics
+  group : {None, string}
+      an optional tag (e.g. speaker or file name), `FeatureProcessor` merges
+      the statistics of the same group separately for CMVN.
+
+  Example
+  -------
+  >>> s = OnlineStatistics(x1).merge(OnlineStatistics(x2))
+  >>> s.mean, s.std  # same as numpy.concatenate([x1, x2]).std(0)
+  """
+
+  def __init__(self, x=None, axis=0, group=None):
+    super(OnlineStatistics, self).__init__()
+    self.count = 0
+    self.mean = 0.
+    self.m2 = 0.
+    self.group = group
+    if x is not None:
+      self.update(x, axis=axis)
+
+  def update(self, x, axis=0):
+    x = np.asarray(x)
+    n = x.shape[axis]
+    if n == 0:
+      return self
+    mean = np.mean(x, axis=axis, dtype='float64')
+    m2 = np.sum(np.power(x - np.expand_dims(mean, axis), 2),
+                axis=axis,
+                dtype='float64')
+    return self._merge(n, mean, m2)
+
+  def merge(self, other):
+    """ Combine with another `OnlineStatistics` in place """
+    return self._merge(other.count, other.mean, other.m2)
+
+  def _merge(self, n, mean, m2):
+    if n == 0:
+      return self
+    if self.count == 0:
+      self.count, self.mean, self.m2 = n, np.array(mean, dtype='float64'), \
+        np.array(m2, dtype='float64')
+      return self
+    total = self.count + n
+    delta = mean - self.mean
+    self.mean = self.mean + delta * (n / total)
+    self.m2 = self.m2 + m2 + np.power(delta, 2) * (self.count * n / total)
+    self.count = total
+    return self
+
+  def __iadd__(self, other):
+    return self.merge(other)
+
+  @property
+  def var(self):
+    return self.m2 / max(self.count, 1)
+
+  @property
+  def std(self):
+    return np.sqrt(self.var)
+
+  @property
+  def sum1(self):
+    return self.mean * self.count
+
+  @property
+  def sum2(self):
+    return self.m2 + np.power(self.mean, 2) * self.count
+
+  def __str__(self):
+    return '<OnlineStatistics count:%d shape:%s group:%s>' % \
+      (self.count, str(np.shape(self.mean)), str(self.group))
+
+  def __repr__(self):
+    return self.__str__()
+
+
+def mvn(x, varnorm=True, indices=None, mean=None, std=None):
   """ Mean and Variance Normalization
   Normalization is applied on time-axis
 
@@ -864,18 +956,38 @@ def mvn(x, varnorm=True, indices=None):
     `numpy.bool` array, the speech activities boolean indices,
     which frames will be taken into account for calculating
     the `mean` and `std`
+  mean : {None, numpy.ndarray} [f,]
+    precomputed mean (e.g. per-speaker CMVN statistics saved by
+    `FeatureProcessor`), if given, the data is not rescanned
+  std : {None, numpy.ndarray} [f,]
+    precomputed standard deviation, only used when `mean` is given
 
   Note
   ----
   Just standard normalization, not a big deal for its name
   """
+  if mean is not None:
+    x = x - mean
+    if varnorm:
+      if std is None:
+        raise ValueError("`std` must be given for precomputed variance "
+                         "normalization")
+      x = x / (std + 1e-18)
+    return x
   x_stat = x[indices] if indices is not None else x
   if varnorm:
     return _fnorm2(x, x_stat, True)
   else:
     return _fnorm1(x, x_stat, True)
 
-def wmvn(x, w=301, varnorm=True, indices=None):
+def _running_sum(x, start, w):
+  """ Sum of `x` over the windows `[start, start + w)` along the first
+  axis, O(T) using cumulative sums in float64 """
+  cumsum = np.zeros((x.shape[0] + 1,) + x.shape[1:], dtype='float64')
+  np.cumsum(x, axis=0, dtype='float64', out=cumsum[1:])
+  return cumsum[start + w] - cumsum[start]
+
+def wmvn(x, w=301, varnorm=True, indices=None, out=None):
   """ Windowed - Mean and Variance Normalization
   Normalization is applied on time-axis
 
@@ -891,37 +1003,52 @@ def wmvn(x, w=301, varnorm=True, indices=None):
     `numpy.bool` array, the speech activities boolean indices,
     which frames will be taken into account for calculating
     the `mean` and `std`
+  out : {None, numpy.ndarray} [t, f]
+    preallocated output buffer, by default, a new array with
+    the same dtype as `x` is returned
 
+  Note
+  ----
+  The statistics of all windows are computed in O(t * f) using
+  cumulative sums, the first and the last `w // 2` frames are
+  normalized using the first and the last window.
   """
   if w < 3 or (w & 1) != 1:
     raise ValueError('Window length should be an odd integer >= 3')
   nobs, ndim = x.shape
   if nobs < w:
-    return mvn(x, varnorm=varnorm, indices=indices)
-  fnorm = _fnorm2 if varnorm else _fnorm1
+    y = mvn(x, varnorm=varnorm, indices=indices)
+    if out is None:
+      return y
+    out[:] = y
+    return out
+  if out is None:
+    out = np.empty((nobs, ndim), dtype=x.dtype)
   # ====== init ====== #
   hlen = int((w - 1) / 2)
-  y = np.zeros((nobs, ndim), dtype=x.dtype)
-  # ====== first window ====== #
-  # applying indices
-  x_stat = x[:w] if indices is None else x[:w][indices[:w]]
-  # normalize
-  y[:hlen] = fnorm(x[:hlen], x_stat, True)
-  # ====== iterate ====== #
-  for ix in range(hlen, nobs - hlen):
-    # applying indices
-    if indices is None:
-      x_stat = x[ix - hlen:ix + hlen + 1]
-    else:
-      sad = indices[ix - hlen:ix + hlen + 1]
-      x_stat = x[ix - hlen:ix + hlen + 1][sad]
-    # normalize
-    y[ix] = fnorm(x[ix], x_stat, False)
-  # ====== last window ====== #
-  # applying indices
-  x_stat = x[nobs - w:] if indices is None else x[nobs - w:][indices[nobs - w:]]
-  y[nobs - hlen:nobs] = fnorm(x[nobs - hlen:nobs], x_stat, True)
-  return y
+  start = np.clip(np.arange(nobs) - hlen, 0, nobs - w)
+  # shifted by the global mean for numerical stability
+  x = x.astype('float64')
+  if indices is None:
+    x -= np.mean(x, axis=0)
+    count = float(w)
+    x_stat = x
+  else:
+    indices = np.asarray(indices, dtype=bool)
+    if np.any(indices):
+      x -= np.mean(x[indices], axis=0)
+    count = _running_sum(indices, start, w)[:, np.newaxis]
+    x_stat = x * indices[:, np.newaxis]
+  # ====== windowed statistics ====== #
+  with np.errstate(divide='ignore', invalid='ignore'):
+    mean = _running_sum(x_stat, start, w) / count
+    if varnorm:
+      var = _running_sum(np.square(x_stat), start, w) / count - mean**2
+    x -= mean
+    if varnorm:
+      x /= np.sqrt(np.maximum(var, 0.)) + 1e-18
+  out[:] = x
+  return out
 
 def rastafilt(x):
   """ Based on rastafile.m by Dan Ellis
@@ -990,8 +1117,13 @@ def smooth(x, win=11, window='hanning'):
   s = np.concatenate([2 * x[0] - x[win - 1::-1],
                       x,
                       2 * x[-1] - x[-1:-win:-1]], axis=0)
-  # moving average
+  # moving average, O(T) using cumulative sums
   if window == 'flat':
+    if len(s) >= win:
+      cumsum = np.zeros(len(s) + 1, dtype='float64')
+      np.cumsum(s, out=cumsum[1:])
+      start = np.arange(len(s) - 2 * win + 1) + (win - 1) // 2 + 1
+      return (cumsum[start + win] - cumsum[start]) / win
     w = np.ones(win, dtype='d')
   # windowing
   else:
@@ -1039,31 +1171,35 @@ def delta(data, width=9, order=1, axis=0):
   if order <= 0:
     raise ValueError('order must be a positive integer')
 
-  half_length = 1 + int(width // 2)
-  window = np.arange(half_length - 1., -half_length, -1.)
-
-  # Normalize the window so we're scale-invariant
-  window /= np.sum(np.abs(window)**2)
-
-  # Pad out the data by repeating the border values (delta=0)
-  padding = [(0, 0)] * data.ndim
-  width = int(width)
-  padding[axis] = (width, width)
-  delta_x = np.pad(data, padding, mode='edge')
-
+  # delta[t] = sum_{n=-N}^{N} n * x[t + n] / sum_{n=-N}^{N} n^2
+  N = int(width // 2)
+  weights = np.arange(-N, N + 1, dtype='float64')
+  weights /= np.sum(weights**2)
+  # ====== pad out the data by repeating the border values ====== #
+  # each order consumes `N` frames on both sides
+  x = np.moveaxis(data, axis, 0)
+  length = x.shape[0]
+  pad = order * N
+  delta_x = np.empty((length + 2 * pad,) + x.shape[1:], dtype='float64')
+  delta_x[:pad] = x[:1]
+  delta_x[pad:pad + length] = x
+  delta_x[pad + length:] = x[-1:]
   # ====== compute deltas ====== #
   all_deltas = []
-  for _ in range(order):
-    delta_x = signal.lfilter(window, 1, delta_x, axis=axis)
-    all_deltas.append(delta_x)
-  # ====== Cut back to the original shape of the input data ====== #
-  trim_deltas = []
-  for delta_x in all_deltas:
-    idx = [slice(None)] * delta_x.ndim
-    idx[axis] = slice(- half_length - data.shape[axis], - half_length)
-    delta_x = delta_x[idx]
-    trim_deltas.append(delta_x.astype('float32'))
-  return trim_deltas[0] if order == 1 else trim_deltas
+  for i in range(order):
+    n_frames = delta_x.shape[0] - 2 * N
+    # strided view of all windows [n_frames, ..., width], no copy
+    windows = as_strided(delta_x,
+                         shape=(n_frames,) + delta_x.shape[1:] + (2 * N + 1,),
+                         strides=delta_x.strides + delta_x.strides[:1])
+    d = np.matmul(windows, weights)
+    # ====== cut back to the original shape of the input data ====== #
+    trim = (order - i - 1) * N
+    all_deltas.append(
+        np.ascontiguousarray(np.moveaxis(d[trim:trim + length], 0, axis),
+                             dtype='float32'))
+    delta_x = d
+  return all_deltas[0] if order == 1 else all_deltas
 
 def shifted_deltas(x, N=7, d=1, P=3, k=7):
   """ Calculate Shifted Delta Coefficients
@@ -1074,20 +1210,18 @@ def shifted_deltas(x, N=7, d=1, P=3, k=7):
   x: [t, f]
       time x frequency
   """
-  x = x.T
   if d < 1:
     raise ValueError('d should be an integer >= 1')
-  nobs = x.shape[1]
-  x = x[:N]
-  w = 2 * d + 1
-  dx = delta(x, w, order=1, axis=-1)
-  sdc = np.empty((k * N, nobs))
-  sdc[:] = np.tile(dx[:, -1], k).reshape(k * N, 1)
+  nobs = x.shape[0]
+  dx = delta(x[:, :N], 2 * d + 1, order=1, axis=0)
+  sdc = np.empty((nobs, k * N))
   for ix in range(k):
-    if ix * P > nobs:
-      break
-    sdc[ix * N:(ix + 1) * N, :nobs - ix * P] = dx[:, ix * P:nobs]
-  return sdc.T
+    # the shifted frames out of the range repeat the last delta
+    shift = min(ix * P, nobs)
+    block = sdc[:, ix * N:(ix + 1) * N]
+    block[:nobs - shift] = dx[shift:]
+    block[nobs - shift:] = dx[-1]
+  return sdc
 
 @cache_memory('__strict__')
 def pad_center(data, size, axis=-1, **kwargs):
@@ -1432,13 +1566,268 @@ def get_energy(frames, log=True):
   ------
   E : ndarray [shape=(nb_frames,), dtype=float32]
   """
-  log_energy = (frames**2).sum(axis=1)
+  log_energy = np.einsum('...i,...i->...', frames, frames)
   log_energy = np.where(log_energy == 0., np.finfo(np.float32).eps,
                         log_energy)
   if log:
     log_energy = np.log(log_energy)
   return np.expand_dims(log_energy.astype('float32'), -1)
 
+_SPECTRAL_PLANS = {}
+_RFFT_OUT = 'out' in inspect.signature(np.fft.rfft).parameters
+
+def _power2db_inplace(S, amin=1e-10, top_db=80.0):
+  """ In-place `power2db` of a non-negative power spectrogram with
+  `ref=1.0` """
+  np.maximum(S, amin, out=S)
+  np.log10(S, out=S)
+  S *= 10.0
+  if top_db is not None:
+    if top_db < 0:
+      raise ValueError('top_db must be non-negative')
+    np.maximum(S, S.max() - top_db, out=S)
+  return S
+
+class SpectralPlan(object):
+  """ Precomputed window, mel filter banks and DCT basis for extracting
+  spectra of many utterances with the same configuration.
+
+  The plan also keeps scratch buffers (one set per thread) for the framed
+  signal and the FFT output, and `spectra` fuses windowing, power, mel, log and DCT
+  into a single pass without intermediate copies.
+
+  Parameters
+  ----------
+  sr : {None, int}
+      sample rate, required for mel filter banks
+  frame_length : {None, int}
+      number of samples point for 1 frame, required for STFT
+  step_length : {None, int}
+      number of samples point for 1 step, default `frame_length // 4`
+  n_fft : {None, int}
+      FFT window size, by default, the smallest power of 2 enclosing
+      `frame_length`
+  n_mels : {None, int}
+      number of mel-filter bands
+  fmin : int
+      min frequency for mel-filter bands
+  fmax : {None, int}
+      max frequency for mel-filter bands, if None, `sr // 2`
+  n_ceps : {None, int}
+      number of cepstral coefficients (excluding the first one)
+  window : string, tuple, number, function, or np.ndarray
+      window specification, see `get_window`, None for no windowing
+
+  Note
+  ----
+  Use `get_spectral_plan` to share the same plan for all calls within a
+  process, a plan is pickled without its buffers so each worker process
+  creates its own. The scratch buffers are local to each thread, so a
+  plan (and the module functions using it) could be shared by threads.
+  The mel filter banks are stored only for the range of FFT bins
+  with non-zero weights.
+  """
+
+  def __init__(self, sr=None, frame_length=None, step_length=None,
+               n_fft=None, n_mels=None, fmin=64, fmax=None, n_ceps=None,
+               window='hann'):
+    super(SpectralPlan, self).__init__()
+    self.sr = sr
+    self.frame_length = None if frame_length is None else int(frame_length)
+    if step_length is None and frame_length is not None:
+      step_length = self.frame_length // 4
+    self.step_length = None if step_length is None else int(step_length)
+    if n_fft is None and frame_length is not None:
+      n_fft = int(2**np.ceil(np.log(frame_length) / np.log(2.0)))
+    self.n_fft = None if n_fft is None else int(n_fft)
+    if None not in (self.n_fft, self.frame_length) and \
+    self.n_fft < self.frame_length:
+      raise ValueError('n_fft must be greater than or equal to `frame_length`.')
+    self.n_mels = None if n_mels is None else int(n_mels)
+    self.fmin = fmin
+    self.fmax = fmax
+    self.n_ceps = None if n_ceps is None else int(n_ceps)
+    self.window = window
+    self._window = None
+    self._mel_basis = None
+    self._dct_basis = None
+    self._local = threading.local()
+
+  def __getstate__(self):
+    return (self.sr, self.frame_length, self.step_length, self.n_fft,
+            self.n_mels, self.fmin, self.fmax, self.n_ceps, self.window)
+
+  def __setstate__(self, states):
+    self.__init__(*states)
+
+  def _require(self, *names):
+    for name in names:
+      if getattr(self, name) is None:
+        raise ValueError("`%s` of the SpectralPlan must be given" % name)
+
+  def _scratch(self, name, shape, dtype, zeros=False):
+    """ Reusable buffer, grown when the requested size is bigger """
+    size = int(np.prod(shape))
+    buffers = self._local.__dict__.setdefault('buffers', {})
+    buf = buffers.get(name, None)
+    if buf is None or buf.dtype != dtype or buf.size < size:
+      buf = np.zeros(size, dtype=dtype) if zeros else np.empty(size, dtype=dtype)
+      buffers[name] = buf
+    return buf[:size].reshape(shape)
+
+  # ==================== precomputed filters ==================== #
+  @property
+  def fft_window(self):
+    """ 1-D window of `frame_length` (None if no windowing) """
+    if self._window is None and self.window is not None:
+      self._require('frame_length')
+      self._window = np.asarray(
+          get_window(self.window, self.frame_length, periodic=True),
+          dtype='float64')
+    return self._window
+
+  @property
+  def scale(self):
+    """ Default scale of the STFT matrix """
+    if self.window is None:
+      return np.sqrt(1.0 / self.frame_length**2)
+    return np.sqrt(1.0 / self.fft_window.sum()**2)
+
+  @property
+  def mel_basis(self):
+    """ (first_bin, weights) the mel filter banks `[n_bins, n_mels]` for
+    the FFT bins `first_bin:first_bin + n_bins` """
+    if self._mel_basis is None:
+      self._require('sr', 'n_fft', 'n_mels')
+      fmax = self.sr // 2 if self.fmax is None else self.fmax
+      weights = mel_filters(self.sr, n_fft=self.n_fft, n_mels=self.n_mels,
+                            fmin=self.fmin, fmax=fmax)
+      bins = np.flatnonzero(np.any(weights != 0, axis=0))
+      start, end = (bins[0], bins[-1] + 1) if len(bins) > 0 else (0, 1)
+      self._mel_basis = (start,
+                         np.ascontiguousarray(weights[:, start:end].T))
+    return self._mel_basis
+
+  @property
+  def dct_basis(self):
+    """ DCT basis `[n_mels, n_ceps + 1]` including the first coefficient """
+    if self._dct_basis is None:
+      self._require('n_mels', 'n_ceps')
+      self._dct_basis = np.ascontiguousarray(
+          dct_filters(self.n_ceps + 1, self.n_mels).T)
+    return self._dct_basis
+
+  # ==================== transformation ==================== #
+  def framing(self, y, padding=False):
+    """ Return windowed frames `[n_frames, frame_length]` of signal `y`,
+    or of the already framed signal, stored in the scratch buffer """
+    return self._framing(y, padding)[:, :self.frame_length]
+
+  def _framing(self, y, padding):
+    """ Windowed frames zero-padded to `[n_frames, n_fft]` """
+    self._require('frame_length')
+    if y.ndim == 2 and y.shape[1] > 2:
+      frames = y
+    else:
+      if padding:
+        y = np.pad(y, int(self.frame_length // 2), mode='constant')
+      if y.ndim == 1:
+        n = max(0, 1 + (len(y) - self.frame_length) // self.step_length)
+        frames = as_strided(y, shape=(n, self.frame_length),
+                            strides=(y.strides[0] * self.step_length,
+                                     y.strides[0]))
+      else:
+        shape = y.shape[:-1] + (y.shape[-1] - self.frame_length + 1,
+                                self.frame_length)
+        frames = as_strided(y, shape=shape, strides=y.strides + y.strides[-1:])
+        frames = np.rollaxis(frames, 1)[::self.step_length]
+    # the zero padded part of the buffer is never written
+    out = self._scratch('frames', (len(frames), self.n_fft), np.float64,
+                        zeros=True)
+    if self.fft_window is None:
+      out[:, :self.frame_length] = frames
+    else:
+      np.multiply(frames, self.fft_window, out=out[:, :self.frame_length])
+    return out
+
+  def stft(self, y, scale=None, padding=False, energy=False):
+    """ Same as `odin.preprocessing.signal.stft` """
+    frames = self._framing(y, padding)
+    if energy:
+      log_energy = get_energy(frames[:, :self.frame_length], log=True)
+    S = np.fft.rfft(frames, axis=-1)
+    S *= self.scale if scale is None else float(scale)
+    if energy:
+      return S, log_energy
+    return S
+
+  def mels(self, spec, top_db=80.0):
+    """ Same as `odin.preprocessing.signal.mels_spectrogram` """
+    start, weights = self.mel_basis
+    mspec = np.dot(spec[:, start:start + weights.shape[0]], weights)
+    return _power2db_inplace(mspec, top_db=top_db)
+
+  def ceps(self, mspec, remove_first_coef=True):
+    """ Same as `odin.preprocessing.signal.ceps_spectrogram` """
+    mfcc = np.dot(mspec, self.dct_basis)
+    return mfcc[:, 1:] if remove_first_coef else mfcc[:, :-1]
+
+  def spectra(self, y, power=2.0, log=True, top_db=80.0, padding=False):
+    """ Fused spectra extraction, return the same dictionary as
+    `odin.preprocessing.signal.spectra` """
+    power = int(power)
+    frames = self._framing(y, padding)
+    log_energy = get_energy(frames[:, :self.frame_length], log=True)
+    # ====== power spectrum ====== #
+    n_bins = self.n_fft // 2 + 1
+    if _RFFT_OUT:
+      S = np.fft.rfft(frames, axis=-1,
+                      out=self._scratch('rfft', (len(frames), n_bins),
+                                        np.complex128))
+    else:
+      S = np.fft.rfft(frames, axis=-1)
+    spec = self._scratch('power', S.shape, np.float64)
+    tmp = self._scratch('imag', S.shape, np.float64)
+    np.multiply(S.real, S.real, out=spec)
+    np.multiply(S.imag, S.imag, out=tmp)
+    spec += tmp
+    spec *= self.scale**2
+    if power != 2:
+      np.power(spec, max(power, 1) / 2., out=spec)
+    # ====== mel filter banks and cepstrum ====== #
+    mel_spec = None
+    mfcc = None
+    if self.n_mels is not None:
+      mel_spec = self.mels(spec, top_db=top_db)
+      if self.n_ceps is not None:
+        mfcc = self.ceps(mel_spec, remove_first_coef=True)
+    if log:
+      spec = _power2db_inplace(spec, top_db=top_db)
+    return {
+        'spec': spec.astype('float32'),
+        'energy': log_energy,
+        'mspec': None if mel_spec is None else mel_spec.astype('float32'),
+        'mfcc': None if mfcc is None else mfcc.astype('float32')
+    }
+
+def get_spectral_plan(sr=None, frame_length=None, step_length=None,
+                      n_fft=None, n_mels=None, fmin=64, fmax=None,
+                      n_ceps=None, window='hann'):
+  """ Return the `SpectralPlan` of given configuration, the plans are
+  cached in the memory of each process, except for windows given as
+  a function or an array """
+  key = (sr, frame_length, step_length, n_fft, n_mels, fmin, fmax, n_ceps,
+         window)
+  try:
+    plan = _SPECTRAL_PLANS.get(key, None)
+  except TypeError:  # unhashable window
+    return SpectralPlan(*key)
+  if plan is None:
+    plan = SpectralPlan(*key)
+    if not hasattr(window, '__call__'):
+      _SPECTRAL_PLANS[key] = plan
+  return plan
+
 def stft(y,
          frame_length=None, step_length=None, n_fft=None,
          window='hann', scale=None,
@@ -1523,44 +1912,11 @@ def stft(y,
     n_fft = int(2**np.ceil(np.log(frame_length) / np.log(2.0)))
   elif n_fft < frame_length:
     raise ValueError('n_fft must be greater than or equal to `frame_length`.')
-  # ====== doing framing on raw signal ====== #
-  if frames is None:
-    # check if padding zeros
-    if padding:
-      y = np.pad(y, int(frame_length // 2), mode='constant')
-    # framing the signal
-    shape = y.shape[:-1] + (y.shape[-1] - frame_length + 1, frame_length)
-    strides = y.strides + (y.strides[-1],)
-    y_frames = np.lib.stride_tricks.as_strided(y, shape=shape, strides=strides)
-    if y_frames.ndim > 2:
-      y_frames = np.rollaxis(y_frames, 1)
-    # [n_frames, frame_length]
-    y_frames = y_frames[::step_length]
-  else:
-    y_frames = frames
-  # ====== prepare the window function ====== #
-  if window is not None:
-    fft_window = get_window(window, frame_length, periodic=True
-        ).reshape(1, -1)
-    y_frames = fft_window * y_frames
-    # scaling factor
-    scale = np.sqrt(1.0 / fft_window.sum()**2) if scale is None else float(scale)
-  else:
-    scale = np.sqrt(1.0 / frame_length**2) if scale is None else float(scale)
-  # ====== calculate frames energy ====== #
-  if energy:
-    log_energy = get_energy(y_frames, log=True).astype('float32')
-  # ====== STFT matrix ====== #
-  # norm='ortho' ?
-  S = np.fft.rfft(a=y_frames, n=n_fft, axis=-1)
-  # this scale is important for iSTFT reconstruct original signal
-  if scale is not None:
-    S *= scale
-  # return in form (t, d)
-  if energy:
-    return S, log_energy
-  return S
-
+  # ====== STFT using the cached plan ====== #
+  plan = get_spectral_plan(frame_length=frame_length, step_length=step_length,
+                           n_fft=n_fft, window=window)
+  return plan.stft(y if frames is None else frames, scale=scale,
+                   padding=padding, energy=energy)
 
 def istft(stft_matrix, frame_length, step_length=None,
           window='hann', padding=False):
@@ -1681,14 +2037,11 @@ def mels_spectrogram(spec, sr, n_mels,
     raise ValueError("fmin must < fmax, but fmin=%d and fmax=%d" %
                      (fmin, fmax))
   # ====== mel transform ====== #
-  mel_basis = mel_filters(sr,
-      n_fft=n_fft, n_mels=24 if n_mels is None else int(n_mels),
-      fmin=fmin, fmax=fmax)
-  # transpose to (nb_samples; nb_mels)
-  mel_spec = np.dot(mel_basis, spec.T)
-  mel_spec = mel_spec.T
-  mel_spec = power2db(mel_spec, top_db=top_db)
-  return mel_spec
+  plan = get_spectral_plan(sr=sr, n_fft=n_fft,
+                           n_mels=24 if n_mels is None else int(n_mels),
+                           fmin=fmin, fmax=fmax)
+  # (nb_samples; nb_mels)
+  return plan.mels(spec, top_db=top_db)
 
 def ceps_spectrogram(mspec, n_ceps, remove_first_coef=True):
   """ Compute the MFCCs coefficients (cepstrum analysis)
@@ -1705,15 +2058,8 @@ def ceps_spectrogram(mspec, n_ceps, remove_first_coef=True):
     if True remove the first coefficient of the extracted MFCCs
 
   """
-  if remove_first_coef:
-    n_ceps = int(n_ceps) + 1
-    dct_basis = dct_filters(n_ceps, mspec.shape[1])
-    mfcc = np.dot(dct_basis, mspec.T)[1:, :].T
-  else:
-    n_ceps = int(n_ceps)
-    dct_basis = dct_filters(n_ceps, mspec.shape[1])
-    mfcc = np.dot(dct_basis, mspec.T).T
-  return mfcc
+  plan = get_spectral_plan(n_mels=mspec.shape[1], n_ceps=int(n_ceps))
+  return plan.ceps(mspec, remove_first_coef=remove_first_coef)
 
 def spectra(sr, frame_length, y=None, S=None,
             step_length=None, n_fft=512, window='hann',
@@ -1787,15 +2133,6 @@ def spectra(sr, frame_length, y=None, S=None,
   a sequence of speech features at once.
 
   """
-  mel_spec = None
-  mfcc = None
-  log_energy = None
-  # ====== compute STFT if needed ====== #
-  if S is None:
-    S, log_energy = stft(y, frame_length=frame_length,
-                         step_length=step_length, n_fft=n_fft,
-                         window=window, padding=padding, energy=True)
-  n_fft = int(2 * (S.shape[1] - 1))
   # ====== check arguments ====== #
   power = int(power)
   # check fmax
@@ -1808,25 +2145,33 @@ def spectra(sr, frame_length, y=None, S=None,
   if fmin >= fmax:
     raise ValueError("fmin must < fmax, but fmin=%d and fmax=%d" %
                      (fmin, fmax))
+  if n_ceps is not None and n_mels is None:
+    n_mels = 24
+  # ====== fused extraction from the signal ====== #
+  if S is None:
+    plan = get_spectral_plan(sr=sr, frame_length=frame_length,
+                             step_length=step_length, n_fft=n_fft,
+                             n_mels=n_mels, fmin=fmin, fmax=fmax,
+                             n_ceps=n_ceps, window=window)
+    return plan.spectra(y, power=power, log=log, top_db=top_db,
+                        padding=padding)
   # ====== extract the basic spectrogram ====== #
-  if 'complex' in str(S.dtype): # get magnitude from STFT
-    spec = np.abs(S)
+  plan = get_spectral_plan(sr=sr, n_fft=int(2 * (S.shape[1] - 1)),
+                           n_mels=n_mels, fmin=fmin, fmax=fmax, n_ceps=n_ceps)
+  spec = np.abs(S) if 'complex' in str(S.dtype) else S
   if power > 1:
     spec = np.power(spec, power)
   # ====== extrct mel-filter-bands features ====== #
-  if n_mels is not None or n_ceps is not None:
-    mel_spec = mels_spectrogram(spec, sr, n_mels)
+  mel_spec = None if n_mels is None else plan.mels(spec, top_db=top_db)
   # ====== extract cepstrum features ====== #
-  # extract MFCC
-  if n_ceps is not None:
-    mfcc = ceps_spectrogram(mel_spec, n_ceps)
+  mfcc = None if n_ceps is None else plan.ceps(mel_spec)
   # applying log to convert to db
   if log:
     spec = power2db(spec, top_db=top_db)
   # ====== return result ====== #
   results = {}
   results['spec'] = spec.astype('float32')
-  results['energy'] = log_energy
+  results['energy'] = None
   results['mspec'] = None if mel_spec is None else mel_spec.astype('float32')
   results['mfcc'] = None if mfcc is None else mfcc.astype('float32')
   return results
@@ -55,7 +55,7 @@ from six import string_types
 from bigarray import MmapArray
 from odin.fuel import Dataset, MmapDict
 from odin.preprocessing._opensmile import *
-from odin.preprocessing.base import Extractor, ExtractorSignal
+from odin.preprocessing.base import Extractor, ExtractorSignal, _concat_ragged
 from odin.preprocessing.signal import (
     anything2wav, ceps_spectrogram, get_energy, get_window, mels_spectrogram,
     mvn, pitch_track, power2db, power_spectrogram, pre_emphasis, rastafilt,
@@ -220,6 +220,25 @@ def _extract_frame_step_length(sr, frame_length, step_length):
   return frame_length, step_length
 
 
+def _framing(y, frame_length, step_length, padding):
+  """ Return a strided view [n_frames, frame_length] of signal `y` """
+  if padding:
+    y = np.pad(y, int(frame_length // 2), mode='constant')
+  shape = y.shape[:-1] + (y.shape[-1] - frame_length + 1, frame_length)
+  strides = y.strides + (y.strides[-1],)
+  y_frames = np.lib.stride_tricks.as_strided(y, shape=shape, strides=strides)
+  if y_frames.ndim > 2:
+    y_frames = np.rollaxis(y_frames, 1)
+  return y_frames[::step_length]
+
+
+def _unique_value(X, name):
+  """ Return the value of feature `name` if it is the same for all inputs
+  (e.g. the sample rate), otherwise, None """
+  values = set(x[name] for x in X)
+  return values.pop() if len(values) == 1 else None
+
+
 @cache_memory
 def _num_two_factors(x):
   """return number of times x is divideable for 2"""
@@ -597,16 +616,28 @@ class Framing(Extractor):
     y, sr = [y_sr[name] for name in self.input_name]
     frame_length, step_length = _extract_frame_step_length(
         sr, self.frame_length, self.step_length)
-    # ====== check if padding zeros ====== #
-    if self.padding:
-      y = np.pad(y, int(frame_length // 2), mode='constant')
     # ====== framing the signal ====== #
-    shape = y.shape[:-1] + (y.shape[-1] - frame_length + 1, frame_length)
-    strides = y.strides + (y.strides[-1],)
-    y_frames = np.lib.stride_tricks.as_strided(y, shape=shape, strides=strides)
-    if y_frames.ndim > 2:
-      y_frames = np.rollaxis(y_frames, 1)
-    y_frames = y_frames[::step_length]  # [n, frame_length]
+    y_frames = _framing(y, frame_length, step_length,
+                        self.padding)  # [n, frame_length]
+    return self._windowing(y_frames, frame_length)
+
+  def _transform_batch(self, X):
+    sr = _unique_value(X, self.input_name[1])
+    if sr is None:
+      return [self._transform(x) for x in X]
+    frame_length, step_length = _extract_frame_step_length(
+        sr, self.frame_length, self.step_length)
+    y_frames, offsets = _concat_ragged([
+        _framing(x[self.input_name[0]], frame_length, step_length,
+                 self.padding) for x in X
+    ])
+    ret = self._windowing(y_frames, frame_length)
+    return [{
+        self.output_name: frames,
+        'scale': ret['scale']
+    } for frames in np.split(ret[self.output_name], offsets, axis=0)]
+
+  def _windowing(self, y_frames, frame_length):
     # ====== prepare the window function ====== #
     if self.window is not None:
       fft_window = get_window(self.window, frame_length,
@@ -648,6 +679,11 @@ class CalculateEnergy(Extractor):
     energy = get_energy(frames, log=self.log).astype('float32')
     return {self.output_name: energy}
 
+  def _transform_batch(self, X):
+    frames, offsets = _concat_ragged([x[self.input_name] for x in X])
+    energy = get_energy(frames, log=self.log).astype('float32')
+    return [{self.output_name: e} for e in np.split(energy, offsets, axis=0)]
+
 
 # ===========================================================================
 # Spectrogram
@@ -744,6 +780,40 @@ class STFTExtractor(Extractor):
     else:
       return {self.output_name: results}
 
+  def _transform_batch(self, X):
+    # all frames of the batch are transformed by a single FFT
+    sr = _unique_value(X, self.input_name[1])
+    if sr is None or self.frame_length is None or \
+      isinstance(self.scale, string_types):
+      return [self._transform(x) for x in X]
+    frame_length, step_length = _extract_frame_step_length(
+        sr, self.frame_length, self.step_length)
+    frames = []
+    for x in X:
+      y = x[self.input_name[0]]
+      if y.ndim == 2 and y.shape[1] > 2:  # already framed
+        frames.append(y)
+      else:
+        frames.append(_framing(y, frame_length, step_length, self.padding))
+    frames, offsets = _concat_ragged(frames)
+    results = stft(y=frames,
+                   frame_length=frame_length,
+                   step_length=step_length,
+                   n_fft=self.n_fft,
+                   window=self.window,
+                   scale=self.scale,
+                   padding=False,
+                   energy=self.energy)
+    if self.energy:
+      return [{
+          self.output_name: s,
+          '%s_energy' % self.output_name: e
+      } for s, e in zip(np.split(results[0], offsets, axis=0),
+                        np.split(results[1], offsets, axis=0))]
+    return [{
+        self.output_name: s
+    } for s in np.split(results, offsets, axis=0)]
+
 
 class PowerSpecExtractor(Extractor):
   """ Extract power spectrogram from complex STFT array
@@ -762,6 +832,10 @@ class PowerSpecExtractor(Extractor):
   def _transform(self, X):
     return power_spectrogram(S=X[self.input_name], power=self.power)
 
+  def _transform_batch(self, X):
+    S, offsets = _concat_ragged([x[self.input_name] for x in X])
+    return np.split(power_spectrogram(S=S, power=self.power), offsets, axis=0)
+
 
 class MelsSpecExtractor(Extractor):
   """
@@ -801,6 +875,27 @@ class MelsSpecExtractor(Extractor):
                             fmax=self.fmax,
                             top_db=self.top_db)
 
+  def _transform_batch(self, X):
+    sr = _unique_value(X, self.input_name[1])
+    if sr is None or any(len(x[self.input_name[0]]) == 0 for x in X):
+      return [self._transform(x) for x in X]
+    spec, offsets = _concat_ragged([x[self.input_name[0]] for x in X])
+    mspec = mels_spectrogram(spec=spec,
+                             sr=sr,
+                             n_mels=self.n_mels,
+                             fmin=self.fmin,
+                             fmax=self.fmax,
+                             top_db=None)
+    # `top_db` is relative to the peak of each utterance
+    if self.top_db is not None:
+      if self.top_db < 0:
+        raise ValueError('top_db must be non-negative')
+      peak = np.maximum.reduceat(mspec.max(axis=1), np.r_[0, offsets])
+      floor = np.repeat(peak - self.top_db, np.diff(np.r_[0, offsets,
+                                                          len(mspec)]))
+      mspec = np.maximum(mspec, floor[:, None])
+    return np.split(mspec, offsets, axis=0)
+
 
 class MFCCsExtractor(Extractor):
   """
@@ -819,12 +914,21 @@ class MFCCsExtractor(Extractor):
     self.first_coef_energy = bool(first_coef_energy)
 
   def _transform(self, X):
+    return self._ceps(X[self.input_name])
+
+  def _transform_batch(self, X):
+    mspec, offsets = _concat_ragged([x[self.input_name] for x in X])
+    ret = self._ceps(mspec)
+    return [
+        dict(zip(ret.keys(), values))
+        for values in zip(*[np.split(v, offsets, axis=0) for v in ret.values()])
+    ]
+
+  def _ceps(self, mspec):
     n_ceps = self.n_ceps
     if self.remove_first_coef:
       n_ceps += 1
-    mfcc = ceps_spectrogram(mspec=X[self.input_name],
-                            n_ceps=n_ceps,
-                            remove_first_coef=False)
+    mfcc = ceps_spectrogram(mspec=mspec, n_ceps=n_ceps, remove_first_coef=False)
     ret = {self.output_name: mfcc[:, 1:] if self.remove_first_coef else mfcc}
     if self.first_coef_energy:
       ret['%s_energy' % self.output_name] = mfcc[:, 0]
@@ -1296,10 +1400,10 @@ class PitchExtractor(Extractor):
 # ===========================================================================
 # SAD
 # ===========================================================================
-def _numba_thresholding(energy, energy_threshold, energy_mean_scale,
-                        frame_context, proportion_threshold):
-  """ Using this numba function if at least 5 time faster than
-  python/numpy implementation """
+def _sad_thresholding(energy, energy_threshold, energy_mean_scale,
+                      frame_context, proportion_threshold):
+  """ The number of frames above the threshold within each context
+  window is computed in O(T) using cumulative sums """
   n_frames = len(energy)
   # ====== normalize to [0, 1] ====== #
   e_min = np.min(energy)
@@ -1309,29 +1413,17 @@ def _numba_thresholding(energy, energy_threshold, energy_mean_scale,
   if energy_mean_scale != 0:
     energy_threshold += energy_mean_scale * np.sum(energy) / n_frames
   # ====== thresholding ====== #
-  sad = np.empty(shape=(n_frames,))
-  for t in range(n_frames):
-    num_count = 0
-    den_count = 0
-    for t2 in range(t - frame_context, t + frame_context + 1):
-      if 0 <= t2 < n_frames:
-        den_count += 1
-        if energy[t2] > energy_threshold:
-          num_count += 1
-    if num_count >= den_count * proportion_threshold:
-      sad[t] = 1
-    else:
-      sad[t] = 0
+  active = np.zeros(shape=(n_frames + 1,), dtype='int64')
+  np.cumsum(energy > energy_threshold, out=active[1:])
+  t = np.arange(n_frames)
+  start = np.maximum(t - frame_context, 0)
+  end = np.minimum(t + frame_context + 1, n_frames)
+  num_count = active[end] - active[start]
+  den_count = end - start
+  sad = (num_count >= den_count * proportion_threshold).astype('float64')
   return sad, energy_threshold
 
 
-try:
-  import numba as nb
-  _numba_thresholding = nb.jit(nopython=True, nogil=True)(_numba_thresholding)
-except ImportError as e:
-  pass
-
-
 class SADthreshold(Extractor):
   """ Compute voice-activity vector for a file: 1 if we judge the frame as
   voiced, 0 otherwise.  There are no continuity constraints.
@@ -1347,8 +1439,8 @@ class SADthreshold(Extractor):
   for automatic speech recognition (ASR) because it makes independent
   decisions for each frame without imposing any notion of continuity.
 
-  This function is optimized by numba, hence, the performance is
-  comparable to kaldi-C code
+  The context windows are computed in O(T) using cumulative sums,
+  hence, the performance is comparable to kaldi-C code
 
   Parameters
   ----------
@@ -1418,11 +1510,11 @@ class SADthreshold(Extractor):
     if energy.ndim > 1:
       energy = np.squeeze(energy)
     assert energy.ndim == 1, "Only support 1-D energy"
-    sad, energy_threshold = _numba_thresholding(energy.astype('float32'),
-                                                self.energy_threshold,
-                                                self.energy_mean_scale,
-                                                self.frame_context,
-                                                self.proportion_threshold)
+    sad, energy_threshold = _sad_thresholding(energy.astype('float32'),
+                                              self.energy_threshold,
+                                              self.energy_mean_scale,
+                                              self.frame_context,
+                                              self.proportion_threshold)
     sad = sad.astype('uint8')
     # ====== smooth the sad ====== #
     if self.smooth_window > 0:
@@ -1540,14 +1632,22 @@ class AcousticNorm(Extractor):
   mean_var_norm : bool (default: True)
     mean-variance normalization
   windowed_mean_var_norm : bool (default: False)
-    perform standardization on small windows, very computaiton
-    intensive.
+    perform standardization on sliding windows of `win_length` frames,
+    the windowed statistics are computed in linear time.
   sad_name : {str, None} (default: None)
     feature name of SAD indices, and only using statistics from
     SAD indexed frames for normalization
   ignore_sad_error : bool
     if True, when length of SAD and feature mismatch, still perform
     normalization, otherwise raise `RuntimeError`.
+  cmvn : {None, Mapping}
+    precomputed CMVN statistics, mapping from feature name to a dictionary
+    `group -> (mean, std)`, i.e. `Dataset['mspec_cmvn']` saved by
+    `FeatureProcessor` using `RunningStatistics(group_name=...)`.
+    The features of unknown group are normalized by their own statistics.
+  cmvn_key : str (default: 'name')
+    name of the feature identifying the group in `cmvn`
+    (e.g. 'spkid' for per-speaker CMVN)
 
   """
 
@@ -1559,7 +1659,9 @@ class AcousticNorm(Extractor):
                win_length=301,
                var_norm=True,
                sad_name=None,
-               ignore_sad_error=True):
+               ignore_sad_error=True,
+               cmvn=None,
+               cmvn_key='name'):
     # ====== check which features will be normalized ====== #
     self.sad_name = str(sad_name) if isinstance(sad_name,
                                                 string_types) else None
@@ -1578,6 +1680,9 @@ class AcousticNorm(Extractor):
     if win_length < 3:
       raise ValueError("win_length must >= 3")
     self.win_length = win_length
+    # ====== precomputed statistics ====== #
+    self.cmvn = cmvn
+    self.cmvn_key = str(cmvn_key)
 
   def _transform(self, feat):
     # ====== check SAD indices ====== #
@@ -1601,7 +1706,13 @@ class AcousticNorm(Extractor):
           X_sad = None
       # mean-variance normalization
       if self.mean_var_norm:
-        X = mvn(X, varnorm=self.var_norm, indices=X_sad)
+        stats = None
+        if self.cmvn is not None and name in self.cmvn:
+          stats = self.cmvn[name].get(str(feat.get(self.cmvn_key, None)))
+        if stats is not None:
+          X = mvn(X, varnorm=self.var_norm, mean=stats[0], std=stats[1])
+        else:
+          X = mvn(X, varnorm=self.var_norm, indices=X_sad)
       # windowed normalization
       if self.windowed_mean_var_norm:
         X = wmvn(X, w=self.win_length, varnorm=False, indices=X_sad)
@@ -26,9 +26,10 @@ import numpy
 
 from odin.utils import crypto, decorators, mpi
 from odin.utils.cache_utils import *
-from odin.utils.crypto import md5_checksum, md5_folder, MD5object
-from odin.utils.mpi import (MPI, SharedCounter, async_mpi, async_thread,
-                            segment_list)
+from odin.utils.crypto import (MD5object, fast_checksum, md5_checksum,
+                               md5_folder)
+from odin.utils.mpi import (MPI, SharedArray, SharedCounter, WorkerPool,
+                            async_mpi, async_thread, segment_list)
 from odin.utils.net_utils import *
 from odin.utils.np_utils import *
 from odin.utils.ordered_flag import OrderedFlag
@@ -2,8 +2,10 @@ from __future__ import absolute_import, division, print_function
 
 import inspect
 import os
+import pickle
 import shutil
 from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
 from functools import lru_cache, wraps
 
 import numpy as np
@@ -11,7 +13,15 @@ from decorator import FunctionMaker
 from six import string_types
 from six.moves import builtins
 
-__all__ = ['lru_cache', 'cache_disk', 'cache_memory']
+try:
+  import fcntl
+except ImportError:  # Windows
+  fcntl = None
+
+__all__ = [
+    'lru_cache', 'cache_disk', 'cache_memory', 'DiskLRUCache', 'MmapLRUCache',
+    'file_lock'
+]
 
 # to set the cache dir, set the environment CACHE_DIR
 __cache_dir = os.environ.get(
@@ -225,3 +235,302 @@ def cache_memory(func, *attrs):
   if func is None:
     return wrap_function
   return wrap_function(func)
+
+
+# ===========================================================================
+# Content-addressed disk cache
+# ===========================================================================
+_MISSING = object()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+  r""" Inter-process lock using `flock` on the given file (created if not
+  exist), the lock is released when exiting the context.
+
+  Note:
+    on platform without `fcntl` (i.e. Windows), no locking is performed.
+  """
+  while True:
+    f = open(path, 'a')
+    if fcntl is None:
+      break
+    fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+    # the lock file was removed (i.e. its entry evicted) while waiting
+    try:
+      if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+        break
+    except OSError:
+      pass
+    f.close()
+  try:
+    yield f
+  finally:
+    if fcntl is not None:
+      fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    f.close()
+
+
+def _remove_lock(path):
+  r""" Remove the lock file if it is not held by any process """
+  try:
+    f = open(path, 'r')
+  except (IOError, OSError):
+    return
+  with f:
+    if fcntl is not None:
+      try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+      except (IOError, OSError):  # in use
+        return
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+
+class DiskLRUCache(object):
+  r""" Content-addressed cache on disk with size-bounded LRU eviction,
+  each value is pickled to a separated file named by its key (e.g. a hash
+  string), the access time is tracked by the file modification time.
+
+  Arguments:
+    path : str
+        path to the cache directory, default: `cache_path()/lru`
+    max_size : int
+        maximum size of the cache in MB, the least recently used entries
+        are removed when exceeded
+
+  Note:
+    Writing is atomic, so the cache could be shared by multiple processes,
+    however, each process only bounds the size of the entries it knows
+    about (i.e. existed at opening or written by itself).
+    `lock(key)` serializes the computation of the same entry among
+    processes, the lock file is removed together with its entry.
+
+  Example:
+  ```
+  cache = DiskLRUCache('/tmp/cache', max_size=1024)
+  cache['a1b2c3'] = np.ones((12, 8))
+  x = cache.get('a1b2c3')
+  ```
+  """
+  _EXT = ''
+
+  def __init__(self, path=None, max_size=4096):
+    if path is None:
+      path = os.path.join(cache_path(), 'lru')
+    self.path = os.path.abspath(str(path))
+    self.max_size = int(max_size * 1024 * 1024)
+    if not os.path.exists(self.path):
+      os.makedirs(self.path, exist_ok=True)
+    # ====== key -> nbytes, the least recently used first ====== #
+    self._index = OrderedDict(
+        (key, size) for _, key, size in sorted(self._entries()))
+    self._size = sum(self._index.values())
+    self._evict()
+
+  def _entries(self):
+    r""" List of (mtime, key, nbytes) of all entries in the directory """
+    entries = []
+    for root, _, files in os.walk(self.path):
+      for name in files:
+        if name.endswith('.tmp') or name.endswith('.lock') or \
+          not name.endswith(self._EXT):
+          continue
+        try:
+          stat = os.stat(os.path.join(root, name))
+        except OSError:  # removed by other process
+          continue
+        entries.append((stat.st_mtime_ns, name[:len(name) - len(self._EXT)],
+                        stat.st_size))
+    return entries
+
+  @property
+  def size(self):
+    r""" Total size in bytes of all entries """
+    return self._size
+
+  def keys(self, prefix=''):
+    return [key for key in self._index if key.startswith(prefix)]
+
+  def __len__(self):
+    return len(self._index)
+
+  def __contains__(self, key):
+    return key in self._index or os.path.exists(self._path(key))
+
+  def _path(self, key):
+    return os.path.join(self.path, key[:2], key + self._EXT)
+
+  def lock(self, key=None):
+    r""" Exclusive inter-process lock for given key, or for the whole
+    cache if `key=None` """
+    if key is None:
+      return file_lock(os.path.join(self.path, '.lock'))
+    path = self._path(key)
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+      os.makedirs(folder, exist_ok=True)
+    return file_lock(path + '.lock')
+
+  # ====== serialization ====== #
+  def _load(self, path):
+    with open(path, 'rb') as f:
+      return pickle.load(f)
+
+  def _dump(self, value, f):
+    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+  # ====== read and write ====== #
+  def get(self, key, default=None):
+    path = self._path(key)
+    try:
+      value = self._load(path)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+      self._drop(key)
+      return default
+    # mark as recently used
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+    if key not in self._index:
+      self._index[key] = os.path.getsize(path)
+      self._size += self._index[key]
+    self._index.move_to_end(key)
+    return value
+
+  def __getitem__(self, key):
+    value = self.get(key, default=_MISSING)
+    if value is _MISSING:
+      raise KeyError(key)
+    return value
+
+  def set(self, key, value):
+    r""" Store the value (atomically) and return it """
+    path = self._path(key)
+    folder = os.path.dirname(path)
+    if not os.path.exists(folder):
+      os.makedirs(folder, exist_ok=True)
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+      self._dump(value, f)
+    os.replace(tmp, path)
+    self._drop(key, remove=False)
+    self._index[key] = os.path.getsize(path)
+    self._size += self._index[key]
+    self._evict(keep=key)
+    return value
+
+  def __setitem__(self, key, value):
+    self.set(key, value)
+
+  def _drop(self, key, remove=False):
+    if key in self._index:
+      self._size -= self._index.pop(key)
+    if remove:
+      path = self._path(key)
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      _remove_lock(path + '.lock')
+
+  def _evict(self, keep=None):
+    for key in list(self._index.keys()):
+      if self._size <= self.max_size:
+        break
+      if key != keep:
+        self._drop(key, remove=True)
+
+  def clear(self):
+    for key in list(self._index.keys()):
+      self._drop(key, remove=True)
+    shutil.rmtree(self.path, ignore_errors=True)
+    os.makedirs(self.path)
+
+  def __str__(self):
+    return '<%s path:%s #entries:%d size:%.2f/%.2f(MB)>' % \
+      (self.__class__.__name__, self.path, len(self),
+       self.size / 1024. / 1024., self.max_size / 1024. / 1024.)
+
+
+# ===========================================================================
+# Memory-mapped arrays cache
+# ===========================================================================
+class MmapLRUCache(DiskLRUCache):
+  r""" Cache of numpy arrays on disk, each array is stored as a `.npy` file
+  named by its key and returned as a memory-map, the least recently used
+  entries (tracked by the file modification time) are removed when the total
+  size exceeds the byte budget.
+
+  Different from `DiskLRUCache`, the budget is enforced over all entries in
+  the directory under an inter-process lock, so the cache could be shared
+  by parallel processes, and `lock(key)` serializes the computation of the
+  same entry, hence, only one process computes it and the others reuse it.
+
+  Arguments:
+    path : str
+        path to the cache directory, default: `cache_path()/mmap`
+    max_size : int
+        maximum size of the cache in MB
+    mmap_mode : {'r', 'c', None}
+        mode for loading the arrays, 'c' (copy-on-write) returns arrays that
+        could be modified in memory without changing the cached files.
+
+  Example:
+  ```
+  cache = MmapLRUCache('/tmp/cache', max_size=1024)
+  with cache.lock('a1b2c3'):
+    x = cache.get('a1b2c3')
+    if x is None:
+      x = cache.set('a1b2c3', np.ones((12, 8)))
+  ```
+  """
+  _EXT = '.npy'
+
+  def __init__(self, path=None, max_size=4096, mmap_mode='c'):
+    if path is None:
+      path = os.path.join(cache_path(), 'mmap')
+    self.mmap_mode = mmap_mode
+    super(MmapLRUCache, self).__init__(path=path, max_size=max_size)
+
+  @property
+  def size(self):
+    return sum(i[-1] for i in self._entries())
+
+  def keys(self, prefix=''):
+    return [key for _, key, _ in self._entries() if key.startswith(prefix)]
+
+  def __len__(self):
+    return len(self._entries())
+
+  def _load(self, path):
+    return np.load(path, mmap_mode=self.mmap_mode, allow_pickle=False)
+
+  def _dump(self, value, f):
+    np.save(f, value, allow_pickle=False)
+
+  def set(self, key, value):
+    r""" Store the array and return its memory-mapped version """
+    value = super(MmapLRUCache, self).set(key, np.asarray(value))
+    return self.get(key, default=value)
+
+  def _evict(self, keep=None):
+    with self.lock():
+      entries = sorted(self._entries())
+      size = sum(i[-1] for i in entries)
+      for _, key, nbytes in entries:
+        if size <= self.max_size:
+          break
+        if key == keep:
+          continue
+        self._drop(key, remove=True)
+        size -= nbytes
+    self._size = size
+
+  def clear(self):
+    with self.lock():
+      for _, key, _ in self._entries():
+        self._drop(key, remove=True)
@@ -2,11 +2,13 @@ from __future__ import absolute_import, division, print_function
 
 import base64
 import hashlib
+import mmap
 import os
 import pickle
 import struct
 import zipfile
 from collections import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from numbers import Number
 
@@ -14,6 +16,11 @@ import numpy as np
 import scipy as sp
 from six import string_types
 
+try:
+  import xxhash
+except ImportError:
+  xxhash = None
+
 
 class MD5object:
 
@@ -72,6 +79,25 @@ def _is_dictionary(obj):
     'omegaconf.dictconfig.DictConfig' in str(type(obj))
 
 
+def _array_buffers(arr, chunksize):
+  r""" Iterate the raw bytes of `arr` in C order as `memoryview`s of at
+  most `chunksize` bytes, C-contiguous arrays (including memmap) are not
+  copied, otherwise, only one chunk of rows is copied at a time """
+  if arr.dtype.hasobject:
+    yield arr.tobytes()
+    return
+  if arr.flags['C_CONTIGUOUS']:
+    buf = memoryview(arr.reshape(-1).view(np.uint8))
+    for start in range(0, len(buf), chunksize):
+      yield buf[start:start + chunksize]
+    return
+  row_bytes = max(arr.itemsize * int(np.prod(arr.shape[1:])), 1)
+  batch_size = max(chunksize // row_bytes, 1)
+  for start in range(0, arr.shape[0], batch_size):
+    x = np.ascontiguousarray(arr[start:start + batch_size])
+    yield memoryview(x.reshape(-1).view(np.uint8))
+
+
 def md5_folder(path,
                chunksize=512 * 1024,
                base64_encode=False,
@@ -160,18 +186,16 @@ def md5_checksum(file_or_path,
    all(isinstance(i, (np.ndarray, Number, str, bool)) for i in file_or_path)):
     if not isinstance(file_or_path, (tuple, list)):
       file_or_path = (file_or_path,)
-    # copy data
-    f = BytesIO()
+    # update hash directly from the array buffers
     for arr in file_or_path:
       if hasattr(arr, 'tobytes'):
-        f.write(arr.tobytes())
+        for chunk in _array_buffers(arr, chunksize):
+          hash_md5.update(chunk)
       else:
+        f = BytesIO()
         np.save(file=f, arr=arr, allow_pickle=False)
-    f.seek(0)
-    # update hash
-    for chunk in iter(lambda: f.read(chunksize), b""):
-      hash_md5.update(chunk)
-    f.close()
+        hash_md5.update(f.getbuffer())
+        f.close()
   # ======  path to file or folder ====== #
   elif isinstance(file_or_path, string_types):
     # TODO: sometimes the folder or file "accidently" exists
@@ -201,8 +225,9 @@ def md5_checksum(file_or_path,
         max(chunksize // (itemsize * np.prod(file_or_path.shape[1:])), 8))
     indices = range(0, file_or_path.shape[0] + batch_size, batch_size)
     for start, end in zip(indices, indices[1:]):
-      x = file_or_path[start:end].tobytes()
-      hash_md5.update(x)
+      for chunk in _array_buffers(np.asarray(file_or_path[start:end]),
+                                  chunksize):
+        hash_md5.update(chunk)
   # ====== NO support ====== #
   else:
     raise ValueError(f"MD5 checksum has NO support for input: {file_or_path} "
@@ -217,6 +242,152 @@ def md5_checksum(file_or_path,
   return digest
 
 
+# ===========================================================================
+# Fast checksum
+# ===========================================================================
+_FILE_CHECKSUMS = {}
+
+
+def new_hash(algorithm='auto'):
+  r""" Create a hash object with `update` and `hexdigest`
+
+  Parameters
+  ----------
+  algorithm : str
+    'auto' for 'xxh3_128' if `xxhash` is installed, otherwise 'blake2b',
+    'xxh64', 'xxh3_64', 'xxh3_128' (require `xxhash`), 'blake2b' (128 bits
+    digest), or any algorithm supported by `hashlib.new` (e.g. 'md5')
+  """
+  algorithm = str(algorithm).lower()
+  if algorithm == 'auto':
+    algorithm = 'blake2b' if xxhash is None or \
+      not hasattr(xxhash, 'xxh3_128') else 'xxh3_128'
+  if algorithm.startswith('xxh'):
+    if xxhash is None:
+      raise ImportError("Require 'xxhash' for hashing algorithm: %s" %
+                        algorithm)
+    return getattr(xxhash, algorithm)()
+  if algorithm == 'blake2b':
+    return hashlib.blake2b(digest_size=16)
+  return hashlib.new(algorithm)
+
+
+def _memmap_key(arr, algorithm, blocksize):
+  r""" (path, size, mtime, offset, dtype, shape) of a read-only array
+  mapping a whole region of a file, otherwise, None """
+  path = getattr(arr, 'filename', None)
+  if path is None or not isinstance(getattr(arr, 'base', None), mmap.mmap) \
+    or arr.flags['WRITEABLE'] or not arr.flags['C_CONTIGUOUS']:
+    return None
+  stat = os.stat(path)
+  return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns,
+          getattr(arr, 'offset', 0), arr.dtype.str, arr.shape, algorithm,
+          blocksize)
+
+
+def fast_checksum(x, algorithm='auto', blocksize=64 * 1024 * 1024, ncpu=1):
+  r""" Content checksum of arrays, files or any object supported by
+  `md5_checksum`, optimized for big arrays:
+
+    - the buffer of C-contiguous arrays and memmap is hashed directly
+      without copying
+    - the dtype and shape are included in the digest
+    - an array bigger than `blocksize` is hashed as a tree: the digest of
+      the concatenated digests of all blocks, the blocks are hashed in
+      parallel by `ncpu` threads
+    - the checksum of a read-only memmap (mapping a whole region of the
+      file) or a path to a file is memoized by (path, size, mtime)
+
+  The digest only depends on the content, `algorithm` and `blocksize`
+  (not `ncpu`), note that `algorithm='auto'` is different when `xxhash`
+  is installed.
+
+  Parameters
+  ----------
+  x : object
+    numpy array, path to a file, or any object supported by `md5_checksum`
+  algorithm : str
+    hashing algorithm, see `new_hash`
+  blocksize : int (in bytes)
+    size of each block for tree hashing
+  ncpu : int
+    number of threads for hashing the blocks
+
+  Example
+  -------
+  >>> x = np.memmap('/tmp/features', dtype='float32', mode='r')
+  >>> fast_checksum(x, ncpu=4)  # read the file once
+  >>> fast_checksum(x)  # memoized until the file is modified
+  """
+  blocksize = int(blocksize)
+  # ====== path to a file ====== #
+  if isinstance(x, string_types) and os.path.isfile(x):
+    stat = os.stat(x)
+    key = (os.path.realpath(x), stat.st_size, stat.st_mtime_ns, algorithm,
+           blocksize)
+    if key not in _FILE_CHECKSUMS:
+      _FILE_CHECKSUMS[key] = fast_checksum(
+          np.memmap(x, dtype=np.uint8, mode='r') if stat.st_size > 0 else
+          np.empty((0,), dtype=np.uint8),
+          algorithm=algorithm,
+          blocksize=blocksize,
+          ncpu=ncpu)
+    return _FILE_CHECKSUMS[key]
+  # ====== other objects ====== #
+  if not isinstance(x, np.ndarray) or x.dtype.hasobject:
+    hasher = new_hash(algorithm)
+    hasher.update(md5_checksum(x).encode('utf-8'))
+    return hasher.hexdigest()
+  # ====== memoized memmap ====== #
+  key = _memmap_key(x, algorithm, blocksize)
+  if key is not None and key in _FILE_CHECKSUMS:
+    return _FILE_CHECKSUMS[key]
+  # ====== hashing the array ====== #
+  hasher = new_hash(algorithm)
+  hasher.update(('%s%s' % (x.dtype.str, str(x.shape))).encode('utf-8'))
+  if x.nbytes <= blocksize:
+    for chunk in _array_buffers(x, blocksize):
+      hasher.update(chunk)
+  else:
+
+    def hash_block(block):
+      h = new_hash(algorithm)
+      h.update(block)
+      return h.digest()
+
+    if x.flags['C_CONTIGUOUS']:
+      buffer = memoryview(x.reshape(-1).view(np.uint8))
+      blocks = (buffer[i:i + blocksize]
+                for i in range(0, len(buffer), blocksize))
+    else:  # copy rows of one block at a time
+      blocks = _rechunk(_array_buffers(x, blocksize), blocksize)
+    # only parallel for views, the copied blocks are hashed one by one
+    if ncpu > 1 and x.flags['C_CONTIGUOUS']:
+      with ThreadPoolExecutor(max_workers=int(ncpu)) as executor:
+        for digest in executor.map(hash_block, blocks):
+          hasher.update(digest)
+    else:
+      for block in blocks:
+        hasher.update(hash_block(block))
+  digest = hasher.hexdigest()
+  if key is not None:
+    _FILE_CHECKSUMS[key] = digest
+  return digest
+
+
+def _rechunk(chunks, blocksize):
+  r""" Regroup the stream of byte chunks into blocks of `blocksize` """
+  buffer = bytearray()
+  for chunk in chunks:
+    buffer += chunk
+    while len(buffer) >= blocksize:
+      block = bytes(buffer[:blocksize])
+      del buffer[:blocksize]
+      yield block
+  if len(buffer) > 0:
+    yield bytes(buffer)
+
+
 # ===========================================================================
 # Encryption
 # ===========================================================================
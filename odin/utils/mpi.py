@@ -1,15 +1,18 @@
 from __future__ import absolute_import, division, print_function
 
 import inspect
+import mmap
 import os
 import pickle
 import sys
 import time
+import traceback
 import types
+import weakref
 from abc import ABCMeta, abstractmethod
 from collections import defaultdict
-from multiprocessing import (Lock, Pipe, Process, Queue, Value, cpu_count,
-                             current_process)
+from multiprocessing import (Lock, Pipe, Process, Queue, Semaphore, Value,
+                             cpu_count, current_process, resource_tracker)
 from multiprocessing.pool import Pool, ThreadPool
 
 import numpy as np
@@ -300,6 +303,473 @@ class SharedCounter(object):
     del self.lock
     del self.val
 
+class SharedArray(object):
+  """ Descriptor of a `numpy.ndarray` copied into a
+  `multiprocessing.shared_memory` block, only `(name, shape, dtype)` is
+  pickled when it is sent between processes.
+
+  The block is owned by the receiver, who must call `release` after using
+  the array returned by `attach`.
+
+  Example
+  -------
+  >>> # in the worker
+  >>> desc = SharedArray.from_array(x)
+  >>> # in the parent
+  >>> x = desc.attach()
+  >>> ...
+  >>> desc.release()
+  """
+
+  def __init__(self, name, shape, dtype):
+    self.name = str(name)
+    self.shape = tuple(shape)
+    self.dtype = np.dtype(dtype)
+    self._shm = None
+
+  @staticmethod
+  def from_array(x):
+    from multiprocessing.shared_memory import SharedMemory
+    x = np.asarray(x)
+    shm = SharedMemory(create=True, size=max(1, x.nbytes))
+    np.ndarray(x.shape, dtype=x.dtype, buffer=shm.buf)[...] = x
+    desc = SharedArray(shm.name, x.shape, x.dtype)
+    shm.close()
+    return desc
+
+  @property
+  def nbytes(self):
+    return int(np.prod(self.shape)) * self.dtype.itemsize
+
+  def attach(self):
+    """ Return a view of the array on the shared block (no copy) """
+    if self._shm is None:
+      from multiprocessing.shared_memory import SharedMemory
+      self._shm = SharedMemory(name=self.name, create=False)
+    return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+  def release(self, unlink=True):
+    """ Close the block, and remove it from the system if `unlink=True`,
+    all views returned by `attach` must be deleted before calling this. """
+    from multiprocessing.shared_memory import SharedMemory
+    shm = self._shm
+    if shm is None:
+      shm = SharedMemory(name=self.name, create=False)
+    self._shm = None
+    shm.close()
+    if unlink:
+      shm.unlink()
+
+  def __getstate__(self):
+    return self.name, self.shape, self.dtype.str
+
+  def __setstate__(self, states):
+    self.__init__(*states)
+
+  def __repr__(self):
+    return '<SharedArray name:%s shape:%s dtype:%s>' % \
+      (self.name, str(self.shape), str(self.dtype))
+
+
+# arrays and objects broadcasted by `WorkerPool`, in the workers and
+# in the main process
+_POOL_SHARED = {}
+
+
+def _pool_receive(inbox, funcs, views):
+  """ Process one broadcasted message inside a `WorkerPool` worker """
+  import dill
+  kind, name, value = inbox.get()
+  # overriding previous broadcasted array
+  if name in views:
+    _POOL_SHARED.pop(name, None)
+    try:
+      views.pop(name).release(unlink=False)
+    except BufferError: # the array is still referenced
+      pass
+  if kind == 'func':
+    funcs[name] = dill.loads(value)
+  elif kind == 'drop':
+    funcs.pop(name, None)
+  elif kind == 'shm':
+    try:
+      _POOL_SHARED[name] = value.attach()
+      views[name] = value
+    except FileNotFoundError: # already overridden by the main process
+      pass
+  elif kind == 'memmap':
+    filename, dtype, shape, offset = value
+    _POOL_SHARED[name] = np.memmap(filename, dtype=dtype, mode='r',
+                                   shape=shape, offset=offset)
+  elif kind == 'object':
+    _POOL_SHARED[name] = dill.loads(value)
+  elif kind == 'remove':
+    _POOL_SHARED.pop(name, None)
+
+
+def _pool_worker(tasks, inbox, results):
+  funcs = {}
+  views = {}
+  n_messages = 0
+  t = tasks.get()
+  while t is not None:
+    fid, required, idx, job = t
+    # all broadcast sent before this task must be received
+    while n_messages < required:
+      _pool_receive(inbox, funcs, views)
+      n_messages += 1
+    try:
+      ret = funcs[fid](job)
+      if not isinstance(ret, types.GeneratorType):
+        ret = (ret,)
+      for r in ret:
+        if r is not None: # ignore None values
+          results.put((fid, idx, 'item', r))
+      del ret
+      results.put((fid, idx, 'done', None))
+    except Exception:
+      results.put((fid, idx, 'error', traceback.format_exc()))
+    t = tasks.get()
+  sys.exit(0)
+
+
+class WorkerPool(object):
+  """ A long-lived pool of processes that runs many `map` or `imap`
+  calls, e.g. one call for every iteration of an E-M algorithm.
+
+  Each call only sends the function once to every worker (serialized
+  by `dill`), and the jobs are dispatched on demand, i.e. a new job is
+  sent whenever a worker finished one, so at most
+  `ncpu * backlog` jobs are waiting in the queue.
+
+  Large read-only arrays are broadcasted once by `broadcast`, and
+  retrieved inside the function by `WorkerPool.shared(name)`:
+
+   - `numpy.memmap` (e.g. `MmapArray`) is re-opened from its path.
+   - `numpy.ndarray` is copied to a shared memory block, which is also
+     writable, the changes are visible from every process
+     (e.g. for accumulators).
+   - other objects are pickled and sent to each worker.
+
+  Parameters
+  ----------
+  ncpu : {int, None}
+    number of processes, if None, use `cpu_count() - 1`
+  backlog : int (default: 2)
+    number of jobs waiting in the queue for each worker
+
+  Example
+  -------
+  >>> def map_fn(idx):
+  ...   X = WorkerPool.shared('X')
+  ...   return X[idx].sum()
+  >>> with WorkerPool(ncpu=4) as pool:
+  ...   pool.broadcast('X', X)
+  ...   for it in range(16):
+  ...     results = pool.map(map_fn, range(X.shape[0]))
+
+  Note
+  ----
+  Only one `map` or `imap` call can be run at a time, and the names of
+  broadcasted objects are shared by all the pools of the main process.
+  """
+
+  def __init__(self, ncpu=None, backlog=2):
+    super(WorkerPool, self).__init__()
+    if ncpu is None:
+      ncpu = cpu_count() - 1
+    self._ncpu = max(1, int(ncpu))
+    self._backlog = max(1, int(backlog))
+    self._processes = []
+    self._inboxes = []
+    self._tasks = None
+    self._results = None
+    # number of messages broadcasted to each worker
+    self._n_messages = 0
+    # name -> SharedArray owned by this pool
+    self._shared = {}
+    self._names = set()
+    self._call_id = 0
+    self._is_running = False
+    self._is_closed = False
+
+  # ==================== properties ==================== #
+  @property
+  def ncpu(self):
+    return self._ncpu
+
+  @property
+  def is_started(self):
+    return len(self._processes) > 0
+
+  @property
+  def is_closed(self):
+    return self._is_closed
+
+  @staticmethod
+  def shared(name):
+    """ Return the object broadcasted with given name (call this inside
+    the function executed by the workers) """
+    if name not in _POOL_SHARED:
+      raise KeyError("No object broadcasted with name: '%s'" % name)
+    return _POOL_SHARED[name]
+
+  # ==================== helper ==================== #
+  def start(self):
+    """ Start the worker processes, objects broadcasted before this call
+    are inherited by the workers without any copy """
+    if self._is_closed:
+      raise RuntimeError("WorkerPool is closed.")
+    if self.is_started:
+      return self
+    resource_tracker.ensure_running()
+    self._tasks = Queue(maxsize=0)
+    self._results = Queue(maxsize=0)
+    for i in range(self._ncpu):
+      inbox = Queue(maxsize=0)
+      p = Process(target=_pool_worker,
+                  args=(self._tasks, inbox, self._results))
+      p.daemon = True
+      p.start()
+      self._processes.append(p)
+      self._inboxes.append(inbox)
+    return self
+
+  def _send(self, kind, name, value):
+    if not self.is_started:
+      return
+    for inbox in self._inboxes:
+      inbox.put((kind, name, value))
+    self._n_messages += 1
+
+  def _release(self, name):
+    _POOL_SHARED.pop(name, None)
+    self._names.discard(name)
+    desc = self._shared.pop(name, None)
+    if desc is not None:
+      shm = desc._shm
+      try:
+        desc.release(unlink=True)
+      except BufferError: # the array is still referenced
+        shm.unlink()
+
+  def broadcast(self, name, value):
+    """ Send an array or object to all workers, the object could be
+    retrieved by `WorkerPool.shared(name)` in the workers, and in the
+    main process.
+
+    Return
+    ------
+    the broadcasted object, for `numpy.ndarray` this is a view on the
+    shared memory block.
+    """
+    import dill
+    name = str(name)
+    self._release(name)
+    # memory-mapped array, only send the path
+    if isinstance(value, np.memmap) and isinstance(value.base, mmap.mmap):
+      msg = ('memmap', name, (value.filename, value.dtype.str,
+                              value.shape, value.offset))
+    # numpy array, copy to shared memory
+    elif isinstance(value, np.ndarray):
+      desc = SharedArray.from_array(value)
+      self._shared[name] = desc
+      value = desc.attach()
+      msg = ('shm', name, desc)
+    # any other object
+    else:
+      msg = ('object', name, dill.dumps(value))
+    _POOL_SHARED[name] = value
+    self._names.add(name)
+    self._send(*msg)
+    return value
+
+  def remove(self, name):
+    """ Remove a broadcasted object """
+    name = str(name)
+    if name in self._names:
+      self._release(name)
+      self._send('remove', name, None)
+    return self
+
+  # ==================== map ==================== #
+  def imap(self, func, jobs, ordered=False):
+    """ Apply `func` to every job, and yield the results
+
+    Parameters
+    ----------
+    func : call-able
+      take a single job as input, if a generator is returned, every
+      yielded value is returned (`None` values are ignored)
+    jobs : iterable
+      list of jobs, only `ncpu * backlog` jobs are taken from the
+      iterable at a time
+    ordered : bool (default: False)
+      if True, the results are returned in the same order as the jobs,
+      otherwise, returned as soon as they are available.
+    """
+    import dill
+    if not hasattr(func, '__call__'):
+      raise ValueError('"func" must be call-able')
+    if self._is_running:
+      raise RuntimeError("Only one `map` or `imap` can run at a time.")
+    self.start()
+    self._is_running = True
+    self._call_id += 1
+    fid = self._call_id
+    self._send('func', fid, dill.dumps(func))
+    required = self._n_messages
+    jobs = iter(jobs)
+    n_dispatched = 0
+    n_finished = 0
+
+    def dispatch():
+      nonlocal n_dispatched
+      for job in jobs:
+        self._tasks.put((fid, required, n_dispatched, job))
+        n_dispatched += 1
+        return True
+      return False
+    # ====== start the jobs ====== #
+    try:
+      for _ in range(self._ncpu * self._backlog):
+        if not dispatch():
+          break
+      buffers = defaultdict(list)
+      finished = set()
+      next_idx = 0
+      while n_finished < n_dispatched:
+        call_id, idx, kind, value = self._results.get()
+        if call_id != fid: # results of an interrupted call
+          continue
+        if kind == 'item':
+          if ordered:
+            buffers[idx].append(value)
+          else:
+            yield value
+          continue
+        n_finished += 1
+        if kind == 'error':
+          raise RuntimeError("Error in WorkerPool process:\n%s" % value)
+        dispatch()
+        # return the results of finished jobs in order
+        if ordered:
+          finished.add(idx)
+          while next_idx in finished:
+            finished.remove(next_idx)
+            for r in buffers.pop(next_idx, []):
+              yield r
+            next_idx += 1
+    # ====== drain unfinished jobs (e.g. on error) ====== #
+    finally:
+      while n_finished < n_dispatched:
+        call_id, idx, kind, value = self._results.get()
+        if call_id == fid and kind != 'item':
+          n_finished += 1
+      self._send('drop', fid, None)
+      self._is_running = False
+
+  def map(self, func, jobs):
+    """ Same as `imap` with `ordered=True`, but return a list """
+    return list(self.imap(func, jobs, ordered=True))
+
+  # ==================== finalize ==================== #
+  def close(self):
+    if self._is_closed:
+      return
+    self._is_closed = True
+    for _ in self._processes:
+      self._tasks.put(None)
+    for p in self._processes:
+      p.join(timeout=5)
+      if p.is_alive():
+        p.terminate()
+    for q in [self._tasks, self._results] + self._inboxes:
+      if q is not None:
+        q.close()
+    for name in list(self._names):
+      self._release(name)
+    self._processes = []
+    self._inboxes = []
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def __del__(self):
+    try:
+      self.close()
+    except Exception:
+      pass
+
+  def __repr__(self):
+    return '<WorkerPool ncpu:%d started:%s closed:%s shared:%s>' % \
+      (self._ncpu, self.is_started, self._is_closed, sorted(self._names))
+
+
+# ndarray bigger than this is sent without pickling its data:
+# zmq frame for 'pyzmq' backend, and shared memory for 'python' backend
+# (creating a shared memory block is only cheaper than the pipe for
+# big arrays)
+_ZERO_COPY_BYTES = 64 * 1024
+_SHARED_MEMORY_BYTES = 1024 * 1024
+
+
+class _ArrayRef(object):
+  """ Placeholder of the `index`-th array in the returned object """
+  __slots__ = ('index', 'dtype', 'shape')
+
+  def __init__(self, index, dtype, shape):
+    self.index = index
+    self.dtype = dtype
+    self.shape = shape
+
+  def __getstate__(self):
+    return self.index, self.dtype, self.shape
+
+  def __setstate__(self, states):
+    self.index, self.dtype, self.shape = states
+
+
+def _pack_arrays(obj, arrays, min_bytes):
+  """ Replace ndarray bigger than `min_bytes` (also inside tuple, list
+  and dict) by `_ArrayRef`, the arrays are appended to `arrays` """
+  if isinstance(obj, np.ndarray):
+    if obj.dtype != np.object_ and obj.nbytes >= min_bytes:
+      arrays.append(np.ascontiguousarray(obj))
+      return _ArrayRef(len(arrays) - 1, obj.dtype.str, obj.shape)
+    return obj
+  if type(obj) in (tuple, list):
+    return type(obj)([_pack_arrays(i, arrays, min_bytes) for i in obj])
+  if type(obj) is dict:
+    return {k: _pack_arrays(v, arrays, min_bytes) for k, v in obj.items()}
+  return obj
+
+
+def _unpack_arrays(obj, get_array):
+  """ Inverse of `_pack_arrays`, `get_array(ref)` return the array """
+  if isinstance(obj, _ArrayRef):
+    return get_array(obj)
+  if type(obj) in (tuple, list):
+    return type(obj)([_unpack_arrays(i, get_array) for i in obj])
+  if type(obj) is dict:
+    return {k: _unpack_arrays(v, get_array) for k, v in obj.items()}
+  return obj
+
+
+def _attach_shared(desc):
+  """ Zero-copy view of a `SharedArray` sent by a worker, the block is
+  unlinked at once and closed when the view is garbage collected """
+  x = desc.attach()
+  shm = desc._shm
+  desc._shm = None
+  shm.unlink()
+  weakref.finalize(x, shm.close)
+  return x
+
+
 class MPI(object):
   r""" MPI - Simple multi-processing interface
   This class use round robin to schedule the tasks to each processes
@@ -333,14 +803,26 @@ class MPI(object):
         beginning, do this if you sure all jobs require same processing time.
     backend: {'pyzmq', 'python'}
         using 'pyzmq' for interprocess communication or default python Queue.
+    ordered: bool
+        if `True`, the results are returned in the same order as the jobs
+        (the results of finished jobs are buffered until all the previous
+        jobs finished), otherwise, returned as soon as they are available.
 
   Note:
     Using pyzmq backend often 3 time faster than python Queue
+    The main process blocks (no busy waiting) until a result is available,
+    each worker is given credits for `max(1, hwm // ncpu)` results, and
+    waits for the main process to consume its results when the credits
+    run out. A credit is given back when its result is yielded, hence,
+    with `ordered=True` at most `hwm` results are buffered in memory.
+    Big `numpy.ndarray` (also inside tuple, list and dict) are not
+    pickled: they are sent as raw zmq frames (copied once into writeable
+    arrays), or shared memory blocks for python backend.
   """
 
   def __init__(self, jobs, func,
                ncpu=1, batch=1, hwm=144,
-               backend='python'):
+               backend='python', ordered=False):
     super(MPI, self).__init__()
     backend = str(backend).lower()
     if backend not in ('pyzmq', 'python'):
@@ -361,6 +843,9 @@ class MPI(object):
     )
     self._batch = max(1, int(batch))
     self._hwm = max(0, int(hwm))
+    self._ordered = bool(ordered)
+    # number of results each worker could send without waiting
+    self._credit = max(1, self._hwm // max(1, self._ncpu))
     # ====== internal states ====== #
     self._nb_working_cpu = self._ncpu
     # processes manager
@@ -375,9 +860,10 @@ class MPI(object):
     self._remain_jobs = SharedCounter(len(self._jobs))
     # Equally split for all processes
     self._tasks = Queue(maxsize=0)
-    for i in segment_list(np.arange(len(self._jobs), dtype='int32'),
-                          size=self._batch):
-      self._tasks.put_nowait(i)
+    for task_id, i in enumerate(
+        segment_list(np.arange(len(self._jobs), dtype='int32'),
+                     size=self._batch)):
+      self._tasks.put_nowait((task_id, i))
     for i in range(self._ncpu): # ending signal
       self._tasks.put_nowait(None)
     # ====== only 1 iteration is created ====== #
@@ -414,6 +900,25 @@ class MPI(object):
       except StopIteration:
         pass
 
+  def cancel(self):
+    """ Stop dispatching the remaining jobs, wait for the running tasks to
+    finish, and return the list of their results that are not consumed
+    (e.g. to release their resources) """
+    from queue import Empty
+    if self._is_finished:
+      return []
+    while True:
+      try:
+        self._tasks.get_nowait()
+      except Empty:
+        break
+    for i in range(self._ncpu): # ending signal
+      self._tasks.put_nowait(None)
+    if self._current_iter is None:
+      self._is_finished = True
+      return []
+    return list(self._current_iter)
+
   # ==================== helper ==================== #
   def __iter(self):
     # Initialize
@@ -429,7 +934,8 @@ class MPI(object):
     yield None # yeild not thing for init
     # Select run function
     self._is_running = True
-    for i in run_func():
+    for i in (self._reorder(run_func()) if self._ordered else
+              self._consume(run_func())):
       if self._terminate_now:
         break
       yield i
@@ -444,6 +950,80 @@ class MPI(object):
       next(self._current_iter)
     return self._current_iter
 
+  def _consume(self, results):
+    """ Return the results as soon as they are available """
+    for worker, task_id, kind, r in results:
+      if kind == 'item':
+        self._release_credit(worker)
+        yield r
+
+  def _reorder(self, results):
+    """ Return the results of each task in the order of the jobs, the
+    results of the running task are returned as soon as they arrive, the
+    others are buffered and keep their credits until they are returned """
+    buffers = defaultdict(list)
+    finished = set()
+    next_task = 0
+    for worker, task_id, kind, r in results:
+      if kind == 'item':
+        if task_id == next_task:
+          self._release_credit(worker)
+          yield r
+        else:
+          buffers[task_id].append((worker, r))
+        continue
+      finished.add(task_id)
+      while next_task in finished:
+        finished.remove(next_task)
+        next_task += 1
+        for worker, i in buffers.pop(next_task, []):
+          self._release_credit(worker)
+          yield i
+    # the tasks after cancelled ones
+    for task_id in sorted(buffers.keys()):
+      for worker, i in buffers[task_id]:
+        self._release_credit(worker)
+        yield i
+
+  def _release_credit(self, worker):
+    """ Give back the credit of a result returned by given worker """
+    if self._backend == 'pyzmq':
+      sk = self._sockets[worker]
+      if sk is None: # the worker finished
+        return
+      self._consumed[worker] += 1
+      # credits are given back in group to reduce the number of messages
+      if self._consumed[worker] >= max(1, self._credit // 2):
+        sk.send(str(self._consumed[worker]).encode())
+        self._consumed[worker] = 0
+    else:
+      self._credit_sems[worker].release()
+
+  def _run_tasks(self, tasks, remain_jobs, send):
+    """ Worker loop, `send(task_id, kind, result)` """
+    t = tasks.get()
+    while t is not None:
+      # `t` is just list of indices
+      task_id, t = t
+      t = [self._jobs[i] for i in t]
+      remain_jobs.add(-len(t)) # monitor current number of remain jobs
+      if self._batch == 1: # batch=1, NO need for list of inputs
+        ret = self._func(t[0])
+      else: # we have input is list of inputs here
+        ret = self._func(t)
+      # if a generator is return, traverse through the
+      # iterator and return each result
+      if not isinstance(ret, types.GeneratorType):
+        ret = (ret,)
+      for r in ret:
+        if r is not None: # ignore None values
+          send(task_id, 'item', r)
+      del ret # delete old data (this work, checked)
+      if self._ordered:
+        send(task_id, 'done', None)
+      # get new tasks
+      t = tasks.get()
+
   # ==================== pyzmq ==================== #
   def _init_zmq(self):
     # this is ugly but work well
@@ -454,37 +1034,29 @@ class MPI(object):
       # ====== create ZMQ socket ====== #
       ctx = zmq.Context()
       sk = ctx.socket(zmq.PAIR)
-      sk.set(zmq.SNDHWM, self._hwm)
       sk.set(zmq.LINGER, -1)
       sk.bind("ipc:///tmp/%d" % (self._ID + pID))
+      credit = [self._credit]
 
+      def send(task_id, kind, r):
+        # wait for the main process to give more credits
+        if kind == 'item':
+          while credit[0] <= 0:
+            credit[0] += int(sk.recv())
+          credit[0] -= 1
+        arrays = []
+        header = pickle.dumps((task_id, kind,
+                               _pack_arrays(r, arrays, _ZERO_COPY_BYTES)),
+                              protocol=pickle.HIGHEST_PROTOCOL)
+        sk.send_multipart([header] + [memoryview(a) for a in arrays],
+                          copy=len(arrays) == 0)
       # ====== Doing the jobs ====== #
-      t = tasks.get()
-      while t is not None:
-        # `t` is just list of indices
-        t = [self._jobs[i] for i in t]
-        # monitor current number of remain jobs
-        remain_jobs.add(-len(t))
-        if self._batch == 1: # batch=1, NO need for list of inputs
-          ret = self._func(t[0])
-        else: # we have input is list of inputs here
-          ret = self._func(t)
-        # if a generator is return, traverse through the
-        # iterator and return each result
-        if not isinstance(ret, types.GeneratorType):
-          ret = (ret,)
-        for r in ret:
-          # ignore None values
-          if r is not None:
-            sk.send_pyobj(r)
-        # delete old data (this work, checked)
-        del ret
-        # ge tne tasks
-        t = tasks.get()
+      self._run_tasks(tasks, remain_jobs, send)
       # ending signal
-      sk.send_pyobj(None)
-      # wait for ending message
-      sk.recv()
+      sk.send_multipart([pickle.dumps(None)])
+      # wait for ending message (credits may arrive before)
+      while sk.recv() != b'':
+        pass
       sk.close()
       ctx.term()
       sys.exit(0)
@@ -493,98 +1065,87 @@ class MPI(object):
                                args=(i, self._tasks, self._remain_jobs))
                        for i in range(self._ncpu)]
     [p.start() for p in self._processes]
-    # ====== pyzmq PULL socket ====== #
+    # ====== pyzmq PAIR socket ====== #
     ctx = zmq.Context()
     sockets = []
+    poller = zmq.Poller()
+    self._consumed = [0] * self._ncpu
     for i in range(self._ncpu):
       sk = ctx.socket(zmq.PAIR)
       sk.set(zmq.RCVHWM, 0) # no limit receiving
       sk.connect("ipc:///tmp/%d" % (self._ID + i))
+      poller.register(sk, zmq.POLLIN)
       sockets.append(sk)
     self._ctx = ctx
     self._sockets = sockets
-    self._zmq_noblock = zmq.NOBLOCK
-    self._zmq_again = zmq.error.Again
+    self._poller = poller
 
   def _run_pyzmq(self):
     while self._nb_working_cpu > 0:
-      for sk in self._sockets:
-        try:
-          r = sk.recv_pyobj(flags=self._zmq_noblock)
-          if r is None:
-            self._nb_working_cpu -= 1
-            sk.send(b'')
-            sk.close()
-            self._sockets.remove(sk)
-          else:
-            yield r
-        except self._zmq_again:
-          pass
+      # block until any socket has data
+      for sk, _ in self._poller.poll():
+        worker = self._sockets.index(sk)
+        frames = sk.recv_multipart(copy=False)
+        r = pickle.loads(frames[0].buffer)
+        if r is None:
+          self._nb_working_cpu -= 1
+          sk.send(b'')
+          self._poller.unregister(sk)
+          sk.close()
+          self._sockets[worker] = None
+          continue
+        task_id, kind, r = r
+        # the zmq frames are read-only, a single copy into owned arrays
+        if kind == 'item' and len(frames) > 1:
+          r = _unpack_arrays(r, lambda ref: np.frombuffer(
+              frames[ref.index + 1].buffer,
+              dtype=ref.dtype).reshape(ref.shape).copy())
+        yield worker, task_id, kind, r
 
   # ==================== python queue ==================== #
   def _init_python(self):
-    def worker_func(tasks, queue, counter, remain_jobs):
-      hwm = self._hwm
-      minimum_update_size = max(hwm // self._ncpu, 1)
+    def worker_func(pID, tasks, queue, credit, remain_jobs):
+
+      def send(task_id, kind, r):
+        if kind == 'item':
+          credit.acquire() # block until the consumer catch up
+        arrays = []
+        r = _pack_arrays(r, arrays, _SHARED_MEMORY_BYTES)
+        if len(arrays) > 0:
+          r = (r, [SharedArray.from_array(a) for a in arrays])
+        queue.put((pID, task_id, kind, r, len(arrays) > 0))
       # ====== Doing the jobs ====== #
-      t = tasks.get()
-      while t is not None:
-        # `t` is just list of indices
-        t = [self._jobs[i] for i in t]
-        remain_jobs.add(-len(t)) # monitor current number of remain jobs
-        if self._batch == 1: # batch=1, NO need for list of inputs
-          ret = self._func(t[0])
-        else: # we have input is list of inputs here
-          ret = self._func(t)
-        # if a generator is return, traverse through the
-        # iterator and return each result
-        if not isinstance(ret, types.GeneratorType):
-          ret = (ret,)
-        nb_returned = 0
-        for r in ret:
-          if r is not None: # ignore None values
-            queue.put(r)
-            nb_returned += 1
-            # sometime 1 batch get too big, and we need to stop
-            # putting too many data into the queue
-            if nb_returned >= minimum_update_size:
-              counter.add(nb_returned)
-              nb_returned = 0
-              while counter.value > hwm:
-                time.sleep(_SLEEP_TIME)
-        del ret # delete old data (this work, checked)
-        # increase shared counter (this number must perfectly
-        # counted, only 1 mismatch and deadlock will happen)
-        if nb_returned > 0:
-          counter.add(nb_returned)
-        # check if we need to wait for the consumer here
-        while counter.value > hwm:
-          time.sleep(_SLEEP_TIME)
-        # get new tasks
-        t = tasks.get()
+      self._run_tasks(tasks, remain_jobs, send)
       # ending signal
       queue.put(None)
       sys.exit(0)
     # ====== multiprocessing variables ====== #
+    # the workers must share the tracker of shared memory blocks, since
+    # the blocks created by the workers are unlinked by this process
+    resource_tracker.ensure_running()
     self._queue = Queue(maxsize=0)
-    self._counter = SharedCounter(initial_value=0)
+    # each result consumes one credit of its worker, given back by the
+    # main process when the result is yielded
+    self._credit_sems = [Semaphore(min(self._credit, 2**30))
+                         for i in range(self._ncpu)]
     self._processes = [Process(target=worker_func,
-                               args=(self._tasks, self._queue,
-                                     self._counter, self._remain_jobs))
+                               args=(i, self._tasks, self._queue,
+                                     self._credit_sems[i], self._remain_jobs))
                        for i in range(self._ncpu)]
     [p.start() for p in self._processes]
 
   def _run_python(self):
     while self._nb_working_cpu > 0:
-      r = self._queue.get()
-      while r is None:
+      r = self._queue.get() # blocking
+      if r is None:
         self._nb_working_cpu -= 1
-        if self._nb_working_cpu <= 0:
-          break
-        r = self._queue.get()
-      if r is not None:
-        self._counter.add(-1)
-        yield r
+        continue
+      worker, task_id, kind, r, shared = r
+      if shared:
+        r, descs = r
+        arrays = [_attach_shared(d) for d in descs]
+        r = _unpack_arrays(r, lambda ref: arrays[ref.index])
+      yield worker, task_id, kind, r
 
   # ==================== finalize ==================== #
   def _finalize(self):
@@ -601,9 +1162,10 @@ class MPI(object):
     # ====== pyzmq ====== #
     if self._backend == 'pyzmq':
       for sk in self._sockets:
-        sk.close()
+        if sk is not None:
+          sk.close()
       self._ctx.term()
     # ====== python ====== #
     elif self._backend == 'python':
       self._queue.close()
-      del self._counter
+      del self._credit_sems
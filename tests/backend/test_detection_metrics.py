@@ -0,0 +1,105 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+from odin.backend.metrics import (CavgAccumulator, DetectionAccumulator,
+                                  compute_Cavg, compute_EER, compute_minDCF,
+                                  det_curve)
+
+np.random.seed(8)
+
+
+def _trials(n, seed):
+  rand = np.random.RandomState(seed)
+  labels = rand.rand(n) < 0.1
+  scores = rand.randn(n) + 2.5 * labels
+  return scores, labels
+
+
+class DetectionMetricsTest(unittest.TestCase):
+
+  def test_exact_mode(self):
+    scores, labels = _trials(5000, 1)
+    acc = DetectionAccumulator(exact_size=10000)
+    for s, l in zip(np.array_split(scores, 7), np.array_split(labels, 7)):
+      acc.update(s, l)
+    self.assertTrue(acc.is_exact)
+    Pfa, Pmiss = det_curve(labels.astype('int64'), scores)
+    self.assertAlmostEqual(acc.eer(), compute_EER(Pfa, Pmiss), places=8)
+    self.assertAlmostEqual(acc.min_dcf(Ptrue=0.1)[0],
+                           compute_minDCF(Pfa, Pmiss, Ptrue=0.1)[0],
+                           places=8)
+
+  def test_histogram_and_merge(self):
+    scores, labels = _trials(200000, 2)
+    exact = DetectionAccumulator(exact_size=len(scores)).update(
+        scores, labels)
+    # parallel accumulators with different score ranges
+    parts = []
+    for s, l in zip(np.array_split(scores * [1.], 4),
+                    np.array_split(labels, 4)):
+      acc = DetectionAccumulator(n_bins=4096, exact_size=1000)
+      parts.append(acc.update(s[:len(s) // 2], l[:len(l) // 2]).update(
+          s[len(s) // 2:], l[len(l) // 2:]))
+    parts[1].update([50.], [0])  # outlier coarsens the grid
+    merged = DetectionAccumulator(exact_size=0).merge(*parts)
+    self.assertFalse(merged.is_exact)
+    self.assertEqual(merged.n_target, np.sum(labels))
+    self.assertEqual(merged.n_nontarget, len(labels) - np.sum(labels) + 1)
+    self.assertAlmostEqual(merged.eer(), exact.eer(), places=2)
+    dcf1 = merged.min_dcf(Ptrue=[0.01, 0.1], normalize=True)[0]
+    dcf2 = exact.min_dcf(Ptrue=[0.01, 0.1], normalize=True)[0]
+    self.assertTrue(np.allclose(dcf1, dcf2, atol=0.02))
+
+  def test_constant_scores(self):
+    for score in (5.0, -3.0, 0.0, 1e8):
+      acc = DetectionAccumulator(exact_size=0)
+      acc.update([score], [1]).update([score, score], [0, 1])
+      self.assertFalse(acc.is_exact)
+      self.assertEqual(acc.n_target, 2)
+      self.assertEqual(acc.n_nontarget, 1)
+      acc.update([score + 1.], [1])
+      self.assertEqual(acc.n_target, 3)
+
+  def test_cavg_probability_input(self):
+    rand = np.random.RandomState(5)
+    y_true = rand.randint(0, 4, size=500)
+    y_prob = rand.rand(500, 4) + np.eye(4)[y_true]
+    y_prob /= np.sum(y_prob, axis=1, keepdims=True)
+    # same conversion as `odin.backend.maths.to_llr`
+    y_llr = np.log(13) + np.stack([
+        y_prob[:, j] - np.log(np.sum(np.exp(np.delete(y_prob, j, 1)), 1))
+        for j in range(4)
+    ], 1)
+    self.assertAlmostEqual(
+        compute_Cavg(y_prob, y_true, Ptrue=0.2, probability_input=True),
+        compute_Cavg(y_llr, y_true, Ptrue=0.2),
+        places=8)
+
+  def test_cavg(self):
+    rand = np.random.RandomState(3)
+    y_true = rand.randint(0, 4, size=2000)
+    y_llr = rand.randn(2000, 4) + 3 * np.eye(4)[y_true]
+    cavg = compute_Cavg(y_llr, y_true)
+    # brute force of the LRE definition
+    thresh = 0.
+    costs = []
+    for t in range(4):
+      miss = np.mean(y_llr[y_true == t, t] < thresh)
+      fa = np.mean([
+          np.mean(y_llr[y_true == n, t] >= thresh) for n in range(4) if n != t
+      ])
+      costs.append(0.5 * miss + 0.5 * fa)
+    self.assertAlmostEqual(cavg, 100 * np.mean(costs), places=8)
+    # batches, merge and clusters
+    acc1 = CavgAccumulator(4).update(y_llr[:700], y_true[:700])
+    acc2 = CavgAccumulator(4).update(y_llr[700:], y_true[700:])
+    clusters, total = acc1.merge(acc2).cavg(cluster_idx=[[0, 1], [2, 3]])
+    self.assertEqual(len(clusters), 2)
+    self.assertAlmostEqual(acc1.cavg(), cavg, places=8)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from odin.bay.vi.utils import FactorIndex
+
+np.random.seed(1)
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+
+def _factors(n=5000, seed=1):
+  rand = np.random.RandomState(seed)
+  return np.stack([
+      rand.randint(0, 3, size=n),
+      rand.choice([-2, 5, 7, 11], size=n),
+      rand.randint(10, 16, size=n),
+  ], axis=1)
+
+
+class FactorIndexTest(unittest.TestCase):
+
+  def test_match_and_postings(self):
+    factors = _factors()
+    index = FactorIndex(factors)
+    self.assertEqual(index.sizes, [3, 4, 6])
+    for known in [{}, {1: 5}, {0: 2, 2: 13}, {0: 1, 1: 11, 2: 10}, {1: 3}]:
+      ids = index.match(known)
+      # same as scanning all the rows
+      expected = [
+          i for i, x in enumerate(factors)
+          if all(x[k] == v for k, v in known.items())
+      ]
+      self.assertTrue(np.array_equal(ids, expected), msg=str(known))
+    self.assertTrue(
+        np.array_equal(index.postings(1, 7),
+                       np.flatnonzero(factors[:, 1] == 7)))
+
+  def test_sample_rows(self):
+    factors = _factors()
+    index = FactorIndex(factors)
+    rand = np.random.RandomState(8)
+    query = np.concatenate([factors[rand.randint(0, len(factors), 100)],
+                            [[0, 6, 10], [5, 5, 10]]], axis=0)
+    ids = index.sample_rows(query, rand)
+    self.assertTrue(np.all(ids[-2:] == -1))
+    self.assertTrue(np.all(factors[ids[:-2]] == query[:-2]))
+    # uniformly among the matching samples
+    ids = index.sample_rows(np.repeat(query[:1], 2000, axis=0), rand)
+    matches = np.flatnonzero(np.all(factors == query[0], axis=1))
+    self.assertEqual(set(ids), set(matches))
+
+  def test_sample_matching(self):
+    factors = _factors()
+    index = FactorIndex(factors)
+    rand = np.random.RandomState(3)
+    factor_index = rand.randint(0, 3, size=1000)
+    samples = rand.randint(0, len(factors), size=1000)
+    for num, replace in [(8, True), (3, False)]:
+      ids, counts = index.sample_matching(factor_index, samples, num, rand,
+                                          replace)
+      self.assertEqual(ids.shape, (1000, num))
+      self.assertTrue(np.all(counts >= num))
+      values = factors[samples, factor_index]
+      self.assertTrue(np.all(factors[ids, factor_index[:, None]] ==
+                             values[:, None]))
+      if not replace:
+        self.assertTrue(np.all(np.diff(np.sort(ids, axis=1), axis=1) > 0))
+    # not enough matching samples
+    index = FactorIndex([[0], [0], [1]])
+    ids, counts = index.sample_matching([0, 0], [0, 2], 2, rand, False)
+    self.assertEqual(sorted(ids[0]), [0, 1])
+    self.assertTrue(np.all(ids[1] == -1))
+    self.assertEqual(list(counts), [2, 1])
+
+  def test_radix_overflow(self):
+    rand = np.random.RandomState(2)
+    factors = rand.randint(0, 2**20, size=(1000, 8))
+    index = FactorIndex(factors)
+    self.assertTrue(len(index._steps) > 0)
+    ids = index.sample_rows(factors, rand)
+    self.assertTrue(np.all(factors[ids] == factors))
+    self.assertTrue(np.all(index.sample_rows(factors + 2**21, rand) == -1))
+
+
+if __name__ == '__main__':
+  unittest.main()
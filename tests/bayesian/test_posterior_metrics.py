@@ -0,0 +1,83 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+
+import numpy as np
+import tensorflow as tf
+from scipy import stats
+from tensorflow.python import keras
+from tensorflow_probability.python import distributions as tfd
+
+from odin.bay.vi.posterior import GroundTruth, Posterior
+
+np.random.seed(1)
+tf.random.set_seed(1)
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+
+class _Posterior(Posterior):
+
+  def __init__(self, loc, factors):
+    super().__init__(model=keras.layers.Layer(),
+                     groundtruth=GroundTruth(factors))
+    self._latents = tfd.Independent(tfd.Normal(loc, 0.1), 1)
+
+  @property
+  def latents(self):
+    return self._latents
+
+
+def _posterior(n=500, seed=1):
+  rand = np.random.RandomState(seed)
+  factors = np.stack([rand.randint(0, 3, n), rand.randint(0, 5, n)], axis=1)
+  loc = np.concatenate([factors + rand.randn(n, 2) * 0.1,
+                        rand.randn(n, 2)], axis=1).astype('float32')
+  return _Posterior(loc, factors), loc
+
+
+class PosteriorMetricsTest(unittest.TestCase):
+
+  def test_metric_cache(self):
+    posterior, loc = _posterior()
+    calls = []
+
+    def mean(d):
+      calls.append(d)
+      return d.mean()
+
+    with posterior.configure(dist_to_tensor=mean):
+      codes = posterior.latent_codes()
+      self.assertTrue(np.allclose(codes, loc))
+      # the codes are converted once and shared by all the metrics
+      corr = posterior.correlation_matrix(method='spearman')
+      mig = posterior.mutual_info_gap(n_bins=10)
+      self.assertTrue(posterior.latent_codes() is codes)
+      self.assertTrue(posterior.correlation_matrix(method='spearman') is corr)
+      self.assertEqual(posterior.mutual_info_gap(n_bins=10), mig)
+      self.assertEqual(len(calls), 1)
+    # a different dist_to_tensor is a different cache entry
+    samples = posterior.latent_codes()
+    self.assertFalse(np.allclose(samples, loc))
+    self.assertTrue(posterior.latent_codes() is samples)
+    posterior.clear_cache()
+    self.assertFalse(posterior.latent_codes() is samples)
+    with posterior.configure(dist_to_tensor=mean):
+      posterior.latent_codes()
+    self.assertEqual(len(calls), 2)
+
+  def test_correlation_matrix(self):
+    posterior, _ = _posterior()
+    z, f = posterior.latent_codes(), posterior.factors
+    for method, fn in (('spearman', stats.spearmanr),
+                       ('pearson', stats.pearsonr)):
+      corr = posterior.correlation_matrix(method=method)
+      self.assertEqual(corr.shape, (4, 2))
+      for i in range(4):
+        for j in range(2):
+          self.assertAlmostEqual(corr[i, j], fn(z[:, i], f[:, j])[0], places=6)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,76 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from odin.exp import Trainer
+from odin.exp.trainer import _async_checkpoints, _AsyncWriter
+
+np.random.seed(8)
+tf.random.set_seed(8)
+
+
+class AsyncCheckpointTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_writer_drop_intermediate(self):
+    writer = _AsyncWriter(max_pending=2)
+    started = threading.Event()
+    release = threading.Event()
+    written = []
+
+    def blocked():
+      started.set()
+      release.wait()
+
+    writer.submit('a', blocked)
+    started.wait()
+    # the writer is busy, only the last job of each key is kept
+    for i in range(5):
+      writer.submit('b', lambda i=i: written.append(i))
+    release.set()
+    self.assertTrue(writer.wait(timeout=10))
+    self.assertEqual(written, [4])
+    self.assertEqual(writer.n_dropped, 4)
+    # errors are raised in the training thread
+    writer.submit('c', lambda: 1 / 0)
+    with self.assertRaises(RuntimeError):
+      writer.wait(timeout=10)
+
+  def test_save_restore(self):
+    layer = tf.keras.layers.Dense(4)
+    layer.build((None, 3))
+    var = tf.Variable(np.arange(3, dtype='float32'))
+    values = [w.copy() for w in layer.get_weights()]
+    for i in range(7):
+      Trainer.save_checkpoint(self.path, [layer, var],
+                              max_to_keep=3,
+                              async_mode=True)
+      # the snapshot is not affected by following updates
+      var.assign_add(tf.ones(3))
+    Trainer.wait()
+    ckpts = _async_checkpoints(self.path)
+    self.assertTrue(0 < len(ckpts) <= 3)
+    # each checkpoint is a single file, no partial or side files
+    self.assertEqual(sorted(os.listdir(self.path)),
+                     sorted(os.path.basename(f) for f in ckpts))
+    layer.set_weights([np.zeros_like(w) for w in values])
+    Trainer.restore_checkpoint(self.path, models=[layer, var])
+    self.assertTrue(np.allclose(var.numpy(), np.arange(3) + 6))
+    for w1, w2 in zip(layer.get_weights(), values):
+      self.assertTrue(np.allclose(w1, w2))
+
+
+if __name__ == '__main__':
+  unittest.main()
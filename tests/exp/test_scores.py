@@ -0,0 +1,66 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from tempfile import mkstemp
+
+import numpy as np
+
+from odin.exp.scores import ScoreBoard
+
+np.random.seed(8)
+
+
+class ScoreBoardTest(unittest.TestCase):
+
+  def test_write_many(self):
+    board = ScoreBoard()
+    board.write('t1', epoch=0, loss=1.5, name='a')
+    board.write_many('t1', [
+        dict(epoch=1, loss=0.5, name='b'),
+        dict(epoch=2, name='c', w=np.arange(3)),
+    ])
+    board.write_many('t1', dict(epoch=np.arange(3, 6), loss=np.ones(3) / 4))
+    self.assertEqual(board.get_nrow('t1'), 6)
+    self.assertEqual(board.get_column_names('t1'),
+                     ['epoch', 'loss', 'name', 'w'])
+    # same results as row-by-row select
+    rows = board.select(table='t1', order='epoch')
+    data = board.select(table='t1', order='epoch', columnar=True)
+    self.assertEqual(list(data.keys()), ['epoch', 'loss', 'name', 'w'])
+    self.assertTrue(np.all(data['epoch'] == [r[0] for r in rows]))
+    self.assertEqual(data['epoch'].dtype, np.int64)
+    self.assertTrue(np.allclose(data['loss'], [1.5, 0.5, np.nan, .25, .25, .25],
+                                equal_nan=True))
+    self.assertTrue(np.all(data['w'][2] == np.arange(3)))
+    # unique rows are skipped or replaced
+    board.write_many('t2', dict(k=[1, 2, 2], v=[1, 2, 3]), unique='k')
+    self.assertEqual(board.select(table='t2', keys='v', order='k'), [1, 2])
+    board.write_many('t2', [dict(k=2, v=4)], unique='k', replace=True)
+    self.assertEqual(board.select(table='t2', keys='v', order='k'), [1, 4])
+
+  def test_wal_and_schema_cache(self):
+    fd, path = mkstemp(suffix='.db')
+    os.close(fd)
+    board = ScoreBoard(path, synchronous='normal')
+    board.write_many('t', dict(a=np.arange(10)))
+    self.assertEqual(
+        board.select("PRAGMA journal_mode;"), ['wal'])
+    # the table is modified by another connection
+    other = ScoreBoard(path)
+    other.select("DROP TABLE t;")
+    other.write('t', b='x')
+    other.close()
+    board.write('t', a=1)
+    reader = ScoreBoard(path, read_only=True)
+    self.assertEqual(reader.get_column_names('t'), ['b', 'a'])
+    self.assertEqual(reader.get_nrow('t'), 2)
+    reader.close()
+    board.close()
+    for ext in ('', '-wal', '-shm'):
+      if os.path.exists(path + ext):
+        os.remove(path + ext)
+
+
+if __name__ == '__main__':
+  unittest.main()
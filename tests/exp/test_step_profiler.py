@@ -0,0 +1,38 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+from odin.exp.trainer import StepProfiler
+
+np.random.seed(8)
+
+
+class StepProfilerTest(unittest.TestCase):
+
+  def test_rolling_statistics(self):
+    profiler = StepProfiler(window=100, percentiles=(50, 90))
+    self.assertEqual(profiler.statistics(), dict())
+    # the first iterations are dropped from the window
+    for _ in range(50):
+      profiler.record([1., 1., 0., 0., 0., 0.], n_examples=8)
+    # input-bound: 3ms data, 1ms step, 1ms sync
+    for i in range(100):
+      profiler.record([0.003, 0.001, 0.001, 0., 0., i / 1000.], n_examples=32)
+    stats = profiler.statistics()
+    self.assertAlmostEqual(stats['data_p50'], 3.)
+    self.assertAlmostEqual(stats['step_p90'], 1.)
+    self.assertAlmostEqual(stats['callback_p50'], 49.5)
+    self.assertAlmostEqual(stats['input_fraction'], 0.6)
+    self.assertEqual(stats['input_bound'], 1.)
+    self.assertAlmostEqual(stats['examples_per_sec'],
+                           3200 / (0.5 + np.sum(np.arange(100)) / 1000.))
+    # compute-bound
+    for i in range(100):
+      profiler.record([0.001, 0.004, 0.001, 0., 0., 0.], n_examples=32)
+    self.assertEqual(profiler.statistics()['input_bound'], 0.)
+
+
+if __name__ == '__main__':
+  unittest.main()
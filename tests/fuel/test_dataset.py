@@ -0,0 +1,73 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+from odin.fuel import Dataset
+
+np.random.seed(8)
+
+
+class DatasetTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = os.path.join(mkdtemp(), 'ds')
+
+  def tearDown(self):
+    shutil.rmtree(os.path.dirname(self.path))
+
+  def test_lazy_open(self):
+    X = np.random.rand(120, 8).astype('float32')
+    ds = Dataset(self.path)
+    ds['X'] = X
+    ds['meta'] = {'name': 'test', 'n': 120}
+    ds.flush()
+    ds.close()
+    # only the headers are read, the data is loaded on first access
+    ds = Dataset(self.path, lazy=True)
+    self.assertTrue(os.path.exists(os.path.join(self.path, '.odin_manifest')))
+    self.assertEqual(sorted(ds.keys()), ['X', 'meta'])
+    self.assertEqual(repr(ds._data_map['X'][2]), '<lazy>')
+    self.assertTrue(np.all(ds['X'][:] == X))
+    self.assertEqual(ds['meta'], {'name': 'test', 'n': 120})
+    ds.close()
+    # re-open from the manifest, the modified files are sniffed again
+    ds = Dataset(self.path)
+    ds['meta'] = {'name': 'modified'}
+    ds.flush()
+    ds.close()
+    ds = Dataset(self.path, lazy=True)
+    self.assertTrue(np.all(ds['X'][:] == X))
+    self.assertEqual(ds['meta'], {'name': 'modified'})
+    ds.close()
+
+  def test_memmap_append(self):
+    X = np.random.rand(50, 4).astype('float32')
+    Y = [np.random.rand(n, 4).astype('float32') for n in (7, 13)]
+    ds = Dataset(self.path)
+    ds['X'] = X
+    ds[('labels', 'pickle')] = np.arange(3)
+    path = os.path.join(self.path, 'X')
+    size = os.path.getsize(path)
+    ds.append('X', Y)
+    # the file is extended in place by the new rows only
+    self.assertEqual(os.path.getsize(path) - size, 20 * 4 * 4)
+    self.assertEqual(ds['X'].shape, (70, 4))
+    ds.append('X', X[:5])
+    self.assertTrue(np.all(ds['X'][:] == np.concatenate([X] + Y + [X[:5]])))
+    # pickled data cannot be appended
+    with self.assertRaises(ValueError):
+      ds.append('labels', np.arange(3))
+    ds.close()
+    ds = Dataset(self.path, read_only=True)
+    self.assertEqual(ds['X'].shape, (75, 4))
+    self.assertTrue(np.all(ds['labels'] == np.arange(3)))
+    ds.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,111 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import shutil
+import threading
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+from odin.fuel.databases import MmapDict, MmapDictV1
+
+np.random.seed(8)
+random.seed(8)
+
+
+class MmapDictTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def _random_dict(self, path, n=3000):
+    db = MmapDict(path, cache_size=100)
+    ref = {}
+    for i in range(n):
+      key = 'key%d' % random.randint(0, n // 2)
+      db[key] = (i, i + 1)
+      ref[key] = (i, i + 1)
+      if i % 100 == 0:
+        key = random.choice(list(ref.keys()))
+        del db[key]
+        del ref[key]
+    return db, ref
+
+  def test_read_write(self):
+    path = os.path.join(self.path, 'db')
+    db, ref = self._random_dict(path)
+    self.assertEqual(len(db), len(ref))
+    self.assertEqual(dict(db.items()), ref)
+    db.close()
+    # reopen
+    db = MmapDict(path, read_only=True)
+    self.assertEqual(len(db), len(ref))
+    self.assertEqual(dict(db.items()), ref)
+    for key, val in ref.items():
+      self.assertTrue(key in db)
+      self.assertEqual(db[key], val)
+    self.assertFalse('unknown' in db)
+    db.close()
+
+  def test_get_many(self):
+    path = os.path.join(self.path, 'db')
+    db, ref = self._random_dict(path)
+    keys = list(ref.keys())
+    random.shuffle(keys)
+    self.assertEqual(db.get_many(keys), [ref[k] for k in keys])
+    with self.assertRaises(KeyError):
+      db.get_many(keys[:10] + ['unknown'])
+    db.close()
+
+  def test_compaction(self):
+    path = os.path.join(self.path, 'db')
+    db = MmapDict(path, cache_size=10)
+    for i in range(5000):
+      db['key%d' % (i % 20)] = 'x' * 100 + str(i)
+    db.close()
+    db = MmapDict(path, read_only=True)
+    self.assertEqual(len(db), 20)
+    self.assertEqual(db['key7'], 'x' * 100 + '4987')
+    # the overwritten values are not kept forever
+    self.assertTrue(os.path.getsize(path) < 5000 * 100 // 10)
+    db.close()
+
+  def test_threads(self):
+    path = os.path.join(self.path, 'db')
+    db, ref = self._random_dict(path)
+    db.flush()
+    errors = []
+
+    def reader():
+      for key in random.sample(list(ref.keys()), 500):
+        if db[key] != ref[key]:
+          errors.append(key)
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(len(errors), 0)
+    db.close()
+
+  def test_read_version1(self):
+    path = os.path.join(self.path, 'db')
+    db = MmapDictV1(path)
+    db['a'] = 1
+    db['b'] = [1, 2, 3]
+    db.close()
+    db = MmapDict(path, read_only=True)
+    self.assertTrue(isinstance(db, MmapDictV1))
+    self.assertEqual(db['b'], [1, 2, 3])
+    self.assertEqual(db.get_many(['a', 'b']), [1, [1, 2, 3]])
+    db.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,51 @@
+from __future__ import absolute_import, division, print_function
+
+import shutil
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+from odin.ml.embedding_cache import cached_embedding, set_embedding_cache
+
+np.random.seed(8)
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = mkdtemp()
+    set_embedding_cache(self.path, max_size=16)
+
+  def tearDown(self):
+    set_embedding_cache()
+    shutil.rmtree(self.path)
+
+  def test_cached_embedding(self):
+    calls = []
+
+    def fit(x, init):
+      calls.append(init)
+      return x[:, :2] * 2
+
+    x = np.random.rand(100, 5)
+    kw = dict(perplexity=30., verbose=1)
+    y = cached_embedding('tsne', x, fit, kw)
+    self.assertTrue(np.allclose(y, x[:, :2] * 2))
+    # verbose does not change the key
+    cached_embedding('tsne', x, fit, dict(perplexity=30., verbose=0))
+    self.assertEqual(len(calls), 1)
+    cached_embedding('tsne', x, fit, dict(perplexity=5.))
+    cached_embedding('tsne', x, fit, kw, refit=True)
+    self.assertEqual(len(calls), 3)
+    # warm start from the embedding of the first 100 samples
+    x_new = np.concatenate([x, x[:10] + 1e-3], axis=0)
+    cached_embedding('tsne', x_new, fit, kw, warm_start=True)
+    init = calls[-1]
+    self.assertEqual(init.shape, (110, 2))
+    self.assertTrue(np.all(init[:100] == y))
+    self.assertTrue(np.allclose(init[100:], y[:10], atol=1e-3))
+
+
+if __name__ == '__main__':
+  unittest.main()
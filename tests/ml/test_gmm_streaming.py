@@ -0,0 +1,68 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from tempfile import mkstemp
+
+import numpy as np
+from bigarray import MmapArray, MmapArrayWriter
+
+from odin.ml import GMM
+
+np.random.seed(8)
+
+
+class GMMStreamingTest(unittest.TestCase):
+
+  def setUp(self):
+    fd, self.path = mkstemp()
+    os.close(fd)
+    X = np.concatenate([np.random.randn(2000, 8) + i for i in range(4)])
+    with MmapArrayWriter(self.path, shape=(0, 8), dtype='float32',
+                         remove_exist=True) as f:
+      f.write(X.astype('float32'))
+    self.X = MmapArray(self.path)
+    self.sad = (np.random.rand(8000) > 0.3).astype('int8')
+    self.indices = {'utt%d' % i: (i * 500, i * 500 + 400) for i in range(16)}
+
+  def tearDown(self):
+    os.remove(self.path)
+
+  def test_expectation(self):
+    mean = np.random.randn(8, 4).astype('float32')
+    for X in (self.X, (self.X, self.indices)):
+      gmm = GMM(nmix=4, nmix_start=4, batch_size_cpu=10**7)
+      gmm.initialize(X)
+      gmm.mean = mean
+      gmm._resfresh_cpu_posterior()
+      Z, F, S, L = gmm.expectation(X, sad=self.sad, print_progress=False)
+      for ncpu in (1, 2):
+        # 0.01MB ~ 80 frames per chunk
+        gmm.streaming = True
+        gmm.memory_budget = 0.01
+        gmm.ncpu = ncpu
+        for x, y in zip(
+            (Z, F, S, L),
+            gmm.expectation(X, sad=self.sad, print_progress=False)):
+          self.assertTrue(np.allclose(x, y, rtol=1e-4))
+        gmm.streaming = False
+
+  def test_expectation_workers(self):
+    # multiple batches on the worker processes, not streaming
+    mean = np.random.randn(8, 4).astype('float32')
+    for X in (self.X, (self.X, self.indices)):
+      gmm = GMM(nmix=4, nmix_start=4, batch_size_cpu=10**7)
+      gmm.initialize(X)
+      gmm.mean = mean
+      gmm._resfresh_cpu_posterior()
+      Z, F, S, L = gmm.expectation(X, sad=self.sad, print_progress=False)
+      gmm.batch_size_cpu = 256
+      gmm.ncpu = 2
+      for x, y in zip(
+          (Z, F, S, L),
+          gmm.expectation(X, sad=self.sad, print_progress=False)):
+        self.assertTrue(np.allclose(x, y, rtol=1e-4))
+
+
+if __name__ == '__main__':
+  unittest.main()
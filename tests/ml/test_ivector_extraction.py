@@ -0,0 +1,62 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from tempfile import mkdtemp, mkstemp
+
+import numpy as np
+from scipy import linalg
+
+from odin.ml import GMM, Tmatrix
+
+np.random.seed(8)
+
+
+def _exact_ivector(tmat, z, f):
+  L = np.zeros((tmat.tv_dim, tmat.tv_dim), dtype=tmat.dtype)
+  L[tmat._itril] = np.dot(z, tmat.T_invS_Tt)
+  L += np.tril(L, -1).T + tmat.Im
+  return np.dot(linalg.inv(L), np.dot(tmat.T_invS, f.T)).T
+
+
+class IvectorExtractionTest(unittest.TestCase):
+
+  def setUp(self):
+    nmix, feat_dim = 8, 5
+    gmm = GMM(nmix=nmix, nmix_start=nmix, device='cpu')
+    gmm.initialize(np.random.randn(100, feat_dim).astype('float32'))
+    gmm.mean = np.random.randn(feat_dim, nmix).astype('float32')
+    gmm.sigma = np.random.rand(feat_dim, nmix).astype('float32') + 0.5
+    gmm.w = np.random.dirichlet(np.ones(nmix))[np.newaxis, :].astype('float32')
+    self.tmat = Tmatrix(tv_dim=12, gmm=gmm, device='cpu', cache_path=mkdtemp())
+    self.Z = np.random.rand(50, nmix).astype('float32') * 100
+    self.F = np.random.randn(50, nmix * feat_dim).astype('float32') * 10
+
+  def test_exact(self):
+    fd, path = mkstemp()
+    os.close(fd)
+    self.tmat.batch_size_cpu = 16  # multiple batches
+    ivec = self.tmat.transform_to_disk(self.Z, self.F, path=path,
+                                       dtype='float64', device='cpu')
+    self.assertEqual(ivec.shape, (50, 12))
+    for i in range(50):
+      ref = _exact_ivector(self.tmat, self.Z[i:i + 1], self.F[i:i + 1])
+      self.assertTrue(np.allclose(ivec[i:i + 1], ref, rtol=1e-5, atol=1e-6))
+    os.remove(path)
+
+  def test_approximation(self):
+    # the approximation is exact when the occupancy follows the UBM weights
+    n = np.random.rand(50, 1) * 1000
+    Z = n * self.tmat.gmm.w
+    exact = self.tmat.transform((Z, self.F))
+    approx = self.tmat.transform((Z, self.F), approx=True)
+    self.assertTrue(np.allclose(exact, approx, rtol=1e-5, atol=1e-6))
+    # otherwise, highly correlated to the exact i-vectors
+    exact = self.tmat.transform((self.Z, self.F))
+    approx = self.tmat.transform((self.Z, self.F), approx=True)
+    corr = np.mean([np.corrcoef(i, j)[0, 1] for i, j in zip(exact, approx)])
+    self.assertTrue(corr > 0.9)
+
+
+if __name__ == '__main__':
+  unittest.main()
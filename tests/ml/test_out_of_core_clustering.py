@@ -0,0 +1,84 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from tempfile import mkstemp
+
+import numpy as np
+
+from odin.ml.cluster import (BlockedKNN, IVFIndex, StreamingKMeans,
+                             fast_kmeans, fast_knn)
+
+np.random.seed(8)
+
+
+class OutOfCoreClusteringTest(unittest.TestCase):
+
+  def setUp(self):
+    rand = np.random.RandomState(8)
+    centers = rand.randn(8, 12) * 6
+    x = centers[rand.randint(0, 8, size=6000)] + rand.randn(6000, 12)
+    fd, self.path = mkstemp()
+    os.close(fd)
+    X = np.memmap(self.path, dtype='float32', mode='w+', shape=x.shape)
+    X[:] = x
+    X.flush()
+    del X
+    self.X = np.memmap(self.path, dtype='float32', mode='r', shape=x.shape)
+    self.x = np.array(self.X)
+
+  def tearDown(self):
+    del self.X
+    os.remove(self.path)
+
+  def test_kmeans(self):
+    kmeans = fast_kmeans(self.X, n_clusters=8, max_samples_per_batch=1024)
+    self.assertTrue(isinstance(kmeans, StreamingKMeans))
+    self.assertEqual(kmeans.labels_.shape, (6000,))
+    self.assertEqual(len(np.unique(kmeans.labels_)), 8)
+    # the within-cluster variance is the unit noise
+    self.assertTrue(kmeans.inertia_ / 6000 < 12 * 1.2)
+    self.assertTrue(
+        np.all(kmeans.predict(self.X) == np.argmin(kmeans.transform(self.x),
+                                                   axis=1)))
+
+  def test_knn(self):
+    q = self.x[:200]
+    d = np.sum((q[:, None] - self.x[None])**2, axis=-1)
+    ref = np.argsort(d, axis=1)[:, :6]
+    knn = fast_knn(self.X, n_neighbors=5, n_jobs=2)
+    self.assertTrue(isinstance(knn, BlockedKNN))
+    knn.tile_size = 1000
+    dist, idx = knn.kneighbors(q)
+    self.assertTrue(np.all(idx == ref[:, :5]))
+    self.assertTrue(np.allclose(dist**2, np.sort(d, axis=1)[:, :5], atol=1e-2))
+    # the sample itself is excluded
+    idx = knn.kneighbors(n_neighbors=5, return_distance=False)[:200]
+    self.assertTrue(np.all(idx == ref[:, 1:]))
+    # approximated search
+    ivf = IVFIndex(n_neighbors=5, n_probe=8, n_threads=2).fit(self.X)
+    idx = ivf.kneighbors(q, return_distance=False)
+    recall = np.mean([len(set(i) & set(j)) for i, j in zip(idx, ref)]) / 5
+    self.assertTrue(recall > 0.9)
+
+  def test_knn_small(self):
+    x = self.x[:50]
+    # the probed list contains less than `n_neighbors` samples
+    ivf = IVFIndex(n_neighbors=10, n_lists=25, n_probe=1, n_threads=1).fit(x)
+    dist, idx = ivf.kneighbors(x[:20])
+    self.assertTrue(np.all(idx >= 0) and np.all(np.isfinite(dist)))
+    graph = ivf.kneighbors_graph(None, mode='distance')
+    self.assertEqual(graph.shape, (50, 50))
+    self.assertEqual(graph.nnz, 50 * 10)
+    self.assertTrue(np.all(np.isfinite(graph.data)))
+    # `n_neighbors` is larger than the number of samples
+    graph = BlockedKNN(n_neighbors=5).fit(x[:4]).kneighbors_graph(None)
+    self.assertEqual(graph.shape, (4, 4))
+    self.assertEqual(graph.nnz, 4 * 3)
+    self.assertTrue(np.all(graph.diagonal() == 0))
+    knn = fast_knn(x, n_neighbors=3, algorithm='ivf', n_lists=5, n_probe=2)
+    self.assertEqual((knn.n_lists, knn.n_probe), (5, 2))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,81 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from tempfile import mkstemp
+
+import numpy as np
+
+from odin.ml.trial_scoring import ScoringEngine
+
+np.random.seed(8)
+
+
+class _Collector(object):
+
+  def __init__(self):
+    self.scores = []
+    self.labels = []
+
+  def update(self, scores, labels):
+    self.scores.append(scores)
+    self.labels.append(labels)
+
+
+class ScoringEngineTest(unittest.TestCase):
+
+  def setUp(self):
+    rand = np.random.RandomState(8)
+    self.enroll = rand.randn(300, 16)
+    self.test = rand.randn(1000, 16)
+    self.h1 = rand.randn(300)
+    self.h2 = rand.randn(1000)
+    self.ref = np.dot(self.test, self.enroll.T) + self.h1 + self.h2[:, None]
+
+  def test_score_matrix(self):
+    fd, path = mkstemp(suffix='.npy')
+    os.close(fd)
+    for dtype, out in (('float64', None), ('float32', path)):
+      engine = ScoringEngine(self.enroll, self.test, self.h1, self.h2,
+                             dtype=dtype, test_tile=128, enroll_tile=100,
+                             n_threads=3)
+      scores = engine.score_matrix(out=out)
+      self.assertEqual(scores.dtype, np.dtype(dtype))
+      self.assertTrue(np.allclose(scores, self.ref, atol=1e-4))
+      self.assertTrue(engine.trials_per_second > 0)
+    self.assertTrue(np.allclose(np.load(path), self.ref, atol=1e-4))
+    os.remove(path)
+
+  def test_score_trials(self):
+    rand = np.random.RandomState(1)
+    engine = ScoringEngine(self.enroll, self.test, self.h1, self.h2,
+                           dtype='float64', test_tile=128, n_threads=2)
+    # sparse trials and dense trials (all models of the first segments)
+    sparse = (rand.randint(0, 300, 500), rand.randint(0, 1000, 500))
+    dense = np.meshgrid(np.arange(300), np.arange(10))
+    for model_idx, segment_idx in (sparse, dense):
+      labels = rand.randint(0, 2, size=np.size(model_idx))
+      sink = _Collector()
+      scores = engine.score_trials(model_idx, segment_idx, labels=labels,
+                                   sink=sink)
+      ref = self.ref[np.ravel(segment_idx), np.ravel(model_idx)]
+      self.assertTrue(np.allclose(scores, ref))
+      # the sink received all trials with their labels
+      order = np.argsort(ref)
+      self.assertTrue(
+          np.allclose(np.sort(np.concatenate(sink.scores)), ref[order]))
+      self.assertEqual(sorted(np.concatenate(sink.labels)), sorted(labels))
+    # the dense trials span several tiles of models
+    engine = ScoringEngine(self.enroll, self.test, self.h1, self.h2,
+                           dtype='float64', test_tile=128, enroll_tile=64,
+                           n_threads=2)
+    model_idx, segment_idx = dense
+    order = rand.permutation(model_idx.size)
+    model_idx, segment_idx = model_idx.ravel()[order], segment_idx.ravel()[order]
+    self.assertTrue(
+        np.allclose(engine.score_trials(model_idx, segment_idx),
+                    self.ref[segment_idx, model_idx]))
+
+
+if __name__ == '__main__':
+  unittest.main()
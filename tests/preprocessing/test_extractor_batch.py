@@ -0,0 +1,58 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+
+from odin.preprocessing import make_pipeline, speech
+from odin.preprocessing.base import ExtractorSignal
+
+np.random.seed(8)
+
+
+class ExtractorBatchTest(unittest.TestCase):
+
+  def _compare(self, pipeline, inputs):
+    outputs = pipeline.transform_batch(inputs)
+    self.assertEqual(len(outputs), len(inputs))
+    for x, y in zip(inputs, outputs):
+      ref = pipeline.transform(dict(x) if isinstance(x, dict) else x)
+      if isinstance(ref, ExtractorSignal):
+        self.assertTrue(isinstance(y, ExtractorSignal))
+        continue
+      self.assertEqual(sorted(ref.keys()), sorted(y.keys()))
+      for name, value in ref.items():
+        if isinstance(value, np.ndarray):
+          self.assertEqual(value.shape, y[name].shape, name)
+          self.assertTrue(np.allclose(value, y[name], rtol=1e-4, atol=1e-4),
+                          name)
+
+  def _inputs(self):
+    sr = 16000
+    inputs = [
+        dict(raw=np.random.randn(n).astype('float32'), sr=sr, name='utt%d' % i)
+        for i, n in enumerate((8000, 16000, 4000, 12345))
+    ]
+    # an invalid input in the middle of the batch
+    inputs.insert(2, dict(sr=sr, name='missing'))
+    return inputs
+
+  def test_mfcc_pipeline(self):
+    pipeline = make_pipeline([
+        speech.STFTExtractor(frame_length=0.025, step_length=0.010, n_fft=512),
+        speech.PowerSpecExtractor(power=2.0),
+        speech.MelsSpecExtractor(n_mels=40, fmin=64),
+        speech.MFCCsExtractor(n_ceps=20),
+    ])
+    self._compare(pipeline, self._inputs())
+
+  def test_framing_energy(self):
+    pipeline = make_pipeline([
+        speech.Framing(frame_length=0.025, step_length=0.010),
+        speech.CalculateEnergy(log=True),
+    ])
+    self._compare(pipeline, self._inputs())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,103 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from odin.fuel import Dataset
+from odin.preprocessing.base import Extractor
+from odin.preprocessing.processor import FeatureProcessor
+
+np.random.seed(8)
+
+
+def _shm_blocks():
+  if not os.path.isdir('/dev/shm'):
+    return set()
+  return set(i for i in os.listdir('/dev/shm') if i.startswith('psm_'))
+
+
+def _length(name):
+  return 3 + int(name[1:]) % 4
+
+
+class _Features(Extractor):
+
+  def __init__(self, fail_on=None):
+    super(_Features, self).__init__(is_input_layer=True, name='features')
+    self.fail_on = fail_on
+
+  def _transform(self, X):
+    if X == self.fail_on:
+      raise ValueError("Failed at: %s" % X)
+    i = int(X[1:])
+    return {'name': X, 'x': np.full((_length(X), 4), i, dtype='float32')}
+
+
+class FeatureProcessorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+    self.jobs = ['f%d' % i for i in range(24)]
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def _check(self, jobs):
+    ds = Dataset(self.path, read_only=True)
+    indices = ds['indices_x']
+    self.assertEqual(sorted(indices.keys()), sorted(jobs))
+    self.assertEqual(ds['x'].shape[0], sum(_length(j) for j in jobs))
+    for name, (start, end) in indices.items():
+      self.assertEqual(end - start, _length(name))
+      self.assertTrue(np.all(ds['x'][start:end] == int(name[1:])))
+    ds.close()
+
+  def test_shared_memory(self):
+    blocks = _shm_blocks()
+    FeatureProcessor(self.jobs,
+                     self.path,
+                     _Features(),
+                     n_cache=5,
+                     ncpu=2,
+                     shared_memory=True).run()
+    self._check(self.jobs)
+    self.assertEqual(_shm_blocks() - blocks, set())
+    # the writer is joined and the blocks are released on failure
+    shutil.rmtree(self.path)
+    with self.assertRaises(RuntimeError):
+      FeatureProcessor(self.jobs,
+                       self.path,
+                       _Features(fail_on='f13'),
+                       n_cache=5,
+                       ncpu=2,
+                       stop_on_failure=True,
+                       shared_memory=True).run()
+    self.assertEqual(_shm_blocks() - blocks, set())
+
+  def test_resume(self):
+    FeatureProcessor(self.jobs[:12], self.path, _Features(), n_cache=5).run()
+    self._check(self.jobs[:12])
+    # rows flushed without commit (i.e. crashed) are discarded
+    ds = Dataset(self.path, read_only=False)
+    ds.append('x', np.full((7, 4), -1, dtype='float32'))
+    ds.close()
+    processor = FeatureProcessor(self.jobs,
+                                 self.path,
+                                 _Features(fail_on='f2'),
+                                 n_cache=5)
+    processor.run()  # the committed jobs are skipped
+    self.assertEqual(len(processor.error_log), 0)
+    self._check(self.jobs)
+    # a Dataset without journal is not modified
+    os.remove(os.path.join(self.path, '.odin_journal'))
+    with self.assertRaises(RuntimeError):
+      FeatureProcessor(self.jobs + ['f30'], self.path, _Features()).run()
+    self._check(self.jobs)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,49 @@
+from __future__ import absolute_import, division, print_function
+
+import unittest
+
+import numpy as np
+from scipy import signal
+
+from odin.preprocessing.signal import delta, wmvn
+
+np.random.seed(8)
+
+
+class SlidingWindowTest(unittest.TestCase):
+
+  def test_wmvn(self):
+    x = (np.random.randn(1000, 12) * 5 + 30).astype('float32')
+    sad = np.random.rand(1000) > 0.3
+    w, hlen = 101, 50
+    for indices in (None, sad):
+      y = wmvn(x, w=w, varnorm=True, indices=indices)
+      self.assertEqual((y.shape, y.dtype), (x.shape, x.dtype))
+      for i in (0, 49, 50, 500, 949, 950, 999):
+        start = min(max(i - hlen, 0), 1000 - w)
+        x_stat = x[start:start + w]
+        if indices is not None:
+          x_stat = x_stat[indices[start:start + w]]
+        ref = (x[i] - x_stat.mean(0)) / x_stat.std(0)
+        self.assertTrue(np.allclose(y[i], ref, rtol=1e-4, atol=1e-4))
+
+  def test_delta(self):
+    x = np.random.randn(12, 500).astype('float32')
+    for width in (3, 9):
+      window = np.arange(width // 2, -width // 2, -1.)
+      window /= np.sum(window**2)
+      ref = signal.lfilter(window, 1,
+                           np.pad(x, [(0, 0), (width, width)], mode='edge'),
+                           axis=-1)[:, width + width // 2:-width // 2]
+      d1, d2 = delta(x, width=width, order=2, axis=-1)
+      self.assertEqual((d1.shape, d2.shape), (x.shape, x.shape))
+      self.assertTrue(np.allclose(d1, ref, atol=1e-6))
+      # second order is the delta of the first order, away from the borders
+      n = 2 * (width // 2)
+      self.assertTrue(
+          np.allclose(d2[:, n:-n], delta(d1, width=width, axis=-1)[:, n:-n],
+                      atol=1e-6))
+
+
+if __name__ == '__main__':
+  unittest.main()
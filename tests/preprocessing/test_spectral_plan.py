@@ -0,0 +1,65 @@
+from __future__ import absolute_import, division, print_function
+
+import pickle
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from odin.preprocessing.signal import (ceps_spectrogram, get_spectral_plan,
+                                       mels_spectrogram, power2db, spectra,
+                                       stft)
+
+np.random.seed(8)
+
+
+class SpectralPlanTest(unittest.TestCase):
+
+  def test_fused_spectra(self):
+    kw = dict(sr=16000, frame_length=400, step_length=160, n_fft=512,
+              window='hamm')
+    for duration in (4000, 16000, 8000):  # scratch buffers are reused
+      y = np.random.randn(duration).astype('float32')
+      feat = spectra(y=y, n_mels=40, n_ceps=20, fmin=100, fmax=6000, **kw)
+      S, energy = stft(y, kw['frame_length'], kw['step_length'], kw['n_fft'],
+                       window=kw['window'], energy=True)
+      spec = np.abs(S)**2
+      mspec = mels_spectrogram(spec, kw['sr'], 40, fmin=100, fmax=6000)
+      mfcc = ceps_spectrogram(mspec, 20)
+      for name, ref in (('spec', power2db(spec)), ('energy', energy),
+                        ('mspec', mspec), ('mfcc', mfcc)):
+        self.assertEqual(feat[name].shape, ref.shape)
+        self.assertTrue(np.allclose(feat[name], ref, rtol=1e-4, atol=1e-4))
+
+  def test_cache_and_pickle(self):
+    plan = get_spectral_plan(sr=8000, frame_length=200, n_mels=24, n_ceps=12)
+    self.assertTrue(plan is get_spectral_plan(sr=8000, frame_length=200,
+                                              n_mels=24, n_ceps=12))
+    self.assertEqual((plan.step_length, plan.n_fft), (50, 256))
+    y = np.random.randn(8000)
+    feat = plan.spectra(y)
+    plan = pickle.loads(pickle.dumps(plan))
+    self.assertTrue(np.allclose(plan.spectra(y)['mfcc'], feat['mfcc']))
+    # the cached filters only cover the non-zero FFT bins
+    start, weights = plan.mel_basis
+    self.assertEqual(weights.shape[1], 24)
+    self.assertTrue(start > 0)
+
+  def test_threads(self):
+    signals = [np.random.randn(n).astype('float32')
+               for n in np.random.randint(8000, 24000, size=64)]
+
+    def extract(y):
+      return spectra(16000, 400, y=y, step_length=160, n_mels=40, n_ceps=20)
+
+    serial = [extract(y) for y in signals]
+    # the scratch buffers of the shared plan are not shared by the threads
+    with ThreadPoolExecutor(8) as pool:
+      parallel = list(pool.map(extract, signals))
+    for ref, feat in zip(serial, parallel):
+      for name in ('spec', 'energy', 'mspec', 'mfcc'):
+        self.assertTrue(np.array_equal(ref[name], feat[name]), name)
+
+
+if __name__ == '__main__':
+  unittest.main()
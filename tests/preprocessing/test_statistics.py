@@ -0,0 +1,45 @@
+from __future__ import absolute_import, division, print_function
+
+import pickle
+import unittest
+
+import numpy as np
+
+from odin.preprocessing.signal import OnlineStatistics, mvn
+
+np.random.seed(8)
+
+
+class OnlineStatisticsTest(unittest.TestCase):
+
+  def test_merge(self):
+    x = np.random.randn(1234, 12)
+    stats = OnlineStatistics()
+    for b in np.array_split(x, 7):
+      stats.merge(OnlineStatistics(b))
+    self.assertEqual(stats.count, 1234)
+    self.assertTrue(np.allclose(stats.mean, x.mean(0)))
+    self.assertTrue(np.allclose(stats.std, x.std(0)))
+    self.assertTrue(np.allclose(stats.sum1, x.sum(0)))
+    self.assertTrue(np.allclose(stats.sum2, np.sum(x**2, 0)))
+    # pickle-able for sending from workers
+    stats = pickle.loads(pickle.dumps(stats))
+    self.assertTrue(np.allclose(stats.var, x.var(0)))
+
+  def test_precision_float32(self):
+    x = (np.random.randn(200000, 4) * 0.01 + 1e4).astype('float32')
+    stats = OnlineStatistics()
+    for b in np.array_split(x, 13):
+      stats += OnlineStatistics(b)
+    std = x.astype('float64').std(0)
+    self.assertTrue(np.allclose(stats.std, std, rtol=1e-6))
+
+  def test_precomputed_mvn(self):
+    x = np.random.rand(100, 8) * 3 + 2
+    stats = OnlineStatistics(x)
+    self.assertTrue(
+        np.allclose(mvn(x, mean=stats.mean, std=stats.std), mvn(x)))
+
+
+if __name__ == '__main__':
+  unittest.main()
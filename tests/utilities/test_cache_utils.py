@@ -0,0 +1,103 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import time
+import unittest
+from tempfile import mkdtemp
+
+import numpy as np
+
+from odin.utils.cache_utils import DiskLRUCache, MmapLRUCache
+
+np.random.seed(8)
+
+
+class DiskLRUCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_read_write(self):
+    cache = DiskLRUCache(self.path)
+    x = np.random.rand(12, 8)
+    cache['abcd'] = {'x': x}
+    self.assertTrue('abcd' in cache)
+    self.assertTrue(np.all(cache['abcd']['x'] == x))
+    self.assertEqual(cache.get('efgh'), None)
+    with self.assertRaises(KeyError):
+      cache['efgh']
+    # re-open
+    cache = DiskLRUCache(self.path)
+    self.assertEqual(len(cache), 1)
+    self.assertTrue(np.all(cache.get('abcd')['x'] == x))
+
+  def test_eviction(self):
+    cache = DiskLRUCache(self.path, max_size=1)  # 1MB
+    for i in range(3):
+      cache['key%d' % i] = np.zeros(40000)  # ~320KB
+      time.sleep(0.01)
+    cache.get('key0')  # key1 is the least recently used
+    cache['key3'] = np.zeros(40000)
+    self.assertEqual(cache.get('key1'), None)
+    for i in (0, 2, 3):
+      self.assertTrue(cache.get('key%d' % i) is not None)
+    self.assertTrue(cache.size <= 1024 * 1024)
+    # the access order is preserved after re-opening
+    cache = DiskLRUCache(self.path, max_size=0.7)
+    self.assertEqual(len(cache), 2)
+    self.assertEqual(cache.get('key0'), None)
+
+
+class MmapLRUCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.path = mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def test_memmap_and_eviction(self):
+    cache = MmapLRUCache(self.path, max_size=1)  # 1MB
+    x = np.random.rand(200, 8)
+    y = cache.set('key0', x)
+    self.assertTrue(isinstance(y, np.memmap))
+    self.assertTrue(np.all(y == x))
+    # copy-on-write, the cached file is not modified
+    y[:] = 0
+    self.assertTrue(np.all(cache['key0'] == x))
+    for i in range(1, 4):
+      time.sleep(0.01)
+      cache['key%d' % i] = np.zeros(40000)  # ~320KB
+    time.sleep(0.01)
+    cache.get('key0')  # key1 is the least recently used
+    cache['key4'] = np.zeros(40000)
+    self.assertTrue(cache.get('key1') is None)
+    self.assertEqual(sorted(cache.keys('key')), ['key0', 'key2', 'key3', 'key4'])
+    # the budget is shared by all instances on the same directory
+    other = MmapLRUCache(self.path, max_size=1)
+    time.sleep(0.01)
+    cache.get('key0')
+    other['key5'] = np.zeros(40000)
+    self.assertEqual(sorted(cache.keys()), ['key0', 'key3', 'key4', 'key5'])
+    self.assertTrue(cache.size <= 1024 * 1024)
+
+  def test_lock_files(self):
+    cache = MmapLRUCache(self.path, max_size=0.5)
+    for i in range(4):
+      with cache.lock('key%d' % i):
+        cache['key%d' % i] = np.zeros(40000)  # ~320KB
+    # the lock files are removed together with the evicted entries
+    locks = [name for _, _, files in os.walk(self.path)
+             for name in files if name.endswith('.lock') and name != '.lock']
+    self.assertEqual(locks, ['key3.npy.lock'])
+    cache.clear()
+    self.assertEqual(len(cache), 0)
+    self.assertFalse(os.path.exists(cache._path('key3') + '.lock'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import os
+import unittest
+from tempfile import mkstemp
+
+import numpy as np
+
+from odin.utils.crypto import fast_checksum, md5_checksum
+
+np.random.seed(8)
+
+
+class ChecksumTest(unittest.TestCase):
+
+  def test_md5_checksum(self):
+    x = np.random.rand(120, 33).astype('float32')
+    y = np.asfortranarray(np.random.rand(50, 7))
+    md5 = hashlib.md5(x.tobytes() + y.tobytes()).hexdigest()
+    # same digest as hashing the copied bytes, with small chunks
+    self.assertEqual(md5_checksum([x, y], chunksize=1000), md5)
+    self.assertEqual(md5_checksum([x, y]), md5)
+
+  def test_fast_checksum(self):
+    x = np.random.rand(1000, 33)
+    digest = fast_checksum(x, blocksize=4096)
+    # only depends on the content, not the memory layout or threads
+    self.assertEqual(digest, fast_checksum(np.asfortranarray(x),
+                                           blocksize=4096))
+    self.assertEqual(digest, fast_checksum(x, blocksize=4096, ncpu=3))
+    self.assertNotEqual(digest, fast_checksum(x))
+    # dtype and shape are included
+    self.assertNotEqual(fast_checksum(x), fast_checksum(x.reshape(33, 1000)))
+    self.assertNotEqual(fast_checksum(x), fast_checksum(x.view('int64')))
+    self.assertEqual(fast_checksum(x, algorithm='md5'),
+                     fast_checksum(x.copy(), algorithm='md5'))
+
+  def test_memmap_memoized(self):
+    fd, path = mkstemp()
+    os.close(fd)
+    x = np.memmap(path, dtype='float32', mode='w+', shape=(200, 8))
+    x[:] = np.random.rand(200, 8)
+    x.flush()
+    del x
+    x = np.memmap(path, dtype='float32', mode='r', shape=(200, 8))
+    digest = fast_checksum(x)
+    self.assertEqual(digest, fast_checksum(np.array(x)))
+    self.assertEqual(digest, fast_checksum(x))
+    # modified file is hashed again, the mtime is moved forward explicitly
+    # since the file system timestamp could be too coarse
+    y = np.memmap(path, dtype='float32', mode='r+', shape=(200, 8))
+    y[0, 0] += 1
+    y.flush()
+    del y
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    self.assertNotEqual(digest, fast_checksum(x))
+    self.assertEqual(fast_checksum(path), fast_checksum(path))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+  unittest.main()
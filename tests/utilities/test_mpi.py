@@ -0,0 +1,51 @@
+from __future__ import absolute_import, division, print_function
+
+import time
+import unittest
+
+import numpy as np
+
+from odin.utils.mpi import MPI, SharedCounter
+
+np.random.seed(8)
+
+
+class MPITest(unittest.TestCase):
+
+  def _run(self, backend):
+    n_items = 3
+    produced = SharedCounter()
+
+    def func(i):
+      if i == 0:  # all other jobs finish before the first one
+        time.sleep(0.5)
+      for j in range(n_items):
+        produced.add(1)
+        yield i, j, np.full((128, 128), i, dtype='float64')  # 128KB
+
+    jobs = list(range(24))
+    hwm = 4
+    mpi = MPI(jobs, func, ncpu=2, batch=1, hwm=hwm, backend=backend,
+              ordered=True)
+    results = []
+    max_pending = 0
+    for i, j, x in mpi:
+      results.append((i, j))
+      max_pending = max(max_pending, produced.value - len(results))
+      self.assertTrue(np.all(x == i))
+      # the returned arrays are owned by the main process
+      x[:] = -1
+    self.assertEqual(results, [(i, j) for i in jobs for j in range(n_items)])
+    # the results waiting for the first job are bounded by the credits
+    # (plus one result per worker waiting for its credit)
+    self.assertTrue(max_pending <= hwm + 2, max_pending)
+
+  def test_ordered_credits_python(self):
+    self._run('python')
+
+  def test_ordered_credits_pyzmq(self):
+    self._run('pyzmq')
+
+
+if __name__ == '__main__':
+  unittest.main()
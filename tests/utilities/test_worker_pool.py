@@ -0,0 +1,57 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+
+import numpy as np
+
+from odin.utils.mpi import WorkerPool
+
+np.random.seed(8)
+
+
+def _sum_row(i):
+  X = WorkerPool.shared('X')
+  WorkerPool.shared('acc')[i] = X[i].sum()
+  return i, os.getpid()
+
+
+def _repeat(i):
+  for j in range(i % 3):
+    yield i, j
+
+
+def _error(i):
+  if i == 5:
+    raise ValueError("error job")
+  return i
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+  def test_map_reuse(self):
+    X = np.random.rand(40, 8)
+    with WorkerPool(ncpu=2) as pool:
+      pids = set()
+      for scale in (1, 2, 3):
+        pool.broadcast('X', X * scale)
+        acc = pool.broadcast('acc', np.zeros(40))
+        results = pool.map(_sum_row, range(40))
+        self.assertEqual([i for i, _ in results], list(range(40)))
+        self.assertTrue(np.allclose(acc, (X * scale).sum(1)))
+        pids |= set(pid for _, pid in results)
+      # the same processes are used for all calls
+      self.assertTrue(len(pids) <= 2)
+
+  def test_imap_and_error(self):
+    with WorkerPool(ncpu=2) as pool:
+      self.assertEqual(sorted(pool.imap(_repeat, range(6))),
+                       [(i, j) for i in range(6) for j in range(i % 3)])
+      with self.assertRaises(RuntimeError):
+        pool.map(_error, range(20))
+      # the pool is still usable after an error
+      self.assertEqual(pool.map(_error, range(5)), list(range(5)))
+
+
+if __name__ == '__main__':
+  unittest.main()